@@ -0,0 +1,373 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+from functools import partial
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+import main
+from main import app, db_manager, upload_service, upload_sessions
+from metrics import requisicoes_http
+from storage import ArquivoMuitoGrande
+from upload_service import UploadInvalido
+
+logger = logging.getLogger(__name__)
+
+# Corpo repassado ao Flask fica em memória até este tamanho, depois vai para disco
+_LIMITE_CORPO_MEMORIA = 1024 * 1024
+
+
+def _corpo_muito_grande():
+    return main.jsonify({'error': 'Corpo da requisição muito grande'}), 413
+
+
+def _erro(mensagem, status):
+    return main.jsonify({'error': mensagem}), status
+
+
+class ClienteDesconectado(Exception):
+    """Cliente encerrou a conexão antes de terminar de enviar o corpo"""
+
+
+class AsyncDatabase:
+    """Ponte entre corrotinas e o DatabaseManager síncrono
+
+    Chamadas bloqueantes (banco, disco, Flask) rodam em um pool de threads do
+    tamanho do pool de conexões, de forma que o número de threads não cresce
+    com o número de clientes: quem ainda está enviando ou recebendo bytes
+    espera no event loop, sem ocupar thread nem conexão.
+    """
+
+    def __init__(self, db_manager, max_workers=None):
+        self.db_manager = db_manager
+        self.max_workers = max_workers or int(os.getenv('DATABASE_POOL_SIZE', 10))
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='asgi-bridge')
+        return self._executor
+
+    async def call(self, fn, *args, **kwargs):
+        """Executa uma função bloqueante no pool e aguarda o resultado"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    async def run(self, sql, params=None, fetch=False):
+        """Equivalente assíncrono de DatabaseManager.run"""
+        return await self.call(self.db_manager.run, sql, params, fetch=fetch)
+
+    def close(self):
+        """Aguarda as chamadas em andamento e fecha o pool de conexões"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.db_manager.close_pool()
+
+
+def _headers(scope):
+    """Headers da requisição ASGI (nomes em minúsculas; repetidos unidos por vírgula)"""
+    headers = {}
+    for nome, valor in scope.get('headers', ()):
+        nome = nome.decode('latin-1')
+        valor = valor.decode('latin-1')
+        headers[nome] = f"{headers[nome]},{valor}" if nome in headers else valor
+    return headers
+
+
+class PortalASGI:
+    """Aplicação ASGI do portal
+
+    As rotas de upload (POST /api/upload e PUT de pedaços de sessão) são
+    atendidas aqui: o corpo chega pelo receive() e cada bloco de até
+    `storage.chunk_size` bytes é entregue ao LeitorMultipart/GravacaoChunk no
+    pool da AsyncDatabase. As demais rotas são repassadas ao app Flask (WSGI)
+    no mesmo pool, com o corpo já recebido e a resposta enviada pelo event
+    loop. Rotas, autenticação e respostas de erro são as mesmas do main.py.
+    """
+
+    def __init__(self, flask_app, db, receive_timeout=60.0):
+        self.flask_app = flask_app
+        self.db = db
+        self.receive_timeout = receive_timeout
+        self._rotas = flask_app.url_map.bind('localhost')
+        self._nativas = {
+            'upload_documento': self._upload_documento,
+            'enviar_chunk': self._enviar_chunk,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            handler, argumentos, regra = self._rota_nativa(scope)
+            if handler is None:
+                await self._repassar_wsgi(scope, receive, send)
+            else:
+                await self._medir(handler, regra, scope, receive, send, argumentos)
+        else:
+            raise RuntimeError(f"Tipo de conexão não suportado: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.db.call(main.iniciar_worker)
+                logger.info(f"Modo ASGI iniciado ({self.db.max_workers} threads para banco e Flask)")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.db.close)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _rota_nativa(self, scope):
+        try:
+            regra, argumentos = self._rotas.match(scope['path'], method=scope['method'], return_rule=True)
+        except (HTTPException, RequestRedirect):
+            return None, None, None
+        return self._nativas.get(regra.endpoint), argumentos, regra
+
+    async def _medir(self, handler, regra, scope, receive, send, argumentos):
+        """Executa a rota nativa com o rate limit e a medição de latência dos hooks do Flask"""
+        inicio = time.perf_counter()
+        resposta = {'status': 499}  # cliente desconectado antes da resposta
+        limite = None
+
+        async def enviar(message):
+            if message['type'] == 'http.response.start':
+                resposta['status'] = message['status']
+                if limite is not None and limite.permitido:
+                    message['headers'] = message['headers'] + [
+                        (nome.lower().encode('latin-1'), valor.encode('latin-1'))
+                        for nome, valor in main.cabecalhos_rate_limit(limite).items()
+                    ]
+            await send(message)
+
+        try:
+            limite = await self.db.call(
+                main.verificar_rate_limit, regra.endpoint,
+                _headers(scope).get('authorization'), (scope.get('client') or (None,))[0]
+            )
+            if limite is not None and not limite.permitido:
+                await self._responder(enviar, partial(main.resposta_limite_excedido, limite))
+            else:
+                await handler(scope, receive, enviar, **argumentos)
+        finally:
+            requisicoes_http.observar(
+                time.perf_counter() - inicio, scope['method'], regra.rule, str(resposta['status'])
+            )
+
+    async def _receber(self, receive):
+        """Próxima mensagem do corpo, com tempo limite para clientes parados"""
+        try:
+            message = await asyncio.wait_for(receive(), self.receive_timeout)
+        except asyncio.TimeoutError:
+            raise UploadInvalido(f"Nenhum dado recebido em {self.receive_timeout:.0f} s")
+        if message['type'] == 'http.disconnect':
+            raise ClienteDesconectado()
+        return message.get('body', b''), message.get('more_body', False)
+
+    async def _blocos(self, receive, tamanho):
+        """Corpo da requisição agrupado em blocos de até `tamanho` bytes"""
+        buffer = bytearray()
+        mais = True
+        while mais:
+            body, mais = await self._receber(receive)
+            buffer += body
+            if len(buffer) >= tamanho or (buffer and not mais):
+                yield bytes(buffer)
+                buffer.clear()
+
+    async def _usuario(self, headers):
+        """Claims do token do header Authorization (NaoAutorizado se recusado)"""
+        return dict(await self.db.call(main.autenticar, headers.get('authorization')))
+
+    async def _upload_documento(self, scope, receive, send):
+        headers = _headers(scope)
+        try:
+            usuario = await self._usuario(headers)
+        except main.NaoAutorizado as e:
+            return await self._responder(send, partial(_erro, str(e), 401))
+
+        leitor = None
+        try:
+            tamanho = headers.get('content-length')
+            if tamanho and tamanho.isdigit() and int(tamanho) > upload_service.limite_padrao + 64 * 1024:
+                raise ArquivoMuitoGrande(upload_service.limite_padrao)
+
+            campos = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+            leitor = upload_service.leitor_multipart(headers.get('content-type'), campos)
+            async for bloco in self._blocos(receive, upload_service.storage.chunk_size):
+                if not leitor.fim:
+                    await self.db.call(leitor.alimentar, bloco)
+            if not leitor.fim:
+                await self.db.call(leitor.alimentar, None)
+            recebido = await self.db.call(leitor.concluir)
+            leitor = None
+
+            documento = await self.db.call(
+                upload_service.registrar_recebido,
+                usuario, recebido,
+                ip_address=(scope.get('client') or (None,))[0],
+                user_agent=headers.get('user-agent')
+            )
+        except ClienteDesconectado:
+            logger.info("Upload interrompido: cliente desconectado")
+            return
+        except Exception as e:
+            return await self._responder(send, partial(main.resposta_erro_upload, e))
+        finally:
+            if leitor is not None:
+                await self.db.call(leitor.descartar)
+
+        await self._responder(send, partial(main.resposta_upload_criado, documento))
+
+    async def _enviar_chunk(self, scope, receive, send, sessao_id, indice):
+        headers = _headers(scope)
+        try:
+            usuario = await self._usuario(headers)
+        except main.NaoAutorizado as e:
+            return await self._responder(send, partial(_erro, str(e), 401))
+
+        try:
+            gravacao = await self.db.call(upload_sessions.abrir_chunk, usuario, sessao_id, indice)
+            try:
+                async for bloco in self._blocos(receive, upload_sessions.storage.chunk_size):
+                    await self.db.call(gravacao.write, bloco)
+            finally:
+                gravacao.fechar()
+            resultado = await self.db.call(gravacao.concluir, headers.get('x-chunk-sha256'))
+        except ClienteDesconectado:
+            logger.info(f"Pedaço {indice} da sessão {sessao_id} interrompido: cliente desconectado")
+            return
+        except Exception as e:
+            return await self._responder(send, partial(main.resposta_erro_upload, e))
+
+        await self._responder(send, lambda: main.jsonify(resultado))
+
+    async def _responder(self, send, gerar):
+        """Envia a resposta Flask produzida por `gerar` (executado no app context)"""
+        def montar():
+            with self.flask_app.app_context():
+                response = self.flask_app.make_response(gerar())
+                return response.status_code, response.headers.to_wsgi_list(), response.get_data()
+
+        status, headers, corpo = await self.db.call(montar)
+        headers.append(('Access-Control-Allow-Origin', '*'))
+        await self._enviar(send, status, headers, [corpo])
+
+    async def _enviar(self, send, status, headers, corpo):
+        await self._iniciar_resposta(send, status, headers)
+        for parte in corpo:
+            if parte:
+                await send({'type': 'http.response.body', 'body': parte, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def _iniciar_resposta(self, send, status, headers):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in headers],
+        })
+
+    async def _repassar_wsgi(self, scope, receive, send):
+        """Executa a requisição no app Flask, enviando a resposta à medida que é gerada
+
+        O corpo é recebido antes (em memória até _LIMITE_CORPO_MEMORIA, depois
+        em disco) e recusado com 413 acima do limite de upload. Cada pedaço da
+        resposta é produzido no pool e enviado em seguida, então respostas em
+        streaming (listagem de documentos, compressão) não são acumuladas.
+        """
+        limite = upload_service.limite_padrao + 64 * 1024
+        tamanho = _headers(scope).get('content-length')
+        if tamanho and tamanho.isdigit() and int(tamanho) > limite:
+            return await self._responder(send, _corpo_muito_grande)
+
+        corpo = tempfile.SpooledTemporaryFile(max_size=_LIMITE_CORPO_MEMORIA)
+        try:
+            try:
+                recebidos = 0
+                async for bloco in self._blocos(receive, _LIMITE_CORPO_MEMORIA):
+                    recebidos += len(bloco)
+                    if recebidos > limite:
+                        return await self._responder(send, _corpo_muito_grande)
+                    corpo.write(bloco)
+            except ClienteDesconectado:
+                return
+            except UploadInvalido as e:
+                return await self._responder(send, partial(_erro, str(e), 408))
+
+            environ = self._environ(scope, corpo)
+            corpo.seek(0)
+            status, headers, iterable = await self.db.call(self._iniciar_wsgi, environ)
+            try:
+                await self._iniciar_resposta(send, status, headers)
+                partes = iter(iterable)
+                while True:
+                    parte = await self.db.call(next, partes, None)
+                    if parte is None:
+                        break
+                    if parte:
+                        await send({'type': 'http.response.body', 'body': parte, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                # Fecha o gerador (cursor da listagem) mesmo se o cliente desconectar
+                if hasattr(iterable, 'close'):
+                    await self.db.call(iterable.close)
+        finally:
+            corpo.close()
+
+    def _environ(self, scope, corpo):
+        servidor = scope.get('server') or ('localhost', 80)
+        cliente = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(servidor[0]),
+            'SERVER_PORT': str(servidor[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': cliente[0],
+            'REMOTE_PORT': str(cliente[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': corpo,
+            # Corpo já recebido por inteiro (inclusive chunked): o tamanho é o real
+            'CONTENT_LENGTH': str(corpo.seek(0, os.SEEK_END)),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for nome, valor in _headers(scope).items():
+            if nome == 'content-type':
+                environ['CONTENT_TYPE'] = valor
+            elif nome != 'content-length':
+                environ['HTTP_' + nome.upper().replace('-', '_')] = valor
+        return environ
+
+    def _iniciar_wsgi(self, environ):
+        """Chama o app Flask: (status, headers, iterável do corpo ainda não consumido)"""
+        resposta = {}
+
+        def start_response(status, headers, exc_info=None):
+            resposta['status'] = int(status.split(' ', 1)[0])
+            resposta['headers'] = headers
+
+        iterable = self.flask_app(environ, start_response)
+        return resposta['status'], resposta['headers'], iterable
+
+
+# uvicorn asgi:application --host 0.0.0.0 --port 5000
+application = PortalASGI(
+    app,
+    AsyncDatabase(db_manager, max_workers=int(os.getenv('ASGI_THREADS', 0)) or None),
+    receive_timeout=float(os.getenv('ASGI_RECEIVE_TIMEOUT', 60))
+)
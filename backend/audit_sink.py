@@ -0,0 +1,289 @@
+import os
+import json
+import glob
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: segmentos sem flock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+# Colunas gravadas por tipo de evento (a ordem é a do registro no spill)
+_COLUNAS = {
+    'historico_documentos': ('documento_id', 'usuario_id', 'acao', 'status_anterior', 'status_novo',
+                             'observacoes', 'dados_alteracao', 'ip_origem', 'user_agent', 'data_acao'),
+    'auditoria_sistema': ('usuario_id', 'acao', 'tabela_afetada', 'registro_id', 'dados_anteriores',
+                          'dados_novos', 'ip_origem', 'user_agent', 'data_acao'),
+}
+
+
+def _json(valor):
+    if valor is None or isinstance(valor, str):
+        return valor
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+
+class _Segmento:
+    """Arquivo de spill do processo, travado (flock) enquanto estiver aberto"""
+
+    __slots__ = ('caminho', 'fd', 'eventos')
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.fd = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.eventos = 0
+
+    def fechar(self, remover=False):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if remover:
+            try:
+                os.unlink(self.caminho)
+            except FileNotFoundError:
+                pass
+
+
+class AuditSink:
+    """Grava historico_documentos e auditoria_sistema em lote, fora da requisição
+
+    historico() e auditar() apenas acrescentam uma linha JSON ao arquivo de
+    spill do processo (um write() com O_APPEND) e enfileiram o evento em
+    memória. Uma thread grava a fila com INSERT multi-linha (bulk_insert) em
+    uma única transação quando ela atinge `max_lote` eventos ou a cada
+    `intervalo` segundos.
+
+    A cada gravação o segmento de spill é trocado por um novo, e os segmentos
+    cujos eventos já foram confirmados são apagados. Segmentos deixados por um
+    processo que morreu (sem flock ativo) são regravados por recuperar(), de
+    modo que nenhum evento aceito se perde. flush() é a barreira: retorna
+    quando tudo o que foi enfileirado antes da chamada está no banco.
+
+    Sem fcntl (Windows) não há flock: recuperar() trata como ativos apenas os
+    segmentos do próprio processo, então a pasta não pode ser compartilhada.
+    """
+
+    def __init__(self, db_manager, diretorio, max_lote=500, intervalo=1.0, fsync=False):
+        self.db_manager = db_manager
+        self.diretorio = os.path.abspath(diretorio)
+        self.max_lote = max_lote
+        self.intervalo = intervalo
+        self.fsync = fsync
+        self._pid = None
+        self._thread = None
+        self._parar = False
+        self._spill_pendente = False
+        self._lock_inicio = threading.Lock()
+
+    def _iniciar_processo(self):
+        """Estado por processo: após fork() o filho começa com fila e spill próprios"""
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._fila = deque()
+        self._enfileirados = 0
+        self._confirmados = 0
+        self._urgente = False
+        self._numero_segmento = 0
+        self._antigos = []
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._segmento = self._novo_segmento()
+        self._parar = False
+        self._spill_pendente = True
+        self._thread = threading.Thread(target=self._executar, name='audit-sink', daemon=True)
+        self._thread.start()
+
+    def _novo_segmento(self):
+        self._numero_segmento += 1
+        return _Segmento(os.path.join(self.diretorio, f"audit-{self._pid}-{self._numero_segmento:06d}.jsonl"))
+
+    def _garantir_processo(self):
+        if self._pid != os.getpid():
+            with self._lock_inicio:
+                if self._pid != os.getpid():
+                    self._iniciar_processo()
+
+    def historico(self, documento_id, usuario_id, acao, status_anterior=None, status_novo=None,
+                  observacoes=None, dados_alteracao=None, ip_origem=None, user_agent=None):
+        """Enfileira uma linha de historico_documentos"""
+        self._enfileirar('historico_documentos', (
+            documento_id, usuario_id, acao, status_anterior, status_novo, observacoes,
+            _json(dados_alteracao), ip_origem, user_agent, datetime.utcnow().strftime(_FORMATO_DATA)
+        ))
+
+    def auditar(self, acao, usuario_id=None, tabela_afetada=None, registro_id=None,
+                dados_anteriores=None, dados_novos=None, ip_origem=None, user_agent=None):
+        """Enfileira uma linha de auditoria_sistema"""
+        self._enfileirar('auditoria_sistema', (
+            usuario_id, acao, tabela_afetada, registro_id, _json(dados_anteriores), _json(dados_novos),
+            ip_origem, user_agent, datetime.utcnow().strftime(_FORMATO_DATA)
+        ))
+
+    def _enfileirar(self, tabela, valores):
+        self._garantir_processo()
+        linha = (json.dumps([tabela, valores], ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        with self._cond:
+            os.write(self._segmento.fd, linha)
+            self._segmento.eventos += 1
+            self._fila.append((tabela, valores))
+            self._enfileirados += 1
+            if len(self._fila) >= self.max_lote:
+                self._cond.notify_all()
+
+    def pendentes(self):
+        """Eventos aceitos e ainda não confirmados no banco"""
+        if self._pid != os.getpid():
+            return 0
+        return self._enfileirados - self._confirmados
+
+    def flush(self, timeout=None):
+        """Barreira: aguarda a gravação de tudo o que já foi enfileirado
+
+        Retorna False se o tempo limite acabar antes (ex.: banco indisponível).
+        """
+        if self._pid != os.getpid():
+            return True
+        with self._cond:
+            alvo = self._enfileirados
+            self._urgente = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._confirmados >= alvo, timeout)
+
+    def _executar(self):
+        while True:
+            if self._spill_pendente:
+                # Na partida, e de novo a cada intervalo enquanto o banco estiver fora
+                try:
+                    self.recuperar()
+                except Exception as e:
+                    self._spill_pendente = False
+                    logger.error(f"Auditoria: falha ao recuperar o spill: {e}")
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._parar or self._urgente or len(self._fila) >= self.max_lote, self.intervalo
+                )
+                self._urgente = False
+                if not self._fila:
+                    if self._parar:
+                        return
+                    continue
+                lote = list(self._fila)
+                self._fila.clear()
+                # Novos eventos vão para outro segmento; este só some após o commit
+                self._antigos.append(self._segmento)
+                self._segmento = self._novo_segmento()
+            self._gravar_lote(lote)
+
+    def _gravar_lote(self, lote):
+        if self.fsync:
+            for segmento in self._antigos:
+                os.fsync(segmento.fd)
+        try:
+            self._inserir(lote)
+        except Exception as e:
+            if not self.db_manager.health_check(timeout=1.0):
+                logger.error(f"Auditoria: banco indisponível, {len(lote)} eventos aguardando nova tentativa: {e}")
+                with self._cond:
+                    self._fila.extendleft(reversed(lote))
+                    self._cond.wait(self.intervalo)
+                return
+            # Banco responde: isola os eventos que o banco recusa (ex.: chave estrangeira)
+            self._inserir_individualmente(lote)
+
+        # Só o flusher altera _antigos; o spill é apagado antes de liberar a barreira
+        antigos, self._antigos = self._antigos, []
+        for segmento in antigos:
+            segmento.fechar(remover=True)
+        with self._cond:
+            self._confirmados += len(lote)
+            self._cond.notify_all()
+
+    def _inserir(self, lote):
+        por_tabela = {}
+        for tabela, valores in lote:
+            por_tabela.setdefault(tabela, []).append(valores)
+        with self.db_manager.transaction() as tx:
+            for tabela, linhas in por_tabela.items():
+                tx.bulk_insert(tabela, _COLUNAS[tabela], linhas)
+
+    def _inserir_individualmente(self, lote):
+        rejeitados = os.path.join(self.diretorio, 'audit-rejeitados.jsonl')
+        for tabela, valores in lote:
+            try:
+                self._inserir([(tabela, valores)])
+            except Exception as e:
+                logger.error(f"Auditoria: evento de {tabela} recusado ({e}); gravado em {rejeitados}")
+                with open(rejeitados, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps([tabela, valores, str(e)], ensure_ascii=False, default=str) + '\n')
+
+    def recuperar(self):
+        """Regrava os segmentos de spill deixados por processos encerrados
+
+        Com o banco indisponível os segmentos ficam no disco e a recuperação é
+        tentada de novo pela thread de gravação.
+        """
+        self._spill_pendente = False
+        recuperados = 0
+        for caminho in sorted(glob.glob(os.path.join(self.diretorio, 'audit-*-*.jsonl'))):
+            try:
+                fd = os.open(caminho, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                if fcntl is None:
+                    # Sem flock não há como saber se outro processo está vivo:
+                    # só os segmentos deste processo são considerados ativos
+                    if os.path.basename(caminho).startswith(f"audit-{os.getpid()}-"):
+                        continue
+                else:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # segmento de um processo ativo
+                if os.fstat(fd).st_nlink == 0:
+                    continue  # já recuperado por outro processo
+                with os.fdopen(os.dup(fd), 'rb') as f:
+                    lote = []
+                    for linha in f:
+                        try:
+                            tabela, valores = json.loads(linha)
+                        except ValueError:
+                            continue  # última linha incompleta de um processo interrompido
+                        if tabela in _COLUNAS:
+                            lote.append((tabela, tuple(valores)))
+                if lote:
+                    try:
+                        self._inserir(lote)
+                    except Exception as e:
+                        if not self.db_manager.health_check(timeout=1.0):
+                            logger.error(f"Auditoria: banco indisponível, spill mantido para nova tentativa: {e}")
+                            self._spill_pendente = True
+                            break
+                        self._inserir_individualmente(lote)
+                os.unlink(caminho)
+                recuperados += len(lote)
+            finally:
+                os.close(fd)
+        if recuperados:
+            logger.warning(f"Auditoria: {recuperados} eventos recuperados do spill")
+        return recuperados
+
+    def stop(self, timeout=None):
+        """Grava o que estiver na fila e encerra a thread"""
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            self._parar = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        with self._cond:
+            self._segmento.fechar(remover=self._segmento.eventos == 0)
+            self._pid = None
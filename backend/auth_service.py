@@ -0,0 +1,217 @@
+import os
+import hmac
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+_FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+# Incrementa as tentativas e bloqueia ao atingir o limite em um único statement.
+# Depois de um bloqueio vencido (segundo parâmetro de cada CASE) a contagem
+# recomeça do zero e bloqueado_ate é limpo. Nenhuma atribuição lê a coluna que a
+# outra altera, então o resultado não depende da ordem em que o banco as aplica
+# (o MySQL aplica da esquerda para a direita).
+_REGISTRAR_FALHA = """
+    UPDATE usuarios
+    SET bloqueado_ate = CASE WHEN (CASE WHEN ? THEN 0 ELSE tentativas_login END) + 1 >= ? THEN ?
+                             WHEN ? THEN NULL
+                             ELSE bloqueado_ate END,
+        tentativas_login = CASE WHEN ? THEN 1 ELSE tentativas_login + 1 END
+    WHERE id = ?
+"""
+
+_REGISTRAR_SUCESSO = """
+    UPDATE usuarios
+    SET tentativas_login = 0, bloqueado_ate = NULL, ultimo_acesso = ?,
+        ip_ultimo_acesso = ?, senha = COALESCE(?, senha)
+    WHERE id = ?
+"""
+
+
+class CredenciaisInvalidas(Exception):
+    """Email ou senha incorretos"""
+
+
+class UsuarioBloqueado(Exception):
+    """Usuário bloqueado por excesso de tentativas de login"""
+
+    def __init__(self, bloqueado_ate):
+        super().__init__(f"Usuário bloqueado até {bloqueado_ate}")
+        self.bloqueado_ate = bloqueado_ate
+
+
+class AutenticacaoSobrecarregada(Exception):
+    """Fila de verificação de senhas cheia"""
+
+
+def hash_senha(senha, rounds=12):
+    """Gera o hash bcrypt da senha com o fator de custo `rounds`"""
+    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(rounds)).decode('ascii')
+
+
+def custo_hash(senha_hash):
+    """Fator de custo de um hash bcrypt, ou None se não for bcrypt"""
+    partes = senha_hash.split('$') if senha_hash else []
+    if len(partes) < 4 or partes[1] not in ('2a', '2b', '2y') or not partes[2].isdigit():
+        return None
+    return int(partes[2])
+
+
+def _data(valor):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.fromisoformat(str(valor))
+
+
+class SenhaHasher:
+    """Executa bcrypt em um pool de threads limitado
+
+    bcrypt libera o GIL, então as threads usam núcleos distintos. No máximo
+    `max_workers` hashes rodam ao mesmo tempo e até `max_queue` aguardam; além
+    disso a chamada falha na hora com AutenticacaoSobrecarregada em vez de
+    prender mais workers da aplicação.
+    """
+
+    def __init__(self, rounds=12, max_workers=None, max_queue=32, timeout=10.0):
+        self.rounds = rounds
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # Um executor por processo: threads não sobrevivem ao fork()
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='bcrypt')
+                    self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _executar(self, func, *args):
+        executor = self._get_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise AutenticacaoSobrecarregada("Muitas verificações de senha em andamento")
+
+        def tarefa():
+            try:
+                return func(*args)
+            finally:
+                slots.release()
+
+        try:
+            future = executor.submit(tarefa)
+        except Exception:
+            slots.release()
+            raise
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise AutenticacaoSobrecarregada("Tempo esgotado na verificação de senha")
+
+    def verificar(self, senha, senha_hash):
+        """Confere a senha com o hash armazenado"""
+        if custo_hash(senha_hash) is None:
+            # Senha legada sem hash: comparação em tempo constante, rehash no sucesso
+            return hmac.compare_digest(senha.encode('utf-8'), (senha_hash or '').encode('utf-8'))
+        return self._executar(bcrypt.checkpw, senha.encode('utf-8'), senha_hash.encode('utf-8'))
+
+    def gerar(self, senha):
+        """Gera o hash da senha com o fator de custo configurado"""
+        return self._executar(hash_senha, senha, self.rounds)
+
+    def precisa_rehash(self, senha_hash):
+        """Hash ausente ou com fator de custo menor que o configurado"""
+        custo = custo_hash(senha_hash)
+        return custo is None or custo < self.rounds
+
+
+class AuthService:
+    """Autenticação de usuários contra a tabela usuarios"""
+
+    def __init__(self, db_manager, hasher, max_tentativas=5, bloqueio_minutos=15, sessao_horas=24):
+        self.db_manager = db_manager
+        self.hasher = hasher
+        self.max_tentativas = max_tentativas
+        self.bloqueio_minutos = bloqueio_minutos
+        self.sessao_horas = sessao_horas
+        self._hash_ficticio = None
+
+    def _verificar_ficticio(self, senha):
+        """Verificação com o mesmo custo para usuários inexistentes ou inativos"""
+        if self._hash_ficticio is None:
+            # Gerado no pool do hasher, como qualquer bcrypt, e não na thread da requisição
+            self._hash_ficticio = self.hasher.gerar(uuid.uuid4().hex)
+        self.hasher.verificar(senha, self._hash_ficticio)
+
+    def autenticar(self, email, senha, ip_address=None, user_agent=None):
+        """Valida as credenciais e abre uma sessão
+
+        Retorna os dados do usuário com `sid` (id em sessoes_usuario) e `exp`.
+        A senha é conferida antes do bloqueio: uma senha errada recebe
+        CredenciaisInvalidas mesmo com a conta bloqueada, de forma que a resposta
+        não revela quais contas existem ou estão bloqueadas.
+        """
+        rows = self.db_manager.run(
+            """SELECT id, nome, email, senha, tipo, transportadora_id, status_ativo, bloqueado_ate
+               FROM usuarios WHERE email = ?""",
+            (email,),
+            fetch=True
+        )
+        usuario = rows[0] if rows else None
+        agora = datetime.utcnow()
+
+        if usuario is None or not usuario['status_ativo']:
+            self._verificar_ficticio(senha)
+            raise CredenciaisInvalidas()
+
+        senha_correta = self.hasher.verificar(senha, usuario['senha'])
+        bloqueado_ate = _data(usuario['bloqueado_ate'])
+        if bloqueado_ate is not None and bloqueado_ate > agora:
+            # Tentativas durante o bloqueio não contam nem o prolongam
+            if senha_correta:
+                raise UsuarioBloqueado(bloqueado_ate)
+            raise CredenciaisInvalidas()
+
+        if not senha_correta:
+            bloqueio = (agora + timedelta(minutes=self.bloqueio_minutos)).strftime(_FORMATO_DATA)
+            vencido = bloqueado_ate is not None
+            self.db_manager.run(
+                _REGISTRAR_FALHA, (vencido, self.max_tentativas, bloqueio, vencido, vencido, usuario['id'])
+            )
+            raise CredenciaisInvalidas()
+
+        novo_hash = self.hasher.gerar(senha) if self.hasher.precisa_rehash(usuario['senha']) else None
+        sid = uuid.uuid4().hex
+        expira = agora + timedelta(hours=self.sessao_horas)
+        with self.db_manager.transaction() as tx:
+            tx.run(_REGISTRAR_SUCESSO, (agora.strftime(_FORMATO_DATA), ip_address, novo_hash, usuario['id']))
+            tx.run(
+                """INSERT INTO sessoes_usuario (id, usuario_id, ip_address, user_agent, data_expiracao, ativo)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (sid, usuario['id'], ip_address, (user_agent or '')[:500], expira.strftime(_FORMATO_DATA), True)
+            )
+        if novo_hash:
+            logger.info(f"Hash de senha atualizado para o usuário {usuario['id']}")
+
+        return {
+            'id': usuario['id'],
+            'email': usuario['email'],
+            'nome': usuario['nome'],
+            'tipo': usuario['tipo'],
+            'transportadora_id': usuario['transportadora_id'],
+            'sid': sid,
+            'exp': expira,
+        }
@@ -0,0 +1,52 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Executa uma função em intervalo fixo numa thread daemon
+
+    A thread é iniciada sob demanda e uma vez por processo, de modo que
+    workers criados por fork() iniciam a própria thread no primeiro uso.
+    """
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _running(self):
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def ensure_started(self):
+        """Inicia a thread se ainda não estiver rodando neste processo"""
+        if self.interval <= 0 or self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Interrompe a thread e aguarda o término da execução corrente"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _run(self):
+        stop = self._stop
+        while not stop.is_set():
+            try:
+                self.func()
+            except Exception as e:
+                logger.error(f"Erro na tarefa periódica {self.name}: {e}")
+            stop.wait(self.interval)
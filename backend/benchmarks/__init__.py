@@ -0,0 +1,14 @@
+"""Micro-benchmarks e teste de carga do Portal NIMOENERGIA
+
+Executar a partir de backend/:
+
+    python -m benchmarks todos              # micro + carga, compara com baseline.json
+    python -m benchmarks micro --filtro json
+    python -m benchmarks carga --url http://127.0.0.1:8000   # servidor já em execução
+    python -m benchmarks todos --atualizar-baseline
+    python -m benchmarks gerar --documentos 5000000   # dados sintéticos no banco configurado
+
+Roda sem rede externa contra um SQLite descartável semeado de forma
+determinística, ou contra o PostgreSQL local configurado quando
+DATABASE_TYPE=postgresql estiver no ambiente.
+"""
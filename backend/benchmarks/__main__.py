@@ -0,0 +1,130 @@
+import sys
+import json
+import atexit
+import shutil
+import logging
+import argparse
+from datetime import date
+
+from benchmarks import ambiente, baseline
+from benchmarks.gerador import REFERENCIA
+
+logger = logging.getLogger('benchmarks')
+
+
+def _argumentos(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks do Portal NIMOENERGIA')
+    parser.add_argument('modo', choices=('micro', 'carga', 'todos', 'gerar', 'servidor'))
+    parser.add_argument('--diretorio', help='Diretório do banco SQLite e uploads (temporário por padrão; '
+                                            'em gerar, sem ele é usado o banco configurado)')
+    parser.add_argument('--transportadoras', type=int, help='Padrão: 2000 (benchmarks) ou 20000 (gerar)')
+    parser.add_argument('--documentos', type=int, help='Padrão: 50000 (benchmarks) ou 1000000 (gerar)')
+    parser.add_argument('--historico', type=int, default=300000, help='Linhas de historico_documentos (gerar)')
+    parser.add_argument('--notificacoes', type=int, default=200000, help='Linhas de notificacoes (gerar)')
+    parser.add_argument('--auditoria', type=int, default=100000, help='Linhas de auditoria_sistema (gerar)')
+    parser.add_argument('--referencia', type=date.fromisoformat, default=REFERENCIA,
+                        help='Data "de hoje" dos dados gerados (AAAA-MM-DD)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeticoes', type=int, default=5, help='Rodadas de cada micro-benchmark')
+    parser.add_argument('--filtro', help='Executa apenas micro-benchmarks com este trecho no nome')
+    parser.add_argument('--processos', type=int, default=4, help='Processos geradores de carga')
+    parser.add_argument('--conexoes', type=int, default=4, help='Conexões keep-alive por processo')
+    parser.add_argument('--duracao', type=float, default=10.0, help='Segundos de carga')
+    parser.add_argument('--url', help='Servidor alvo da carga (padrão: inicia um servidor local)')
+    parser.add_argument('--porta', type=int, help='Porta do modo servidor')
+    parser.add_argument('--baseline', default=baseline.ARQUIVO_BASELINE)
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='Piora relativa aceita (0.25 = 25%%)')
+    parser.add_argument('--atualizar-baseline', action='store_true', help='Grava o resultado como nova baseline')
+    parser.add_argument('--saida', help='Grava o resultado em JSON neste arquivo')
+    return parser.parse_args(argv)
+
+
+def gerar(args):
+    """Carrega dados sintéticos no banco configurado (ou em --diretorio)"""
+    if args.diretorio:
+        ambiente.preparar(args.diretorio)
+    from database_manager import db_manager
+    from benchmarks.gerador import GeradorDados
+    contagem = GeradorDados(db_manager, args.seed, args.referencia).gerar(
+        transportadoras=args.transportadoras or 20000, documentos=args.documentos or 1000000,
+        historico=args.historico, notificacoes=args.notificacoes, auditoria=args.auditoria
+    )
+    print(json.dumps(contagem, indent=2))
+    return 0
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    logger.setLevel(logging.INFO)
+    logging.getLogger('benchmarks.micro').setLevel(logging.INFO)
+    logging.getLogger('benchmarks.gerador').setLevel(logging.INFO)
+
+    if args.modo == 'servidor':
+        from benchmarks.carga import servir
+        servir(args.porta)
+        return 0
+
+    if args.modo == 'gerar':
+        return gerar(args)
+
+    args.transportadoras = args.transportadoras or 2000
+    args.documentos = args.documentos or 50000
+    parametros = {
+        'transportadoras': args.transportadoras, 'documentos': args.documentos, 'seed': args.seed,
+        'processos': args.processos, 'conexoes': args.conexoes, 'duracao': args.duracao,
+    }
+    resultado = {'ambiente': baseline.ambiente_execucao(), 'parametros': parametros}
+
+    if args.modo != 'carga' or not args.url:
+        diretorio = ambiente.preparar(args.diretorio)
+        if not args.diretorio:
+            atexit.register(shutil.rmtree, diretorio, True)
+        from database_manager import db_manager
+        logger.info(f"Semeando banco de benchmark em {diretorio}")
+        ambiente.semear(db_manager, args.transportadoras, args.documentos, args.seed)
+
+    if args.modo in ('micro', 'todos'):
+        from benchmarks import micro
+        resultado['micro'] = micro.executar(args.repeticoes, args.filtro)
+
+    if args.modo in ('carga', 'todos'):
+        from benchmarks import carga
+        if args.url:
+            resultado['carga'] = carga.gerar_carga(args.url, args.processos, args.conexoes, args.duracao,
+                                                   semente=args.seed)
+        else:
+            with carga.ServidorLocal() as servidor:
+                resultado['carga'] = carga.gerar_carga(servidor.url, args.processos, args.conexoes, args.duracao,
+                                                       semente=args.seed)
+        for nome, linha in resultado['carga'].items():
+            logger.info(f"{nome}: p50 {linha['p50_ms']} ms, p95 {linha['p95_ms']} ms, p99 {linha['p99_ms']} ms, "
+                        f"{linha['rps']} req/s, {linha['erros']} erros")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+    if args.atualizar_baseline:
+        anterior = baseline.carregar(args.baseline) or {}
+        # Atualiza só as seções medidas nesta execução
+        baseline.gravar({**anterior, **resultado}, args.baseline)
+        logger.info(f"Baseline gravada em {args.baseline}")
+        return 0
+
+    referencia = baseline.carregar(args.baseline)
+    if referencia is None:
+        logger.warning(f"Sem baseline em {args.baseline}; use --atualizar-baseline")
+        return 0
+    if referencia.get('parametros') != parametros or referencia.get('ambiente') != resultado['ambiente']:
+        logger.warning("Parâmetros ou ambiente diferentes da baseline: a comparação é apenas indicativa")
+    regressoes = baseline.comparar(resultado, referencia, args.tolerancia)
+    for regressao in regressoes:
+        logger.error(f"REGRESSÃO {regressao}")
+    if not regressoes:
+        logger.info(f"Sem regressões acima de {args.tolerancia:.0%} em relação à baseline")
+    return 1 if regressoes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
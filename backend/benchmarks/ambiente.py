@@ -0,0 +1,48 @@
+import os
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def preparar(diretorio=None):
+    """Configura o ambiente da aplicação antes de importar main
+
+    Sem DATABASE_TYPE=postgresql no ambiente, usa um SQLite descartável em
+    `diretorio` (temporário por padrão); uploads e spill de auditoria ficam no
+    mesmo diretório. Retorna o diretório usado.
+    """
+    diretorio = diretorio or tempfile.mkdtemp(prefix='portal_bench_')
+    os.makedirs(diretorio, exist_ok=True)
+    if os.environ.get('DATABASE_TYPE') != 'postgresql':
+        os.environ['DATABASE_TYPE'] = 'sqlite'
+        os.environ['DATABASE_PATH'] = os.path.join(diretorio, 'portal_bench.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(diretorio, 'uploads')
+    os.environ['AUDIT_SPILL_DIR'] = os.path.join(diretorio, 'audit')
+    # bcrypt barato: o login é medido pelo custo da rota, não do fator de custo
+    os.environ.setdefault('AUTH_BCRYPT_ROUNDS', '4')
+    os.environ.setdefault('FLASK_ENV', 'production')
+    # A carga sai de um único IP: limites altos mantêm o custo do rate limiting sem recusar nada
+    for variavel in ('RATE_LIMIT_DEFAULT', 'RATE_LIMIT_LOGIN', 'RATE_LIMIT_UPLOAD'):
+        os.environ.setdefault(variavel, '1000000000 per minute')
+    return diretorio
+
+
+def semear(db_manager, transportadoras=2000, documentos=50000, seed=42):
+    """Carrega o banco de benchmark com o gerador de dados sintéticos
+
+    A mesma semente gera sempre as mesmas linhas, então resultados de máquinas
+    ou execuções diferentes são comparáveis. Um banco já semeado (ex.: em
+    --diretorio de uma execução anterior) é reaproveitado. Retorna a contagem
+    por tabela, ou None quando o banco foi reaproveitado.
+    """
+    db_manager.create_tables()
+    existentes = db_manager.run("SELECT COUNT(*) AS total FROM transportadoras", fetch=True)[0]['total']
+    if existentes:
+        logger.info(f"Banco de benchmark já semeado ({existentes} transportadoras)")
+        return None
+    from benchmarks.gerador import GeradorDados
+    return GeradorDados(db_manager, seed).gerar(
+        transportadoras=transportadoras, documentos=documentos, historico=documentos * 3 // 10,
+        notificacoes=documentos // 5, auditoria=documentos // 10, uploads=50
+    )
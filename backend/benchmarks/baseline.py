@@ -0,0 +1,64 @@
+import json
+import os
+import platform
+
+ARQUIVO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def ambiente_execucao():
+    """Identificação da máquina e do banco, gravada junto dos resultados"""
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'banco': os.environ.get('DATABASE_TYPE', 'sqlite'),
+    }
+
+
+def carregar(caminho=ARQUIVO_BASELINE):
+    """Baseline gravada ou None se o arquivo não existir"""
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def gravar(resultado, caminho=ARQUIVO_BASELINE):
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False, sort_keys=True)
+        arquivo.write('\n')
+
+
+def comparar(resultado, baseline, tolerancia=0.25, taxa_erros=0.01):
+    """Regressões de `resultado` em relação à `baseline` (lista de mensagens)
+
+    Um micro-benchmark regride quando o tempo por operação passa de
+    baseline × (1 + tolerância); um endpoint da carga, quando o p95 passa
+    desse limite, a vazão cai abaixo de baseline × (1 − tolerância) ou a taxa
+    de erros passa de `taxa_erros`. Casos ausentes de um dos lados são
+    ignorados.
+    """
+    regressoes = []
+    limite = 1 + tolerancia
+    for nome, atual in sorted(resultado.get('micro', {}).items()):
+        base = baseline.get('micro', {}).get(nome)
+        if base and atual['por_operacao_us'] > base['por_operacao_us'] * limite:
+            regressoes.append(
+                f"micro {nome}: {atual['por_operacao_us']:.1f} µs/op "
+                f"(baseline {base['por_operacao_us']:.1f}, limite +{tolerancia:.0%})"
+            )
+    for nome, atual in sorted(resultado.get('carga', {}).items()):
+        if atual['requisicoes'] and atual['erros'] / atual['requisicoes'] > taxa_erros:
+            regressoes.append(f"carga {nome}: {atual['erros']} erros em {atual['requisicoes']} requisições")
+        base = baseline.get('carga', {}).get(nome)
+        if not base:
+            continue
+        if atual['p95_ms'] is not None and base['p95_ms'] and atual['p95_ms'] > base['p95_ms'] * limite:
+            regressoes.append(
+                f"carga {nome}: p95 {atual['p95_ms']:.1f} ms (baseline {base['p95_ms']:.1f}, limite +{tolerancia:.0%})"
+            )
+        if atual['rps'] < base['rps'] * (1 - tolerancia):
+            regressoes.append(
+                f"carga {nome}: {atual['rps']:.1f} req/s (baseline {base['rps']:.1f}, limite -{tolerancia:.0%})"
+            )
+    return regressoes
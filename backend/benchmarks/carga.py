@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import logging
+import threading
+import subprocess
+import http.client
+import multiprocessing
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Mistura de requisições: (nome, método, caminho, autenticada, peso)
+ENDPOINTS = (
+    ('health', 'GET', '/api/health', False, 10),
+    ('tipos_documentos', 'GET', '/api/tipos-documentos', False, 10),
+    ('dashboard', 'GET', '/api/dashboard', True, 15),
+    ('listar_documentos', 'GET', '/api/documentos?limit=50', True, 30),
+    ('listar_documentos_filtro', 'GET', '/api/documentos?status=pendente&limit=50', True, 15),
+    ('buscar_transportadoras', 'GET', '/api/transportadoras/busca?q=transp%20silva', True, 15),
+    ('login', 'POST', '/api/auth/login', False, 5),
+)
+
+CREDENCIAIS = json.dumps({'email': 'admin@nimoenergia.com.br', 'password': 'senha123'})
+
+
+def percentil(valores, p):
+    """Percentil pelo método nearest-rank sobre valores já ordenados"""
+    if not valores:
+        return None
+    posicao = max(1, -(-len(valores) * p // 100))
+    return valores[int(posicao) - 1]
+
+
+def resumir(amostras, duracao):
+    """Latências por endpoint em ms (p50/p95/p99), vazão e erros
+
+    `amostras` é {endpoint: ([latências em segundos], erros)}.
+    """
+    resumo = {}
+    for nome, (latencias, erros) in sorted(amostras.items()):
+        latencias = sorted(latencias)
+        total = len(latencias) + erros
+        resumo[nome] = {
+            'requisicoes': total,
+            'erros': erros,
+            'rps': round(total / duracao, 1),
+            **{f'p{p}_ms': round(percentil(latencias, p) * 1000, 2) if latencias else None
+               for p in (50, 95, 99)},
+        }
+    return resumo
+
+
+def _conexao(url):
+    partes = urlsplit(url)
+    return http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+
+
+def _cliente(url, token, duracao, semente, resultados):
+    """Thread de carga: sorteia endpoints pelo peso sobre uma conexão keep-alive"""
+    rng = random.Random(semente)
+    pesos = [endpoint[4] for endpoint in ENDPOINTS]
+    conexao = _conexao(url)
+    fim = time.monotonic() + duracao
+    while time.monotonic() < fim:
+        nome, metodo, caminho, autenticada, _ = rng.choices(ENDPOINTS, pesos)[0]
+        cabecalhos = {'Authorization': f'Bearer {token}'} if autenticada else {}
+        corpo = None
+        if metodo == 'POST':
+            corpo = CREDENCIAIS
+            cabecalhos['Content-Type'] = 'application/json'
+        latencias, erros = resultados.setdefault(nome, ([], [0]))
+        inicio = time.perf_counter()
+        try:
+            conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+            response = conexao.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            conexao.close()
+            conexao = _conexao(url)
+            ok = False
+        if ok:
+            latencias.append(time.perf_counter() - inicio)
+        else:
+            erros[0] += 1
+    conexao.close()
+
+
+def _processo(url, token, duracao, conexoes, semente, fila):
+    """Processo gerador de carga com `conexoes` threads"""
+    parciais = [{} for _ in range(conexoes)]
+    threads = [
+        threading.Thread(target=_cliente, args=(url, token, duracao, semente * 1000 + i, parciais[i]))
+        for i in range(conexoes)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    amostras = {}
+    for parcial in parciais:
+        for nome, (latencias, erros) in parcial.items():
+            atual = amostras.setdefault(nome, ([], 0))
+            amostras[nome] = (atual[0] + latencias, atual[1] + erros[0])
+    fila.put(amostras)
+
+
+def obter_token(url):
+    """Login do administrador de demonstração no servidor alvo"""
+    conexao = _conexao(url)
+    try:
+        conexao.request('POST', '/api/auth/login', body=CREDENCIAIS, headers={'Content-Type': 'application/json'})
+        response = conexao.getresponse()
+        corpo = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Login da carga falhou: {response.status} {corpo[:200]!r}")
+        return json.loads(corpo)['token']
+    finally:
+        conexao.close()
+
+
+def gerar_carga(url, processos=4, conexoes=4, duracao=10.0, aquecimento=1.0, semente=42):
+    """Dispara `processos` × `conexoes` clientes contra `url` por `duracao` segundos
+
+    Os processos usam spawn para não herdar o estado da aplicação; cada um
+    devolve as latências brutas, e os percentis são calculados sobre o
+    conjunto de todos os processos.
+    """
+    token = obter_token(url)
+    if aquecimento:
+        _cliente(url, token, aquecimento, semente, {})
+
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    filhos = [
+        contexto.Process(target=_processo, args=(url, token, duracao, conexoes, semente + i, fila))
+        for i in range(processos)
+    ]
+    inicio = time.monotonic()
+    for filho in filhos:
+        filho.start()
+    amostras = {}
+    for _ in filhos:
+        for nome, (latencias, erros) in fila.get(timeout=duracao + 120).items():
+            atual = amostras.setdefault(nome, ([], 0))
+            amostras[nome] = (atual[0] + latencias, atual[1] + erros)
+    for filho in filhos:
+        filho.join()
+    decorrido = max(time.monotonic() - inicio, duracao)
+
+    resumo = resumir(amostras, decorrido)
+    todas = sorted(latencia for latencias, _ in amostras.values() for latencia in latencias)
+    resumo['total'] = resumir({'total': (todas, sum(erros for _, erros in amostras.values()))}, decorrido)['total']
+    return resumo
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ServidorLocal:
+    """Servidor da aplicação em subprocesso (`python -m benchmarks servidor`)
+
+    Herda o ambiente já preparado (banco semeado). Para medir outro servidor
+    (gunicorn, uvicorn com asgi:application) basta iniciá-lo à parte e passar
+    --url ao gerador de carga.
+    """
+
+    def __init__(self, porta=None):
+        self.porta = porta or porta_livre()
+        self.url = f'http://127.0.0.1:{self.porta}'
+        self.processo = None
+
+    def __enter__(self):
+        diretorio = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.processo = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks', 'servidor', '--porta', str(self.porta)],
+            cwd=diretorio, env=os.environ.copy()
+        )
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            if self.processo.poll() is not None:
+                raise RuntimeError(f"Servidor de benchmark encerrou com código {self.processo.returncode}")
+            try:
+                conexao = _conexao(self.url)
+                conexao.request('GET', '/api/health')
+                if conexao.getresponse().status == 200:
+                    conexao.close()
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError("Servidor de benchmark não respondeu em 30s")
+
+    def __exit__(self, *exc):
+        if self.processo and self.processo.poll() is None:
+            self.processo.terminate()
+            try:
+                self.processo.wait(10)
+            except subprocess.TimeoutExpired:
+                self.processo.kill()
+
+
+def servir(porta):
+    """Executa a aplicação em um servidor WSGI com threads (keep-alive HTTP/1.1)"""
+    from werkzeug.serving import make_server
+    import main
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    # Como um worker de produção: recursos iniciados antes da primeira requisição medida
+    aplicacao = main.create_app()
+    main.iniciar_worker()
+    servidor = make_server('127.0.0.1', porta, aplicacao, threaded=True)
+    logger.info(f"Servidor de benchmark em http://127.0.0.1:{porta}")
+    servidor.serve_forever()
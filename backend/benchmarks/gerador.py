@@ -0,0 +1,528 @@
+import os
+import json
+import time
+import random
+import logging
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Data de referência ("hoje" dos dados): fixa para que a mesma semente gere sempre as mesmas linhas
+REFERENCIA = date(2025, 1, 1)
+
+UFS = ('SP', 'RJ', 'MG', 'PR', 'SC', 'RS', 'BA', 'GO', 'PE', 'ES')
+CIDADES = ('São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Curitiba', 'Joinville',
+           'Porto Alegre', 'Salvador', 'Goiânia', 'Recife', 'Vitória', 'Campinas', 'Santos')
+PREFIXOS = ('Transportes', 'Transportadora', 'Logística', 'Expresso', 'Rápido', 'Cargas')
+NOMES = ('São João', 'Paulista', 'Silva', 'Oliveira', 'Santos', 'Souza', 'Bandeirantes',
+         'Atlântico', 'Cerrado', 'Serra Verde', 'Rio Doce', 'Horizonte', 'Norte Sul')
+SUFIXOS = ('Ltda', 'SA', 'ME', 'EIRELI')
+SEGURADORAS = ('Porto Seguro', 'Tokio Marine', 'Allianz', 'Mapfre', 'Sompo', 'HDI', 'Liberty')
+USER_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) Firefox/121.0',
+    'PortalNimo/2.0 (Android 14)',
+)
+MOTIVOS_REJEICAO = ('Documento ilegível', 'Documento vencido', 'Dados divergentes do cadastro',
+                    'Assinatura ausente', 'Tipo de documento incorreto')
+
+# Versões de um mesmo documento ficam em média um ano distantes
+_VALIDADE = 365
+# Eventos de histórico e notificações elegíveis por documento, em média (calibra a amostragem)
+_EVENTOS_POR_DOCUMENTO = 1.9
+_NOTIFICACOES_POR_DOCUMENTO = 0.5
+
+_COLUNAS = {
+    'transportadoras': (
+        'id', 'cnpj', 'razao_social', 'nome_fantasia', 'inscricao_estadual', 'antt', 'endereco_logradouro',
+        'endereco_numero', 'endereco_bairro', 'endereco_cidade', 'endereco_estado', 'endereco_cep',
+        'telefone_principal', 'email_corporativo', 'responsavel_nome', 'status_cadastro',
+        'classificacao_risco', 'limite_credito', 'data_cadastro', 'data_aprovacao', 'data_atualizacao', 'ativo'
+    ),
+    'usuarios': (
+        'id', 'transportadora_id', 'nome', 'email', 'senha', 'telefone', 'tipo', 'status_ativo',
+        'ultimo_acesso', 'data_criacao', 'data_atualizacao'
+    ),
+    'documentos': (
+        'id', 'numero_protocolo', 'transportadora_id', 'tipo_documento_id', 'usuario_upload_id',
+        'nome_arquivo_original', 'nome_arquivo_sistema', 'caminho_arquivo', 'tamanho_arquivo', 'hash_arquivo',
+        'mime_type', 'data_upload', 'data_vencimento', 'valor_garantia', 'numero_apolice', 'seguradora',
+        'status', 'data_aprovacao', 'usuario_aprovacao_id', 'motivo_rejeicao', 'versao_documento',
+        'documento_anterior_id', 'ip_upload', 'user_agent', 'data_atualizacao'
+    ),
+    'historico_documentos': (
+        'id', 'documento_id', 'usuario_id', 'acao', 'status_anterior', 'status_novo', 'observacoes',
+        'ip_origem', 'user_agent', 'data_acao'
+    ),
+    'notificacoes': (
+        'id', 'usuario_id', 'transportadora_id', 'documento_id', 'tipo', 'titulo', 'mensagem', 'canal',
+        'status_envio', 'data_envio', 'data_leitura', 'tentativas_envio', 'erro_envio', 'prioridade',
+        'proxima_tentativa', 'data_criacao'
+    ),
+    'auditoria_sistema': (
+        'id', 'usuario_id', 'acao', 'tabela_afetada', 'registro_id', 'dados_novos', 'ip_origem', 'user_agent',
+        'data_acao'
+    ),
+    'sessoes_usuario': ('id', 'usuario_id', 'ip_address', 'user_agent', 'data_criacao', 'data_expiracao', 'ativo'),
+    'upload_sessoes': (
+        'id', 'usuario_id', 'transportadora_id', 'tipo_documento_id', 'nome_arquivo_original', 'mime_type',
+        'tamanho_total', 'tamanho_chunk', 'total_chunks', 'metadata', 'data_criacao', 'data_atualizacao'
+    ),
+    'upload_sessoes_chunks': ('sessao_id', 'indice', 'tamanho', 'sha256'),
+}
+
+# Tabelas volumosas cujos índices secundários são recriados após a carga
+_TABELAS_VOLUMOSAS = ('documentos', 'historico_documentos', 'notificacoes', 'auditoria_sistema')
+
+# Tabelas com id inteiro gerado aqui (sequências do PostgreSQL são ajustadas ao final)
+_TABELAS_SEQUENCIA = ('transportadoras', 'usuarios', 'documentos', 'historico_documentos',
+                      'notificacoes', 'auditoria_sistema')
+
+
+def cnpj(raiz):
+    """CNPJ de matriz formatado e válido a partir de uma raiz de 8 dígitos"""
+    numeros = [int(d) for d in f"{raiz:08d}0001"]
+    for pesos in ((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)):
+        resto = sum(n * p for n, p in zip(numeros, pesos)) % 11
+        numeros.append(0 if resto < 2 else 11 - resto)
+    d = ''.join(map(str, numeros))
+    return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
+
+
+class GeradorDados:
+    """Gera e carrega um volume sintético realista em todas as tabelas do esquema
+
+    Determinístico: cada tabela usa um gerador pseudoaleatório derivado de
+    `seed` e as datas são relativas a `referencia` (fixa por padrão), então a
+    mesma semente produz exatamente as mesmas linhas em qualquer máquina e
+    banco. Os ids são atribuídos aqui, em ordem, o que permite montar chaves
+    estrangeiras e cadeias de versões (documento_anterior_id sempre aponta
+    para um id menor, já inserido) sem reler o banco.
+
+    As linhas são geradas em fluxo e gravadas em lotes de `lote` linhas pelo
+    caminho mais rápido de cada banco (copy_rows): COPY no PostgreSQL,
+    INSERT multi-linha no MySQL e executemany de uma instrução preparada em
+    transação no SQLite.
+    """
+
+    def __init__(self, db_manager, seed=42, referencia=REFERENCIA, lote=50000):
+        self.db_manager = db_manager
+        self.seed = seed
+        self.referencia = referencia
+        self.lote = lote
+        self.contagem = {}
+        # Datas e horários pré-formatados: formatar por linha custaria mais que gerá-la
+        self._dias = [(referencia + timedelta(days=offset)).isoformat() for offset in range(-4000, 1001)]
+        self._horas = [f" {hora:02d}:{minuto:02d}:{segundo:02d}"
+                       for hora in range(7, 20) for minuto in range(60) for segundo in (0, 17, 34, 51)]
+        aleatorio = self._rng('ips')
+        self._ips = [f"{aleatorio.choice((10, 177, 189, 200))}.{aleatorio.randrange(256)}."
+                     f"{aleatorio.randrange(256)}.{aleatorio.randrange(1, 255)}" for _ in range(997)]
+
+    def _rng(self, tabela):
+        return random.Random(f"{self.seed}:{tabela}")
+
+    def _dia(self, offset):
+        """Data ISO `offset` dias após a referência"""
+        return self._dias[offset + 4000]
+
+    def _momento(self, offset, r):
+        """Timestamp no dia `offset` em horário comercial; `r` em [0, 1)"""
+        return self._dias[offset + 4000] + self._horas[int(r * len(self._horas))]
+
+    def _carregar(self, tabela, linhas):
+        """Grava `linhas` (iterável) em lotes, uma transação por lote"""
+        colunas = _COLUNAS[tabela]
+        lote = []
+        total = 0
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= self.lote:
+                total += self._gravar_lote(tabela, colunas, lote)
+                lote = []
+        if lote:
+            total += self._gravar_lote(tabela, colunas, lote)
+        self.contagem[tabela] = self.contagem.get(tabela, 0) + total
+        return total
+
+    def _gravar_lote(self, tabela, colunas, lote):
+        with self.db_manager.transaction() as tx:
+            return tx.copy_rows(tabela, colunas, lote)
+
+    @contextmanager
+    def _indices_suspensos(self, tabelas):
+        """Remove os índices secundários de `tabelas` durante a carga e os recria ao final
+
+        Construir um índice de uma vez (ordenando) é bem mais rápido que
+        mantê-lo linha a linha, sobretudo os de valores aleatórios como
+        hash_arquivo. Índices de PRIMARY KEY/UNIQUE ficam, assim como as
+        chaves estrangeiras, que continuam verificadas. No MySQL os índices
+        são mantidos (o DROP/ADD reconstruiria a tabela inteira).
+        """
+        db_type = self.db_manager.db_type
+        marcadores = ', '.join('?' * len(tabelas))
+        if db_type == 'sqlite':
+            indices = self.db_manager.run(
+                f"""SELECT name, sql FROM sqlite_master
+                    WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({marcadores})""",
+                tabelas, fetch=True
+            )
+        elif db_type == 'postgresql':
+            indices = self.db_manager.run(
+                f"""SELECT indexname AS name, indexdef AS sql FROM pg_indexes
+                    WHERE schemaname = current_schema() AND tablename IN ({marcadores})
+                      AND indexname NOT IN (SELECT conname FROM pg_constraint)""",
+                tabelas, fetch=True
+            )
+        else:
+            indices = []
+        with self.db_manager.transaction() as tx:
+            for indice in indices:
+                tx.execute(f"DROP INDEX {indice['name']}")
+        try:
+            yield
+        finally:
+            inicio = time.perf_counter()
+            with self.db_manager.transaction() as tx:
+                for indice in indices:
+                    tx.execute(indice['sql'])
+            if indices:
+                logger.info(f"{len(indices)} índices recriados em {time.perf_counter() - inicio:.1f}s")
+
+    def _proximo_id(self, tabela):
+        return (self.db_manager.run(f"SELECT MAX(id) AS id FROM {tabela}", fetch=True)[0]['id'] or 0) + 1
+
+    def gerar(self, transportadoras=20000, documentos=1000000, historico=300000, notificacoes=200000,
+              auditoria=100000, uploads=200):
+        """Cria o esquema (se preciso) e carrega o volume pedido; retorna linhas por tabela
+
+        O banco não pode ter transportadoras: CNPJs, e-mails e protocolos
+        gerados pela mesma semente colidiriam. Todos os usuários gerados
+        usam a senha de demonstração 'senha123'.
+        """
+        inicio = time.perf_counter()
+        self.db_manager.create_tables()
+        self.db_manager.insert_sample_data()
+        if self.db_manager.run("SELECT COUNT(*) AS total FROM transportadoras", fetch=True)[0]['total']:
+            raise RuntimeError("O banco já contém transportadoras; gere os dados sintéticos em um banco vazio")
+
+        self.contagem = {}
+        self._tipos = self.db_manager.run(
+            "SELECT id, codigo, tem_vencimento, tem_garantia FROM tipos_documento WHERE ativo = ? ORDER BY id",
+            (True,), fetch=True
+        )
+        self._admin_id = self.db_manager.run(
+            "SELECT id FROM usuarios WHERE email = ?", ('admin@nimoenergia.com.br',), fetch=True
+        )[0]['id']
+
+        self._gerar_transportadoras(transportadoras)
+        self._gerar_usuarios()
+        with self._indices_suspensos(_TABELAS_VOLUMOSAS):
+            self._gerar_documentos(documentos, historico, notificacoes)
+            self._gerar_auditoria(auditoria)
+        self._gerar_sessoes()
+        self._gerar_uploads(uploads)
+        self._finalizar()
+
+        duracao = time.perf_counter() - inicio
+        total = sum(self.contagem.values())
+        logger.info(f"Dados sintéticos: {total} linhas em {duracao:.1f}s ({total / duracao:,.0f} linhas/s) "
+                    f"{self.contagem}")
+        return dict(self.contagem)
+
+    def _gerar_transportadoras(self, quantidade):
+        rng = self._rng('transportadoras')
+        r = rng.random
+        primeiro = self._proximo_id('transportadoras')
+        self._transportadoras = list(range(primeiro, primeiro + quantidade))
+        status = ('APROVADO',) * 70 + ('PENDENTE',) * 18 + ('SUSPENSO',) * 8 + ('INATIVO',) * 4
+        riscos = ('BAIXO',) * 70 + ('MEDIO',) * 25 + ('ALTO',) * 5
+        self._status_transportadora = []
+
+        def linhas():
+            for i, transportadora_id in enumerate(self._transportadoras):
+                # Raízes distintas e espalhadas: 7919 é primo com 10^8
+                raiz = (i * 7919 + self.seed * 104729 + 1) % 100000000
+                nome = NOMES[int(r() * len(NOMES))]
+                situacao = status[int(r() * 100)]
+                self._status_transportadora.append(situacao)
+                cadastro = -int(r() * 3000) - 30
+                aprovacao = self._momento(cadastro + 1 + int(r() * 20), r()) if situacao != 'PENDENTE' else None
+                cidade = int(r() * len(CIDADES))
+                yield (
+                    transportadora_id, cnpj(raiz),
+                    f"{PREFIXOS[int(r() * len(PREFIXOS))]} {nome} {SUFIXOS[int(r() * len(SUFIXOS))]}",
+                    f"{nome} Cargas" if r() < 0.7 else None,
+                    f"{int(r() * 1e12):012d}", f"{int(r() * 1e8):08d}",
+                    f"Rua {NOMES[int(r() * len(NOMES))]}", str(1 + int(r() * 3000)), 'Centro',
+                    CIDADES[cidade], UFS[cidade % len(UFS)], f"{int(r() * 1e5):05d}-{int(r() * 1e3):03d}",
+                    f"(11) 9{int(r() * 1e8):08d}", f"contato@transportadora{transportadora_id}.com.br",
+                    f"Responsável {transportadora_id}", situacao, riscos[int(r() * 100)],
+                    f"{int(r() * 500) * 1000:.2f}", self._momento(cadastro, r()), aprovacao,
+                    aprovacao or self._momento(cadastro, r()), situacao != 'INATIVO'
+                )
+
+        self._carregar('transportadoras', linhas())
+
+    def _gerar_usuarios(self):
+        """Analistas e financeiro da casa e um ou dois usuários por transportadora"""
+        from auth_service import hash_senha
+        rng = self._rng('usuarios')
+        r = rng.random
+        senha = hash_senha('senha123', int(os.getenv('AUTH_BCRYPT_ROUNDS', 12)))
+        proximo = self._proximo_id('usuarios')
+        self._analistas = list(range(proximo, proximo + 20))
+        self._usuario_da_transportadora = []
+        self._usuarios = [self._admin_id] + self._analistas
+
+        def linhas():
+            usuario_id = proximo
+            for indice, tipo in [(i, 'analista') for i in range(20)] + [(i, 'financeiro') for i in range(5)]:
+                yield (usuario_id, None, f"{tipo.title()} {indice + 1}", f"{tipo}{indice + 1}@nimoenergia.com.br",
+                       senha, None, tipo, True, self._momento(-int(r() * 10), r()), self._dia(-2000), self._dia(-2000))
+                usuario_id += 1
+            for posicao, transportadora_id in enumerate(self._transportadoras):
+                ativa = self._status_transportadora[posicao] != 'INATIVO'
+                self._usuario_da_transportadora.append(usuario_id)
+                for contato in range(2 if r() < 0.3 else 1):
+                    self._usuarios.append(usuario_id)
+                    acesso = self._momento(-int(r() * 90), r()) if r() < 0.8 else None
+                    yield (usuario_id, transportadora_id, f"Contato {contato + 1} Transportadora {transportadora_id}",
+                           f"contato{contato + 1}@transportadora{transportadora_id}.com.br", senha,
+                           f"(11) 9{int(r() * 1e8):08d}", 'transportadora', ativa, acesso,
+                           self._dia(-1000), self._dia(-1000))
+                    usuario_id += 1
+
+        self._carregar('usuarios', linhas())
+
+    def _gerar_documentos(self, total, historico, notificacoes):
+        """Documentos em cadeias de versões, com histórico e notificações coerentes
+
+        Cada transportadora recebe sua cota de documentos em cadeias de 1 a 6
+        versões do mesmo tipo, um ano entre versões. As versões substituídas
+        ficam vencidas (ou rejeitadas); a versão vigente foi enviada nos
+        últimos ~400 dias, de modo que cerca de 9% já venceu e o restante
+        vence ao longo do próximo ano. Histórico e notificações são amostrados
+        por documento para chegar às quantidades pedidas (o histórico de um
+        documento entra inteiro, então pode passar em até 2 linhas), sempre
+        coerentes com o status do documento. Cada lote de documentos é gravado antes do
+        histórico e das notificações que o referenciam.
+        """
+        rng = self._rng('documentos')
+        r = rng.random
+        bits = rng.getrandbits
+        tipos = self._tipos
+        analistas = self._analistas
+        ips = self._ips
+        dias = self._dias
+        horas = self._horas
+        total_horas = len(horas)
+        total_ips = len(ips)
+        total_tipos = len(tipos)
+        total_analistas = len(analistas)
+        documento_id = self._proximo_id('documentos')
+        historico_id = self._proximo_id('historico_documentos')
+        notificacao_id = self._proximo_id('notificacoes')
+        colunas = {tabela: _COLUNAS[tabela] for tabela in ('documentos', 'historico_documentos', 'notificacoes')}
+        docs, eventos, avisos = [], [], []
+        faltam = {'documentos': total, 'historico': historico, 'notificacoes': notificacoes}
+        contagem = {'documentos': 0, 'historico_documentos': 0, 'notificacoes': 0}
+
+        def gravar():
+            with self.db_manager.transaction() as tx:
+                for tabela, linhas in (('documentos', docs), ('historico_documentos', eventos),
+                                       ('notificacoes', avisos)):
+                    if linhas:
+                        contagem[tabela] += tx.copy_rows(tabela, colunas[tabela], linhas)
+            docs.clear()
+            eventos.clear()
+            avisos.clear()
+
+        base, resto = divmod(total, len(self._transportadoras)) if self._transportadoras else (0, 0)
+        for posicao, transportadora_id in enumerate(self._transportadoras):
+            cota = base + (1 if posicao < resto else 0)
+            usuario_id = self._usuario_da_transportadora[posicao]
+            while cota:
+                tipo = tipos[int(r() * total_tipos)]
+                versoes = 1
+                while versoes < cota and versoes < 6 and r() < 0.35:
+                    versoes += 1
+                cota -= versoes
+                vigente = int(r() * 400)
+                anterior = None
+                for versao in range(1, versoes + 1):
+                    upload = -(vigente + (versoes - versao) * _VALIDADE) - 1
+                    vencimento = upload + _VALIDADE if tipo['tem_vencimento'] else None
+                    s = r()
+                    if versao < versoes:
+                        status = 'rejeitado' if s < 0.2 else ('vencido' if vencimento is not None else 'aprovado')
+                    elif vencimento is not None and vencimento < 0:
+                        status = 'vencido' if s < 0.7 else 'renovacao'
+                    else:
+                        status = 'aprovado' if s < 0.72 else ('pendente' if s < 0.9 else 'rejeitado')
+                    decidido = status != 'pendente'
+                    analista = analistas[int(r() * total_analistas)] if decidido else None
+                    decisao = dias[upload + 4001 + int(r() * 5)] + horas[int(r() * total_horas)] if decidido else None
+                    enviado = dias[upload + 4000] + horas[int(r() * total_horas)]
+                    digest = f"{bits(256):064x}"
+                    imagem = r() < 0.1
+                    extensao = '.jpg' if imagem else '.pdf'
+                    ip = ips[int(r() * total_ips)]
+                    agente = USER_AGENTS[int(r() * len(USER_AGENTS))]
+                    garantia = tipo['tem_garantia']
+                    docs.append((
+                        documento_id, f"DOC-S{documento_id:012d}", transportadora_id, tipo['id'], usuario_id,
+                        f"{tipo['codigo'].lower()}_v{versao}{extensao}", digest + extensao,
+                        f"{digest[:2]}/{digest[2:4]}/{digest}", 20000 + int(r() * 5000000), digest,
+                        'image/jpeg' if imagem else 'application/pdf', enviado,
+                        dias[vencimento + 4000] if vencimento is not None else None,
+                        f"{100000 + int(r() * 4900000)}.00" if garantia else None,
+                        f"AP-{bits(32):010d}" if garantia else None,
+                        SEGURADORAS[int(r() * len(SEGURADORAS))] if garantia else None,
+                        status, decisao, analista,
+                        MOTIVOS_REJEICAO[int(r() * len(MOTIVOS_REJEICAO))] if status == 'rejeitado' else None,
+                        versao, anterior, ip, agente, decisao or enviado
+                    ))
+
+                    if faltam['historico'] > 0 and r() * faltam['documentos'] * _EVENTOS_POR_DOCUMENTO < faltam['historico']:
+                        primeiro_evento = historico_id
+                        eventos.append((historico_id, documento_id, usuario_id, 'upload', None, 'pendente',
+                                        None, ip, agente, enviado))
+                        historico_id += 1
+                        if decidido:
+                            acao = 'rejeicao' if status == 'rejeitado' else 'aprovacao'
+                            eventos.append((historico_id, documento_id, analista, acao, 'pendente',
+                                            'rejeitado' if acao == 'rejeicao' else 'aprovado',
+                                            None, None, None, decisao))
+                            historico_id += 1
+                        if status in ('vencido', 'renovacao'):
+                            eventos.append((historico_id, documento_id, self._admin_id,
+                                            'vencimento' if status == 'vencido' else 'renovacao',
+                                            'aprovado', status, None, None, None,
+                                            self._momento(min(vencimento, -1), r())))
+                            historico_id += 1
+                        faltam['historico'] -= historico_id - primeiro_evento
+
+                    if (versao == versoes and decidido and faltam['notificacoes'] > 0
+                            and r() * faltam['documentos'] * _NOTIFICACOES_POR_DOCUMENTO < faltam['notificacoes']):
+                        if status in ('vencido', 'renovacao') or (vencimento is not None and vencimento <= 30):
+                            restantes = max(vencimento, 0)
+                            titulo = 'Documento vencido' if vencimento < 0 else \
+                                f"Documento vence em {restantes} dia{'s' if restantes != 1 else ''}"
+                            tipo_aviso = 'vencimento'
+                            prioridade = 'critica' if vencimento <= 1 else ('alta' if vencimento <= 7 else 'normal')
+                            criacao = self._momento(min(vencimento - 30, -1), r())
+                        else:
+                            tipo_aviso = 'rejeicao' if status == 'rejeitado' else 'aprovacao'
+                            titulo = 'Documento rejeitado' if status == 'rejeitado' else 'Documento aprovado'
+                            prioridade = 'normal'
+                            criacao = decisao
+                        e = r()
+                        situacao = 'enviado' if e < 0.65 else ('lido' if e < 0.85 else ('pendente' if e < 0.95 else 'erro'))
+                        canal = 'email' if e * 7 % 1 < 0.8 else ('sistema' if e * 7 % 1 < 0.95 else 'sms')
+                        entregue = situacao in ('enviado', 'lido')
+                        avisos.append((
+                            notificacao_id, usuario_id, transportadora_id, documento_id, tipo_aviso, titulo,
+                            f"O documento DOC-S{documento_id:012d}: {titulo.lower()}.", canal, situacao,
+                            criacao if entregue else None, criacao if situacao == 'lido' else None,
+                            {'pendente': 0, 'erro': 3}.get(situacao, 1),
+                            'SMTP 421: serviço indisponível' if situacao == 'erro' else None, prioridade,
+                            criacao if situacao == 'erro' else None, criacao
+                        ))
+                        notificacao_id += 1
+                        faltam['notificacoes'] -= 1
+
+                    anterior = documento_id
+                    documento_id += 1
+                    faltam['documentos'] -= 1
+                    if len(docs) >= self.lote:
+                        gravar()
+        gravar()
+        for tabela, quantidade in contagem.items():
+            self.contagem[tabela] = self.contagem.get(tabela, 0) + quantidade
+
+    def _gerar_auditoria(self, quantidade):
+        rng = self._rng('auditoria')
+        r = rng.random
+        usuarios = self._usuarios
+        documentos = self.contagem.get('documentos', 0)
+        primeiro_documento = self._proximo_id('documentos') - documentos
+        proximo = self._proximo_id('auditoria_sistema')
+
+        def linhas():
+            for auditoria_id in range(proximo, proximo + quantidade):
+                usuario_id = usuarios[int(r() * len(usuarios))]
+                acao = r()
+                if acao < 0.6 or not documentos:
+                    dados = ('login', 'usuarios', usuario_id, None)
+                else:
+                    documento_id = primeiro_documento + int(r() * documentos)
+                    dados = ('upload_documento' if acao < 0.85 else 'aprovar_documento', 'documentos', documento_id,
+                             json.dumps({'numero_protocolo': f"DOC-S{documento_id:012d}"}))
+                yield (auditoria_id, usuario_id, *dados, self._ips[int(r() * len(self._ips))],
+                       USER_AGENTS[int(r() * len(USER_AGENTS))], self._momento(-int(r() * 730), r()))
+
+        self._carregar('auditoria_sistema', linhas())
+
+    def _gerar_sessoes(self):
+        """Uma sessão por usuário que acessou; as dos últimos dias seguem ativas"""
+        rng = self._rng('sessoes')
+        r = rng.random
+
+        def linhas():
+            for usuario_id in self._usuarios:
+                if r() < 0.2:
+                    continue
+                criacao = -int(r() * 30)
+                yield (f"{rng.getrandbits(128):032x}", usuario_id, self._ips[int(r() * len(self._ips))],
+                       USER_AGENTS[int(r() * len(USER_AGENTS))], self._momento(criacao, r()),
+                       self._momento(criacao + 1, r()), criacao >= -1)
+
+        self._carregar('sessoes_usuario', linhas())
+
+    def _gerar_uploads(self, quantidade):
+        """Sessões de upload em partes interrompidas, com parte dos chunks recebidos"""
+        if not self._transportadoras:
+            return
+        rng = self._rng('uploads')
+        r = rng.random
+        tamanho_chunk = 8 * 1024 * 1024
+        sessoes, chunks = [], []
+        for _ in range(quantidade):
+            posicao = int(r() * len(self._transportadoras))
+            tipo = self._tipos[int(r() * len(self._tipos))]
+            total_chunks = 1 + int(r() * 12)
+            tamanho_total = (total_chunks - 1) * tamanho_chunk + 1 + int(r() * (tamanho_chunk - 1))
+            sessao_id = f"{rng.getrandbits(128):032x}"
+            criacao = self._momento(-int(r() * 2), r())
+            sessoes.append((sessao_id, self._usuario_da_transportadora[posicao], self._transportadoras[posicao],
+                            tipo['id'], f"{tipo['codigo'].lower()}.pdf", 'application/pdf', tamanho_total,
+                            tamanho_chunk, total_chunks, '{}', criacao, criacao))
+            for indice in range(int(r() * total_chunks)):
+                chunks.append((sessao_id, indice, tamanho_chunk, f"{rng.getrandbits(256):064x}"))
+        self._carregar('upload_sessoes', sessoes)
+        self._carregar('upload_sessoes_chunks', chunks)
+
+    def _finalizar(self):
+        """Resumo do dashboard, marca d'água dos vencimentos e sequências do PostgreSQL"""
+        from dashboard_service import DashboardService
+        DashboardService(self.db_manager).reconciliar()
+        self.contagem['dashboard_resumo'] = self.db_manager.run(
+            "SELECT COUNT(*) AS total FROM dashboard_resumo", fetch=True
+        )[0]['total']
+        with self.db_manager.transaction() as tx:
+            # Vencimentos até a referência já estão refletidos nos status gerados
+            tx.run(
+                """INSERT INTO marcas_processamento (chave, valor) VALUES (?, ?)
+                   ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor""",
+                ('vencimento', self.referencia.isoformat())
+            )
+            if self.db_manager.db_type == 'postgresql':
+                for tabela in _TABELAS_SEQUENCIA:
+                    tx.execute(
+                        f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), "
+                        f"(SELECT COALESCE(MAX(id), 1) FROM {tabela}))"
+                    )
+        self.contagem['marcas_processamento'] = 1
@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import timeit
+import logging
+import statistics
+
+logger = logging.getLogger(__name__)
+
+# Tamanho do arquivo enviado no benchmark de upload
+TAMANHO_UPLOAD = 256 * 1024
+
+
+def medir(funcao, repeticoes=5, tempo_minimo=0.2):
+    """Tempo por chamada de `funcao` (melhor e mediana de `repeticoes` rodadas)
+
+    Como no timeit, o número de chamadas por rodada é escolhido para que cada
+    rodada dure ao menos `tempo_minimo` segundos; o melhor tempo é o menos
+    sujeito a ruído da máquina e é o usado na comparação com a baseline.
+    """
+    timer = timeit.Timer(funcao)
+    chamadas = 1
+    while timer.timeit(chamadas) < tempo_minimo:
+        chamadas *= 2
+    tempos = [tempo / chamadas for tempo in timer.repeat(repeticoes, chamadas)]
+    return {
+        'por_operacao_us': round(min(tempos) * 1e6, 2),
+        'mediana_us': round(statistics.median(tempos) * 1e6, 2),
+        'chamadas': chamadas,
+    }
+
+
+def login(client):
+    """Token do administrador de demonstração pelo test client"""
+    response = client.post('/api/auth/login', json={
+        'email': 'admin@nimoenergia.com.br', 'password': 'senha123'
+    })
+    if response.status_code != 200:
+        raise RuntimeError(f"Login do benchmark falhou: {response.status_code} {response.get_data(as_text=True)}")
+    return response.get_json()['token']
+
+
+def casos(main, client, token):
+    """Casos de micro-benchmark: {nome: função sem argumentos}"""
+    from database_manager import db_manager
+
+    cabecalhos = {'Authorization': f'Bearer {token}'}
+    documento_id = db_manager.run("SELECT MAX(id) AS id FROM documentos", fetch=True)[0]['id'] or 0
+    transportadora_id = db_manager.run("SELECT MIN(id) AS id FROM transportadoras", fetch=True)[0]['id']
+    linhas = db_manager.run(
+        "SELECT * FROM documentos ORDER BY id DESC LIMIT 100", fetch=True
+    )
+
+    protegido = main.require_auth(lambda: 'ok')
+    contexto = main.app.test_request_context(headers=cabecalhos)
+
+    def require_auth():
+        with contexto:
+            return protegido()
+
+    def rate_limit():
+        # Limites padrão (duas janelas) + política da rota, identidade pelo token em cache
+        return main.verificar_rate_limit('upload_documento', cabecalhos['Authorization'], '127.0.0.1')
+
+    def consulta_trivial():
+        return db_manager.execute_query("SELECT 1 AS um", fetch=True)
+
+    def consulta_por_chave():
+        return db_manager.execute_query("SELECT * FROM documentos WHERE id = ?", (documento_id,), fetch=True)
+
+    def json_stdlib():
+        return json.dumps(linhas, default=str)
+
+    def json_flask():
+        return main.app.json.dumps(linhas)
+
+    def pagina_documentos():
+        return b''.join(chunk.encode() if isinstance(chunk, str) else chunk
+                        for chunk in main.document_service.pagina_json({}, None, 100))
+
+    def listar_documentos():
+        response = client.get('/api/documentos?limit=100', headers=cabecalhos)
+        response.get_data()
+        return response
+
+    enviados = [0]
+
+    def upload():
+        # Conteúdo único a cada envio: duplicatas seriam recusadas com 409
+        enviados[0] += 1
+        conteudo = b'%PDF-1.4 ' + enviados[0].to_bytes(8, 'big') + os.urandom(16) + b'\0' * TAMANHO_UPLOAD
+        response = client.post('/api/upload', headers=cabecalhos, data={
+            'tipo_documento': 'ALVARA_FUNCIONAMENTO',
+            'transportadora_id': str(transportadora_id),
+            'arquivo': (io.BytesIO(conteudo), 'benchmark.pdf')
+        }, content_type='multipart/form-data')
+        if response.status_code != 201:
+            raise RuntimeError(f"Upload do benchmark falhou: {response.status_code}")
+        return response
+
+    return {
+        'require_auth': require_auth,
+        'rate_limit_verificar': rate_limit,
+        'execute_query_select_1': consulta_trivial,
+        'execute_query_por_chave': consulta_por_chave,
+        'json_stdlib_100_documentos': json_stdlib,
+        'json_flask_100_documentos': json_flask,
+        'pagina_json_100_documentos': pagina_documentos,
+        'http_listar_documentos': listar_documentos,
+        'http_upload_256kb': upload,
+    }
+
+
+def executar(repeticoes=5, filtro=None):
+    """Executa os micro-benchmarks no processo atual (ambiente já preparado)"""
+    import main
+
+    client = main.app.test_client()
+    token = login(client)
+    resultados = {}
+    for nome, funcao in casos(main, client, token).items():
+        if filtro and filtro not in nome:
+            continue
+        resultados[nome] = medir(funcao, repeticoes)
+        logger.info(f"{nome}: {resultados[nome]['por_operacao_us']:.1f} µs/op")
+    return resultados
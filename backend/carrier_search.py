@@ -0,0 +1,189 @@
+import re
+import logging
+from document_service import FiltroInvalido
+
+logger = logging.getLogger(__name__)
+
+STATUS_CADASTRO = ('PENDENTE', 'APROVADO', 'SUSPENSO', 'INATIVO')
+
+_COLUNAS_BUSCA = """
+    t.id, t.cnpj, t.razao_social, t.nome_fantasia, t.endereco_cidade, t.endereco_estado,
+    t.status_cadastro, t.ativo
+"""
+
+# Termos de texto (letras e dígitos, com acentos) e consultas só de CNPJ/CPF
+_TERMO = re.compile(r'\w+', re.UNICODE)
+_SO_DOCUMENTO = re.compile(r'^[\d.\-/\s]+$')
+
+# Pesos das colunas no ranking: razão social > nome fantasia > cidade
+_PESOS = (10.0, 6.0, 2.0)
+
+
+def digitos(valor):
+    """Apenas os dígitos de um CNPJ/CPF ('12.345.678/0001-90' -> '12345678000190')"""
+    return re.sub(r'\D', '', valor or '')
+
+
+class CarrierSearch:
+    """Busca de transportadoras por nome, nome fantasia, cidade ou CNPJ/CPF
+
+    Consultas só com dígitos e pontuação de CNPJ/CPF viram uma busca por
+    prefixo em cnpj_digitos (coluna gerada e indexada), então o CNPJ pode ser
+    digitado com ou sem máscara. As demais usam o índice de texto de cada
+    banco: FTS5 com prefixos no SQLite (tabela transportadoras_busca, mantida
+    por triggers), FULLTEXT em modo booleano no MySQL e pg_trgm no PostgreSQL.
+    O resultado é ordenado por relevância e paginado por limit/offset.
+    """
+
+    def __init__(self, db_manager, default_limit=20, max_limit=100, max_offset=1000):
+        self.db_manager = db_manager
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self.max_offset = max_offset
+
+    def parse_busca(self, args):
+        """Valida os parâmetros de query da busca"""
+        termo = (args.get('q') or '').strip()
+        if len(termo) < 2:
+            raise FiltroInvalido("Informe ao menos 2 caracteres em q")
+        filtros = {}
+        if args.get('uf'):
+            uf = args['uf'].strip().upper()
+            if len(uf) != 2 or not uf.isalpha():
+                raise FiltroInvalido(f"UF inválida: {args['uf']}")
+            filtros['uf'] = uf
+        if args.get('status'):
+            status = args['status'].upper()
+            if status not in STATUS_CADASTRO:
+                raise FiltroInvalido(f"Status inválido: {args['status']}")
+            filtros['status'] = status
+
+        limite = self._inteiro(args.get('limit', self.default_limit), 'limit')
+        if not 1 <= limite <= self.max_limit:
+            raise FiltroInvalido(f"limit deve estar entre 1 e {self.max_limit}")
+        offset = self._inteiro(args.get('offset', 0), 'offset')
+        if not 0 <= offset <= self.max_offset:
+            raise FiltroInvalido(f"offset deve estar entre 0 e {self.max_offset}")
+        return termo, filtros, limite, offset
+
+    def _inteiro(self, valor, campo):
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            raise FiltroInvalido(f"Valor inválido em {campo}: {valor}")
+
+    def montar_query(self, termo, filtros, limite, offset=0):
+        """SQL do banco configurado e parâmetros da página pedida
+
+        Retorna (None, None) quando o termo não tem nada pesquisável.
+        """
+        condicoes = []
+        params = []
+        if 'uf' in filtros:
+            condicoes.append("t.endereco_estado = ?")
+            params.append(filtros['uf'])
+        if 'status' in filtros:
+            condicoes.append("t.status_cadastro = ?")
+            params.append(filtros['status'])
+        extra = ''.join(f" AND {condicao}" for condicao in condicoes)
+
+        if _SO_DOCUMENTO.match(termo) and len(digitos(termo)) >= 2:
+            prefixo = digitos(termo)
+            if self.db_manager.db_type == 'sqlite':
+                # LIKE do SQLite ignora maiúsculas e não usa o índice BINARY; o
+                # intervalo (':' sucede '9' na ordem binária) usa
+                condicao, valores = "t.cnpj_digitos >= ? AND t.cnpj_digitos < ?", (prefixo, prefixo + ':')
+            else:
+                # LIKE 'prefixo%' usa o B-tree do MySQL (qualquer collation) e o
+                # text_pattern_ops do PostgreSQL
+                condicao, valores = "t.cnpj_digitos LIKE ?", (prefixo + '%',)
+            sql = f"""
+                SELECT {_COLUNAS_BUSCA}
+                FROM transportadoras t
+                WHERE {condicao}{extra}
+                ORDER BY t.cnpj_digitos, t.id
+                LIMIT ? OFFSET ?
+            """
+            return sql, (*valores, *params, limite, offset)
+
+        termos = _TERMO.findall(termo)
+        if not termos:
+            return None, None
+        db_type = self.db_manager.db_type
+
+        if db_type == 'sqlite':
+            # Cada termo como prefixo entre aspas (sem operadores FTS vindos do usuário)
+            consulta = ' '.join(f'"{parte}"*' for parte in termos)
+            pesos = ', '.join(str(peso) for peso in _PESOS)
+            sql = f"""
+                SELECT {_COLUNAS_BUSCA}
+                FROM transportadoras_busca b
+                JOIN transportadoras t ON t.id = b.rowid
+                WHERE transportadoras_busca MATCH ?{extra}
+                ORDER BY bm25(transportadoras_busca, {pesos}), t.id
+                LIMIT ? OFFSET ?
+            """
+            return sql, (consulta, *params, limite, offset)
+
+        if db_type == 'mysql':
+            consulta = ' '.join(f'+{parte}*' for parte in termos)
+            match = "MATCH (t.razao_social, t.nome_fantasia, t.endereco_cidade) AGAINST (? IN BOOLEAN MODE)"
+            sql = f"""
+                SELECT {_COLUNAS_BUSCA}, {match} AS relevancia
+                FROM transportadoras t
+                WHERE {match}{extra}
+                ORDER BY relevancia DESC, t.id
+                LIMIT ? OFFSET ?
+            """
+            return sql, (consulta, consulta, *params, limite, offset)
+
+        # PostgreSQL: todo termo em alguma coluna (ILIKE via índice trigram), ordem por similaridade
+        por_termo = []
+        params_termos = []
+        for parte in termos:
+            por_termo.append(
+                "(t.razao_social ILIKE ? OR t.nome_fantasia ILIKE ? OR t.endereco_cidade ILIKE ?)"
+            )
+            params_termos.extend([f'%{parte}%'] * 3)
+        frase = ' '.join(termos)
+        sql = f"""
+            SELECT {_COLUNAS_BUSCA},
+                   GREATEST(similarity(t.razao_social, ?), similarity(COALESCE(t.nome_fantasia, ''), ?) * 0.8,
+                            similarity(COALESCE(t.endereco_cidade, ''), ?) * 0.4) AS relevancia
+            FROM transportadoras t
+            WHERE {' AND '.join(por_termo)}{extra}
+            ORDER BY relevancia DESC, t.id
+            LIMIT ? OFFSET ?
+        """
+        return sql, (frase, frase, frase, *params_termos, *params, limite, offset)
+
+    def buscar(self, termo, filtros=None, limite=None, offset=0):
+        """Página da busca: {"transportadoras": [...], "quantidade", "limit", "offset", "proximo_offset"}"""
+        limite = limite or self.default_limit
+        # Uma linha a mais indica se existe próxima página
+        sql, params = self.montar_query(termo, filtros or {}, limite + 1, offset)
+        rows = self.db_manager.run(sql, params, fetch=True) if sql else []
+        for row in rows:
+            row.pop('relevancia', None)
+            row['ativo'] = bool(row['ativo'])
+        proximo = offset + limite if len(rows) > limite else None
+        return {
+            'transportadoras': rows[:limite],
+            'quantidade': min(len(rows), limite),
+            'limit': limite,
+            'offset': offset,
+            'proximo_offset': proximo,
+        }
+
+    def reconstruir_indice(self):
+        """Recria o índice de texto a partir de transportadoras
+
+        Necessário no SQLite quando a tabela FTS perde linhas. O FULLTEXT do
+        MySQL é mantido pelo próprio InnoDB e os índices pg_trgm do PostgreSQL
+        são criados por DatabaseManager.create_tables().
+        """
+        db_type = self.db_manager.db_type
+        if db_type == 'sqlite':
+            with self.db_manager.transaction() as tx:
+                tx.execute("INSERT INTO transportadoras_busca (transportadoras_busca) VALUES ('rebuild')")
+        logger.info(f"Índice de busca de transportadoras reconstruído ({db_type})")
@@ -0,0 +1,88 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+# Tipos de conteúdo que se beneficiam de compressão (PDFs e imagens já são comprimidos)
+_TIPOS_COMPRESSIVEIS = ('application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+
+class ResponseCompressor:
+    """Compressão das respostas negociada pelo Accept-Encoding (br quando disponível, gzip)
+
+    Respostas com corpo em memória só são comprimidas a partir de
+    `tamanho_minimo` bytes; respostas em streaming (listagem de documentos) são
+    comprimidas pedaço a pedaço, sem acumular o corpo. Respostas que já têm
+    Content-Encoding, arquivos servidos diretamente e `Cache-Control:
+    no-transform` passam intactos.
+    """
+
+    def __init__(self, tamanho_minimo=1024, nivel_gzip=6, qualidade_brotli=4):
+        self.tamanho_minimo = tamanho_minimo
+        self.nivel_gzip = nivel_gzip
+        self.qualidade_brotli = qualidade_brotli
+        self.codificacoes = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def aplicar(self, request, response):
+        """Comprime `response` se o cliente aceitar e valer a pena; retorna a resposta"""
+        if not self._compressivel(response):
+            return response
+        # O conteúdo varia com o Accept-Encoding mesmo quando esta resposta não é comprimida
+        response.vary.add('Accept-Encoding')
+        if request.method == 'HEAD':
+            return response
+        codificacao = request.accept_encodings.best_match(self.codificacoes)
+        if codificacao is None:
+            return response
+
+        if response.is_streamed:
+            original = response.response
+            response.response = self._comprimir_fluxo(response.iter_encoded(), original, codificacao)
+            response.headers.pop('Content-Length', None)
+        else:
+            corpo = response.get_data()
+            if len(corpo) < self.tamanho_minimo:
+                return response
+            compressor, finalizar = self._compressor(codificacao)
+            response.set_data(compressor(corpo) + finalizar())
+
+        response.headers['Content-Encoding'] = codificacao
+        # Bytes diferentes por codificação: o ETag forte passa a fraco (If-None-Match segue valendo)
+        etag, fraco = response.get_etag()
+        if etag and not fraco:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _compressivel(self, response):
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        if response.cache_control.no_transform:
+            return False
+        mimetype = response.mimetype or ''
+        return mimetype.startswith('text/') or mimetype in _TIPOS_COMPRESSIVEIS or mimetype.endswith('+json')
+
+    def _compressor(self, codificacao):
+        """Par (comprimir pedaço, finalizar) para a codificação"""
+        if codificacao == 'br':
+            compressor = brotli.Compressor(quality=self.qualidade_brotli)
+            return compressor.process, compressor.finish
+        # wbits 31: formato gzip (cabeçalho e CRC32)
+        compressor = zlib.compressobj(self.nivel_gzip, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+    def _comprimir_fluxo(self, pedacos, original, codificacao):
+        comprimir, finalizar = self._compressor(codificacao)
+        try:
+            for pedaco in pedacos:
+                saida = comprimir(pedaco)
+                if saida:
+                    yield saida
+            yield finalizar()
+        finally:
+            # Fecha o gerador original (cursor da listagem) mesmo se o cliente desconectar
+            if hasattr(original, 'close'):
+                original.close()
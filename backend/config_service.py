@@ -0,0 +1,166 @@
+import json
+import time
+import logging
+import threading
+from background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+_VERDADEIROS = ('true', '1', 'sim', 'yes', 'on')
+_FALSOS = ('false', '0', 'nao', 'não', 'no', 'off', '')
+
+
+def converter_valor(valor, tipo_valor):
+    """Converte o texto de configuracoes.valor conforme tipo_valor
+
+    Levanta ValueError se o texto não for válido para o tipo.
+    """
+    if valor is None:
+        return None
+    if tipo_valor == 'integer':
+        return int(str(valor).strip())
+    if tipo_valor == 'boolean':
+        texto = str(valor).strip().lower()
+        if texto in _VERDADEIROS:
+            return True
+        if texto in _FALSOS:
+            return False
+        raise ValueError(f"Booleano inválido: {valor!r}")
+    if tipo_valor == 'json':
+        return json.loads(valor)
+    return valor
+
+
+def serializar_valor(valor, tipo_valor):
+    """Texto gravado em configuracoes.valor para um valor nativo"""
+    if tipo_valor == 'boolean':
+        return 'true' if valor else 'false'
+    if tipo_valor == 'json':
+        return json.dumps(valor, ensure_ascii=False)
+    return str(valor)
+
+
+class ConfigService:
+    """Configurações do sistema já convertidas para tipos nativos, servidas da memória
+
+    A tabela inteira é lida na primeira consulta e cada valor é convertido por
+    tipo_valor. A cada `intervalo` segundos uma thread roda uma consulta de
+    detecção de mudança (COUNT e MAX(data_atualizacao)); só quando ela muda as
+    linhas com data_atualizacao a partir da última marca são relidas. Como a
+    coluna tem resolução de segundos, a assinatura só é considerada estável
+    quando o relógio do banco já passou da marca; remoções (total menor que o
+    esperado) forçam a recarga completa. definir() grava e atualiza o processo
+    atual na hora; os demais convergem no próximo ciclo.
+    """
+
+    def __init__(self, db_manager, intervalo=5.0):
+        self.db_manager = db_manager
+        self._valores = None
+        self._tipos = {}
+        self._assinatura = None
+        self._estavel = False
+        self._lock = threading.Lock()
+        self._task = PeriodicTask('config-sync', intervalo, self.sincronizar)
+
+    def ensure_started(self):
+        """Inicia a sincronização periódica uma vez por processo"""
+        self._task.ensure_started()
+
+    def stop(self):
+        """Interrompe a sincronização periódica"""
+        self._task.stop()
+
+    def obter(self, chave, default=None):
+        """Valor convertido de uma configuração, ou `default` se ausente"""
+        valores = self._valores
+        if valores is None:
+            valores = self._carregar_inicial()
+        return valores.get(chave, default)
+
+    def todas(self):
+        """Todas as configurações (chave -> valor convertido)"""
+        valores = self._valores
+        if valores is None:
+            valores = self._carregar_inicial()
+        return dict(valores)
+
+    def _carregar_inicial(self):
+        self.ensure_started()
+        with self._lock:
+            if self._valores is None:
+                self._sincronizar()
+            return self._valores
+
+    def sincronizar(self):
+        """Aplica as alterações feitas no banco; retorna o número de chaves lidas"""
+        with self._lock:
+            return self._sincronizar()
+
+    def _sincronizar(self):
+        start = time.perf_counter()
+        with self.db_manager.transaction() as tx:
+            estado = tx.run(
+                """SELECT COUNT(*) AS total, MAX(data_atualizacao) AS ultima, CURRENT_TIMESTAMP AS agora
+                   FROM configuracoes""",
+                fetch=True
+            )[0]
+            assinatura = (estado['total'], estado['ultima'])
+            if self._valores is not None and self._estavel and assinatura == self._assinatura:
+                return 0
+
+            completa = self._valores is None or self._assinatura[1] is None
+            if completa:
+                rows = tx.run("SELECT chave, valor, tipo_valor FROM configuracoes", fetch=True)
+            else:
+                # >= porque outras linhas podem ter sido gravadas no mesmo segundo da marca
+                rows = tx.run(
+                    "SELECT chave, valor, tipo_valor FROM configuracoes WHERE data_atualizacao >= ?",
+                    (self._assinatura[1],),
+                    fetch=True
+                )
+                chaves = set(self._tipos) | {row['chave'] for row in rows}
+                if len(chaves) != estado['total']:
+                    # Alguma chave foi removida: relê tudo
+                    completa = True
+                    rows = tx.run("SELECT chave, valor, tipo_valor FROM configuracoes", fetch=True)
+
+        valores = {} if completa else dict(self._valores)
+        tipos = {} if completa else dict(self._tipos)
+        for row in rows:
+            tipos[row['chave']] = row['tipo_valor'] or 'string'
+            try:
+                valores[row['chave']] = converter_valor(row['valor'], tipos[row['chave']])
+            except ValueError as e:
+                logger.error(f"Configuração {row['chave']} ignorada: valor inválido para {tipos[row['chave']]} ({e})")
+                valores.pop(row['chave'], None)
+
+        self._tipos = tipos
+        self._valores = valores
+        self._assinatura = assinatura
+        # Só é seguro pular a releitura quando nenhuma gravação futura pode repetir a marca
+        self._estavel = assinatura[1] is not None and str(assinatura[1]) < str(estado['agora'])
+        logger.info(
+            f"Configurações {'carregadas' if completa else 'atualizadas'} ({len(rows)} linhas) "
+            f"em {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return len(rows)
+
+    def definir(self, chave, valor, tipo_valor=None, descricao=None):
+        """Grava uma configuração e atualiza este processo imediatamente
+
+        Sem `tipo_valor`, mantém o tipo já cadastrado (ou 'string' para chaves novas).
+        """
+        if self._valores is None:
+            self._carregar_inicial()
+        tipo_valor = tipo_valor or self._tipos.get(chave, 'string')
+        texto = serializar_valor(valor, tipo_valor)
+        converter_valor(texto, tipo_valor)
+        # Relógio do banco, como os demais gravadores: a marca incremental compara com ele
+        self.db_manager.run(
+            """INSERT INTO configuracoes (chave, valor, descricao, tipo_valor, data_atualizacao)
+               VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+               ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor, tipo_valor = excluded.tipo_valor,
+                                                 data_atualizacao = CURRENT_TIMESTAMP""",
+            (chave, texto, descricao, tipo_valor)
+        )
+        self.sincronizar()
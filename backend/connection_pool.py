@@ -0,0 +1,293 @@
+import os
+import time
+import logging
+import threading
+import weakref
+from collections import deque
+from metrics import espera_pool
+
+logger = logging.getLogger(__name__)
+
+# Pools vivos no processo, usados para reiniciar o estado após fork()
+_pools = weakref.WeakSet()
+
+
+def _reset_pools_after_fork():
+    """Descarta o estado herdado do processo pai em todos os pools"""
+    for pool in list(_pools):
+        pool._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo limite"""
+
+
+class PoolClosedError(Exception):
+    """Operação em um pool já encerrado"""
+
+
+class _PoolEntry:
+    """Conexão física mantida pelo pool (geracao: estado do pool que a emprestou)"""
+
+    __slots__ = ('raw', 'created_at', 'last_used', 'cache', 'geracao')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.cache = {}
+        self.geracao = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PooledConnection:
+    """Proxy de conexão emprestada; close() devolve a conexão ao pool"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def raw(self):
+        """Conexão do driver subjacente"""
+        if self._entry is None:
+            raise PoolClosedError("Conexão já devolvida ao pool")
+        return self._entry.raw
+
+    @property
+    def cache(self):
+        """Dicionário ligado à conexão física (ex.: statements preparados)"""
+        if self._entry is None:
+            raise PoolClosedError("Conexão já devolvida ao pool")
+        return self._entry.cache
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def close(self):
+        """Devolve a conexão ao pool (idempotente)"""
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry)
+
+    def invalidate(self):
+        """Fecha a conexão física em vez de devolvê-la ao pool"""
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """Pool de conexões limitado, com validação, reciclagem e estatísticas"""
+
+    def __init__(self, factory, max_size=10, timeout=30.0, max_lifetime=1800.0,
+                 ping_interval=1.0, validator=None, reset=None, name='portal_pool'):
+        if max_size < 1:
+            raise ValueError("max_size deve ser maior que zero")
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self._factory = factory
+        self._validator = validator
+        self._reset = reset
+        self._orphans = []
+        self._init_state()
+        _pools.add(self)
+
+    def _init_state(self):
+        """Inicializa lock, fila de ociosas e contadores"""
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._pid = os.getpid()
+        # Muda a cada reinício após fork: conexões de gerações anteriores são do processo pai
+        self._geracao = getattr(self, '_geracao', 0) + 1
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _reset_after_fork(self):
+        """Abandona as conexões do processo pai sem fechá-las"""
+        # Fechar sockets herdados encerraria a sessão do processo pai;
+        # as referências são mantidas para que o GC não as finalize.
+        self._orphans.extend(entry.raw for entry in self._idle)
+        self._init_state()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+    def acquire(self, timeout=None):
+        """Empresta uma conexão, aguardando até `timeout` segundos"""
+        self._check_pid()
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosedError(f"Pool {self.name} encerrado")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Pool {self.name} esgotado após {timeout:.1f}s "
+                            f"({self._in_use}/{self.max_size} em uso)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                self._in_use += 1
+
+            if entry is None:
+                entry = self._open_entry()
+            elif not self._is_usable(entry):
+                self._drop(entry)
+                continue
+
+            entry.geracao = self._geracao
+            waited = time.monotonic() - start
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                if waited > self._wait_max:
+                    self._wait_max = waited
+            espera_pool.observar(waited, self.name)
+            return PooledConnection(self, entry)
+
+    def _open_entry(self):
+        """Abre uma nova conexão física para uma vaga já reservada"""
+        try:
+            raw = self._factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created += 1
+        return _PoolEntry(raw)
+
+    def _is_usable(self, entry):
+        """Verifica tempo de vida e saúde de uma conexão ociosa"""
+        now = time.monotonic()
+        if self.max_lifetime and now - entry.created_at >= self.max_lifetime:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if self._validator and now - entry.last_used >= self.ping_interval:
+            try:
+                self._validator(entry.raw)
+            except Exception as e:
+                logger.warning(f"Conexão inválida descartada do pool {self.name}: {e}")
+                return False
+        return True
+
+    def _drop(self, entry):
+        """Libera a vaga de uma conexão emprestada e fecha a conexão física"""
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._discarded += 1
+            self._cond.notify()
+        self._close_raw(entry.raw)
+
+    def _release(self, entry, discard=False):
+        """Recebe de volta uma conexão emprestada"""
+        self._check_pid()
+        if entry.geracao != self._geracao:
+            # Emprestada antes do fork: o socket é do processo pai e a vaga não é
+            # contada aqui; mantida sem fechar, como as ociosas herdadas
+            self._orphans.append(entry.raw)
+            return
+        if not discard and self._reset:
+            try:
+                self._reset(entry.raw)
+            except Exception as e:
+                logger.warning(f"Falha ao reiniciar conexão do pool {self.name}: {e}")
+                discard = True
+        now = time.monotonic()
+        if not discard and self.max_lifetime and now - entry.created_at >= self.max_lifetime:
+            discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._in_use -= 1
+            self._cond.notify()
+            closing = discard or self._closed
+        if closing:
+            self._close_raw(entry.raw)
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        """Retorna estatísticas instantâneas do pool"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'name': self.name,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'recycled': self._recycled,
+                'discarded': self._discarded,
+                'wait_time_total_ms': round(self._wait_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                'wait_time_max_ms': round(self._wait_max * 1000, 3),
+            }
+
+    def close(self):
+        """Fecha as conexões ociosas e recusa novos empréstimos"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_raw(entry.raw)
@@ -0,0 +1,139 @@
+import time
+import logging
+import threading
+from datetime import datetime
+from background import PeriodicTask
+from document_service import STATUS_DOCUMENTO
+
+logger = logging.getLogger(__name__)
+
+# Soma um delta ao contador (transportadora, status), criando a linha se preciso
+_UPSERT_DELTA = """
+    INSERT INTO dashboard_resumo (transportadora_id, status, total) VALUES (?, ?, ?)
+    ON CONFLICT (transportadora_id, status) DO UPDATE SET total = dashboard_resumo.total + excluded.total
+"""
+
+
+class DashboardService:
+    """Agregados do dashboard servidos da tabela dashboard_resumo
+
+    O resumo é mantido incrementalmente a cada transição de status de documento
+    (na mesma transação) e reconstruído periodicamente a partir de `documentos`.
+    As leituras são servidas de um cache em memória com TTL.
+    """
+
+    def __init__(self, db_manager, cache_ttl=30.0, reconcile_interval=900.0):
+        self.db_manager = db_manager
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._reconciler = PeriodicTask('dashboard-reconciler', reconcile_interval, self.reconciliar)
+
+    def ensure_reconciler_started(self):
+        """Inicia a reconciliação periódica neste processo (só no processo worker, não nos web)"""
+        self._reconciler.ensure_started()
+
+    def stop(self):
+        """Interrompe a reconciliação periódica"""
+        self._reconciler.stop()
+
+    def registrar_transicao(self, tx, transportadora_id, status_anterior, status_novo, quantidade=1):
+        """Atualiza o resumo na transação `tx` que altera o status do documento
+
+        status_anterior=None representa um documento novo; status_novo=None, uma exclusão.
+        """
+        if status_anterior == status_novo:
+            return
+        deltas = []
+        if status_anterior:
+            deltas.append((transportadora_id, status_anterior, -quantidade))
+        if status_novo:
+            deltas.append((transportadora_id, status_novo, quantidade))
+        self.aplicar_deltas(tx, deltas)
+
+    def aplicar_deltas(self, tx, deltas):
+        """Aplica deltas (transportadora_id, status, delta) em lote na transação `tx`"""
+        deltas = [delta for delta in deltas if delta[2]]
+        if not deltas:
+            return
+        tx.run_many(_UPSERT_DELTA, deltas)
+        for transportadora_id in {delta[0] for delta in deltas}:
+            self.invalidar(transportadora_id)
+
+    def reconciliar(self):
+        """Reconstrói o resumo a partir de documentos (via idx_documentos_transportadora_status)"""
+        start = time.perf_counter()
+        with self.db_manager.transaction() as tx:
+            tx.run("DELETE FROM dashboard_resumo")
+            tx.run(
+                """INSERT INTO dashboard_resumo (transportadora_id, status, total)
+                   SELECT transportadora_id, status, COUNT(*)
+                   FROM documentos
+                   GROUP BY transportadora_id, status"""
+            )
+        self.invalidar()
+        logger.info(f"Resumo do dashboard reconciliado em {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def invalidar(self, transportadora_id=None):
+        """Descarta o cache local (global e, se informado, da transportadora)"""
+        with self._lock:
+            self._cache.pop(None, None)
+            if transportadora_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(transportadora_id, None)
+
+    def resumo(self, transportadora_id=None):
+        """Agregados do dashboard, globais ou de uma transportadora"""
+        entry = self._cache.get(transportadora_id)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        data = self._carregar(transportadora_id)
+        with self._lock:
+            self._cache[transportadora_id] = (now + self.cache_ttl, data)
+        return data
+
+    def _carregar(self, transportadora_id):
+        if transportadora_id is None:
+            rows = self.db_manager.run(
+                "SELECT status, SUM(total) AS total FROM dashboard_resumo GROUP BY status", fetch=True
+            )
+            transportadoras = self.db_manager.run(
+                """SELECT COUNT(*) AS total, SUM(CASE WHEN ativo THEN 1 ELSE 0 END) AS ativas
+                   FROM transportadoras""",
+                fetch=True
+            )[0]
+        else:
+            rows = self.db_manager.run(
+                "SELECT status, total FROM dashboard_resumo WHERE transportadora_id = ?",
+                (transportadora_id,),
+                fetch=True
+            )
+            transportadoras = None
+
+        por_status = dict.fromkeys(STATUS_DOCUMENTO, 0)
+        for row in rows:
+            por_status[row['status']] = int(row['total'] or 0)
+
+        data = {
+            'total_documentos': sum(por_status.values()),
+            'documentos_pendentes': por_status['pendente'],
+            'documentos_aprovados': por_status['aprovado'],
+            'documentos_rejeitados': por_status['rejeitado'],
+            'documentos_vencidos': por_status['vencido'],
+            'documentos_renovacao': por_status['renovacao'],
+            'ultima_atualizacao': datetime.utcnow().isoformat()
+        }
+        if transportadoras is not None:
+            data['transportadoras_ativas'] = int(transportadoras['ativas'] or 0)
+            data['transportadoras_total'] = int(transportadoras['total'] or 0)
+        return data
+
+
+if __name__ == '__main__':
+    # Reconciliação avulsa (ex.: cron) quando DASHBOARD_RECONCILE_INTERVAL=0
+    from database_manager import db_manager
+    logging.basicConfig(level=logging.INFO)
+    DashboardService(db_manager).reconciliar()
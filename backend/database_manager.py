@@ -1,43 +1,316 @@
 import os
-import mysql.connector
-import psycopg2
-import sqlite3
+import io
+import itertools
+import csv
+import time
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import logging
+from connection_pool import ConnectionPool
+from sql_dialect import compile_sql, quote_identifier, PreparedStatementCache
+from db_drivers import carregar_driver
+from metrics import medir_consulta
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Colunas e índices acrescentados ao schema depois da primeira versão, aplicados
+# a bancos existentes por create_tables(): (tabela, tipo, nome, cláusula do ALTER TABLE)
+_MIGRACOES_MYSQL = (
+    ('transportadoras', 'coluna', 'cnpj_digitos',
+     "ADD COLUMN cnpj_digitos VARCHAR(14) GENERATED ALWAYS AS ("
+     "REPLACE(REPLACE(REPLACE(REPLACE(cnpj, '.', ''), '/', ''), '-', ''), ' ', '')) STORED AFTER cnpj"),
+    ('transportadoras', 'indice', 'idx_transportadoras_cnpj_digitos',
+     "ADD INDEX idx_transportadoras_cnpj_digitos (cnpj_digitos)"),
+    ('transportadoras', 'indice', 'ft_transportadoras_busca',
+     "ADD FULLTEXT INDEX ft_transportadoras_busca (razao_social, nome_fantasia, endereco_cidade)"),
+    ('notificacoes', 'coluna', 'proxima_tentativa',
+     "ADD COLUMN proxima_tentativa TIMESTAMP NULL AFTER prioridade"),
+    ('notificacoes', 'indice', 'idx_notificacoes_fila',
+     "ADD INDEX idx_notificacoes_fila (status_envio, canal, proxima_tentativa)"),
+    ('documentos', 'indice', 'idx_documentos_hash_unico',
+     "ADD UNIQUE INDEX idx_documentos_hash_unico (hash_arquivo, transportadora_id, tipo_documento_id)"),
+)
+
+# Equivalente SQLite (só colunas; os índices usam CREATE INDEX IF NOT EXISTS): (tabela, coluna, definição)
+_MIGRACOES_SQLITE = (
+    ('transportadoras', 'cnpj_digitos',
+     "cnpj_digitos VARCHAR(14) GENERATED ALWAYS AS ("
+     "replace(replace(replace(replace(cnpj, '.', ''), '/', ''), '-', ''), ' ', '')) VIRTUAL"),
+    ('notificacoes', 'proxima_tentativa', "proxima_tentativa TIMESTAMP NULL"),
+)
+
+# PostgreSQL tem ADD COLUMN/CREATE INDEX IF NOT EXISTS: (tabela, comando idempotente).
+# A busca de transportadoras usa pg_trgm para ILIKE '%termo%' e similarity().
+_MIGRACOES_POSTGRESQL = (
+    ('transportadoras', "CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    ('transportadoras',
+     """ALTER TABLE transportadoras ADD COLUMN IF NOT EXISTS cnpj_digitos VARCHAR(14)
+        GENERATED ALWAYS AS (regexp_replace(cnpj, '[^0-9]', '', 'g')) STORED"""),
+    ('transportadoras',
+     "CREATE INDEX IF NOT EXISTS idx_transportadoras_cnpj_digitos ON transportadoras (cnpj_digitos text_pattern_ops)"),
+    ('transportadoras',
+     """CREATE INDEX IF NOT EXISTS idx_transportadoras_busca_trgm ON transportadoras USING gin
+        (razao_social gin_trgm_ops, nome_fantasia gin_trgm_ops, endereco_cidade gin_trgm_ops)"""),
+    ('documentos',
+     """CREATE UNIQUE INDEX IF NOT EXISTS idx_documentos_hash_unico
+        ON documentos (hash_arquivo, transportadora_id, tipo_documento_id)"""),
+)
+
+class Transaction:
+    """Comandos executados em uma única conexão e confirmados juntos"""
+    
+    def __init__(self, manager, conn):
+        self.manager = manager
+        self.db_type = manager.db_type
+        self.connection = conn
+        self._cursor = None
+    
+    @property
+    def cursor(self):
+        """Cursor reutilizado por todos os comandos da transação"""
+        if self._cursor is None:
+            self._cursor = self.manager._create_cursor(self.connection)
+        return self._cursor
+    
+    def execute(self, query, params=None, fetch=False):
+        """Executa um comando; retorna linhas (fetch) ou lastrowid/rowcount"""
+        cursor = self.cursor
+        inicio = time.perf_counter()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        
+        if fetch:
+            rows = self.manager._fetch_all(cursor)
+            medir_consulta(query, inicio)
+            return rows
+        medir_consulta(query, inicio)
+        return cursor.lastrowid if hasattr(cursor, 'lastrowid') else cursor.rowcount
+    
+    def run(self, sql, params=None, fetch=False):
+        """Executa uma query canônica (placeholders `?`, `ON CONFLICT`) no dialeto do banco
+        
+        No MySQL e PostgreSQL reutiliza statements preparados no servidor, mantidos
+        por conexão física do pool.
+        """
+        if not (self.manager.prepared_statements and self.db_type in ('mysql', 'postgresql')):
+            return self.execute(compile_sql(sql, self.db_type), params, fetch=fetch)
+        
+        statements = self.connection.cache.get('prepared_statements')
+        if statements is None:
+            statements = PreparedStatementCache(self.db_type)
+            self.connection.cache['prepared_statements'] = statements
+        
+        inicio = time.perf_counter()
+        if self.db_type == 'postgresql':
+            cursor = statements.execute(self.connection, sql, params, cursor=self.cursor)
+            if fetch:
+                rows = self.manager._fetch_all(cursor)
+                medir_consulta(sql, inicio)
+                return rows
+        else:  # mysql: cursor preparado retorna tuplas
+            cursor = statements.execute(self.connection, sql, params)
+            if fetch:
+                columns = cursor.column_names
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                medir_consulta(sql, inicio)
+                return rows
+        medir_consulta(sql, inicio)
+        return cursor.lastrowid if hasattr(cursor, 'lastrowid') else cursor.rowcount
+    
+    def run_many(self, sql, params_seq, page_size=1000):
+        """Versão em lote de run() para queries canônicas"""
+        return self.execute_many(compile_sql(sql, self.db_type), params_seq, page_size=page_size)
+    
+    def execute_many(self, query, params_seq, page_size=1000):
+        """Executa o comando para cada conjunto de parâmetros via executemany do driver"""
+        params_seq = list(params_seq)
+        if not params_seq:
+            return 0
+        
+        cursor = self.cursor
+        inicio = time.perf_counter()
+        if self.db_type == 'postgresql':
+            from psycopg2.extras import execute_batch
+            execute_batch(cursor, query, params_seq, page_size=page_size)
+            medir_consulta(query, inicio)
+            return len(params_seq)
+        
+        # mysql.connector reescreve INSERTs em executemany como VALUES multi-linha
+        cursor.executemany(query, params_seq)
+        medir_consulta(query, inicio)
+        return cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else len(params_seq)
+    
+    def bulk_insert(self, table, columns, rows, page_size=1000):
+        """Insere linhas em lote: VALUES multi-linha (MySQL), execute_values (PostgreSQL)
+        ou executemany em transação única (SQLite)"""
+        table = quote_identifier(table)
+        column_list = ', '.join(quote_identifier(column) for column in columns)
+        rows = list(rows)
+        if not rows:
+            return 0
+        
+        cursor = self.cursor
+        if self.db_type == 'postgresql':
+            from psycopg2.extras import execute_values
+            execute_values(
+                cursor, f"INSERT INTO {table} ({column_list}) VALUES %s", rows, page_size=page_size
+            )
+        elif self.db_type == 'mysql':
+            row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+            for start in range(0, len(rows), page_size):
+                page = rows[start:start + page_size]
+                values = ', '.join([row_placeholder] * len(page))
+                params = [value for row in page for value in row]
+                cursor.execute(f"INSERT INTO {table} ({column_list}) VALUES {values}", params)
+        else:  # sqlite
+            placeholders = ', '.join(['?'] * len(columns))
+            cursor.executemany(f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})", rows)
+        return len(rows)
+    
+    def copy_rows(self, table, columns, rows):
+        """Carga via COPY FROM STDIN no PostgreSQL; demais bancos usam bulk_insert"""
+        if self.db_type != 'postgresql':
+            return self.bulk_insert(table, columns, rows)
+        
+        table = quote_identifier(table)
+        column_list = ', '.join(quote_identifier(column) for column in columns)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        count = 0
+        for row in rows:
+            writer.writerow(['\\N' if value is None else value for value in row])
+            count += 1
+        buffer.seek(0)
+        self.cursor.copy_expert(
+            f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+        )
+        return count
+    
+    def _close(self):
+        if self._cursor is not None:
+            try:
+                self._cursor.close()
+            except Exception:
+                pass
+            self._cursor = None
+
+
 class DatabaseManager:
     """Gerenciador de banco de dados universal e robusto"""
     
     def __init__(self):
         self.db_type = os.getenv('DATABASE_TYPE', 'mysql').lower()
         self.connection = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._cursor_ids = itertools.count(1)
+        self.prepared_statements = os.getenv('DATABASE_PREPARED_STATEMENTS', 'true').lower() == 'true'
+        self._driver = None
+        # Chamados após gravar tipos_documento (ex.: ReferenceDataCache.invalidar)
+        self.ao_alterar_referencia = []
         self._initialize_logging()
+    
+    @property
+    def driver(self):
+        """Módulo DB-API do banco configurado, importado no primeiro uso"""
+        if self._driver is None:
+            self._driver = carregar_driver(self.db_type)
+        return self._driver
         
     def _initialize_logging(self):
         """Configura logging específico para banco"""
         self.logger = logging.getLogger(f'db.{self.db_type}')
         
     def get_connection(self):
-        """Retorna conexão baseada no tipo de banco configurado"""
+        """Empresta uma conexão do pool; close() devolve a conexão ao pool"""
         try:
-            if self.db_type == 'mysql':
-                return self._get_mysql_connection()
-            elif self.db_type == 'postgresql':
-                return self._get_postgresql_connection()
-            elif self.db_type == 'sqlite':
-                return self._get_sqlite_connection()
-            else:
-                raise ValueError(f"Tipo de banco não suportado: {self.db_type}")
+            return self._get_pool().acquire()
         except Exception as e:
             self.logger.error(f"Erro na conexão com banco {self.db_type}: {e}")
             return None
     
+    def _get_pool(self):
+        """Cria o pool de conexões sob demanda"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        factory=self._create_connection,
+                        max_size=int(os.getenv('DATABASE_POOL_SIZE', 10)),
+                        timeout=float(os.getenv('DATABASE_POOL_TIMEOUT', 30)),
+                        max_lifetime=float(os.getenv('DATABASE_POOL_MAX_LIFETIME', 1800)),
+                        ping_interval=float(os.getenv('DATABASE_POOL_PING_INTERVAL', 1)),
+                        validator=self._validate_connection,
+                        reset=self._reset_connection,
+                        name=f'portal_pool_{self.db_type}'
+                    )
+        return self._pool
+    
+    def _create_connection(self):
+        """Abre uma conexão física baseada no tipo de banco configurado"""
+        if self.db_type == 'mysql':
+            return self._get_mysql_connection()
+        elif self.db_type == 'postgresql':
+            return self._get_postgresql_connection()
+        elif self.db_type == 'sqlite':
+            return self._get_sqlite_connection()
+        else:
+            raise ValueError(f"Tipo de banco não suportado: {self.db_type}")
+    
+    def _validate_connection(self, conn):
+        """Verifica se uma conexão ociosa ainda responde antes do empréstimo"""
+        if self.db_type == 'mysql':
+            conn.ping(reconnect=False)
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        finally:
+            cursor.close()
+        if self.db_type == 'postgresql':
+            conn.rollback()
+    
+    def _reset_connection(self, conn):
+        """Descarta transação pendente antes de devolver a conexão ao pool"""
+        conn.rollback()
+    
+    def pool_stats(self):
+        """Estatísticas do pool de conexões (em uso, ociosas, espera)"""
+        if self._pool is None:
+            return None
+        return self._pool.stats()
+    
+    def health_check(self, timeout=5.0):
+        """Verifica se o banco responde, sem esperar mais que `timeout` pelo pool"""
+        try:
+            conn = self._get_pool().acquire(timeout=timeout)
+        except Exception as e:
+            self.logger.error(f"Health check do banco {self.db_type} falhou: {e}")
+            return False
+        try:
+            self._validate_connection(conn.raw)
+            return True
+        except Exception as e:
+            self.logger.error(f"Health check do banco {self.db_type} falhou: {e}")
+            conn.invalidate()
+            return False
+        finally:
+            conn.close()
+    
+    def close_pool(self):
+        """Fecha todas as conexões ociosas do pool"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+    
     def _get_mysql_connection(self):
         """Conexão MySQL - Para AWS RDS, JawsDB, etc."""
-        return mysql.connector.connect(
+        return self.driver.connect(
             host=os.getenv('DATABASE_HOST'),
             user=os.getenv('DATABASE_USER'),
             password=os.getenv('DATABASE_PASSWORD'),
@@ -45,20 +318,18 @@ class DatabaseManager:
             port=int(os.getenv('DATABASE_PORT', 3306)),
             charset='utf8mb4',
             autocommit=False,
-            pool_name='portal_pool',
-            pool_size=10,
-            pool_reset_session=True,
             connect_timeout=30,
-            sql_mode='STRICT_TRANS_TABLES,NO_ZERO_DATE,NO_ZERO_IN_DATE,ERROR_FOR_DIVISION_BY_ZERO'
+            # PIPES_AS_CONCAT: `||` concatena como no PostgreSQL e no SQLite
+            sql_mode='STRICT_TRANS_TABLES,NO_ZERO_DATE,NO_ZERO_IN_DATE,ERROR_FOR_DIVISION_BY_ZERO,PIPES_AS_CONCAT'
         )
     
     def _get_postgresql_connection(self):
         """Conexão PostgreSQL - Para Heroku Postgres"""
         database_url = os.getenv('DATABASE_URL')
         if database_url:
-            return psycopg2.connect(database_url, sslmode='require')
+            return self.driver.connect(database_url, sslmode='require')
         else:
-            return psycopg2.connect(
+            return self.driver.connect(
                 host=os.getenv('DATABASE_HOST'),
                 user=os.getenv('DATABASE_USER'),
                 password=os.getenv('DATABASE_PASSWORD'),
@@ -68,65 +339,194 @@ class DatabaseManager:
             )
     
     def _get_sqlite_connection(self):
-        """Conexão SQLite - Para desenvolvimento local"""
-        db_path = os.getenv('DATABASE_PATH', 'portal_nimoenergia.db')
-        conn = sqlite3.connect(db_path, timeout=30.0)
+        """Conexão SQLite - Para desenvolvimento local e instalações de filial
+        
+        Chamado apenas quando o pool abre uma conexão física, então os PRAGMAs
+        de perfil rodam uma vez por conexão, não por query.
+        """
+        db_path = os.getenv('DATABASE_PATH') or os.getenv('DATABASE_NAME') or 'portal_nimoenergia.db'
+        uri = False
+        if db_path == ':memory:':
+            # Banco em memória compartilhado entre as conexões do pool
+            db_path = f'file:portal_memdb_{id(self)}?mode=memory&cache=shared'
+            uri = True
+        conn = self.driver.connect(
+            db_path,
+            timeout=30.0,
+            check_same_thread=False,
+            uri=uri,
+            cached_statements=int(os.getenv('SQLITE_CACHED_STATEMENTS', 256))
+        )
         conn.execute('PRAGMA foreign_keys = ON')
         conn.execute('PRAGMA journal_mode = WAL')
         conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute(f"PRAGMA mmap_size = {int(os.getenv('SQLITE_MMAP_SIZE', 268435456))}")
+        # Valor negativo = tamanho em KiB
+        conn.execute(f"PRAGMA cache_size = -{int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))}")
+        conn.execute(f"PRAGMA wal_autocheckpoint = {int(os.getenv('SQLITE_WAL_AUTOCHECKPOINT', 1000))}")
+        conn.execute(f"PRAGMA journal_size_limit = {int(os.getenv('SQLITE_JOURNAL_SIZE_LIMIT', 67108864))}")
         return conn
     
+    def sqlite_checkpoint(self, mode='PASSIVE'):
+        """Executa checkpoint do WAL (PASSIVE, FULL, RESTART ou TRUNCATE)
+        
+        O autocheckpoint cobre o uso normal; TRUNCATE em horário de baixa carga
+        devolve ao disco o espaço de um WAL que cresceu durante cargas em lote.
+        """
+        mode = mode.upper()
+        if self.db_type != 'sqlite':
+            return None
+        if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Modo de checkpoint inválido: {mode}")
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("Falha na conexão com banco de dados")
+        try:
+            busy, log_frames, checkpointed = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+            return {'busy': busy, 'log_frames': log_frames, 'checkpointed': checkpointed}
+        finally:
+            conn.close()
+    
+    def _create_cursor(self, conn):
+        """Cria cursor configurado para o tipo de banco"""
+        if self.db_type == 'mysql':
+            return conn.cursor(dictionary=True, buffered=True)
+        elif self.db_type == 'postgresql':
+            return conn.cursor()
+        else:  # sqlite
+            cursor = conn.cursor()
+            cursor.row_factory = self.driver.Row
+            return cursor
+    
+    def _fetch_all(self, cursor):
+        """Converte o resultado do cursor em lista de dicionários"""
+        if self.db_type == 'mysql':
+            return cursor.fetchall()
+        elif self.db_type == 'postgresql':
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+            return [dict(zip(columns, row)) for row in rows]
+        else:  # sqlite
+            return [dict(row) for row in cursor.fetchall()]
+    
     def execute_query(self, query, params=None, fetch=False):
         """Executa query de forma universal com tratamento robusto"""
-        conn = None
-        cursor = None
+        try:
+            with self.transaction() as tx:
+                return tx.execute(query, params, fetch=fetch)
+        except Exception as e:
+            self.logger.error(f"Erro na execução da query: {e}")
+            raise
+    
+    def iter_query(self, query, params=None, batch_size=1000):
+        """Gera as linhas do resultado em lotes, sem carregar a tabela inteira em memória
+        
+        Usa cursor nomeado (server-side) no PostgreSQL, cursor não bufferizado no
+        MySQL e fetchmany no SQLite. A conexão fica emprestada do pool apenas
+        enquanto o iterador estiver vivo.
+        """
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("Falha na conexão com banco de dados")
         
+        cursor = None
         try:
-            conn = self.get_connection()
-            if not conn:
-                raise Exception("Falha na conexão com banco de dados")
-            
-            # Configurar cursor baseado no tipo de banco
             if self.db_type == 'mysql':
-                cursor = conn.cursor(dictionary=True, buffered=True)
+                cursor = conn.cursor(dictionary=True, buffered=False)
             elif self.db_type == 'postgresql':
-                cursor = conn.cursor()
+                cursor = conn.cursor(name=f'portal_iter_{next(self._cursor_ids)}')
+                cursor.itersize = batch_size
             else:  # sqlite
                 cursor = conn.cursor()
-                cursor.row_factory = sqlite3.Row
+                cursor.row_factory = self.driver.Row
             
-            # Executar query
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
             
-            # Processar resultado
-            if fetch:
+            columns = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
                 if self.db_type == 'mysql':
-                    return cursor.fetchall()
+                    yield from rows
                 elif self.db_type == 'postgresql':
-                    columns = [desc[0] for desc in cursor.description]
-                    rows = cursor.fetchall()
-                    return [dict(zip(columns, row)) for row in rows]
+                    if columns is None:
+                        columns = [desc[0] for desc in cursor.description]
+                    for row in rows:
+                        yield dict(zip(columns, row))
                 else:  # sqlite
-                    return [dict(row) for row in cursor.fetchall()]
-            
-            # Commit para operações de escrita
-            if not fetch:
-                conn.commit()
-                return cursor.lastrowid if hasattr(cursor, 'lastrowid') else cursor.rowcount
-            
+                    for row in rows:
+                        yield dict(row)
         except Exception as e:
-            if conn:
-                conn.rollback()
-            self.logger.error(f"Erro na execução da query: {e}")
+            self.logger.error(f"Erro na leitura em streaming: {e}")
             raise
         finally:
+            if self.db_type == 'mysql':
+                # Iterador abandonado: descartar linhas não lidas antes de devolver a conexão
+                try:
+                    conn.consume_results()
+                except Exception:
+                    pass
             if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            conn.close()
+    
+    def compile(self, sql):
+        """Compila uma query canônica para o dialeto configurado (com cache)"""
+        return compile_sql(sql, self.db_type)
+    
+    def run(self, sql, params=None, fetch=False):
+        """Executa uma query canônica em transação própria"""
+        with self.transaction() as tx:
+            return tx.run(sql, params, fetch=fetch)
+    
+    def run_many(self, sql, params_seq):
+        """Executa uma query canônica para vários conjuntos de parâmetros em um único commit"""
+        with self.transaction() as tx:
+            return tx.run_many(sql, params_seq)
+    
+    def execute_many(self, query, params_seq):
+        """Executa o mesmo comando para vários conjuntos de parâmetros em um único commit"""
+        with self.transaction() as tx:
+            return tx.execute_many(query, params_seq)
+    
+    def bulk_insert(self, table, columns, rows, page_size=1000):
+        """Insere várias linhas usando o caminho em lote mais rápido do banco"""
+        with self.transaction() as tx:
+            return tx.bulk_insert(table, columns, rows, page_size=page_size)
+    
+    @contextmanager
+    def transaction(self):
+        """Unidade de trabalho: uma conexão e um único commit para vários comandos
+        
+        with db_manager.transaction() as tx:
+            tx.execute(...)
+            tx.execute_many(...)
+        """
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("Falha na conexão com banco de dados")
+        
+        tx = Transaction(self, conn)
+        try:
+            yield tx
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception as rollback_error:
+                self.logger.error(f"Erro no rollback da transação: {rollback_error}")
+            raise
+        finally:
+            tx._close()
+            conn.close()
     
     def create_tables(self):
         """Cria estrutura completa de tabelas baseado no tipo de banco"""
@@ -186,6 +586,9 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS transportadoras (
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 cnpj VARCHAR(18) UNIQUE NOT NULL,
+                cnpj_digitos VARCHAR(14) GENERATED ALWAYS AS (
+                    REPLACE(REPLACE(REPLACE(REPLACE(cnpj, '.', ''), '/', ''), '-', ''), ' ', '')
+                ) STORED,
                 razao_social VARCHAR(200) NOT NULL,
                 nome_fantasia VARCHAR(200),
                 inscricao_estadual VARCHAR(20),
@@ -222,10 +625,12 @@ class DatabaseManager:
                 data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                 ativo BOOLEAN DEFAULT TRUE,
                 INDEX idx_transportadoras_cnpj (cnpj),
+                INDEX idx_transportadoras_cnpj_digitos (cnpj_digitos),
                 INDEX idx_transportadoras_razao_social (razao_social),
                 INDEX idx_transportadoras_status (status_cadastro),
                 INDEX idx_transportadoras_ativo (ativo),
-                INDEX idx_transportadoras_data_cadastro (data_cadastro)
+                INDEX idx_transportadoras_data_cadastro (data_cadastro),
+                FULLTEXT INDEX ft_transportadoras_busca (razao_social, nome_fantasia, endereco_cidade)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             """,
             
@@ -303,7 +708,7 @@ class DatabaseManager:
                 INDEX idx_documentos_status (status),
                 INDEX idx_documentos_data_upload (data_upload),
                 INDEX idx_documentos_data_vencimento (data_vencimento),
-                INDEX idx_documentos_hash (hash_arquivo),
+                UNIQUE INDEX idx_documentos_hash_unico (hash_arquivo, transportadora_id, tipo_documento_id),
                 INDEX idx_documentos_usuario_upload (usuario_upload_id),
                 INDEX idx_documentos_transportadora_status (transportadora_id, status),
                 INDEX idx_documentos_vencimento_status (data_vencimento, status)
@@ -352,6 +757,7 @@ class DatabaseManager:
                 erro_envio TEXT,
                 dados_extras JSON,
                 prioridade ENUM('baixa', 'normal', 'alta', 'critica') DEFAULT 'normal',
+                proxima_tentativa TIMESTAMP NULL,
                 data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
                 FOREIGN KEY (transportadora_id) REFERENCES transportadoras(id) ON DELETE SET NULL,
@@ -362,7 +768,8 @@ class DatabaseManager:
                 INDEX idx_notificacoes_status_envio (status_envio),
                 INDEX idx_notificacoes_tipo (tipo),
                 INDEX idx_notificacoes_data_criacao (data_criacao),
-                INDEX idx_notificacoes_usuario_status (usuario_id, status_envio)
+                INDEX idx_notificacoes_usuario_status (usuario_id, status_envio),
+                INDEX idx_notificacoes_fila (status_envio, canal, proxima_tentativa)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             """,
             
@@ -403,6 +810,59 @@ class DatabaseManager:
                 INDEX idx_sessoes_expiracao (data_expiracao),
                 INDEX idx_sessoes_ativo (ativo)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """,
+            
+            # Resumo do dashboard (contagem de documentos por transportadora e status)
+            """
+            CREATE TABLE IF NOT EXISTS dashboard_resumo (
+                transportadora_id INT NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                total INT NOT NULL DEFAULT 0,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (transportadora_id, status)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """,
+            
+            # Sessões de upload em partes (retomáveis)
+            """
+            CREATE TABLE IF NOT EXISTS upload_sessoes (
+                id VARCHAR(64) PRIMARY KEY,
+                usuario_id INT NOT NULL,
+                transportadora_id INT NOT NULL,
+                tipo_documento_id INT NOT NULL,
+                nome_arquivo_original VARCHAR(255) NOT NULL,
+                mime_type VARCHAR(100),
+                tamanho_total BIGINT NOT NULL,
+                tamanho_chunk INT NOT NULL,
+                total_chunks INT NOT NULL,
+                metadata JSON,
+                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+                FOREIGN KEY (transportadora_id) REFERENCES transportadoras(id) ON DELETE CASCADE,
+                FOREIGN KEY (tipo_documento_id) REFERENCES tipos_documento(id) ON DELETE RESTRICT,
+                INDEX idx_upload_sessoes_atualizacao (data_atualizacao)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """,
+            
+            """
+            CREATE TABLE IF NOT EXISTS upload_sessoes_chunks (
+                sessao_id VARCHAR(64) NOT NULL,
+                indice INT NOT NULL,
+                tamanho INT NOT NULL,
+                sha256 CHAR(64) NOT NULL,
+                PRIMARY KEY (sessao_id, indice),
+                FOREIGN KEY (sessao_id) REFERENCES upload_sessoes(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """,
+            
+            # Marcas d'água de tarefas em lote (ex.: última data varrida pelo scanner de vencimentos)
+            """
+            CREATE TABLE IF NOT EXISTS marcas_processamento (
+                chave VARCHAR(50) PRIMARY KEY,
+                valor VARCHAR(100) NULL,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             """
         ]
         
@@ -413,18 +873,418 @@ class DatabaseManager:
             except Exception as e:
                 self.logger.error(f"Erro ao criar tabela: {e}")
                 raise
+        
+        self._migrar_mysql()
+    
+    def _migrar_mysql(self):
+        """Aplica a bancos MySQL existentes as colunas e índices criados depois deles
+        
+        CREATE TABLE IF NOT EXISTS não altera tabelas já criadas e o MySQL não tem
+        ADD COLUMN/INDEX IF NOT EXISTS: cada passo consulta o information_schema.
+        """
+        for tabela, tipo, nome, ddl in _MIGRACOES_MYSQL:
+            if tipo == 'coluna':
+                consulta = ("SELECT 1 FROM information_schema.COLUMNS "
+                            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s")
+            else:
+                consulta = ("SELECT 1 FROM information_schema.STATISTICS "
+                            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1")
+            if self.execute_query(consulta, (tabela, nome), fetch=True):
+                continue
+            self.execute_query(f"ALTER TABLE {tabela} {ddl}")
+            self.logger.info(f"Migração aplicada: {tabela}.{nome}")
     
     def _create_postgresql_tables(self):
         """Cria estrutura completa PostgreSQL"""
         # Implementação similar ao MySQL, adaptada para PostgreSQL
         # (código similar, mas com sintaxe PostgreSQL)
-        pass
+        self._migrar_postgresql()
+    
+    def _migrar_postgresql(self):
+        """Aplica as colunas e índices posteriores às tabelas PostgreSQL existentes"""
+        with self.transaction() as tx:
+            existentes = {}
+            for tabela, comando in _MIGRACOES_POSTGRESQL:
+                if tabela not in existentes:
+                    existentes[tabela] = tx.execute(
+                        "SELECT to_regclass(%s) AS tabela", (tabela,), fetch=True)[0]['tabela'] is not None
+                if existentes[tabela]:
+                    tx.execute(comando)
     
     def _create_sqlite_tables(self):
         """Cria estrutura completa SQLite"""
-        # Implementação similar ao MySQL, adaptada para SQLite
-        # (código similar, mas com sintaxe SQLite)
-        pass
+        # Índices sobre colunas UNIQUE (cnpj, email, chave, codigo, numero_protocolo)
+        # já são cobertos pelo índice automático da constraint e não são duplicados.
+        queries = [
+            # Configurações do sistema
+            """
+            CREATE TABLE IF NOT EXISTS configuracoes (
+                id INTEGER PRIMARY KEY,
+                chave VARCHAR(100) UNIQUE NOT NULL,
+                valor TEXT NOT NULL,
+                descricao TEXT,
+                tipo_valor TEXT DEFAULT 'string' CHECK (tipo_valor IN ('string', 'integer', 'boolean', 'json')),
+                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            
+            # Tipos de documento
+            """
+            CREATE TABLE IF NOT EXISTS tipos_documento (
+                id INTEGER PRIMARY KEY,
+                codigo VARCHAR(50) UNIQUE NOT NULL,
+                nome VARCHAR(100) NOT NULL,
+                descricao TEXT,
+                categoria TEXT NOT NULL CHECK (categoria IN ('EMPRESA', 'SEGUROS', 'AMBIENTAL', 'FISCAL')),
+                subcategoria VARCHAR(50),
+                obrigatorio BOOLEAN DEFAULT 0,
+                tem_vencimento BOOLEAN DEFAULT 0,
+                tem_garantia BOOLEAN DEFAULT 0,
+                formatos_aceitos TEXT DEFAULT '["PDF", "DOC", "DOCX", "JPG", "JPEG", "PNG"]',
+                tamanho_maximo_mb INTEGER DEFAULT 10,
+                aprovacao_automatica BOOLEAN DEFAULT 0,
+                dias_aviso_vencimento INTEGER DEFAULT 30,
+                ordem_exibicao INTEGER DEFAULT 0,
+                ativo BOOLEAN DEFAULT 1,
+                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_tipos_documento_categoria ON tipos_documento (categoria)",
+            "CREATE INDEX IF NOT EXISTS idx_tipos_documento_ativo ON tipos_documento (ativo)",
+            
+            # Transportadoras
+            """
+            CREATE TABLE IF NOT EXISTS transportadoras (
+                id INTEGER PRIMARY KEY,
+                cnpj VARCHAR(18) UNIQUE NOT NULL,
+                cnpj_digitos VARCHAR(14) GENERATED ALWAYS AS (
+                    replace(replace(replace(replace(cnpj, '.', ''), '/', ''), '-', ''), ' ', '')
+                ) STORED,
+                razao_social VARCHAR(200) NOT NULL,
+                nome_fantasia VARCHAR(200),
+                inscricao_estadual VARCHAR(20),
+                inscricao_municipal VARCHAR(20),
+                antt VARCHAR(20),
+                endereco_logradouro VARCHAR(200),
+                endereco_numero VARCHAR(10),
+                endereco_complemento VARCHAR(100),
+                endereco_bairro VARCHAR(100),
+                endereco_cidade VARCHAR(100),
+                endereco_estado VARCHAR(2),
+                endereco_cep VARCHAR(9),
+                endereco_pais VARCHAR(50) DEFAULT 'Brasil',
+                telefone_principal VARCHAR(20),
+                telefone_secundario VARCHAR(20),
+                email_corporativo VARCHAR(100),
+                email_financeiro VARCHAR(100),
+                site VARCHAR(100),
+                responsavel_nome VARCHAR(100),
+                responsavel_cpf VARCHAR(14),
+                responsavel_cargo VARCHAR(50),
+                responsavel_email VARCHAR(100),
+                responsavel_telefone VARCHAR(20),
+                banco VARCHAR(100),
+                agencia VARCHAR(10),
+                conta VARCHAR(20),
+                pix VARCHAR(100),
+                status_cadastro TEXT DEFAULT 'PENDENTE' CHECK (status_cadastro IN ('PENDENTE', 'APROVADO', 'SUSPENSO', 'INATIVO')),
+                classificacao_risco TEXT DEFAULT 'BAIXO' CHECK (classificacao_risco IN ('BAIXO', 'MEDIO', 'ALTO')),
+                limite_credito DECIMAL(15,2) DEFAULT 0.00,
+                observacoes TEXT,
+                data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_aprovacao TIMESTAMP NULL,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                ativo BOOLEAN DEFAULT 1
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_transportadoras_razao_social ON transportadoras (razao_social)",
+            "CREATE INDEX IF NOT EXISTS idx_transportadoras_status ON transportadoras (status_cadastro)",
+            "CREATE INDEX IF NOT EXISTS idx_transportadoras_ativo ON transportadoras (ativo)",
+            "CREATE INDEX IF NOT EXISTS idx_transportadoras_data_cadastro ON transportadoras (data_cadastro)",
+            # CNPJ/CPF só com dígitos (busca por prefixo com ou sem máscara)
+            "CREATE INDEX IF NOT EXISTS idx_transportadoras_cnpj_digitos ON transportadoras (cnpj_digitos)",
+            # Busca textual: FTS5 sobre as colunas de transportadoras (conteúdo externo)
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS transportadoras_busca USING fts5(
+                razao_social, nome_fantasia, endereco_cidade,
+                content='transportadoras', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_transportadoras_busca_insert AFTER INSERT ON transportadoras
+            BEGIN
+                INSERT INTO transportadoras_busca (rowid, razao_social, nome_fantasia, endereco_cidade)
+                VALUES (NEW.id, NEW.razao_social, NEW.nome_fantasia, NEW.endereco_cidade);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_transportadoras_busca_delete AFTER DELETE ON transportadoras
+            BEGIN
+                INSERT INTO transportadoras_busca (transportadoras_busca, rowid, razao_social, nome_fantasia, endereco_cidade)
+                VALUES ('delete', OLD.id, OLD.razao_social, OLD.nome_fantasia, OLD.endereco_cidade);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_transportadoras_busca_update
+            AFTER UPDATE OF razao_social, nome_fantasia, endereco_cidade ON transportadoras
+            BEGIN
+                INSERT INTO transportadoras_busca (transportadoras_busca, rowid, razao_social, nome_fantasia, endereco_cidade)
+                VALUES ('delete', OLD.id, OLD.razao_social, OLD.nome_fantasia, OLD.endereco_cidade);
+                INSERT INTO transportadoras_busca (rowid, razao_social, nome_fantasia, endereco_cidade)
+                VALUES (NEW.id, NEW.razao_social, NEW.nome_fantasia, NEW.endereco_cidade);
+            END
+            """,
+            
+            # Usuários
+            """
+            CREATE TABLE IF NOT EXISTS usuarios (
+                id INTEGER PRIMARY KEY,
+                transportadora_id INTEGER NULL REFERENCES transportadoras(id) ON DELETE SET NULL,
+                nome VARCHAR(100) NOT NULL,
+                email VARCHAR(100) UNIQUE NOT NULL,
+                senha VARCHAR(255) NOT NULL,
+                salt VARCHAR(50),
+                telefone VARCHAR(20),
+                tipo TEXT NOT NULL CHECK (tipo IN ('admin', 'analista', 'transportadora', 'financeiro')),
+                permissoes TEXT DEFAULT '[]',
+                status_ativo BOOLEAN DEFAULT 1,
+                ultimo_acesso TIMESTAMP NULL,
+                ip_ultimo_acesso VARCHAR(45),
+                tentativas_login INTEGER DEFAULT 0,
+                bloqueado_ate TIMESTAMP NULL,
+                token_reset_senha VARCHAR(100),
+                token_reset_expira TIMESTAMP NULL,
+                preferencias TEXT DEFAULT '{"notificacoes_email": true, "notificacoes_sms": false}',
+                timezone VARCHAR(50) DEFAULT 'America/Sao_Paulo',
+                idioma VARCHAR(5) DEFAULT 'pt-BR',
+                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_usuarios_tipo ON usuarios (tipo)",
+            "CREATE INDEX IF NOT EXISTS idx_usuarios_transportadora ON usuarios (transportadora_id)",
+            "CREATE INDEX IF NOT EXISTS idx_usuarios_ativo ON usuarios (status_ativo)",
+            "CREATE INDEX IF NOT EXISTS idx_usuarios_ultimo_acesso ON usuarios (ultimo_acesso)",
+            
+            # Documentos
+            """
+            CREATE TABLE IF NOT EXISTS documentos (
+                id INTEGER PRIMARY KEY,
+                numero_protocolo VARCHAR(20) UNIQUE NOT NULL,
+                transportadora_id INTEGER NOT NULL REFERENCES transportadoras(id) ON DELETE CASCADE,
+                tipo_documento_id INTEGER NOT NULL REFERENCES tipos_documento(id) ON DELETE RESTRICT,
+                usuario_upload_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE RESTRICT,
+                nome_arquivo_original VARCHAR(255) NOT NULL,
+                nome_arquivo_sistema VARCHAR(255) NOT NULL,
+                caminho_arquivo TEXT NOT NULL,
+                tamanho_arquivo BIGINT NOT NULL,
+                hash_arquivo VARCHAR(64) NOT NULL,
+                mime_type VARCHAR(100),
+                data_upload TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_vencimento DATE NULL,
+                valor_garantia DECIMAL(15,2) NULL,
+                numero_apolice VARCHAR(50),
+                seguradora VARCHAR(100),
+                status TEXT DEFAULT 'pendente' CHECK (status IN ('pendente', 'aprovado', 'rejeitado', 'vencido', 'renovacao')),
+                data_aprovacao TIMESTAMP NULL,
+                usuario_aprovacao_id INTEGER NULL REFERENCES usuarios(id) ON DELETE SET NULL,
+                observacoes_analista TEXT,
+                motivo_rejeicao TEXT,
+                versao_documento INTEGER DEFAULT 1,
+                documento_anterior_id INTEGER NULL REFERENCES documentos(id) ON DELETE SET NULL,
+                ip_upload VARCHAR(45),
+                user_agent TEXT,
+                metadata TEXT,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_documentos_transportadora ON documentos (transportadora_id)",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_tipo ON documentos (tipo_documento_id)",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_status ON documentos (status)",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_data_upload ON documentos (data_upload)",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_data_vencimento ON documentos (data_vencimento)",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_documentos_hash_unico
+               ON documentos (hash_arquivo, transportadora_id, tipo_documento_id)""",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_usuario_upload ON documentos (usuario_upload_id)",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_usuario_aprovacao ON documentos (usuario_aprovacao_id)",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_anterior ON documentos (documento_anterior_id)",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_transportadora_status ON documentos (transportadora_id, status)",
+            "CREATE INDEX IF NOT EXISTS idx_documentos_vencimento_status ON documentos (data_vencimento, status)",
+            
+            # Histórico de documentos
+            """
+            CREATE TABLE IF NOT EXISTS historico_documentos (
+                id INTEGER PRIMARY KEY,
+                documento_id INTEGER NOT NULL REFERENCES documentos(id) ON DELETE CASCADE,
+                usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE RESTRICT,
+                acao TEXT NOT NULL CHECK (acao IN ('upload', 'aprovacao', 'rejeicao', 'vencimento', 'renovacao', 'exclusao')),
+                status_anterior VARCHAR(20),
+                status_novo VARCHAR(20),
+                observacoes TEXT,
+                dados_alteracao TEXT,
+                ip_origem VARCHAR(45),
+                user_agent TEXT,
+                data_acao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_historico_usuario ON historico_documentos (usuario_id)",
+            "CREATE INDEX IF NOT EXISTS idx_historico_data_acao ON historico_documentos (data_acao)",
+            "CREATE INDEX IF NOT EXISTS idx_historico_acao ON historico_documentos (acao)",
+            # (documento_id, data_acao) também atende buscas só por documento_id
+            "CREATE INDEX IF NOT EXISTS idx_historico_documento_data ON historico_documentos (documento_id, data_acao)",
+            
+            # Notificações
+            """
+            CREATE TABLE IF NOT EXISTS notificacoes (
+                id INTEGER PRIMARY KEY,
+                usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+                transportadora_id INTEGER NULL REFERENCES transportadoras(id) ON DELETE SET NULL,
+                documento_id INTEGER NULL REFERENCES documentos(id) ON DELETE SET NULL,
+                tipo TEXT NOT NULL CHECK (tipo IN ('vencimento', 'aprovacao', 'rejeicao', 'cadastro', 'sistema', 'compliance')),
+                titulo VARCHAR(200) NOT NULL,
+                mensagem TEXT NOT NULL,
+                canal TEXT DEFAULT 'email' CHECK (canal IN ('email', 'sms', 'push', 'sistema')),
+                status_envio TEXT DEFAULT 'pendente' CHECK (status_envio IN ('pendente', 'enviado', 'erro', 'lido')),
+                data_envio TIMESTAMP NULL,
+                data_leitura TIMESTAMP NULL,
+                tentativas_envio INTEGER DEFAULT 0,
+                erro_envio TEXT,
+                dados_extras TEXT,
+                prioridade TEXT DEFAULT 'normal' CHECK (prioridade IN ('baixa', 'normal', 'alta', 'critica')),
+                proxima_tentativa TIMESTAMP NULL,
+                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_notificacoes_transportadora ON notificacoes (transportadora_id)",
+            "CREATE INDEX IF NOT EXISTS idx_notificacoes_documento ON notificacoes (documento_id)",
+            "CREATE INDEX IF NOT EXISTS idx_notificacoes_status_envio ON notificacoes (status_envio)",
+            "CREATE INDEX IF NOT EXISTS idx_notificacoes_tipo ON notificacoes (tipo)",
+            "CREATE INDEX IF NOT EXISTS idx_notificacoes_data_criacao ON notificacoes (data_criacao)",
+            "CREATE INDEX IF NOT EXISTS idx_notificacoes_usuario_status ON notificacoes (usuario_id, status_envio)",
+            "CREATE INDEX IF NOT EXISTS idx_notificacoes_fila ON notificacoes (status_envio, canal, proxima_tentativa)",
+            
+            # Auditoria de sistema
+            """
+            CREATE TABLE IF NOT EXISTS auditoria_sistema (
+                id INTEGER PRIMARY KEY,
+                usuario_id INTEGER NULL REFERENCES usuarios(id) ON DELETE SET NULL,
+                acao VARCHAR(100) NOT NULL,
+                tabela_afetada VARCHAR(50),
+                registro_id INTEGER,
+                dados_anteriores TEXT,
+                dados_novos TEXT,
+                ip_origem VARCHAR(45),
+                user_agent TEXT,
+                data_acao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_auditoria_usuario ON auditoria_sistema (usuario_id)",
+            "CREATE INDEX IF NOT EXISTS idx_auditoria_acao ON auditoria_sistema (acao)",
+            "CREATE INDEX IF NOT EXISTS idx_auditoria_data ON auditoria_sistema (data_acao)",
+            # (tabela_afetada, registro_id) também atende buscas só por tabela_afetada
+            "CREATE INDEX IF NOT EXISTS idx_auditoria_registro ON auditoria_sistema (tabela_afetada, registro_id)",
+            
+            # Sessões de usuário
+            """
+            CREATE TABLE IF NOT EXISTS sessoes_usuario (
+                id VARCHAR(128) PRIMARY KEY,
+                usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+                ip_address VARCHAR(45),
+                user_agent TEXT,
+                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_expiracao TIMESTAMP NOT NULL,
+                ativo BOOLEAN DEFAULT 1
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_sessoes_usuario ON sessoes_usuario (usuario_id)",
+            "CREATE INDEX IF NOT EXISTS idx_sessoes_expiracao ON sessoes_usuario (data_expiracao)",
+            "CREATE INDEX IF NOT EXISTS idx_sessoes_ativo ON sessoes_usuario (ativo)",
+            
+            # Resumo do dashboard (contagem de documentos por transportadora e status)
+            """
+            CREATE TABLE IF NOT EXISTS dashboard_resumo (
+                transportadora_id INTEGER NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (transportadora_id, status)
+            ) WITHOUT ROWID
+            """,
+            
+            # Sessões de upload em partes (retomáveis)
+            """
+            CREATE TABLE IF NOT EXISTS upload_sessoes (
+                id VARCHAR(64) PRIMARY KEY,
+                usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+                transportadora_id INTEGER NOT NULL REFERENCES transportadoras(id) ON DELETE CASCADE,
+                tipo_documento_id INTEGER NOT NULL REFERENCES tipos_documento(id) ON DELETE RESTRICT,
+                nome_arquivo_original VARCHAR(255) NOT NULL,
+                mime_type VARCHAR(100),
+                tamanho_total BIGINT NOT NULL,
+                tamanho_chunk INTEGER NOT NULL,
+                total_chunks INTEGER NOT NULL,
+                metadata TEXT,
+                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_upload_sessoes_atualizacao ON upload_sessoes (data_atualizacao)",
+            """
+            CREATE TABLE IF NOT EXISTS upload_sessoes_chunks (
+                sessao_id VARCHAR(64) NOT NULL REFERENCES upload_sessoes(id) ON DELETE CASCADE,
+                indice INTEGER NOT NULL,
+                tamanho INTEGER NOT NULL,
+                sha256 CHAR(64) NOT NULL,
+                PRIMARY KEY (sessao_id, indice)
+            ) WITHOUT ROWID
+            """,
+            
+            # Marcas d'água de tarefas em lote (ex.: última data varrida pelo scanner de vencimentos)
+            """
+            CREATE TABLE IF NOT EXISTS marcas_processamento (
+                chave VARCHAR(50) PRIMARY KEY,
+                valor VARCHAR(100) NULL,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+            """,
+        ]
+        
+        # Equivalente ao ON UPDATE CURRENT_TIMESTAMP do MySQL
+        for tabela in ('configuracoes', 'transportadoras', 'usuarios', 'documentos'):
+            queries.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tabela}_data_atualizacao
+            AFTER UPDATE ON {tabela}
+            FOR EACH ROW WHEN NEW.data_atualizacao = OLD.data_atualizacao
+            BEGIN
+                UPDATE {tabela} SET data_atualizacao = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END
+            """)
+        
+        # Toda a estrutura em uma única transação
+        with self.transaction() as tx:
+            self._migrar_sqlite(tx)
+            fts_existente = tx.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'transportadoras_busca'", fetch=True)
+            for query in queries:
+                tx.execute(query)
+            if not fts_existente:
+                # Índice FTS criado sobre uma tabela já populada: indexa as linhas existentes
+                tx.execute("INSERT INTO transportadoras_busca (transportadoras_busca) VALUES ('rebuild')")
+        self.logger.info("Estrutura SQLite criada com sucesso")
+    
+    def _migrar_sqlite(self, tx):
+        """Acrescenta a tabelas SQLite existentes as colunas criadas depois delas
+        
+        Roda antes dos CREATE INDEX que dependem dessas colunas. O SQLite só aceita
+        colunas geradas VIRTUAL em ALTER TABLE; o valor e o índice são os mesmos.
+        """
+        for tabela, coluna, ddl in _MIGRACOES_SQLITE:
+            colunas = {row['name'] for row in tx.execute(f"PRAGMA table_xinfo({tabela})", fetch=True)}
+            if colunas and coluna not in colunas:
+                tx.execute(f"ALTER TABLE {tabela} ADD COLUMN {ddl}")
+                self.logger.info(f"Migração aplicada: {tabela}.{coluna}")
     
     def insert_sample_data(self):
         """Insere dados iniciais robustos"""
@@ -441,16 +1301,6 @@ class DatabaseManager:
                 ('aprovacao_automatica', 'false', 'Ativar aprovação automática de documentos', 'boolean')
             ]
             
-            for chave, valor, descricao, tipo_valor in configuracoes_iniciais:
-                try:
-                    self.execute_query(
-                        "INSERT IGNORE INTO configuracoes (chave, valor, descricao, tipo_valor) VALUES (%s, %s, %s, %s)" if self.db_type == 'mysql'
-                        else "INSERT INTO configuracoes (chave, valor, descricao, tipo_valor) VALUES (?, ?, ?, ?) ON CONFLICT(chave) DO NOTHING",
-                        (chave, valor, descricao, tipo_valor)
-                    )
-                except:
-                    pass
-            
             # Tipos de documentos robustos
             tipos_documentos = [
                 ('DOC_SOCIETARIO', 'Contrato Social', 'Documento de constituição da empresa', 'EMPRESA', None, True, False, False),
@@ -465,44 +1315,30 @@ class DatabaseManager:
                 ('MANIFESTO_CARGA', 'Manifesto de Carga', 'Documento de controle de carga', 'FISCAL', None, True, False, False)
             ]
             
-            for codigo, nome, descricao, categoria, subcategoria, obrigatorio, tem_vencimento, tem_garantia in tipos_documentos:
-                try:
-                    self.execute_query(
-                        """INSERT IGNORE INTO tipos_documento 
-                           (codigo, nome, descricao, categoria, subcategoria, obrigatorio, tem_vencimento, tem_garantia, ativo) 
-                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""" if self.db_type == 'mysql'
-                        else """INSERT INTO tipos_documento 
-                                (codigo, nome, descricao, categoria, subcategoria, obrigatorio, tem_vencimento, tem_garantia, ativo) 
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(codigo) DO NOTHING""",
-                        (codigo, nome, descricao, categoria, subcategoria, obrigatorio, tem_vencimento, tem_garantia, True)
-                    )
-                except:
-                    pass
+            # Usuário administrador (senha de demonstração documentada)
+            from auth_service import hash_senha
+            senha_hash = hash_senha('senha123', int(os.getenv('AUTH_BCRYPT_ROUNDS', 12)))
             
-            # Usuário administrador
-            try:
-                from main import SecurityUtils
-                senha_hash = SecurityUtils.hash_password('admin123')
+            # Todas as linhas em uma única conexão e um único commit
+            with self.transaction() as tx:
+                tx.run_many(
+                    """INSERT INTO configuracoes (chave, valor, descricao, tipo_valor) 
+                       VALUES (?, ?, ?, ?) ON CONFLICT (chave) DO NOTHING""",
+                    configuracoes_iniciais
+                )
                 
-                self.execute_query(
-                    """INSERT IGNORE INTO usuarios 
-                       (nome, email, senha, tipo, status_ativo) 
-                       VALUES (%s, %s, %s, %s, %s)""" if self.db_type == 'mysql'
-                    else """INSERT INTO usuarios 
-                            (nome, email, senha, tipo, status_ativo) 
-                            VALUES (?, ?, ?, ?, ?) ON CONFLICT(email) DO NOTHING""",
-                    ('Administrador Sistema', 'admin@nimoenergia.com.br', senha_hash, 'admin', True)
+                tx.run_many(
+                    """INSERT INTO tipos_documento 
+                       (codigo, nome, descricao, categoria, subcategoria, obrigatorio, tem_vencimento, tem_garantia, ativo) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (codigo) DO NOTHING""",
+                    [tipo + (True,) for tipo in tipos_documentos]
                 )
-            except:
-                # Fallback se SecurityUtils não estiver disponível
-                self.execute_query(
-                    """INSERT IGNORE INTO usuarios 
+                
+                tx.run(
+                    """INSERT INTO usuarios 
                        (nome, email, senha, tipo, status_ativo) 
-                       VALUES (%s, %s, %s, %s, %s)""" if self.db_type == 'mysql'
-                    else """INSERT INTO usuarios 
-                            (nome, email, senha, tipo, status_ativo) 
-                            VALUES (?, ?, ?, ?, ?) ON CONFLICT(email) DO NOTHING""",
-                    ('Administrador Sistema', 'admin@nimoenergia.com.br', 'admin123', 'admin', True)
+                       VALUES (?, ?, ?, ?, ?) ON CONFLICT (email) DO NOTHING""",
+                    ('Administrador Sistema', 'admin@nimoenergia.com.br', senha_hash, 'admin', True)
                 )
             
             self.logger.info("Dados iniciais inseridos com sucesso")
@@ -510,6 +1346,8 @@ class DatabaseManager:
         except Exception as e:
             self.logger.error(f"Erro ao inserir dados iniciais: {e}")
             raise
+        for invalidar in self.ao_alterar_referencia:
+            invalidar()
 
 # Instância global do gerenciador
 db_manager = DatabaseManager()
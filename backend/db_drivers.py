@@ -0,0 +1,40 @@
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Módulo DB-API de cada DATABASE_TYPE; importado só quando o tipo é usado
+_MODULOS = {
+    'mysql': 'mysql.connector',
+    'postgresql': 'psycopg2',
+    'sqlite': 'sqlite3',
+}
+
+_carregados = {}
+_lock = threading.Lock()
+
+
+def carregar_driver(db_type):
+    """Módulo do driver de `db_type`, importado na primeira chamada
+
+    Um worker configurado para SQLite não paga o import de mysql.connector e
+    psycopg2 (dezenas de milissegundos cada) nem a memória deles.
+    """
+    modulo = _carregados.get(db_type)
+    if modulo is not None:
+        return modulo
+    with _lock:
+        modulo = _carregados.get(db_type)
+        if modulo is None:
+            nome = _MODULOS.get(db_type)
+            if nome is None:
+                raise ValueError(f"Tipo de banco não suportado: {db_type}")
+            modulo = _carregados[db_type] = importlib.import_module(nome)
+            logger.debug(f"Driver {nome} carregado para {db_type}")
+    return modulo
+
+
+def drivers_carregados():
+    """Tipos de banco cujo driver já foi importado neste processo"""
+    return set(_carregados)
@@ -0,0 +1,193 @@
+import json
+import base64
+import logging
+from datetime import date, datetime
+from json_provider import codificar
+
+logger = logging.getLogger(__name__)
+
+STATUS_DOCUMENTO = ('pendente', 'aprovado', 'rejeitado', 'vencido', 'renovacao')
+
+_COLUNAS_LISTAGEM = """
+    d.id, d.numero_protocolo, d.transportadora_id, tr.razao_social AS transportadora_nome,
+    d.tipo_documento_id, t.codigo AS tipo_documento_codigo, t.nome AS tipo_documento_nome,
+    d.nome_arquivo_original, d.data_upload, d.data_vencimento, d.status, d.valor_garantia
+"""
+
+
+class FiltroInvalido(ValueError):
+    """Parâmetro de listagem inválido (resposta 400)"""
+
+
+class AcessoNegado(Exception):
+    """Filtro fora do escopo do usuário (resposta 403)"""
+
+
+def codificar_cursor(data_upload, documento_id):
+    """Cursor opaco com a chave (data_upload, id) do último item da página"""
+    if isinstance(data_upload, datetime):
+        data_upload = data_upload.isoformat(sep=' ')
+    raw = json.dumps([str(data_upload), documento_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Decodifica o cursor recebido do cliente"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data_upload, documento_id = json.loads(raw)
+        return str(data_upload), int(documento_id)
+    except Exception:
+        raise FiltroInvalido("Cursor inválido")
+
+
+class DocumentService:
+    """Listagem de documentos com paginação por chave (keyset) em (data_upload, id)
+
+    Cada página é uma busca por índice a partir do último item da página
+    anterior, então páginas profundas custam o mesmo que a primeira.
+    """
+
+    def __init__(self, db_manager, default_limit=50, max_limit=1000):
+        self.db_manager = db_manager
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+
+    def parse_filtros(self, args):
+        """Valida os parâmetros de query da listagem"""
+        filtros = {}
+        if args.get('transportadora_id'):
+            filtros['transportadora_id'] = self._inteiro(args['transportadora_id'], 'transportadora_id')
+        if args.get('status'):
+            if args['status'] not in STATUS_DOCUMENTO:
+                raise FiltroInvalido(f"Status inválido: {args['status']}")
+            filtros['status'] = args['status']
+        if args.get('tipo'):
+            tipo = args['tipo']
+            if tipo.isdigit():
+                filtros['tipo_documento_id'] = int(tipo)
+            else:
+                filtros['tipo_codigo'] = tipo
+        for campo in ('vencimento_de', 'vencimento_ate'):
+            if args.get(campo):
+                try:
+                    filtros[campo] = date.fromisoformat(args[campo]).isoformat()
+                except ValueError:
+                    raise FiltroInvalido(f"Data inválida em {campo}: {args[campo]}")
+
+        limite = self._inteiro(args.get('limit', self.default_limit), 'limit')
+        if not 1 <= limite <= self.max_limit:
+            raise FiltroInvalido(f"limit deve estar entre 1 e {self.max_limit}")
+        cursor = decodificar_cursor(args['cursor']) if args.get('cursor') else None
+        return filtros, cursor, limite
+
+    def restringir(self, usuario, filtros):
+        """Limita os filtros ao que o usuário pode ver
+
+        Usuários de transportadora listam só os documentos da própria
+        transportadora; pedir outra resulta em AcessoNegado. Usuários internos
+        filtram por qualquer transportadora.
+        """
+        if usuario.get('tipo') != 'transportadora':
+            return filtros
+        proprio = usuario.get('transportadora_id')
+        if not proprio:
+            raise AcessoNegado("Usuário sem transportadora vinculada")
+        if filtros.get('transportadora_id', proprio) != proprio:
+            raise AcessoNegado("Sem permissão para listar documentos de outra transportadora")
+        return {**filtros, 'transportadora_id': proprio}
+
+    def _inteiro(self, valor, campo):
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            raise FiltroInvalido(f"Valor inválido em {campo}: {valor}")
+
+    def montar_query(self, filtros, cursor, limite):
+        """SQL canônico e parâmetros da página pedida"""
+        condicoes = []
+        params = []
+        if 'transportadora_id' in filtros:
+            condicoes.append("d.transportadora_id = ?")
+            params.append(filtros['transportadora_id'])
+        if 'status' in filtros:
+            condicoes.append("d.status = ?")
+            params.append(filtros['status'])
+        if 'tipo_documento_id' in filtros:
+            condicoes.append("d.tipo_documento_id = ?")
+            params.append(filtros['tipo_documento_id'])
+        if 'tipo_codigo' in filtros:
+            condicoes.append("d.tipo_documento_id = (SELECT id FROM tipos_documento WHERE codigo = ?)")
+            params.append(filtros['tipo_codigo'])
+        if 'vencimento_de' in filtros:
+            condicoes.append("d.data_vencimento >= ?")
+            params.append(filtros['vencimento_de'])
+        if 'vencimento_ate' in filtros:
+            condicoes.append("d.data_vencimento <= ?")
+            params.append(filtros['vencimento_ate'])
+        if cursor is not None:
+            # Forma expandida de (data_upload, id) < (?, ?), usável por índice em todos os bancos
+            condicoes.append("(d.data_upload < ? OR (d.data_upload = ? AND d.id < ?))")
+            params.extend([cursor[0], cursor[0], cursor[1]])
+
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        sql = f"""
+            SELECT {_COLUNAS_LISTAGEM}
+            FROM documentos d
+            JOIN tipos_documento t ON t.id = d.tipo_documento_id
+            JOIN transportadoras tr ON tr.id = d.transportadora_id
+            {where}
+            ORDER BY d.data_upload DESC, d.id DESC
+            LIMIT ?
+        """
+        params.append(limite)
+        return sql, tuple(params)
+
+    def listar(self, filtros, cursor=None, limite=None):
+        """Gera os documentos da página, lidos do banco em streaming"""
+        limite = limite or self.default_limit
+        sql, params = self.montar_query(filtros, cursor, limite)
+        return self.db_manager.iter_query(
+            self.db_manager.compile(sql), params, batch_size=min(limite, 500)
+        )
+
+    def pagina_json(self, filtros, cursor=None, limite=None):
+        """Gera a página como JSON em pedaços: {"documentos": [...], "proximo_cursor": ...}
+
+        A query é executada antes do primeiro pedaço, de forma que erros de banco
+        surgem na chamada e não no meio da resposta.
+        """
+        limite = limite or self.default_limit
+        rows = self.listar(filtros, cursor, limite)
+        primeiro = next(rows, None)
+        return self._serializar(primeiro, rows, limite)
+
+    def _serializar(self, primeiro, rows, limite, chunk_size=65536):
+        buffer = [b'{"documentos":[']
+        tamanho = 0
+        ultimo = None
+        total = 0
+        try:
+            if primeiro is not None:
+                buffer.append(codificar(primeiro))
+                ultimo = primeiro
+                total = 1
+                for row in rows:
+                    item = b',' + codificar(row)
+                    buffer.append(item)
+                    tamanho += len(item)
+                    ultimo = row
+                    total += 1
+                    # Agrupa itens em pedaços para não gerar uma escrita por linha
+                    if tamanho >= chunk_size:
+                        yield b''.join(buffer)
+                        buffer = []
+                        tamanho = 0
+        finally:
+            rows.close()
+
+        proximo = None
+        if ultimo is not None and total == limite:
+            proximo = codificar_cursor(ultimo['data_upload'], ultimo['id'])
+        buffer.append(b'],"quantidade":%d,"limit":%d,"proximo_cursor":%s}' % (total, limite, codificar(proximo)))
+        yield b''.join(buffer)
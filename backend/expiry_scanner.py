@@ -0,0 +1,166 @@
+import os
+import time
+import logging
+from datetime import date, datetime, timedelta
+from background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+_MARCA = 'vencimento'
+
+# Status que ainda podem vencer e receber aviso
+_STATUS_VIGENTES = ('pendente', 'aprovado', 'renovacao')
+_FILTRO_STATUS = f"status IN ({', '.join('?' * len(_STATUS_VIGENTES))})"
+
+
+def dias_aviso(valor):
+    """Limiares de aviso ('30,15,7,1') em ordem decrescente, sem repetidos"""
+    dias = set()
+    for parte in (valor or '').split(','):
+        parte = parte.strip()
+        if parte.isdigit() and int(parte) > 0:
+            dias.add(int(parte))
+    return sorted(dias, reverse=True)
+
+
+def prioridade_aviso(dias):
+    """Prioridade da notificação conforme a proximidade do vencimento"""
+    if dias <= 1:
+        return 'critica'
+    if dias <= 7:
+        return 'alta'
+    return 'normal'
+
+
+class ExpiryScanner:
+    """Marca documentos vencidos e agenda avisos de vencimento em poucas instruções
+
+    Roda no máximo uma vez por dia, controlado pela data da última execução em
+    marcas_processamento. Vencem todos os documentos ainda vigentes com
+    data_vencimento anterior a hoje, inclusive os cadastrados ou alterados
+    depois de a data ter sido varrida. O aviso de N dias vai para os que vencem
+    em (hoje + M, hoje + N], sendo M o próximo limiar menor: cada documento
+    recebe o aviso da faixa em que está. Tudo roda em uma transação com
+    INSERT ... SELECT e UPDATE sobre idx_documentos_vencimento_status, sem laço
+    por documento; a linha da marca d'água é travada para que execuções
+    concorrentes (vários processos) não repitam o dia. O filtro de status e a
+    deduplicação dos avisos por (documento, usuário, título) tornam a
+    reexecução segura.
+    """
+
+    def __init__(self, db_manager, dashboard_service, interval=3600.0, dispatcher=None):
+        self.db_manager = db_manager
+        self.dashboard_service = dashboard_service
+        self.dispatcher = dispatcher
+        self._task = PeriodicTask('expiry-scanner', interval, self.executar)
+
+    def ensure_started(self):
+        """Inicia a varredura periódica uma vez por processo"""
+        self._task.ensure_started()
+
+    def stop(self):
+        """Interrompe a varredura periódica"""
+        self._task.stop()
+
+    def _limiares(self, tx):
+        rows = tx.run("SELECT valor FROM configuracoes WHERE chave = ?", ('dias_aviso_vencimento',), fetch=True)
+        valor = rows[0]['valor'] if rows else os.getenv('NOTIFICATION_DAYS_BEFORE_EXPIRY', '30,15,7,1')
+        return dias_aviso(valor)
+
+    def _travar_marca(self, tx):
+        """Lê (e trava até o commit) a última data varrida"""
+        if self.db_manager.db_type == 'sqlite':
+            tx.execute('BEGIN IMMEDIATE')
+            bloqueio = ''
+        else:
+            bloqueio = ' FOR UPDATE'
+        tx.run("INSERT INTO marcas_processamento (chave, valor) VALUES (?, ?) ON CONFLICT (chave) DO NOTHING",
+               (_MARCA, None))
+        valor = tx.run(f"SELECT valor FROM marcas_processamento WHERE chave = ?{bloqueio}",
+                       (_MARCA,), fetch=True)[0]['valor']
+        return date.fromisoformat(valor) if valor else None
+
+    def executar(self, hoje=None):
+        """Vence e avisa os documentos pendentes até `hoje`; retorna o resumo"""
+        hoje = hoje or date.today()
+        start = time.perf_counter()
+        with self.db_manager.transaction() as tx:
+            ultima = self._travar_marca(tx)
+            if ultima is not None and ultima >= hoje:
+                return {'vencidos': 0, 'avisos': [], 'desde': ultima.isoformat(), 'ate': hoje.isoformat()}
+
+            vencidos = self._vencer(tx, hoje)
+            limiares = self._limiares(tx)
+            for dias, menor in zip(limiares, limiares[1:] + [0]):
+                self._avisar(tx, dias, menor, hoje)
+
+            tx.run(
+                """INSERT INTO marcas_processamento (chave, valor, data_atualizacao) VALUES (?, ?, ?)
+                   ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor, data_atualizacao = excluded.data_atualizacao""",
+                (_MARCA, hoje.isoformat(), datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+
+        if self.dispatcher is not None and limiares:
+            self.dispatcher.acordar()
+        logger.info(
+            f"Varredura de vencimentos ({ultima or 'início'} a {hoje}): {vencidos} vencidos, "
+            f"avisos de {limiares} dias, em {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return {
+            'vencidos': vencidos,
+            'avisos': limiares,
+            'desde': ultima.isoformat() if ultima else None,
+            'ate': hoje.isoformat(),
+        }
+
+    def _vencer(self, tx, hoje):
+        janela = (hoje.isoformat(), *_STATUS_VIGENTES)
+        filtro = f"data_vencimento < ? AND {_FILTRO_STATUS}"
+
+        # Deltas do dashboard calculados antes da mudança de status
+        grupos = tx.run(
+            f"""SELECT transportadora_id, status, COUNT(*) AS total FROM documentos
+                WHERE {filtro}
+                GROUP BY transportadora_id, status""",
+            janela,
+            fetch=True
+        )
+        if not grupos:
+            return 0
+
+        tx.run(
+            f"""INSERT INTO historico_documentos (documento_id, usuario_id, acao, status_anterior, status_novo, observacoes)
+                SELECT id, usuario_upload_id, 'vencimento', status, 'vencido', ?
+                FROM documentos
+                WHERE {filtro}""",
+            ('Vencimento automático', *janela)
+        )
+        tx.run(f"UPDATE documentos SET status = 'vencido' WHERE {filtro}", janela)
+
+        deltas = []
+        for grupo in grupos:
+            deltas.append((grupo['transportadora_id'], grupo['status'], -grupo['total']))
+            deltas.append((grupo['transportadora_id'], 'vencido', grupo['total']))
+        self.dashboard_service.aplicar_deltas(tx, deltas)
+        return sum(grupo['total'] for grupo in grupos)
+
+    def _avisar(self, tx, dias, menor, hoje):
+        titulo = f"Documento vence em {dias} dia{'s' if dias > 1 else ''}"
+        tx.run(
+            f"""INSERT INTO notificacoes (usuario_id, transportadora_id, documento_id, tipo, titulo, mensagem,
+                                          canal, prioridade)
+                SELECT u.id, d.transportadora_id, d.id, 'vencimento', ?,
+                       'O documento ' || d.numero_protocolo || ' vence em ' || d.data_vencimento || '.',
+                       'email', ?
+                FROM documentos d
+                JOIN usuarios u ON u.transportadora_id = d.transportadora_id AND u.status_ativo = ?
+                WHERE d.data_vencimento > ? AND d.data_vencimento <= ? AND d.{_FILTRO_STATUS}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM notificacoes n
+                      WHERE n.documento_id = d.id AND n.usuario_id = u.id
+                        AND n.tipo = 'vencimento' AND n.titulo = ?
+                  )""",
+            (titulo, prioridade_aviso(dias), True,
+             (hoje + timedelta(days=menor)).isoformat(), (hoje + timedelta(days=dias)).isoformat(),
+             *_STATUS_VIGENTES, titulo)
+        )
@@ -0,0 +1,17 @@
+"""Configuração do gunicorn: gunicorn -c gunicorn.conf.py
+
+O master importa o app uma vez (create_app) e os workers herdam o código já
+carregado por fork; cada worker inicia as próprias threads e conexões em
+post_fork.
+"""
+import os
+
+wsgi_app = 'main:create_app()'
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WORKERS', 4))
+preload_app = True
+
+
+def post_fork(server, worker):
+    import main
+    main.iniciar_worker()
@@ -0,0 +1,93 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Início do processo atual; reiniciado nos workers criados por fork()
+_process_started_at = time.monotonic()
+
+
+def _reset_process_start():
+    global _process_started_at
+    _process_started_at = time.monotonic()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_process_start)
+
+
+def process_uptime():
+    """Segundos desde o início do processo (ou do fork do worker)"""
+    return time.monotonic() - _process_started_at
+
+
+class HealthMonitor:
+    """Sonda o banco em segundo plano e mantém o último resultado em memória
+
+    O endpoint de health apenas lê o snapshot; nenhuma requisição abre conexão
+    ou espera pelo banco.
+    """
+
+    def __init__(self, db_manager, interval=5.0, probe_timeout=5.0):
+        self.db_manager = db_manager
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._task = PeriodicTask('health-monitor', interval, self.refresh)
+        self._snapshot = {
+            'database': 'unknown',
+            'database_latency_ms': None,
+            'database_checked_at': None,
+            'database_error': None,
+        }
+        self._checked_monotonic = None
+
+    def ensure_started(self):
+        """Inicia a thread de sondagem uma vez por processo"""
+        self._task.ensure_started()
+
+    def stop(self):
+        """Interrompe a thread de sondagem"""
+        self._task.stop(timeout=self.probe_timeout + 1)
+
+    def refresh(self):
+        """Executa uma sondagem e atualiza o snapshot"""
+        start = time.perf_counter()
+        error = None
+        try:
+            healthy = self.db_manager.health_check(timeout=self.probe_timeout)
+        except Exception as e:
+            healthy = False
+            error = str(e)
+        latency_ms = round((time.perf_counter() - start) * 1000, 3)
+        if not healthy and error is None:
+            error = 'Falha na conexão com banco de dados'
+
+        snapshot = {
+            'database': 'connected' if healthy else 'disconnected',
+            'database_latency_ms': latency_ms,
+            'database_checked_at': datetime.utcnow().isoformat(),
+            'database_error': error,
+        }
+        with self._lock:
+            self._snapshot = snapshot
+            self._checked_monotonic = time.monotonic()
+        return snapshot
+
+    def snapshot(self):
+        """Último resultado da sondagem, com métricas do pool e uptime"""
+        with self._lock:
+            data = dict(self._snapshot)
+            checked = self._checked_monotonic
+
+        data['database_stale'] = checked is None or time.monotonic() - checked > 3 * self.interval
+        pool = self.db_manager.pool_stats()
+        if pool:
+            pool['saturation'] = round(pool['in_use'] / pool['max_size'], 3)
+        data['pool'] = pool
+        data['uptime'] = round(process_uptime(), 3)
+        return data
@@ -0,0 +1,72 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+_OPCOES_ORJSON = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def padrao_json(valor):
+    """Tipos do banco fora do JSON: datas em ISO 8601 e Decimal (limite_credito, valor_garantia) como número"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def _codificar_stdlib(obj):
+    return json.dumps(obj, ensure_ascii=False, default=padrao_json, separators=(',', ':')).encode('utf-8')
+
+
+def codificar(obj):
+    """Serializa `obj` em JSON compacto (bytes UTF-8)
+
+    Usa orjson quando instalado (datas nativas, sem passar por isoformat em
+    Python); o json da stdlib cobre a ausência dele e o que o orjson recusa,
+    como inteiros acima de 64 bits. A saída é equivalente nos dois casos.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=padrao_json, option=_OPCOES_ORJSON)
+        except TypeError:
+            pass
+    return _codificar_stdlib(obj)
+
+
+def decodificar(dados):
+    """Interpreta JSON em str ou bytes"""
+    if orjson is not None:
+        return orjson.loads(dados)
+    return json.loads(dados)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Provider JSON do app (jsonify, request.get_json) apoiado em `codificar`
+
+    As chaves não são ordenadas e a saída é sempre compacta e em UTF-8; chamadas
+    com argumentos extras (indent, cls...) seguem pelo json da stdlib.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', padrao_json)
+            return json.dumps(obj, **kwargs)
+        return codificar(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return decodificar(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(codificar(obj) + b'\n', mimetype=self.mimetype)
@@ -1,16 +1,35 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
-import mysql.connector
-import psycopg2
-import sqlite3
 import os
+import time
+import atexit
 from dotenv import load_dotenv
 import jwt
 from datetime import datetime, timedelta
-import bcrypt
 import logging
 from functools import wraps
-import time
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
+from database_manager import db_manager
+from db_drivers import carregar_driver
+from metrics import metricas, requisicoes_http
+from json_provider import FastJSONProvider
+from compression import ResponseCompressor
+from rate_limiter import RateLimiter, criar_armazenamento
+from health_monitor import HealthMonitor
+from dashboard_service import DashboardService
+from document_service import DocumentService, FiltroInvalido, AcessoNegado
+from carrier_search import CarrierSearch
+from reference_cache import ReferenceDataCache
+from config_service import ConfigService
+from token_cache import TokenCache, SessaoRevogada
+from audit_sink import AuditSink
+from storage import DocumentStorage, ArquivoMuitoGrande
+from upload_service import UploadService, UploadInvalido, DocumentoDuplicado
+from upload_sessions import UploadSessionService, SessaoNaoEncontrada, ChecksumInvalido, SessaoEmFinalizacao
+from auth_service import (
+    AuthService, SenhaHasher, CredenciaisInvalidas, UsuarioBloqueado, AutenticacaoSobrecarregada
+)
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -19,63 +38,270 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def confiar_proxies(wsgi_app, quantidade):
+    """Aplica X-Forwarded-For/Proto dos `quantidade` proxies reversos à frente da aplicação
+
+    Com isso request.remote_addr é o IP do cliente (rate limit por IP, auditoria)
+    e não o do nginx. Sem proxy (0) os headers são ignorados: confiar neles
+    permitiria a qualquer cliente escolher o próprio IP.
+    """
+    if quantidade <= 0:
+        return wsgi_app
+    return ProxyFix(wsgi_app, x_for=quantidade, x_proto=quantidade)
+
 app = Flask(__name__)
+app.wsgi_app = confiar_proxies(app.wsgi_app, int(os.getenv('TRUSTED_PROXIES', 0)))
+# jsonify e request.get_json com orjson quando instalado
+app.json = FastJSONProvider(app)
 CORS(app, origins="*")
 
 # Configurações
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'nimoenergia-secret-2024')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-2024')
 
+# Métricas Prometheus; com METRICS_DIR os workers somam as séries entre si
+metricas.configurar(
+    os.getenv('METRICS_DIR') or None,
+    intervalo=float(os.getenv('METRICS_SNAPSHOT_INTERVAL', 5))
+)
+metricas.gauge(
+    'portal_db_pool_connections', 'Conexões do pool por estado', ('state',),
+    lambda: [((estado,), (db_manager.pool_stats() or {}).get(estado, 0)) for estado in ('in_use', 'idle', 'waiting')]
+)
+
+# Compressão gzip/brotli negociada pelo Accept-Encoding
+compressor = ResponseCompressor(
+    tamanho_minimo=int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),
+    nivel_gzip=int(os.getenv('COMPRESSION_GZIP_LEVEL', 6)),
+    qualidade_brotli=int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+)
+
+# Sondagem do banco em segundo plano para o /api/health
+health_monitor = HealthMonitor(
+    db_manager,
+    interval=float(os.getenv('HEALTH_PROBE_INTERVAL', 5)),
+    probe_timeout=float(os.getenv('HEALTH_PROBE_TIMEOUT', 5))
+)
+
+# Agregados do dashboard (resumo incremental + cache com TTL); a reconciliação
+# periódica roda só no processo worker (notification_dispatcher.py), não por worker web
+dashboard_service = DashboardService(
+    db_manager,
+    cache_ttl=float(os.getenv('DASHBOARD_CACHE_TTL', 30)),
+    reconcile_interval=0
+)
+
+# Listagem de documentos com paginação por cursor
+document_service = DocumentService(
+    db_manager,
+    default_limit=int(os.getenv('DOCUMENTOS_LIMIT_PADRAO', 50)),
+    max_limit=int(os.getenv('DOCUMENTOS_LIMIT_MAXIMO', 1000))
+)
+
+# Busca de transportadoras (FTS5 / FULLTEXT / pg_trgm e CNPJ só com dígitos)
+carrier_search = CarrierSearch(
+    db_manager,
+    default_limit=int(os.getenv('BUSCA_TRANSPORTADORAS_LIMIT_PADRAO', 20)),
+    max_limit=int(os.getenv('BUSCA_TRANSPORTADORAS_LIMIT_MAXIMO', 100))
+)
+
+# Tipos de documento pré-serializados e versionados
+reference_cache = ReferenceDataCache(
+    db_manager,
+    ttl=float(os.getenv('REFERENCE_CACHE_TTL', 300))
+)
+db_manager.ao_alterar_referencia.append(reference_cache.invalidar)
+
+# Configurações do sistema convertidas por tipo_valor, sincronizadas entre workers
+config_service = ConfigService(
+    db_manager,
+    intervalo=float(os.getenv('CONFIG_REFRESH_INTERVAL', 5))
+)
+
+# Tokens JWT já verificados (evita HMAC e parsing a cada requisição)
+token_cache = TokenCache(
+    db_manager,
+    max_size=int(os.getenv('TOKEN_CACHE_SIZE', 10000)),
+    revocation_interval=float(os.getenv('TOKEN_REVOCATION_INTERVAL', 30))
+)
+
+# Login contra a tabela usuarios; bcrypt roda em pool de threads limitado
+auth_service = AuthService(
+    db_manager,
+    SenhaHasher(
+        rounds=int(os.getenv('AUTH_BCRYPT_ROUNDS', 12)),
+        max_workers=int(os.getenv('AUTH_HASH_WORKERS', 0)) or None,
+        max_queue=int(os.getenv('AUTH_HASH_QUEUE', 32))
+    ),
+    max_tentativas=int(os.getenv('AUTH_MAX_TENTATIVAS', 5)),
+    bloqueio_minutos=int(os.getenv('AUTH_BLOQUEIO_MINUTOS', 15)),
+    sessao_horas=int(os.getenv('SESSION_TIMEOUT_HOURS', 24))
+)
+
+# Histórico e auditoria enfileirados e gravados em lote (spill local contra perda)
+audit_sink = AuditSink(
+    db_manager,
+    os.getenv('AUDIT_SPILL_DIR', 'audit_spill'),
+    max_lote=int(os.getenv('AUDIT_BATCH_SIZE', 500)),
+    intervalo=float(os.getenv('AUDIT_FLUSH_INTERVAL', 1)),
+    fsync=os.getenv('AUDIT_FSYNC', 'false').lower() == 'true'
+)
+atexit.register(audit_sink.stop, timeout=5)
+
+# Uploads gravados em streaming no armazenamento endereçado por conteúdo
+document_storage = DocumentStorage(
+    os.getenv('UPLOAD_FOLDER', 'uploads'),
+    chunk_size=int(os.getenv('UPLOAD_CHUNK_SIZE_KB', 1024)) * 1024
+)
+upload_service = UploadService(
+    db_manager,
+    document_storage,
+    reference_cache,
+    dashboard_service,
+    limite_padrao_mb=int(os.getenv('MAX_FILE_SIZE_MB', 50)),
+    audit_sink=audit_sink,
+    config_service=config_service
+)
+
+# Upload retomável em pedaços para arquivos grandes e conexões instáveis
+upload_sessions = UploadSessionService(
+    db_manager,
+    upload_service,
+    tamanho_chunk=int(os.getenv('UPLOAD_SESSION_CHUNK_MB', 8)) * 1024 * 1024,
+    expiracao_horas=int(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24)),
+    gc_interval=float(os.getenv('UPLOAD_SESSION_GC_INTERVAL', 3600))
+)
+
+# Rate limiting por rota e identidade (contadores em memória ou SQLite comum aos workers)
+rate_limiter = RateLimiter(
+    criar_armazenamento(os.getenv('RATE_LIMIT_STORAGE', 'memory')),
+    padrao=os.getenv('RATE_LIMIT_DEFAULT', '1000 per hour; 100 per minute'),
+    ativo=os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+)
+rate_limiter.isentar(('health_check', 'exportar_metricas'))
+rate_limiter.politica(('login',), os.getenv('RATE_LIMIT_LOGIN', '10 per minute'), por='ip')
+rate_limiter.politica(('upload_documento', 'criar_sessao_upload'), os.getenv('RATE_LIMIT_UPLOAD', '10 per minute'))
+
 def get_db_connection():
-    """Obter conexão com banco de dados baseado na configuração"""
-    db_type = os.getenv('DATABASE_TYPE', 'sqlite').lower()
+    """Obter conexão do pool do banco configurado (close() devolve ao pool)"""
+    return db_manager.get_connection()
+
+def decode_token(token):
+    """Verifica assinatura e expiração do token JWT"""
+    return jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+
+class NaoAutorizado(Exception):
+    """Header Authorization ausente ou token recusado (resposta 401)"""
+
+def autenticar(authorization):
+    """Valida o header Authorization e retorna as claims do token"""
+    if not authorization:
+        raise NaoAutorizado('Token de acesso requerido')
     
+    token = authorization[7:] if authorization.startswith('Bearer ') else authorization
     try:
-        if db_type == 'mysql':
-            return mysql.connector.connect(
-                host=os.getenv('DATABASE_HOST', 'localhost'),
-                user=os.getenv('DATABASE_USER', 'root'),
-                password=os.getenv('DATABASE_PASSWORD', ''),
-                database=os.getenv('DATABASE_NAME', 'portal_nimoenergia'),
-                port=int(os.getenv('DATABASE_PORT', 3306))
-            )
-        elif db_type == 'postgresql':
-            return psycopg2.connect(
-                host=os.getenv('DATABASE_HOST', 'localhost'),
-                user=os.getenv('DATABASE_USER', 'postgres'),
-                password=os.getenv('DATABASE_PASSWORD', ''),
-                database=os.getenv('DATABASE_NAME', 'portal_nimoenergia'),
-                port=int(os.getenv('DATABASE_PORT', 5432))
-            )
-        else:  # SQLite
-            db_name = os.getenv('DATABASE_NAME', 'portal_nimoenergia.db')
-            if db_name == ':memory:':
-                return sqlite3.connect(':memory:', check_same_thread=False)
-            return sqlite3.connect(db_name, check_same_thread=False)
-    except Exception as e:
-        logger.error(f"Erro ao conectar com banco de dados: {e}")
-        return None
+        token_cache.ensure_started()
+        return token_cache.verificar(token, decode_token)
+    except jwt.ExpiredSignatureError:
+        raise NaoAutorizado('Token expirado')
+    except jwt.InvalidTokenError:
+        raise NaoAutorizado('Token inválido')
+    except SessaoRevogada:
+        raise NaoAutorizado('Sessão encerrada')
 
 def require_auth(f):
     """Decorator para rotas que requerem autenticação"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token de acesso requerido'}), 401
-        
         try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expirado'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
+            claims = autenticar(request.headers.get('Authorization'))
+        except NaoAutorizado as e:
+            return jsonify({'error': str(e)}), 401
         
+        # Claims disponíveis para o handler sem nova decodificação
+        g.usuario = dict(claims)
         return f(*args, **kwargs)
     return decorated_function
 
+@app.before_request
+def iniciar_medicao():
+    """Marca o início da requisição para o histograma de latência"""
+    g.inicio_requisicao = time.perf_counter()
+    metricas.ensure_started()
+
+def verificar_rate_limit(endpoint, authorization, ip):
+    """Conta a requisição nos limites do endpoint; identidade é o usuário do token já verificado, senão o IP"""
+    identidade = None
+    if authorization and rate_limiter.ativo:
+        claims = token_cache.claims(authorization[7:] if authorization.startswith('Bearer ') else authorization)
+        if claims is not None:
+            identidade = f"usuario:{claims.get('id')}"
+    return rate_limiter.verificar(endpoint, identidade or f'ip:{ip}', f'ip:{ip}')
+
+def cabecalhos_rate_limit(resultado):
+    """Headers X-RateLimit-* (e Retry-After quando recusada) do resultado"""
+    cabecalhos = {
+        'X-RateLimit-Limit': str(resultado.limite),
+        'X-RateLimit-Remaining': str(resultado.restantes),
+        'X-RateLimit-Reset': str(resultado.reset),
+    }
+    if not resultado.permitido:
+        cabecalhos['Retry-After'] = str(resultado.retry_after)
+    return cabecalhos
+
+def resposta_limite_excedido(resultado):
+    """Resposta 429 no formato documentado"""
+    return jsonify({
+        'error': f'Muitas requisições. Tente novamente em {resultado.retry_after} segundos.',
+        'code': 'RATE_LIMIT_EXCEEDED',
+        'retry_after': resultado.retry_after
+    }), 429, cabecalhos_rate_limit(resultado)
+
+@app.before_request
+def aplicar_rate_limit():
+    """Recusa com 429 requisições acima dos limites (preflight CORS não conta)"""
+    g.rate_limit = resultado = None
+    if request.method != 'OPTIONS':
+        g.rate_limit = resultado = verificar_rate_limit(
+            request.endpoint, request.headers.get('Authorization'), request.remote_addr
+        )
+    if resultado is not None and not resultado.permitido:
+        return resposta_limite_excedido(resultado)
+    return None
+
+@app.after_request
+def incluir_cabecalhos_rate_limit(response):
+    """Headers X-RateLimit-* nas respostas sujeitas a limite"""
+    resultado = g.get('rate_limit')
+    if resultado is not None and resultado.permitido:
+        response.headers.update(cabecalhos_rate_limit(resultado))
+    return response
+
+@app.after_request
+def registrar_medicao(response):
+    """Registra a duração por método, rota (modelo da URL) e status"""
+    inicio = g.get('inicio_requisicao')
+    if inicio is not None:
+        rota = request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+        requisicoes_http.observar(time.perf_counter() - inicio, request.method, rota, str(response.status_code))
+    return response
+
+@app.after_request
+def comprimir_resposta(response):
+    """Comprime a resposta conforme o Accept-Encoding (executa antes da medição)"""
+    return compressor.aplicar(request, response)
+
+@app.route('/metrics')
+def exportar_metricas():
+    """Métricas no formato de exposição do Prometheus (todos os workers)
+    
+    Com METRICS_TOKEN definido exige o header Authorization: Bearer <token>.
+    """
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Token de métricas inválido'}), 401
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def home():
     """Endpoint principal da API"""
@@ -88,21 +314,17 @@ def home():
 
 @app.route('/api/health')
 def health_check():
-    """Endpoint de health check para monitoramento"""
+    """Endpoint de health check para monitoramento (não acessa o banco)"""
     try:
-        # Testar conexão com banco
-        conn = get_db_connection()
-        db_status = 'connected' if conn else 'disconnected'
-        if conn:
-            conn.close()
+        health_monitor.ensure_started()
+        health = health_monitor.snapshot()
         
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.utcnow().isoformat(),
             'version': '2.0.0',
-            'database': db_status,
             'environment': os.getenv('FLASK_ENV', 'production'),
-            'uptime': time.time()
+            **health
         })
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -116,9 +338,9 @@ def health_check():
 def login():
     """Endpoint de autenticação"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data:
+        if not isinstance(data, dict):
             return jsonify({'error': 'Dados JSON requeridos'}), 400
         
         email = data.get('email')
@@ -127,156 +349,253 @@ def login():
         if not email or not password:
             return jsonify({'error': 'Email e senha são obrigatórios'}), 400
         
-        # Usuários de teste (em produção, consultar banco de dados)
-        test_users = {
-            'admin@nimoenergia.com.br': {
-                'password': 'senha123',
-                'nome': 'Admin NIMO',
-                'tipo': 'admin'
-            },
-            'silva@silvatransportes.com.br': {
-                'password': 'senha123',
-                'nome': 'Silva Transportes',
-                'tipo': 'transportadora'
+        if not isinstance(email, str) or not isinstance(password, str):
+            return jsonify({'error': 'Email e senha devem ser texto'}), 400
+        
+        email = email.strip().lower()
+        try:
+            usuario = auth_service.autenticar(
+                email, password,
+                ip_address=request.remote_addr,
+                user_agent=request.headers.get('User-Agent')
+            )
+        except (CredenciaisInvalidas, UsuarioBloqueado) as e:
+            audit_sink.auditar('login_falha', dados_novos={'email': email, 'motivo': type(e).__name__},
+                               ip_origem=request.remote_addr, user_agent=request.headers.get('User-Agent'))
+            raise
+        audit_sink.auditar('login', usuario_id=usuario['id'], tabela_afetada='usuarios', registro_id=usuario['id'],
+                           ip_origem=request.remote_addr, user_agent=request.headers.get('User-Agent'))
+        
+        # Gerar token JWT (sid permite revogar a sessão)
+        token = jwt.encode({
+            'id': usuario['id'],
+            'email': usuario['email'],
+            'nome': usuario['nome'],
+            'tipo': usuario['tipo'],
+            'transportadora_id': usuario['transportadora_id'],
+            'sid': usuario['sid'],
+            'exp': usuario['exp']
+        }, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+        # Já no cache: o primeiro uso do token não repete a verificação e o rate
+        # limiting passa a contar pelo usuário desde a primeira requisição
+        token_cache.put(token, decode_token(token))
+        
+        return jsonify({
+            'token': token,
+            'user': {
+                'id': usuario['id'],
+                'email': usuario['email'],
+                'nome': usuario['nome'],
+                'tipo': usuario['tipo'],
+                'transportadora_id': usuario['transportadora_id']
             }
-        }
+        })
         
-        if email in test_users and test_users[email]['password'] == password:
-            user_data = test_users[email]
-            
-            # Gerar token JWT
-            token = jwt.encode({
-                'email': email,
-                'nome': user_data['nome'],
-                'tipo': user_data['tipo'],
-                'exp': datetime.utcnow() + timedelta(hours=24)
-            }, app.config['JWT_SECRET_KEY'], algorithm='HS256')
-            
-            return jsonify({
-                'token': token,
-                'user': {
-                    'email': email,
-                    'nome': user_data['nome'],
-                    'tipo': user_data['tipo']
-                }
-            })
-        else:
-            return jsonify({'error': 'Credenciais inválidas'}), 401
-            
+    except CredenciaisInvalidas:
+        return jsonify({'error': 'Credenciais inválidas'}), 401
+    except UsuarioBloqueado as e:
+        return jsonify({
+            'error': 'Usuário bloqueado temporariamente por excesso de tentativas',
+            'bloqueado_ate': e.bloqueado_ate.isoformat()
+        }), 423
+    except AutenticacaoSobrecarregada:
+        response = jsonify({'error': 'Serviço de autenticação sobrecarregado, tente novamente'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         logger.error(f"Erro no login: {e}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @app.route('/api/dashboard', methods=['GET'])
+@require_auth
 def dashboard():
-    """Endpoint de dados do dashboard"""
+    """Endpoint de dados do dashboard (usuários de transportadora veem só a própria)"""
+    if g.usuario.get('tipo') == 'transportadora':
+        if not g.usuario.get('transportadora_id'):
+            return jsonify({'error': 'Usuário sem transportadora vinculada'}), 403
+        transportadora_id = g.usuario['transportadora_id']
+    else:
+        transportadora_id = None
     try:
-        # Em produção, consultar banco de dados real
-        dashboard_data = {
-            'total_documentos': 156,
-            'documentos_pendentes': 12,
-            'documentos_aprovados': 128,
-            'documentos_rejeitados': 16,
-            'transportadoras_ativas': 8,
-            'transportadoras_total': 15,
-            'ultima_atualizacao': datetime.utcnow().isoformat()
-        }
-        
-        return jsonify(dashboard_data)
+        return jsonify(dashboard_service.resumo(transportadora_id))
         
     except Exception as e:
         logger.error(f"Erro no dashboard: {e}")
         return jsonify({'error': 'Erro ao carregar dados do dashboard'}), 500
 
 @app.route('/api/documentos', methods=['GET'])
+@require_auth
 def listar_documentos():
-    """Endpoint para listar documentos"""
+    """Endpoint para listar documentos (paginação por cursor, resposta em streaming)
+    
+    Query: transportadora_id (usuários internos), status, tipo (id ou código),
+    vencimento_de, vencimento_ate, limit e cursor (valor de proximo_cursor da
+    página anterior). Usuários de transportadora veem só os próprios documentos.
+    """
     try:
-        # Em produção, consultar banco de dados
-        documentos = [
-            {
-                'id': 1,
-                'nome': 'Licença de Operação - Silva Transportes',
-                'tipo': 'licenca_operacao',
-                'status': 'aprovado',
-                'data_upload': '2024-01-15T10:30:00Z',
-                'transportadora': 'Silva Transportes'
-            },
-            {
-                'id': 2,
-                'nome': 'Seguro Veicular - Frota 001',
-                'tipo': 'seguro_veicular',
-                'status': 'pendente',
-                'data_upload': '2024-01-16T14:20:00Z',
-                'transportadora': 'Silva Transportes'
-            }
-        ]
-        
-        return jsonify(documentos)
+        filtros, cursor, limite = document_service.parse_filtros(request.args)
+        filtros = document_service.restringir(g.usuario, filtros)
+        pagina = document_service.pagina_json(filtros, cursor, limite)
+        return Response(pagina, mimetype='application/json')
         
+    except FiltroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    except AcessoNegado as e:
+        return jsonify({'error': str(e)}), 403
     except Exception as e:
         logger.error(f"Erro ao listar documentos: {e}")
         return jsonify({'error': 'Erro ao carregar documentos'}), 500
 
+@app.route('/api/transportadoras/busca', methods=['GET'])
+@require_auth
+def buscar_transportadoras():
+    """Endpoint de busca de transportadoras (admin/analista), ordenada por relevância
+    
+    Query: q (nome, nome fantasia, cidade ou CNPJ/CPF com ou sem máscara), uf,
+    status, limit e offset (valor de proximo_offset da página anterior).
+    """
+    if g.usuario.get('tipo') == 'transportadora':
+        return jsonify({'error': 'Sem permissão para buscar transportadoras'}), 403
+    try:
+        termo, filtros, limite, offset = carrier_search.parse_busca(request.args)
+        return jsonify(carrier_search.buscar(termo, filtros, limite, offset))
+        
+    except FiltroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro na busca de transportadoras: {e}")
+        return jsonify({'error': 'Erro ao buscar transportadoras'}), 500
+
 @app.route('/api/tipos-documentos', methods=['GET'])
 def tipos_documentos():
-    """Endpoint para listar tipos de documentos aceitos"""
+    """Endpoint para listar tipos de documentos aceitos (ETag + If-None-Match)"""
     try:
-        tipos = [
-            {
-                'id': 'licenca_operacao',
-                'nome': 'Licença de Operação',
-                'descricao': 'Licença para operação de transporte',
-                'formatos_aceitos': ['PDF', 'JPG', 'PNG']
-            },
-            {
-                'id': 'seguro_veicular',
-                'nome': 'Seguro Veicular',
-                'descricao': 'Apólice de seguro dos veículos',
-                'formatos_aceitos': ['PDF', 'JPG', 'PNG']
-            },
-            {
-                'id': 'cnh_motorista',
-                'nome': 'CNH do Motorista',
-                'descricao': 'Carteira Nacional de Habilitação',
-                'formatos_aceitos': ['PDF', 'JPG', 'PNG']
-            }
-        ]
+        corpo, etag = reference_cache.tipos_documento()
         
-        return jsonify(tipos)
+        response = Response(corpo, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
         
     except Exception as e:
         logger.error(f"Erro ao listar tipos de documentos: {e}")
         return jsonify({'error': 'Erro ao carregar tipos de documentos'}), 500
 
 @app.route('/api/upload', methods=['POST'])
+@require_auth
 def upload_documento():
-    """Endpoint para upload de documentos"""
+    """Endpoint para upload de documentos (multipart lido em streaming)
+    
+    Campos: arquivo, tipo_documento (id ou código; enviar antes do arquivo ou na
+    query string para o limite do tipo valer durante a leitura), transportadora_id
+    (admin/analista), data_vencimento, valor_garantia, numero_apolice, seguradora.
+    """
     try:
-        if 'arquivo' not in request.files:
-            return jsonify({'error': 'Nenhum arquivo enviado'}), 400
-        
-        arquivo = request.files['arquivo']
-        tipo_documento = request.form.get('tipo_documento')
+        # Corpo declarado acima do limite global: recusa sem ler
+        if request.content_length and request.content_length > upload_service.limite_padrao + 64 * 1024:
+            raise ArquivoMuitoGrande(upload_service.limite_padrao)
         
-        if arquivo.filename == '':
-            return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+        recebido = upload_service.receber_multipart(request.stream, request.content_type, request.args)
+        documento = upload_service.registrar_recebido(
+            g.usuario, recebido,
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent')
+        )
         
-        if not tipo_documento:
-            return jsonify({'error': 'Tipo de documento é obrigatório'}), 400
+        return resposta_upload_criado(documento)
         
-        # Em produção, salvar arquivo e registrar no banco
+    except Exception as e:
+        return resposta_erro_upload(e)
+
+def resposta_upload_criado(documento):
+    """Resposta 201 de documento registrado por upload"""
+    return jsonify({'message': 'Documento enviado com sucesso', **documento}), 201
+
+def resposta_erro_upload(e):
+    """Resposta de erro comum às rotas de upload"""
+    if isinstance(e, SessaoNaoEncontrada):
+        return jsonify({'error': str(e)}), 404
+    if isinstance(e, (ArquivoMuitoGrande, RequestEntityTooLarge)):
+        return jsonify({'error': str(e) if isinstance(e, ArquivoMuitoGrande) else 'Campo do formulário muito grande'}), 413
+    if isinstance(e, ChecksumInvalido):
+        return jsonify({'error': str(e)}), 422
+    if isinstance(e, UploadInvalido):
+        return jsonify({'error': str(e)}), 400
+    if isinstance(e, SessaoEmFinalizacao):
+        return jsonify({'error': str(e)}), 409
+    if isinstance(e, DocumentoDuplicado):
         return jsonify({
-            'message': 'Documento enviado com sucesso',
-            'id': 123,
-            'nome_arquivo': arquivo.filename,
-            'tipo_documento': tipo_documento,
-            'status': 'pendente'
-        })
+            'error': 'Documento já enviado',
+            'id': e.documento['id'],
+            'numero_protocolo': e.documento['numero_protocolo'],
+            'status': e.documento['status']
+        }), 409
+    logger.error(f"Erro no upload: {e}")
+    return jsonify({'error': 'Erro ao fazer upload do documento'}), 500
+
+@app.route('/api/upload/sessoes', methods=['POST'])
+@require_auth
+def criar_sessao_upload():
+    """Abre uma sessão de upload em pedaços
+    
+    JSON: tipo_documento, nome_arquivo, tamanho_total e os campos opcionais do
+    upload simples (transportadora_id, data_vencimento, valor_garantia, ...).
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Dados JSON requeridos'}), 400
         
+        upload_sessions.ensure_gc_started()
+        return jsonify(upload_sessions.criar(g.usuario, data)), 201
+        
+    except Exception as e:
+        return resposta_erro_upload(e)
+
+@app.route('/api/upload/sessoes/<sessao_id>', methods=['GET'])
+@require_auth
+def status_sessao_upload(sessao_id):
+    """Pedaços já recebidos (intervalos) para retomar o envio"""
+    try:
+        return jsonify(upload_sessions.status(g.usuario, sessao_id))
+    except Exception as e:
+        return resposta_erro_upload(e)
+
+@app.route('/api/upload/sessoes/<sessao_id>/chunks/<int:indice>', methods=['PUT'])
+@require_auth
+def enviar_chunk(sessao_id, indice):
+    """Recebe um pedaço (corpo binário) com o SHA-256 em X-Chunk-SHA256"""
+    try:
+        resultado = upload_sessions.receber_chunk(
+            g.usuario, sessao_id, indice, request.stream, request.headers.get('X-Chunk-SHA256')
+        )
+        return jsonify(resultado)
     except Exception as e:
-        logger.error(f"Erro no upload: {e}")
-        return jsonify({'error': 'Erro ao fazer upload do documento'}), 500
+        return resposta_erro_upload(e)
+
+@app.route('/api/upload/sessoes/<sessao_id>/finalizar', methods=['POST'])
+@require_auth
+def finalizar_sessao_upload(sessao_id):
+    """Monta o arquivo a partir dos pedaços e registra o documento"""
+    try:
+        documento = upload_sessions.finalizar(
+            g.usuario, sessao_id,
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent')
+        )
+        return resposta_upload_criado(documento)
+    except Exception as e:
+        return resposta_erro_upload(e)
+
+@app.route('/api/upload/sessoes/<sessao_id>', methods=['DELETE'])
+@require_auth
+def cancelar_sessao_upload(sessao_id):
+    """Cancela a sessão e descarta os pedaços recebidos"""
+    try:
+        upload_sessions.cancelar(g.usuario, sessao_id)
+        return '', 204
+    except Exception as e:
+        return resposta_erro_upload(e)
 
 @app.errorhandler(404)
 def not_found(error):
@@ -294,6 +613,35 @@ def internal_error(error):
     logger.error(f"Erro interno: {error}")
     return jsonify({'error': 'Erro interno do servidor'}), 500
 
+def iniciar_worker():
+    """Inicia os recursos do processo atual: tarefas de fundo e a primeira conexão do pool
+
+    Sem isso, cada recurso é iniciado pela primeira requisição que o usa.
+    Chamar em cada worker depois do fork (post_fork no gunicorn), nunca no
+    processo master: threads e conexões não sobrevivem ao fork. Chamadas
+    repetidas não têm efeito.
+    """
+    metricas.ensure_started()
+    health_monitor.ensure_started()
+    config_service.ensure_started()
+    token_cache.ensure_started()
+    upload_sessions.ensure_gc_started()
+    conn = db_manager.get_connection()
+    if conn is not None:
+        conn.close()
+    logger.info(f"Worker {os.getpid()} iniciado")
+
+def create_app():
+    """App configurado, pronto para ser pré-carregado pelo master de um servidor pré-fork
+
+    Importar este módulo já monta rotas e serviços sem abrir conexões nem
+    iniciar threads. Aqui é importado o driver do DATABASE_TYPE configurado,
+    que os workers passam a compartilhar por copy-on-write. Os demais drivers
+    não são importados. Os recursos por processo ficam para iniciar_worker().
+    """
+    carregar_driver(db_manager.db_type)
+    return app
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
@@ -302,5 +650,5 @@ if __name__ == '__main__':
     logger.info(f"Modo debug: {debug}")
     logger.info(f"Banco de dados: {os.getenv('DATABASE_TYPE', 'sqlite')}")
     
-    app.run(host='0.0.0.0', port=port, debug=debug)
+    create_app().run(host='0.0.0.0', port=port, debug=debug)
 
@@ -0,0 +1,433 @@
+import os
+import re
+import glob
+import json
+import time
+import uuid
+import atexit
+import bisect
+import logging
+import threading
+import weakref
+from functools import lru_cache
+from background import PeriodicTask
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: sem flock, só métricas do processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Limites (segundos) dos buckets de latência: de 1 ms a 30 s
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ENCERRADOS = 'metrics-encerrados.json'
+
+# Séries vivas no processo, reiniciadas após fork()
+_series = weakref.WeakSet()
+
+
+def _reset_series_after_fork():
+    """O filho começa com contagens zeradas (as do pai continuam no arquivo do pai)"""
+    for serie in list(_series):
+        serie._reiniciar()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_series_after_fork)
+
+
+@lru_cache(maxsize=4096)
+def impressao_sql(sql):
+    """Forma normalizada de um SQL, usada como rótulo: literais e listas viram `?`
+
+    "SELECT * FROM t WHERE id IN (%s, %s) AND nome = 'x'" -> "SELECT * FROM t WHERE id IN (...) AND nome = ?"
+    """
+    texto = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    texto = re.sub(r'%s|\$\d+|\b\d+(?:\.\d+)?\b', '?', texto)
+    texto = re.sub(r'\s+', ' ', texto).strip()
+    texto = re.sub(r'IN \(\?(?: ?, ?\?)*\)', 'IN (...)', texto, flags=re.IGNORECASE)
+    # VALUES multi-linha (bulk_insert) conta como um único formato
+    texto = re.sub(r'(\(\?(?: ?, ?\?)*\))(?: ?, ?\(\?(?: ?, ?\?)*\))+', r'\1', texto)
+    return texto[:300]
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar(numero):
+    if isinstance(numero, float):
+        if numero == float('inf'):
+            return '+Inf'
+        return repr(numero)
+    return str(numero)
+
+
+class _Serie:
+    """Métrica com rótulos; cada thread acumula no próprio dicionário (sem lock)
+
+    O lock só é usado ao registrar a primeira observação de uma thread e na
+    coleta, que soma os dicionários de todas as threads. Os das threads já
+    encerradas são incorporados a uma base nos dois momentos.
+    """
+
+    tipo = None
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._reiniciar()
+        _series.add(self)
+
+    def _reiniciar(self):
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.dados
+        except AttributeError:
+            dados = {}
+            with self._lock:
+                # Com uma thread por requisição (servidor de desenvolvimento) a lista
+                # cresceria até a próxima coleta: as encerradas saem no registro
+                self._incorporar_encerradas()
+                self._shards.append((threading.current_thread(), dados))
+            self._local.dados = dados
+            return dados
+
+    def _incorporar_encerradas(self):
+        """Passa para a base os valores das threads encerradas (chamado com o lock)"""
+        vivos = []
+        for thread, dados in self._shards:
+            if thread.is_alive():
+                vivos.append((thread, dados))
+            else:
+                # Thread encerrada não escreve mais
+                _acumular(self._base, dados.items())
+        self._shards = vivos
+
+    def coletar(self):
+        """Valores somados de todas as threads: {rotulos: [valores]}"""
+        with self._lock:
+            self._incorporar_encerradas()
+            total = {chave: list(linha) for chave, linha in self._base.items()}
+            for _, dados in self._shards:
+                # list() de um dict é atômico sob o GIL; a linha pode estar uma observação atrasada
+                _acumular(total, list(dados.items()))
+        return total
+
+
+def _acumular(destino, itens):
+    for chave, linha in itens:
+        acumulado = destino.get(chave)
+        if acumulado is None:
+            destino[chave] = list(linha)
+        else:
+            for indice, valor in enumerate(linha):
+                acumulado[indice] += valor
+
+
+class Contador(_Serie):
+    """Valor que só cresce (ex.: bytes recebidos)"""
+
+    tipo = 'counter'
+
+    def somar(self, valor=1, *rotulos):
+        dados = self._shard()
+        linha = dados.get(rotulos)
+        if linha is None:
+            dados[rotulos] = [valor]
+        else:
+            linha[0] += valor
+
+
+class Histograma(_Serie):
+    """Distribuição de valores em buckets cumulativos (formato Prometheus)"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, descricao, rotulos=(), buckets=BUCKETS_LATENCIA):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(nome, descricao, rotulos)
+
+    def observar(self, valor, *rotulos):
+        dados = self._shard()
+        linha = dados.get(rotulos)
+        if linha is None:
+            # Contagem por bucket (não cumulativa) + bucket +Inf, soma e total
+            linha = dados[rotulos] = [0] * (len(self.buckets) + 3)
+        linha[bisect.bisect_left(self.buckets, valor)] += 1
+        linha[-2] += valor
+        linha[-1] += 1
+
+
+class _Gauge:
+    """Valor instantâneo lido por uma função na coleta (somado entre processos vivos)"""
+
+    tipo = 'gauge'
+
+    def __init__(self, nome, descricao, rotulos, funcao):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self.funcao = funcao
+
+    def coletar(self):
+        return {tuple(rotulos): [valor] for rotulos, valor in self.funcao()}
+
+
+class Metricas:
+    """Registro de métricas do processo, exportado no formato texto do Prometheus
+
+    Sem `diretorio` as métricas são apenas do processo atual. Com `diretorio`
+    (compartilhado pelos workers), cada processo grava um retrato das suas
+    séries em metrics-<pid>-<id>.json a cada `intervalo` segundos e mantém um
+    flock em metrics-<pid>-<id>.lock enquanto vive; exportar() soma os
+    retratos dos demais processos com as séries vivas do processo atual.
+    Retratos de processos encerrados (sem flock) são incorporados a
+    metrics-encerrados.json, de modo que contadores e histogramas não
+    regridem quando um worker é reciclado; gauges valem só para processos
+    vivos. Os valores de outros workers podem estar até `intervalo` segundos
+    atrasados.
+    """
+
+    def __init__(self, diretorio=None, intervalo=5.0):
+        self._metricas = {}
+        self.diretorio = None
+        self.intervalo = intervalo
+        self._pid = None
+        self._lock = threading.Lock()
+        self._gravacao = threading.Lock()
+        self._task = None
+        self.configurar(diretorio, intervalo)
+
+    def configurar(self, diretorio=None, intervalo=None):
+        """Define o diretório compartilhado entre processos (None: só o processo atual)"""
+        if intervalo is not None:
+            self.intervalo = intervalo
+        if diretorio and fcntl is None:
+            logger.warning("METRICS_DIR ignorado: a soma entre processos depende de flock (fcntl)")
+            diretorio = None
+        self.diretorio = os.path.abspath(diretorio) if diretorio else None
+        self._pid = None
+        self._task = PeriodicTask('metrics-snapshot', self.intervalo, self.gravar) if self.diretorio else None
+
+    def _registrar(self, metrica):
+        with self._lock:
+            existente = self._metricas.get(metrica.nome)
+            if existente is not None:
+                return existente
+            self._metricas[metrica.nome] = metrica
+            return metrica
+
+    def contador(self, nome, descricao, rotulos=()):
+        """Registra (ou retorna) um contador"""
+        return self._registrar(Contador(nome, descricao, rotulos))
+
+    def histograma(self, nome, descricao, rotulos=(), buckets=BUCKETS_LATENCIA):
+        """Registra (ou retorna) um histograma"""
+        return self._registrar(Histograma(nome, descricao, rotulos, buckets))
+
+    def gauge(self, nome, descricao, rotulos, funcao):
+        """Registra um gauge; `funcao()` retorna pares (rotulos, valor)"""
+        return self._registrar(_Gauge(nome, descricao, rotulos, funcao))
+
+    def ensure_started(self):
+        """Inicia a gravação periódica do retrato uma vez por processo"""
+        if self._task is None:
+            return
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._iniciar_processo()
+        self._task.ensure_started()
+
+    def _iniciar_processo(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        base = os.path.join(self.diretorio, f"metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self._arquivo = base + '.json'
+        self._fd_lock = os.open(base + '.lock', os.O_WRONLY | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # Herdado do pai via fork() pode estar preso por uma thread que não existe aqui
+        self._gravacao = threading.Lock()
+        self._pid = os.getpid()
+        atexit.register(self.gravar)
+
+    def stop(self):
+        """Interrompe a gravação periódica e grava o último retrato"""
+        if self._task is not None:
+            self._task.stop()
+            self.gravar()
+
+    def coletar(self):
+        """Retrato das métricas do processo: {nome: {tipo, descricao, rotulos, buckets, series}}"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        retrato = {}
+        for metrica in metricas:
+            try:
+                series = metrica.coletar()
+            except Exception as e:
+                logger.error(f"Métricas: falha ao coletar {metrica.nome}: {e}")
+                continue
+            retrato[metrica.nome] = {
+                'tipo': metrica.tipo,
+                'descricao': metrica.descricao,
+                'rotulos': list(metrica.rotulos),
+                'buckets': list(getattr(metrica, 'buckets', ())),
+                'series': [[list(chave), valores] for chave, valores in series.items()],
+            }
+        return retrato
+
+    def gravar(self):
+        """Grava o retrato deste processo no diretório compartilhado"""
+        if self.diretorio is None or self._pid != os.getpid():
+            return
+        # Em série: um retrato coletado antes nunca substitui um mais novo
+        with self._gravacao:
+            temporario = f"{self._arquivo}.{threading.get_ident()}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(self.coletar(), f, separators=(',', ':'))
+            os.replace(temporario, self._arquivo)
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (todas as séries, todos os processos)"""
+        retratos = [self.coletar()]
+        if self.diretorio is not None:
+            self.compactar()
+            retratos.extend(self._retratos_externos())
+        return self._texto(_somar(retratos))
+
+    def _retratos_externos(self):
+        proprio = getattr(self, '_arquivo', None) if self._pid == os.getpid() else None
+        caminhos = glob.glob(os.path.join(self.diretorio, 'metrics-*-*.json'))
+        caminhos.append(os.path.join(self.diretorio, _ENCERRADOS))
+        retratos = []
+        for caminho in caminhos:
+            if caminho == proprio:
+                continue
+            try:
+                with open(caminho, encoding='utf-8') as f:
+                    retratos.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return retratos
+
+    def compactar(self):
+        """Incorpora a metrics-encerrados.json os retratos de processos encerrados"""
+        if self.diretorio is None or not os.path.isdir(self.diretorio):
+            return 0
+        fd = os.open(os.path.join(self.diretorio, 'metrics.lock'), os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            mortos = []
+            for trava in glob.glob(os.path.join(self.diretorio, 'metrics-*-*.lock')):
+                fd_trava = os.open(trava, os.O_RDONLY)
+                try:
+                    fcntl.flock(fd_trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # processo vivo
+                finally:
+                    os.close(fd_trava)
+                mortos.append(trava[:-len('.lock')])
+            if not mortos:
+                return 0
+
+            caminho = os.path.join(self.diretorio, _ENCERRADOS)
+            retratos = []
+            for base in [caminho[:-len('.json')]] + mortos:
+                try:
+                    with open(base + '.json', encoding='utf-8') as f:
+                        retratos.append(json.load(f))
+                except (FileNotFoundError, ValueError):
+                    continue
+            encerrados = _somar(retratos, incluir_gauges=False)
+            with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(encerrados, f, separators=(',', ':'))
+            os.replace(caminho + '.tmp', caminho)
+            for base in mortos:
+                # Temporários de uma gravação interrompida pelo fim do processo
+                for arquivo in [base + '.json', base + '.lock'] + glob.glob(base + '.json.*.tmp'):
+                    try:
+                        os.unlink(arquivo)
+                    except FileNotFoundError:
+                        pass
+            return len(mortos)
+        finally:
+            os.close(fd)
+
+    def _texto(self, retrato):
+        linhas = []
+        for nome in sorted(retrato):
+            metrica = retrato[nome]
+            linhas.append(f"# HELP {nome} {metrica['descricao']}")
+            linhas.append(f"# TYPE {nome} {metrica['tipo']}")
+            rotulos = metrica['rotulos']
+            for chave, valores in sorted(metrica['series'], key=lambda serie: serie[0]):
+                pares = [f'{rotulo}="{_escapar(valor)}"' for rotulo, valor in zip(rotulos, chave)]
+                if metrica['tipo'] != 'histogram':
+                    linhas.append(f"{nome}{{{','.join(pares)}}} {_formatar(valores[0])}" if pares
+                                  else f"{nome} {_formatar(valores[0])}")
+                    continue
+                acumulado = 0
+                limites = list(metrica['buckets']) + [float('inf')]
+                for limite, quantidade in zip(limites, valores):
+                    acumulado += quantidade
+                    le = 'le="%s"' % _formatar(float(limite))
+                    linhas.append(f"{nome}_bucket{{{','.join(pares + [le])}}} {acumulado}")
+                sufixo = f"{{{','.join(pares)}}}" if pares else ''
+                linhas.append(f"{nome}_sum{sufixo} {_formatar(float(valores[-2]))}")
+                linhas.append(f"{nome}_count{sufixo} {valores[-1]}")
+        return '\n'.join(linhas) + '\n'
+
+
+def _somar(retratos, incluir_gauges=True):
+    """Soma séries de mesmo nome e rótulos vindas de vários retratos"""
+    total = {}
+    for retrato in retratos:
+        for nome, metrica in retrato.items():
+            if metrica['tipo'] == 'gauge' and not incluir_gauges:
+                continue
+            destino = total.get(nome)
+            if destino is None:
+                destino = total[nome] = {**metrica, 'series': {}}
+            for chave, valores in metrica['series']:
+                chave = tuple(str(valor) for valor in chave)
+                atual = destino['series'].get(chave)
+                if atual is None:
+                    destino['series'][chave] = list(valores)
+                else:
+                    for indice, valor in enumerate(valores):
+                        atual[indice] += valor
+    for metrica in total.values():
+        metrica['series'] = [[list(chave), valores] for chave, valores in metrica['series'].items()]
+    return total
+
+
+# Registro padrão do processo e as séries instrumentadas no código
+metricas = Metricas()
+
+requisicoes_http = metricas.histograma(
+    'portal_http_request_duration_seconds', 'Duração das requisições HTTP por método, rota e status',
+    ('method', 'route', 'status')
+)
+consultas_db = metricas.histograma(
+    'portal_db_query_duration_seconds', 'Duração das consultas por SQL normalizado', ('query',)
+)
+espera_pool = metricas.histograma(
+    'portal_db_pool_wait_seconds', 'Espera por uma conexão do pool', ('pool',)
+)
+bytes_upload = metricas.contador(
+    'portal_upload_bytes_total', 'Bytes de arquivo recebidos em uploads (rate() = bytes/s)', ('mode',)
+)
+
+
+def medir_consulta(sql, inicio):
+    """Registra a duração de uma consulta iniciada em `inicio` (perf_counter)"""
+    consultas_db.observar(time.perf_counter() - inicio, impressao_sql(sql))
@@ -0,0 +1,365 @@
+import os
+import random
+import smtplib
+import logging
+import threading
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+_FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+
+def _ordem_prioridade(coluna='prioridade'):
+    """Expressão de ordenação da fila: críticas primeiro"""
+    return f"CASE {coluna} WHEN 'critica' THEN 0 WHEN 'alta' THEN 1 WHEN 'normal' THEN 2 ELSE 3 END"
+
+
+def _agora():
+    return datetime.utcnow()
+
+
+def _formatar(momento):
+    return momento.strftime(_FORMATO_DATA)
+
+
+def falha_permanente(erro):
+    """Erros 5xx do servidor SMTP (destinatário ou mensagem recusados) não são repetidos"""
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return all(codigo >= 500 for codigo, _ in erro.recipients.values())
+    if isinstance(erro, smtplib.SMTPResponseException):
+        return erro.smtp_code >= 500
+    return False
+
+
+class SMTPSender:
+    """Envia e-mails mantendo uma conexão SMTP aberta por thread
+
+    smtplib não é thread-safe: cada worker do dispatcher usa a sua conexão,
+    reaproveitada entre mensagens e lotes e reaberta se o servidor a encerrar.
+    """
+
+    def __init__(self, host, port=587, username=None, password=None, use_tls=True,
+                 remetente='noreply@nimoenergia.com.br', reply_to=None, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.remetente = remetente
+        self.reply_to = reply_to
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conexoes = []
+        self._lock = threading.Lock()
+
+    def _conectar(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        with self._lock:
+            self._conexoes.append(smtp)
+        return smtp
+
+    def _conexao(self):
+        smtp = getattr(self._local, 'smtp', None)
+        if smtp is None:
+            smtp = self._local.smtp = self._conectar()
+        return smtp
+
+    def _descartar_conexao(self):
+        smtp = getattr(self._local, 'smtp', None)
+        self._local.smtp = None
+        if smtp is not None:
+            with self._lock:
+                if smtp in self._conexoes:
+                    self._conexoes.remove(smtp)
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def mensagem(self, destinatario, assunto, corpo):
+        """Monta a mensagem de texto simples"""
+        mensagem = EmailMessage()
+        mensagem['From'] = self.remetente
+        mensagem['To'] = destinatario
+        mensagem['Subject'] = assunto
+        if self.reply_to:
+            mensagem['Reply-To'] = self.reply_to
+        mensagem.set_content(corpo)
+        return mensagem
+
+    def enviar(self, destinatario, assunto, corpo):
+        """Envia uma mensagem; reconecta uma vez se a conexão reutilizada caiu"""
+        mensagem = self.mensagem(destinatario, assunto, corpo)
+        try:
+            self._conexao().send_message(mensagem)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self._descartar_conexao()
+            self._conexao().send_message(mensagem)
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code == 421:  # serviço encerrando a conexão
+                self._descartar_conexao()
+            else:
+                # Mantém a conexão utilizável para a próxima mensagem
+                try:
+                    self._conexao().rset()
+                except smtplib.SMTPException:
+                    self._descartar_conexao()
+            raise
+
+    def fechar(self):
+        """Encerra (QUIT) todas as conexões abertas"""
+        with self._lock:
+            conexoes, self._conexoes = self._conexoes, []
+        for smtp in conexoes:
+            try:
+                smtp.quit()
+            except Exception:
+                smtp.close()
+        self._local = threading.local()
+
+
+class NotificationDispatcher:
+    """Envia as notificações pendentes de notificacoes, fora do caminho das requisições
+
+    Cada ciclo reivindica um lote de linhas pendentes por e-mail, ordenado por
+    prioridade (críticas primeiro). A reivindicação é um lease: proxima_tentativa
+    é empurrada para o futuro na mesma transação do SELECT, que no PostgreSQL e
+    no MySQL 8 usa FOR UPDATE SKIP LOCKED para que vários dispatchers dividam a
+    fila sem se bloquear (no SQLite a transação é BEGIN IMMEDIATE). Se o
+    processo morrer no meio do lote, as linhas voltam à fila ao fim do lease.
+
+    O lote é enviado por um pool de workers e o resultado gravado em massa: um
+    UPDATE para as enviadas e um executemany para as reagendadas com backoff
+    exponencial (ou marcadas como erro após `max_tentativas` ou falha 5xx).
+    """
+
+    def __init__(self, db_manager, sender, batch_size=50, workers=4, max_tentativas=5,
+                 backoff_base=60.0, backoff_max=3600.0, lease=300.0, interval=5.0):
+        self.db_manager = db_manager
+        self.sender = sender
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_tentativas = max_tentativas
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.interval = interval
+        self._skip_locked = None
+        self._executor = None
+        self._stop = threading.Event()
+        self._acordar = threading.Event()
+
+    def _suporta_skip_locked(self, tx):
+        if self._skip_locked is None:
+            if self.db_manager.db_type == 'postgresql':
+                self._skip_locked = True
+            elif self.db_manager.db_type == 'mysql':
+                versao = tx.run("SELECT VERSION() AS versao", fetch=True)[0]['versao']
+                self._skip_locked = int(versao.split('.', 1)[0]) >= 8
+            else:
+                self._skip_locked = False
+        return self._skip_locked
+
+    def backoff(self, tentativas):
+        """Espera antes da próxima tentativa: base * 2^(n-1), com jitter e teto"""
+        espera = min(self.backoff_base * 2 ** max(tentativas - 1, 0), self.backoff_max)
+        return espera * random.uniform(0.8, 1.2)
+
+    def reivindicar(self):
+        """Reserva um lote de notificações pendentes e retorna os dados para envio"""
+        agora = _agora()
+        with self.db_manager.transaction() as tx:
+            if self.db_manager.db_type == 'sqlite':
+                # Trava de escrita desde o SELECT: dois dispatchers não pegam as mesmas linhas
+                tx.execute('BEGIN IMMEDIATE')
+                bloqueio = ''
+            elif self._suporta_skip_locked(tx):
+                bloqueio = ' FOR UPDATE SKIP LOCKED'
+            else:
+                bloqueio = ' FOR UPDATE'
+            ids = [row['id'] for row in tx.run(
+                f"""SELECT id FROM notificacoes
+                    WHERE status_envio = 'pendente' AND canal = 'email'
+                      AND (proxima_tentativa IS NULL OR proxima_tentativa <= ?)
+                    ORDER BY {_ordem_prioridade()}, id
+                    LIMIT ?{bloqueio}""",
+                (_formatar(agora), self.batch_size),
+                fetch=True
+            )]
+            if not ids:
+                return []
+            marcadores = ', '.join('?' * len(ids))
+            tx.run(
+                f"UPDATE notificacoes SET proxima_tentativa = ? WHERE id IN ({marcadores})",
+                (_formatar(agora + timedelta(seconds=self.lease)), *ids)
+            )
+            return tx.run(
+                f"""SELECT n.id, n.titulo, n.mensagem, n.prioridade, n.tentativas_envio,
+                           u.email, u.nome
+                    FROM notificacoes n
+                    JOIN usuarios u ON u.id = n.usuario_id
+                    WHERE n.id IN ({marcadores})
+                    ORDER BY {_ordem_prioridade('n.prioridade')}, n.id""",
+                tuple(ids),
+                fetch=True
+            )
+
+    def _enviar(self, notificacao):
+        try:
+            self.sender.enviar(notificacao['email'], notificacao['titulo'], notificacao['mensagem'])
+            return notificacao, None
+        except Exception as e:
+            return notificacao, e
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='notificacoes')
+        return self._executor
+
+    def processar_lote(self):
+        """Reivindica, envia e registra um lote; retorna a contagem por resultado"""
+        lote = self.reivindicar()
+        resultado = {'reivindicadas': len(lote), 'enviadas': 0, 'reagendadas': 0, 'falhas': 0}
+        if not lote:
+            return resultado
+
+        enviadas = []
+        falhas = []
+        # map() preserva a ordem do lote: críticas são submetidas primeiro
+        for notificacao, erro in self._pool().map(self._enviar, lote):
+            if erro is None:
+                enviadas.append(notificacao['id'])
+                continue
+            tentativas = (notificacao['tentativas_envio'] or 0) + 1
+            definitiva = falha_permanente(erro) or tentativas >= self.max_tentativas
+            proxima = None if definitiva else _formatar(_agora() + timedelta(seconds=self.backoff(tentativas)))
+            falhas.append((
+                'erro' if definitiva else 'pendente', str(erro)[:1000], proxima, notificacao['id']
+            ))
+            resultado['falhas' if definitiva else 'reagendadas'] += 1
+            logger.warning(f"Falha ao enviar notificação {notificacao['id']} (tentativa {tentativas}): {erro}")
+        resultado['enviadas'] = len(enviadas)
+
+        with self.db_manager.transaction() as tx:
+            if enviadas:
+                tx.run(
+                    f"""UPDATE notificacoes
+                        SET status_envio = 'enviado', data_envio = ?, tentativas_envio = tentativas_envio + 1,
+                            erro_envio = NULL, proxima_tentativa = NULL
+                        WHERE id IN ({', '.join('?' * len(enviadas))})""",
+                    (_formatar(_agora()), *enviadas)
+                )
+            if falhas:
+                tx.run_many(
+                    """UPDATE notificacoes
+                       SET status_envio = ?, erro_envio = ?, proxima_tentativa = ?,
+                           tentativas_envio = tentativas_envio + 1
+                       WHERE id = ?""",
+                    falhas
+                )
+        logger.info(
+            f"Notificações: {resultado['enviadas']} enviadas, {resultado['reagendadas']} reagendadas, "
+            f"{resultado['falhas']} com erro"
+        )
+        return resultado
+
+    def acordar(self):
+        """Antecipa o próximo ciclo (ex.: notificação crítica recém-criada)"""
+        self._acordar.set()
+
+    def executar(self):
+        """Laço do processo dispatcher: lotes cheios seguem direto, senão espera `interval`"""
+        self._stop.clear()
+        logger.info(f"Dispatcher de notificações iniciado ({self.workers} workers, lotes de {self.batch_size})")
+        while not self._stop.is_set():
+            try:
+                cheio = self.processar_lote()['reivindicadas'] >= self.batch_size
+            except Exception as e:
+                logger.error(f"Erro no dispatcher de notificações: {e}")
+                cheio = False
+            if not cheio:
+                self._acordar.wait(self.interval)
+                self._acordar.clear()
+
+    def stop(self):
+        """Pede o fim do laço de executar() ao término do lote corrente"""
+        self._stop.set()
+        self._acordar.set()
+
+    def fechar(self):
+        """Aguarda os envios em andamento e fecha as conexões SMTP"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.sender.fechar()
+
+
+def dispatcher_from_env(db_manager):
+    """Dispatcher configurado pelas variáveis SMTP_* e NOTIFICATION_*"""
+    sender = SMTPSender(
+        os.getenv('SMTP_SERVER', 'localhost'),
+        int(os.getenv('SMTP_PORT', 587)),
+        username=os.getenv('SMTP_USERNAME') or None,
+        password=os.getenv('SMTP_PASSWORD') or None,
+        use_tls=os.getenv('SMTP_USE_TLS', 'true').lower() == 'true',
+        remetente=os.getenv('EMAIL_FROM', 'noreply@nimoenergia.com.br'),
+        reply_to=os.getenv('EMAIL_REPLY_TO') or None
+    )
+    return NotificationDispatcher(
+        db_manager,
+        sender,
+        batch_size=int(os.getenv('NOTIFICATION_BATCH_SIZE', 50)),
+        workers=int(os.getenv('NOTIFICATION_WORKERS', 4)),
+        max_tentativas=int(os.getenv('NOTIFICATION_MAX_TENTATIVAS', 5)),
+        backoff_base=float(os.getenv('NOTIFICATION_BACKOFF_BASE', 60)),
+        backoff_max=float(os.getenv('NOTIFICATION_BACKOFF_MAX', 3600)),
+        lease=float(os.getenv('NOTIFICATION_LEASE', 300)),
+        interval=float(os.getenv('NOTIFICATION_POLL_INTERVAL', 5))
+    )
+
+
+if __name__ == '__main__':
+    import signal
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    from database_manager import db_manager
+    from dashboard_service import DashboardService
+    from expiry_scanner import ExpiryScanner
+    from metrics import metricas
+
+    # Consultas do worker entram no /metrics dos processos web da mesma máquina
+    if os.getenv('METRICS_DIR'):
+        metricas.configurar(os.getenv('METRICS_DIR'), float(os.getenv('METRICS_SNAPSHOT_INTERVAL', 5)))
+        metricas.ensure_started()
+
+    dispatcher = dispatcher_from_env(db_manager)
+    # Reconciliação do resumo do dashboard: um único processo, não um por worker web
+    dashboard = DashboardService(db_manager, reconcile_interval=float(os.getenv('DASHBOARD_RECONCILE_INTERVAL', 900)))
+    dashboard.ensure_reconciler_started()
+    # Varredura de vencimentos no mesmo processo: os avisos críticos acordam o dispatcher
+    scanner = ExpiryScanner(
+        db_manager,
+        dashboard,
+        interval=float(os.getenv('VENCIMENTO_SCAN_INTERVAL', 3600)),
+        dispatcher=dispatcher
+    )
+    scanner.ensure_started()
+    signal.signal(signal.SIGTERM, lambda *_: dispatcher.stop())
+    try:
+        dispatcher.executar()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scanner.stop()
+        dashboard.stop()
+        dispatcher.fechar()
+        metricas.stop()
+        db_manager.close_pool()
@@ -0,0 +1,264 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+_UNIDADES = {
+    'second': 1, 'segundo': 1, 's': 1,
+    'minute': 60, 'minuto': 60, 'min': 60,
+    'hour': 3600, 'hora': 3600, 'h': 3600,
+    'day': 86400, 'dia': 86400, 'd': 86400,
+}
+
+_LIMITE_RE = re.compile(r'^\s*(\d+)\s*(?:per|por|/)\s*(\d+)?\s*([a-zç]+?)s?\s*$', re.IGNORECASE)
+
+Limite = namedtuple('Limite', 'quantidade janela')
+
+# Estado da checagem de uma requisição: o limite mais apertado entre os aplicados
+Resultado = namedtuple('Resultado', 'permitido limite restantes reset retry_after')
+
+
+def parse_limites(texto):
+    """Lista de Limite a partir de "1000 per hour; 100/minute" (também "10 por minuto", "5/30 segundos")"""
+    limites = []
+    for parte in re.split(r'[;,]', texto or ''):
+        if not parte.strip():
+            continue
+        match = _LIMITE_RE.match(parte)
+        unidade = _UNIDADES.get(match.group(3).lower()) if match else None
+        if unidade is None:
+            raise ValueError(f"Limite inválido: {parte.strip()!r}")
+        limites.append(Limite(int(match.group(1)), int(match.group(2) or 1) * unidade))
+    return limites
+
+
+class MemoryStorage:
+    """Contadores de janela fixa em memória, distribuídos em shards com lock próprio
+
+    Cada chave guarda [expira_em, [janela, atual, anterior] por limite]; chaves
+    ociosas são descartadas quando o shard passa de `max_chaves / shards`. Os
+    limites valem por processo: com vários workers, use SQLiteStorage para um
+    contador comum.
+    """
+
+    def __init__(self, shards=16, max_chaves=100000):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._max_por_shard = max(1, max_chaves // shards)
+
+    def consumir(self, chave, limites, agora):
+        """Conta a requisição em todos os `limites` da chave se couber em cada um
+
+        Retorna (índice do primeiro limite excedido ou None, [(atual, anterior)
+        por limite]); quando permitida, as contagens já incluem a requisição.
+        """
+        contadores, lock = self._shards[hash(chave) % len(self._shards)]
+        with lock:
+            entrada = contadores.get(chave)
+            if entrada is None:
+                if len(contadores) >= self._max_por_shard:
+                    self._descartar_ociosas(contadores, agora)
+                entrada = contadores[chave] = [0.0] + [[0, 0, 0] for _ in limites]
+            excedido = None
+            for indice, (quantidade, duracao) in enumerate(limites):
+                estado = entrada[indice + 1]
+                janela = int(agora // duracao)
+                if estado[0] != janela:
+                    estado[2] = estado[1] if estado[0] == janela - 1 else 0
+                    estado[0] = janela
+                    estado[1] = 0
+                if excedido is None and estado[2] * (1.0 - agora % duracao / duracao) + estado[1] >= quantidade:
+                    excedido = indice
+            if excedido is None:
+                for estado in entrada[1:]:
+                    estado[1] += 1
+                # Depois da próxima janela do limite mais longo a contagem não influencia mais nenhuma estimativa
+                entrada[0] = agora + 2 * max(duracao for _, duracao in limites)
+            return excedido, [(estado[1], estado[2]) for estado in entrada[1:]]
+
+    @staticmethod
+    def _descartar_ociosas(contadores, agora):
+        for chave in [chave for chave, entrada in contadores.items() if entrada[0] <= agora]:
+            del contadores[chave]
+
+    def limpar(self):
+        """Remove todos os contadores"""
+        for contadores, lock in self._shards:
+            with lock:
+                contadores.clear()
+
+
+class SQLiteStorage:
+    """Contadores em um arquivo SQLite local, comuns a todos os workers do host
+
+    Cada checagem é uma transação curta (BEGIN IMMEDIATE); em WAL e sem fsync
+    custa dezenas de microssegundos. Uma conexão por thread, refeita após fork.
+    """
+
+    def __init__(self, caminho, limpeza_a_cada=1000):
+        self.caminho = caminho
+        self.limpeza_a_cada = limpeza_a_cada
+        self._local = threading.local()
+        self._operacoes = 0
+        self._conexao().execute(
+            """CREATE TABLE IF NOT EXISTS rate_limit (
+                   chave TEXT NOT NULL,
+                   janela INTEGER NOT NULL,
+                   contagem INTEGER NOT NULL,
+                   expira_em REAL NOT NULL,
+                   PRIMARY KEY (chave, janela)
+               ) WITHOUT ROWID"""
+        )
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            import sqlite3
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Contadores de rate limit não precisam sobreviver a uma queda do sistema
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def consumir(self, chave, limites, agora):
+        """Mesmo contrato de MemoryStorage.consumir"""
+        prefixo = '|'.join(map(str, chave))
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            excedido = None
+            contagens = []
+            for indice, (quantidade, duracao) in enumerate(limites):
+                janela = int(agora // duracao)
+                linhas = dict(conn.execute(
+                    "SELECT janela, contagem FROM rate_limit WHERE chave = ? AND janela IN (?, ?)",
+                    (f'{prefixo}|{duracao}', janela, janela - 1)
+                ).fetchall())
+                atual, anterior = linhas.get(janela, 0), linhas.get(janela - 1, 0)
+                if excedido is None and anterior * (1.0 - agora % duracao / duracao) + atual >= quantidade:
+                    excedido = indice
+                contagens.append((atual, anterior))
+            if excedido is None:
+                for (quantidade, duracao), (atual, anterior) in zip(limites, list(contagens)):
+                    janela = int(agora // duracao)
+                    conn.execute(
+                        """INSERT INTO rate_limit (chave, janela, contagem, expira_em) VALUES (?, ?, 1, ?)
+                           ON CONFLICT (chave, janela) DO UPDATE SET contagem = contagem + 1""",
+                        (f'{prefixo}|{duracao}', janela, (janela + 2) * duracao)
+                    )
+                contagens = [(atual + 1, anterior) for atual, anterior in contagens]
+            self._operacoes += 1
+            if self._operacoes % self.limpeza_a_cada == 0:
+                conn.execute("DELETE FROM rate_limit WHERE expira_em <= ?", (agora,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return excedido, contagens
+
+    def limpar(self):
+        """Remove todos os contadores"""
+        self._conexao().execute("DELETE FROM rate_limit")
+
+
+def criar_armazenamento(url):
+    """Armazenamento a partir de RATE_LIMIT_STORAGE: "memory" ou "sqlite:///caminho.db" """
+    if not url or url == 'memory':
+        return MemoryStorage()
+    if url.startswith('sqlite:///'):
+        return SQLiteStorage(url[len('sqlite:///'):])
+    raise ValueError(f"RATE_LIMIT_STORAGE inválido: {url!r}")
+
+
+class RateLimiter:
+    """Rate limiting por janela deslizante (contador ponderado de duas janelas fixas)
+
+    Os limites padrão valem para todas as rotas não isentas; `politica()` soma
+    limites próprios a endpoints específicos, contados por identidade (usuário
+    autenticado, ou IP na falta dele) ou sempre por IP. Falhas do armazenamento
+    não bloqueiam requisições.
+    """
+
+    def __init__(self, armazenamento=None, padrao='', ativo=True):
+        self.armazenamento = armazenamento if armazenamento is not None else MemoryStorage()
+        self.padrao = tuple(parse_limites(padrao))
+        self.ativo = ativo
+        self._politicas = {}
+        self._isentos = set()
+        self._planos = {}
+
+    def politica(self, endpoints, limites, por='identidade'):
+        """Limites adicionais para os endpoints (por='identidade' ou por='ip')"""
+        if por not in ('identidade', 'ip'):
+            raise ValueError(f"Critério de contagem inválido: {por!r}")
+        for endpoint in endpoints:
+            self._politicas[endpoint] = (tuple(parse_limites(limites)), por == 'ip')
+        self._planos.clear()
+
+    def isentar(self, endpoints):
+        """Endpoints fora dos limites padrão (health check, métricas)"""
+        self._isentos.update(endpoints)
+        self._planos.clear()
+
+    def _plano(self, endpoint):
+        """Escopos aplicáveis ao endpoint: (escopo, conta por IP, limites)"""
+        plano = []
+        if endpoint not in self._isentos and self.padrao:
+            plano.append(('*', False, self.padrao))
+        if endpoint in self._politicas:
+            limites, por_ip = self._politicas[endpoint]
+            if limites:
+                plano.append((endpoint, por_ip, limites))
+        self._planos[endpoint] = plano = tuple(plano)
+        return plano
+
+    def verificar(self, endpoint, identidade, ip):
+        """Conta a requisição e retorna o Resultado, ou None se nenhum limite se aplica"""
+        if not self.ativo:
+            return None
+        plano = self._planos.get(endpoint)
+        if plano is None:
+            plano = self._plano(endpoint)
+        if not plano:
+            return None
+
+        agora = time.time()
+        escolhido = None
+        for escopo, por_ip, limites in plano:
+            try:
+                excedido, contagens = self.armazenamento.consumir(
+                    (escopo, ip if por_ip else identidade), limites, agora
+                )
+            except Exception as e:
+                logger.warning(f"Rate limit indisponível, requisição liberada: {e}")
+                return None
+            if excedido is not None:
+                return self._recusa(limites[excedido], contagens[excedido], agora)
+            # Informa o limite com menos requisições restantes
+            for (quantidade, duracao), (atual, anterior) in zip(limites, contagens):
+                restantes = quantidade - anterior * (1.0 - agora % duracao / duracao) - atual
+                if escolhido is None or restantes < escolhido[0]:
+                    escolhido = (restantes, quantidade, duracao)
+
+        restantes, quantidade, duracao = escolhido
+        return Resultado(True, quantidade, max(0, int(restantes)), int((agora // duracao + 1) * duracao), 0)
+
+    @staticmethod
+    def _recusa(limite, contagem, agora):
+        """Resultado de uma requisição recusada, com os segundos até abrir espaço no limite"""
+        quantidade, duracao = limite
+        atual, anterior = contagem
+        fracao = agora % duracao / duracao
+        reset = (agora // duracao + 1) * duracao
+        if anterior and atual < quantidade:
+            # A contribuição da janela anterior decai linearmente até o fim desta
+            espera = (1.0 - (quantidade - 1 - atual) / anterior - fracao) * duracao
+        else:
+            espera = reset - agora
+        return Resultado(False, quantidade, 0, int(reset), max(1, int(math.ceil(espera))))
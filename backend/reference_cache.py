@@ -0,0 +1,114 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from json_provider import codificar
+
+logger = logging.getLogger(__name__)
+
+_BOOLEANOS_TIPO = ('obrigatorio', 'tem_vencimento', 'tem_garantia', 'aprovacao_automatica', 'ativo')
+
+
+class _Snapshot:
+    """Dados de referência carregados em uma versão do cache"""
+
+    __slots__ = ('versao', 'expira_em', 'tipos_corpo', 'tipos_etag', 'tipos')
+
+    def __init__(self, versao, expira_em, tipos_corpo, tipos_etag, tipos):
+        self.versao = versao
+        self.expira_em = expira_em
+        self.tipos_corpo = tipos_corpo
+        self.tipos_etag = tipos_etag
+        self.tipos = tipos
+
+
+class ReferenceDataCache:
+    """Cache versionado de tipos_documento
+
+    A tabela é lida uma vez e a lista de tipos é mantida já serializada, com
+    um ETag forte derivado do conteúdo. Quem altera a tabela deve chamar
+    invalidar() (registrado em db_manager.ao_alterar_referencia), que incrementa
+    a versão e força a recarga na próxima leitura; o TTL cobre alterações
+    feitas por outros processos. Configurações ficam no ConfigService.
+    """
+
+    def __init__(self, db_manager, ttl=300.0):
+        self.db_manager = db_manager
+        self.ttl = ttl
+        self._versao = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @property
+    def versao(self):
+        """Versão atual dos dados de referência"""
+        return self._versao
+
+    def invalidar(self):
+        """Marca os dados como alterados; a próxima leitura recarrega do banco"""
+        with self._lock:
+            self._versao += 1
+
+    def tipos_documento(self):
+        """Corpo JSON (bytes) dos tipos de documento ativos e seu ETag"""
+        snapshot = self._atual()
+        return snapshot.tipos_corpo, snapshot.tipos_etag
+
+    def tipo_documento(self, chave):
+        """Tipo de documento ativo pelo id ou código, ou None"""
+        tipos = self._atual().tipos
+        if isinstance(chave, str) and chave.isdigit():
+            chave = int(chave)
+        return tipos.get(chave)
+
+    def _atual(self):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.versao == self._versao and snapshot.expira_em > time.monotonic():
+            return snapshot
+
+        with self._lock:
+            # Outra thread pode ter recarregado enquanto esperávamos o lock
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.versao == self._versao and snapshot.expira_em > time.monotonic():
+                return snapshot
+            versao = self._versao
+
+        snapshot = self._carregar(versao)
+        with self._lock:
+            if self._snapshot is None or self._snapshot.versao <= versao:
+                self._snapshot = snapshot
+        return snapshot
+
+    def _carregar(self, versao):
+        start = time.perf_counter()
+        tipos = self.db_manager.run(
+            """SELECT id, codigo, nome, descricao, categoria, subcategoria, obrigatorio,
+                      tem_vencimento, tem_garantia, formatos_aceitos, tamanho_maximo_mb,
+                      aprovacao_automatica, dias_aviso_vencimento, ordem_exibicao, ativo
+               FROM tipos_documento
+               WHERE ativo = ?
+               ORDER BY ordem_exibicao, nome""",
+            (True,),
+            fetch=True
+        )
+
+        for tipo in tipos:
+            for campo in _BOOLEANOS_TIPO:
+                tipo[campo] = bool(tipo[campo])
+            if isinstance(tipo['formatos_aceitos'], (str, bytes)):
+                tipo['formatos_aceitos'] = json.loads(tipo['formatos_aceitos'])
+
+        corpo = codificar(tipos)
+        etag = hashlib.sha256(corpo).hexdigest()[:32]
+        logger.info(
+            f"Dados de referência carregados (versão {versao}, {len(tipos)} tipos) "
+            f"em {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return _Snapshot(
+            versao,
+            time.monotonic() + self.ttl,
+            corpo,
+            etag,
+            {**{tipo['id']: tipo for tipo in tipos}, **{tipo['codigo']: tipo for tipo in tipos}}
+        )
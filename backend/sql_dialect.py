@@ -0,0 +1,185 @@
+import re
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DIALECTS = ('mysql', 'postgresql', 'sqlite')
+
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_CONFLICT_RE = re.compile(
+    r'\s+ON\s+CONFLICT\s*(?:\(([^)]*)\))?\s*DO\s+(NOTHING|UPDATE\s+SET\s+(.+))\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+_INSERT_RE = re.compile(r'^\s*INSERT\s+INTO\s+', re.IGNORECASE)
+_EXCLUDED_RE = re.compile(r'\bexcluded\.([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+
+
+def quote_identifier(name):
+    """Valida nomes de tabela/coluna usados na montagem de SQL"""
+    if not _IDENTIFIER_RE.match(name):
+        raise ValueError(f"Identificador SQL inválido: {name}")
+    return name
+
+
+def _scan(sql, on_placeholder, escape_percent):
+    """Percorre o SQL fora de literais, substituindo placeholders `?`"""
+    out = []
+    quote = None
+    index = 0
+    for char in sql:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+        elif char == '?':
+            index += 1
+            out.append(on_placeholder(index))
+            continue
+        if char == '%' and escape_percent:
+            out.append('%%')
+        else:
+            out.append(char)
+    return ''.join(out), index
+
+
+def _count_placeholders(sql):
+    return _scan(sql, lambda index: '?', False)[1]
+
+
+def _compile_conflict(sql, db_type):
+    """Traduz `ON CONFLICT ... DO NOTHING/UPDATE` para o dialeto alvo"""
+    match = _CONFLICT_RE.search(sql)
+    if not match or db_type != 'mysql':
+        return sql
+
+    head = sql[:match.start()]
+    if match.group(2).upper() == 'NOTHING':
+        return _INSERT_RE.sub('INSERT IGNORE INTO ', head, count=1)
+
+    assignments = _EXCLUDED_RE.sub(lambda m: f'VALUES({m.group(1)})', match.group(3).strip())
+    return f'{head} ON DUPLICATE KEY UPDATE {assignments}'
+
+
+@lru_cache(maxsize=1024)
+def compile_sql(sql, db_type):
+    """Compila uma query canônica para o dialeto do banco (resultado em cache)
+
+    Forma canônica: placeholders `?` e upsert no formato
+    `INSERT ... ON CONFLICT (col) DO NOTHING | DO UPDATE SET c = excluded.c`.
+    """
+    if db_type not in SUPPORTED_DIALECTS:
+        raise ValueError(f"Tipo de banco não suportado: {db_type}")
+
+    sql = _compile_conflict(sql, db_type)
+    if db_type == 'sqlite':
+        return sql
+
+    has_params = _count_placeholders(sql) > 0
+    return _scan(sql, lambda index: '%s', has_params)[0]
+
+
+@lru_cache(maxsize=1024)
+def compile_prepared(sql, db_type):
+    """Compila a query canônica para statement preparado no servidor
+
+    MySQL mantém os placeholders `?`; PostgreSQL usa `$1, $2, ...` no PREPARE.
+    """
+    sql = _compile_conflict(sql, db_type)
+    if db_type == 'mysql':
+        return sql
+    return _scan(sql, lambda index: f'${index}', False)[0]
+
+
+def insert_sql(table, columns, conflict=None, update=None):
+    """Monta um INSERT canônico, opcionalmente com tratamento de conflito
+
+    conflict: colunas da chave única; update: colunas atualizadas no conflito
+    (sem `update`, linhas duplicadas são ignoradas).
+    """
+    table = quote_identifier(table)
+    column_list = ', '.join(quote_identifier(column) for column in columns)
+    placeholders = ', '.join(['?'] * len(columns))
+    sql = f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})"
+    if conflict is None:
+        return sql
+
+    target = ', '.join(quote_identifier(column) for column in conflict)
+    if update:
+        assignments = ', '.join(
+            f"{quote_identifier(column)} = excluded.{column}" for column in update
+        )
+        return f"{sql} ON CONFLICT ({target}) DO UPDATE SET {assignments}"
+    return f"{sql} ON CONFLICT ({target}) DO NOTHING"
+
+
+class PreparedStatementCache:
+    """Statements preparados no servidor, por conexão física (LRU limitado)"""
+
+    def __init__(self, db_type, max_size=64):
+        self.db_type = db_type
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._names = 0
+
+    def execute(self, conn, sql, params=None, cursor=None):
+        """Executa a query canônica reutilizando o statement preparado
+
+        Retorna o cursor com o resultado. No MySQL o cursor preparado pertence
+        ao cache e não deve ser fechado; no PostgreSQL usa `cursor` se informado.
+        """
+        if self.db_type == 'mysql':
+            return self._execute_mysql(conn, sql, params)
+        elif self.db_type == 'postgresql':
+            return self._execute_postgresql(conn, sql, params, cursor)
+        raise ValueError(f"Statements preparados não suportados em {self.db_type}")
+
+    def _execute_mysql(self, conn, sql, params):
+        cursor = self._entries.get(sql)
+        if cursor is None:
+            cursor = conn.cursor(prepared=True)
+            self._store(conn, sql, cursor)
+        else:
+            self._entries.move_to_end(sql)
+        cursor.execute(compile_prepared(sql, 'mysql'), tuple(params or ()))
+        return cursor
+
+    def _execute_postgresql(self, conn, sql, params, cursor=None):
+        cursor = cursor or conn.cursor()
+        name = self._entries.get(sql)
+        if name is None:
+            self._names += 1
+            name = f'portal_stmt_{self._names}'
+            cursor.execute(f"PREPARE {name} AS {compile_prepared(sql, 'postgresql')}")
+            self._store(conn, sql, name)
+        else:
+            self._entries.move_to_end(sql)
+
+        params = tuple(params or ())
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+        return cursor
+
+    def _store(self, conn, sql, handle):
+        self._entries[sql] = handle
+        while len(self._entries) > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._release(conn, evicted)
+
+    def _release(self, conn, handle):
+        try:
+            if self.db_type == 'mysql':
+                handle.close()
+            else:
+                cursor = conn.cursor()
+                cursor.execute(f"DEALLOCATE {handle}")
+                cursor.close()
+        except Exception as e:
+            logger.warning(f"Falha ao liberar statement preparado: {e}")
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,216 @@
+import os
+import uuid
+import hashlib
+import logging
+from metrics import bytes_upload
+
+logger = logging.getLogger(__name__)
+
+
+class ArquivoMuitoGrande(ValueError):
+    """Arquivo excede o tamanho máximo permitido (resposta 413)"""
+
+    def __init__(self, limite_bytes):
+        super().__init__(f"Arquivo excede o limite de {limite_bytes / (1024 * 1024):.0f} MB")
+        self.limite_bytes = limite_bytes
+
+
+class ArquivoArmazenado:
+    """Resultado de uma gravação: conteúdo identificado pelo SHA-256"""
+
+    __slots__ = ('hash', 'tamanho', 'caminho', 'existente')
+
+    def __init__(self, hash, tamanho, caminho, existente):
+        self.hash = hash
+        self.tamanho = tamanho
+        self.caminho = caminho
+        self.existente = existente
+
+
+class ArquivoPendente:
+    """Arquivo completo aguardando publicação no storage
+
+    Hash e tamanho já são conhecidos, então o documento pode ser validado e
+    inserido antes de o conteúdo entrar no storage: publicar() é o último passo
+    da transação e reverter() o desfaz se ela não for confirmada. Após o commit,
+    confirmar() remove a origem de um conteúdo que já existia.
+    """
+
+    def __init__(self, storage, origem, hash, tamanho):
+        self.storage = storage
+        self.origem = origem
+        self.hash = hash
+        self.tamanho = tamanho
+        self.caminho = storage.caminho_relativo(hash)
+        self.armazenado = None
+
+    def publicar(self):
+        """Move o arquivo para o caminho do hash e retorna o ArquivoArmazenado"""
+        self.armazenado = self.storage.publicar(self.origem, self.hash, self.tamanho, manter_origem=True)
+        return self.armazenado
+
+    def reverter(self, referenciado=None):
+        """Devolve à origem um conteúdo publicado agora (transação desfeita)
+
+        Um upload concorrente do mesmo conteúdo pode ter sido confirmado
+        apontando para este arquivo: se `referenciado()` indicar isso (consulta
+        feita após a retirada), o conteúdo volta ao storage.
+        """
+        if self.armazenado is not None and not self.armazenado.existente:
+            destino = self.storage.caminho_absoluto(self.caminho)
+            os.replace(destino, self.origem)
+            if referenciado is not None and referenciado():
+                try:
+                    os.link(self.origem, destino)
+                except FileExistsError:
+                    pass
+        self.armazenado = None
+
+    def confirmar(self):
+        """Após o commit: remove a origem, garantindo o conteúdo no storage
+
+        Se o conteúdo já existia, a transação que o publicou pode ter sido
+        desfeita depois da nossa publicação; nesse caso ele é publicado de novo.
+        """
+        destino = self.storage.caminho_absoluto(self.caminho)
+        if self.armazenado is not None and self.armazenado.existente and not os.path.exists(destino):
+            self.storage.publicar(self.origem, self.hash, self.tamanho)
+        else:
+            self.descartar()
+
+    def descartar(self):
+        """Remove o arquivo de origem, se ainda existir (idempotente)"""
+        try:
+            os.unlink(self.origem)
+        except FileNotFoundError:
+            pass
+
+
+class GravacaoArquivo:
+    """Gravação em andamento: escreve em arquivo temporário calculando o SHA-256
+
+    O limite pode ser ajustado durante a gravação (ex.: quando o tipo de
+    documento é conhecido) e é verificado a cada pedaço recebido.
+    """
+
+    def __init__(self, storage, limite_bytes=None):
+        self.storage = storage
+        self.limite_bytes = limite_bytes
+        self.tamanho = 0
+        self._sha256 = hashlib.sha256()
+        self._tmp_path = os.path.join(storage.tmp_dir, uuid.uuid4().hex)
+        self._file = open(self._tmp_path, 'wb', buffering=0)
+
+    def write(self, data):
+        """Acrescenta um pedaço do arquivo"""
+        self.tamanho += len(data)
+        self.verificar_limite()
+        self._sha256.update(data)
+        self._file.write(data)
+        bytes_upload.somar(len(data), 'simples')
+
+    def verificar_limite(self, limite_bytes=None):
+        """Aplica (e opcionalmente reduz) o limite ao que já foi recebido"""
+        if limite_bytes is not None:
+            self.limite_bytes = limite_bytes
+        if self.limite_bytes is not None and self.tamanho > self.limite_bytes:
+            self.descartar()
+            raise ArquivoMuitoGrande(self.limite_bytes)
+
+    def fechar(self):
+        """Encerra a gravação sem publicar: ArquivoPendente com o hash calculado"""
+        if self.storage.fsync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        return ArquivoPendente(self.storage, self._tmp_path, self._sha256.hexdigest(), self.tamanho)
+
+    def concluir(self):
+        """Move o arquivo para o caminho derivado do hash (deduplicando)"""
+        pendente = self.fechar()
+        armazenado = pendente.publicar()
+        pendente.confirmar()
+        return armazenado
+
+    def descartar(self):
+        """Remove o arquivo temporário (idempotente)"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class DocumentStorage:
+    """Armazenamento de arquivos endereçado por conteúdo
+
+    Cada arquivo é gravado uma única vez em <raiz>/<ab>/<cd>/<sha256>, de forma
+    que uploads idênticos compartilham o mesmo arquivo em disco.
+    """
+
+    def __init__(self, root, chunk_size=1024 * 1024, fsync=True):
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+        self.fsync = fsync
+        self.tmp_dir = os.path.join(self.root, 'tmp')
+        self._preparado = False
+
+    @staticmethod
+    def caminho_relativo(digest):
+        """Caminho relativo (particionado pelos primeiros bytes) de um hash"""
+        return os.path.join(digest[:2], digest[2:4], digest)
+
+    def caminho_absoluto(self, caminho):
+        """Caminho no disco de um arquivo armazenado"""
+        return os.path.join(self.root, caminho)
+
+    def calcular_hash(self, caminho):
+        """SHA-256 de um arquivo em disco, lido em pedaços de `chunk_size`"""
+        sha256 = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                sha256.update(data)
+        return sha256.hexdigest()
+
+    def publicar(self, origem, digest, tamanho, manter_origem=False):
+        """Move um arquivo completo para o caminho do seu hash, sem cópia
+
+        Se o conteúdo já existir o arquivo de origem é apenas removido (ou
+        mantido, com `manter_origem`).
+        """
+        caminho = self.caminho_relativo(digest)
+        destino = self.caminho_absoluto(caminho)
+        if os.path.exists(destino):
+            if not manter_origem:
+                os.unlink(origem)
+            existente = True
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            # os.replace é atômico; gravações concorrentes do mesmo conteúdo convergem
+            os.replace(origem, destino)
+            existente = False
+        return ArquivoArmazenado(digest, tamanho, caminho, existente)
+
+    def gravacao(self, limite_bytes=None):
+        """Inicia a gravação de um novo arquivo"""
+        if not self._preparado:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            self._preparado = True
+        return GravacaoArquivo(self, limite_bytes)
+
+    def salvar_stream(self, stream, limite_bytes=None):
+        """Grava um stream em pedaços de `chunk_size`, sem carregá-lo em memória"""
+        gravacao = self.gravacao(limite_bytes)
+        try:
+            while True:
+                data = stream.read(self.chunk_size)
+                if not data:
+                    break
+                gravacao.write(data)
+            return gravacao.concluir()
+        except BaseException:
+            gravacao.descartar()
+            raise
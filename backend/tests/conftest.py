@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from unittest.mock import patch
+
+# Banco SQLite temporário para a aplicação, configurado antes de importar os módulos
+_test_dir = tempfile.mkdtemp(prefix='portal_tests_')
+os.environ['DATABASE_TYPE'] = 'sqlite'
+os.environ['DATABASE_PATH'] = os.path.join(_test_dir, 'portal_test.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(_test_dir, 'uploads')
+os.environ['AUDIT_SPILL_DIR'] = os.path.join(_test_dir, 'audit')
+# Fator de custo mínimo do bcrypt para manter os testes rápidos
+os.environ.setdefault('AUTH_BCRYPT_ROUNDS', '4')
+# Todas as requisições saem do mesmo IP; o rate limiting é ativado só nos testes dele
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database_schema():
+    """Cria a estrutura e os dados iniciais do banco de testes"""
+    from database_manager import db_manager
+    db_manager.create_tables()
+    db_manager.insert_sample_data()
+    yield db_manager
+    db_manager.close_pool()
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    """Banco SQLite isolado com a estrutura e os dados iniciais
+
+    Os módulos de teste acrescentam as próprias linhas sobrescrevendo a fixture
+    (`def db_manager(self, db_manager)`).
+    """
+    from database_manager import DatabaseManager
+    with patch.dict(os.environ, {'DATABASE_TYPE': 'sqlite', 'DATABASE_PATH': str(tmp_path / 'portal.db')}):
+        db_manager = DatabaseManager()
+        db_manager.create_tables()
+        db_manager.insert_sample_data()
+        yield db_manager
+        db_manager.close_pool()
@@ -0,0 +1,215 @@
+import pytest
+import os
+import sys
+import json
+import asyncio
+import hashlib
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asgi import application
+from database_manager import db_manager
+from tests.test_upload_service import multipart, CONTENT_TYPE
+
+
+def chamar(method, path, body=b'', headers=None, query=b'', pedaco=None, desconectar=False, enviadas=None):
+    """Executa uma requisição na aplicação ASGI, entregando o corpo em pedaços
+
+    Com `desconectar` o cliente some depois do último pedaço, sem concluir o corpo.
+    Mensagens enviadas pela aplicação são acumuladas em `enviadas`, se informada.
+    """
+    pedaco = pedaco or max(len(body), 1)
+    mensagens = [
+        {'type': 'http.request', 'body': body[i:i + pedaco], 'more_body': desconectar or i + pedaco < len(body)}
+        for i in range(0, max(len(body), 1), pedaco)
+    ]
+    enviadas = [] if enviadas is None else enviadas
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'path': path,
+        'query_string': query,
+        'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+
+    async def receive():
+        if mensagens:
+            return mensagens.pop(0)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        enviadas.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    if not enviadas:
+        return None
+    inicio = enviadas[0]
+    corpo = b''.join(m.get('body', b'') for m in enviadas[1:])
+    return inicio['status'], dict(inicio['headers']), corpo
+
+
+class TestASGI:
+    """Testes para o modo de execução ASGI"""
+
+    @pytest.fixture
+    def auth_headers(self):
+        """Headers de autenticação obtidos pelo login via ASGI"""
+        status, _, corpo = chamar(
+            'POST', '/api/auth/login',
+            json.dumps({'email': 'admin@nimoenergia.com.br', 'password': 'senha123'}).encode(),
+            {'Content-Type': 'application/json'}
+        )
+        assert status == 200
+        return {'Authorization': f"Bearer {json.loads(corpo)['token']}"}
+
+    @pytest.fixture
+    def transportadora_id(self):
+        db_manager.run(
+            "INSERT INTO transportadoras (cnpj, razao_social) VALUES (?, ?) ON CONFLICT (cnpj) DO NOTHING",
+            ('44.444.444/0001-44', 'ASGI Transportes')
+        )
+        return db_manager.run(
+            "SELECT id FROM transportadoras WHERE cnpj = ?", ('44.444.444/0001-44',), fetch=True
+        )[0]['id']
+
+    def test_rotas_repassadas_ao_flask(self):
+        """Rotas comuns passam pelo app Flask, com headers de CORS"""
+        status, headers, corpo = chamar('GET', '/', headers={'Origin': 'http://localhost:3000'})
+        assert status == 200
+        assert json.loads(corpo)['status'] == 'online'
+        assert headers[b'access-control-allow-origin'] == b'http://localhost:3000'
+
+        status, _, _ = chamar('GET', '/api/inexistente')
+        assert status == 404
+
+    def test_upload_em_streaming(self, auth_headers, transportadora_id):
+        """Upload atendido pelo event loop com o corpo em vários pedaços"""
+        corpo = multipart(
+            {'tipo_documento': 'SEGURO_CARGA', 'transportadora_id': transportadora_id},
+            b'%PDF-1.4 ' + os.urandom(256 * 1024)
+        )
+        status, headers, resposta = chamar(
+            'POST', '/api/upload', corpo, {**auth_headers, 'Content-Type': CONTENT_TYPE}, pedaco=4096
+        )
+        assert status == 201
+        assert headers[b'access-control-allow-origin'] == b'*'
+        documento = json.loads(resposta)
+        assert documento['numero_protocolo'].startswith('DOC-')
+        assert documento['tamanho_arquivo'] == 256 * 1024 + 9
+
+        # Mesmo conteúdo: mesma resposta de erro do main.py
+        status, _, resposta = chamar(
+            'POST', '/api/upload', corpo, {**auth_headers, 'Content-Type': CONTENT_TYPE}, pedaco=4096
+        )
+        assert status == 409
+        assert json.loads(resposta)['numero_protocolo'] == documento['numero_protocolo']
+
+    def test_upload_nao_autorizado(self):
+        """Upload sem token é recusado antes de ler o corpo"""
+        status, _, resposta = chamar('POST', '/api/upload', multipart({}, b'x'), {'Content-Type': CONTENT_TYPE})
+        assert status == 401
+        assert json.loads(resposta)['error'] == 'Token de acesso requerido'
+
+    def test_upload_interrompido_nao_grava(self, auth_headers, transportadora_id):
+        """Cliente que desconecta no meio do corpo não deixa arquivo nem resposta"""
+        from main import document_storage
+        corpo = multipart({'tipo_documento': 'SEGURO_CARGA', 'transportadora_id': transportadora_id},
+                          b'%PDF-1.4 ' + os.urandom(3 * document_storage.chunk_size))
+        resposta = chamar('POST', '/api/upload', corpo[:len(corpo) // 2],
+                          {**auth_headers, 'Content-Type': CONTENT_TYPE}, pedaco=64 * 1024, desconectar=True)
+        assert resposta is None
+        assert os.listdir(document_storage.tmp_dir) == []
+
+    def test_pedaco_de_sessao(self, auth_headers, transportadora_id):
+        """PUT de pedaços atendido pelo event loop; finalização pelo Flask"""
+        conteudo = b'%PDF-1.4 ' + os.urandom(100 * 1024)
+        status, _, resposta = chamar(
+            'POST', '/api/upload/sessoes',
+            json.dumps({'tipo_documento': 'SEGURO_CARGA', 'nome_arquivo': 'apolice.pdf',
+                        'tamanho_total': len(conteudo), 'transportadora_id': transportadora_id}).encode(),
+            {**auth_headers, 'Content-Type': 'application/json'}
+        )
+        assert status == 201
+        sessao = json.loads(resposta)
+
+        status, _, resposta = chamar(
+            'PUT', f"/api/upload/sessoes/{sessao['id']}/chunks/0", conteudo,
+            {**auth_headers, 'X-Chunk-SHA256': '0' * 64}, pedaco=8192
+        )
+        assert status == 422
+
+        status, _, resposta = chamar(
+            'PUT', f"/api/upload/sessoes/{sessao['id']}/chunks/0", conteudo,
+            {**auth_headers, 'X-Chunk-SHA256': hashlib.sha256(conteudo).hexdigest()}, pedaco=8192
+        )
+        assert status == 200
+        assert json.loads(resposta)['tamanho'] == len(conteudo)
+
+        status, _, resposta = chamar('POST', f"/api/upload/sessoes/{sessao['id']}/finalizar", headers=auth_headers)
+        assert status == 201
+
+    def test_resposta_wsgi_em_streaming(self, auth_headers):
+        """Cada pedaço da resposta do Flask é enviado assim que gerado"""
+        import main
+        from unittest.mock import patch
+        eventos = []
+
+        def pagina(*args):
+            for parte in (b'{"documentos":[', b'],"quantidade":0}'):
+                eventos.append('gerado')
+                yield parte
+
+        class Envios(list):
+            def append(self, message):
+                if message.get('body'):
+                    eventos.append('enviado')
+                super().append(message)
+
+        enviadas = Envios()
+        with patch.object(main.document_service, 'pagina_json', side_effect=pagina):
+            status, _, corpo = chamar('GET', '/api/documentos', headers=auth_headers, enviadas=enviadas)
+        assert status == 200
+        assert json.loads(corpo) == {'documentos': [], 'quantidade': 0}
+        assert eventos == ['gerado', 'enviado', 'gerado', 'enviado']
+        assert enviadas[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+
+    def test_corpo_acima_do_limite(self, auth_headers):
+        """Corpos repassados ao Flask acima do limite de upload recebem 413"""
+        import main
+        from unittest.mock import patch
+        with patch.object(main.upload_service, 'limite_maximo', 1024):
+            limite = main.upload_service.limite_padrao + 64 * 1024
+            corpo = b'{"x": "' + b'a' * limite + b'"}'
+            status, _, resposta = chamar('POST', '/api/upload/sessoes', corpo,
+                                         {**auth_headers, 'Content-Type': 'application/json'}, pedaco=65536)
+            assert status == 413
+            assert 'muito grande' in json.loads(resposta)['error']
+
+            status, _, _ = chamar('POST', '/api/upload/sessoes', b'{}',
+                                  {**auth_headers, 'Content-Type': 'application/json',
+                                   'Content-Length': str(limite + 1)})
+            assert status == 413
+
+    def test_upload_rate_limit(self, auth_headers):
+        """Rotas nativas aplicam a política de upload antes de ler o corpo"""
+        import main
+        from unittest.mock import patch
+        from rate_limiter import MemoryStorage
+        with patch.object(main.rate_limiter, 'ativo', True), \
+                patch.object(main.rate_limiter, 'armazenamento', MemoryStorage()), \
+                patch.dict(main.rate_limiter._politicas), patch.dict(main.rate_limiter._planos, clear=True):
+            main.rate_limiter.politica(('upload_documento',), '1 per minute')
+            status, headers, _ = chamar('POST', '/api/upload', b'', {**auth_headers, 'Content-Type': CONTENT_TYPE})
+            assert status == 400
+            assert headers[b'x-ratelimit-limit'] == b'1'
+            assert headers[b'x-ratelimit-remaining'] == b'0'
+
+            status, headers, corpo = chamar('POST', '/api/upload', b'', {**auth_headers, 'Content-Type': CONTENT_TYPE})
+            assert status == 429
+            assert json.loads(corpo)['code'] == 'RATE_LIMIT_EXCEEDED'
+            assert b'retry-after' in headers
+
@@ -0,0 +1,154 @@
+import pytest
+import os
+import sys
+import json
+import time
+import fcntl
+import subprocess
+from unittest.mock import patch
+
+# Adicionar o diretório pai ao path
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from audit_sink import AuditSink
+
+
+class TestAuditSink:
+    """Testes para a gravação em lote de histórico e auditoria"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """Transportadora com um documento"""
+        db_manager.run(
+            "INSERT INTO transportadoras (id, cnpj, razao_social) VALUES (?, ?, ?)",
+            (1, '11.111.111/0001-11', 'Silva Transportes')
+        )
+        db_manager.run(
+            """INSERT INTO documentos (id, numero_protocolo, transportadora_id, tipo_documento_id, usuario_upload_id,
+                                       nome_arquivo_original, nome_arquivo_sistema, caminho_arquivo,
+                                       tamanho_arquivo, hash_arquivo)
+               VALUES (1, 'DOC-1', 1, 1, 1, 'a.pdf', 'a.pdf', 'a.pdf', 1, 'abc')"""
+        )
+        return db_manager
+
+    @pytest.fixture
+    def spill(self, tmp_path):
+        return str(tmp_path / 'spill')
+
+    @pytest.fixture
+    def sink(self, db_manager, spill):
+        sink = AuditSink(db_manager, spill, max_lote=3, intervalo=60)
+        yield sink
+        sink.stop(timeout=5)
+
+    def contar(self, db_manager, tabela):
+        return db_manager.run(f"SELECT COUNT(*) AS total FROM {tabela}", fetch=True)[0]['total']
+
+    def test_gravacao_por_tamanho_de_lote(self, db_manager, sink):
+        """Eventos ficam na fila até o lote encher"""
+        sink.auditar('login', usuario_id=1)
+        sink.auditar('login', usuario_id=1)
+        time.sleep(0.1)
+        assert sink.pendentes() == 2
+        assert self.contar(db_manager, 'auditoria_sistema') == 0
+
+        sink.historico(1, 1, 'aprovacao', 'pendente', 'aprovado', dados_alteracao={'motivo': 'ok'})
+        limite = time.monotonic() + 5
+        while sink.pendentes() and time.monotonic() < limite:
+            time.sleep(0.01)
+        assert self.contar(db_manager, 'auditoria_sistema') == 2
+        historico = db_manager.run("SELECT * FROM historico_documentos", fetch=True)[0]
+        assert historico['status_novo'] == 'aprovado'
+        assert json.loads(historico['dados_alteracao']) == {'motivo': 'ok'}
+
+    def test_flush_barreira(self, db_manager, sink, spill):
+        """flush() só retorna com os eventos anteriores no banco e o spill limpo"""
+        sink.auditar('exportacao', usuario_id=1, dados_novos={'linhas': 10})
+        data_evento = db_manager.run("SELECT CURRENT_TIMESTAMP AS agora", fetch=True)[0]['agora']
+        assert sink.flush(timeout=5) is True
+
+        row = db_manager.run("SELECT * FROM auditoria_sistema", fetch=True)[0]
+        assert row['acao'] == 'exportacao'
+        assert row['data_acao'] <= data_evento
+        # Apenas o segmento atual (vazio) continua no disco
+        segmentos = [nome for nome in os.listdir(spill) if nome.startswith('audit-')]
+        assert len(segmentos) == 1
+        assert os.path.getsize(os.path.join(spill, segmentos[0])) == 0
+
+    def test_recupera_spill_de_processo_encerrado(self, db_manager, sink, spill):
+        """Segmentos sem dono são regravados; os de processos ativos, não"""
+        os.makedirs(spill, exist_ok=True)
+        orfao = os.path.join(spill, 'audit-999999-000001.jsonl')
+        with open(orfao, 'w') as f:
+            f.write(json.dumps(['auditoria_sistema', [1, 'login', None, None, None, None, None, None,
+                                                      '2025-01-01 10:00:00']]) + '\n')
+            f.write(json.dumps(['historico_documentos', [1, 1, 'upload', None, 'pendente', None, None, None,
+                                                         None, '2025-01-01 10:00:00']]) + '\n')
+            f.write('["auditoria_sistema", [1, "log')  # escrita interrompida
+
+        ativo = os.path.join(spill, 'audit-999998-000001.jsonl')
+        with open(ativo, 'w') as f:
+            f.write(json.dumps(['auditoria_sistema', [1, 'ativo', None, None, None, None, None, None,
+                                                      '2025-01-01 10:00:00']]) + '\n')
+        fd = os.open(ativo, os.O_RDONLY)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            assert sink.recuperar() == 2
+        finally:
+            os.close(fd)
+
+        assert not os.path.exists(orfao) and os.path.exists(ativo)
+        assert self.contar(db_manager, 'auditoria_sistema') == 1
+        assert self.contar(db_manager, 'historico_documentos') == 1
+
+    def test_evento_recusado_nao_bloqueia_o_lote(self, db_manager, sink, spill):
+        """Evento com chave estrangeira inválida vai para o arquivo de rejeitados"""
+        sink.historico(1, 1, 'upload', status_novo='pendente')
+        sink.historico(12345, 1, 'upload', status_novo='pendente')
+        sink.auditar('upload_documento', usuario_id=1)
+        assert sink.flush(timeout=5) is True
+
+        assert self.contar(db_manager, 'historico_documentos') == 1
+        assert self.contar(db_manager, 'auditoria_sistema') == 1
+        with open(os.path.join(spill, 'audit-rejeitados.jsonl')) as f:
+            rejeitado = json.loads(f.readline())
+        assert rejeitado[0] == 'historico_documentos' and rejeitado[1][0] == 12345
+
+    def test_sem_fcntl(self, db_manager, sink, spill):
+        """Sem flock, só os segmentos do próprio processo são tratados como ativos"""
+        codigo = "import sys\nsys.modules['fcntl'] = None\nimport audit_sink\nassert audit_sink.fcntl is None\n"
+        resultado = subprocess.run([sys.executable, '-c', codigo], cwd=BACKEND,
+                                   capture_output=True, text=True, timeout=60)
+        assert resultado.returncode == 0, resultado.stderr
+
+        evento = json.dumps(['auditoria_sistema', [1, 'login', None, None, None, None, None, None,
+                                                   '2025-01-01 10:00:00']]) + '\n'
+        os.makedirs(spill, exist_ok=True)
+        orfao = os.path.join(spill, 'audit-999999-000001.jsonl')
+        proprio = os.path.join(spill, f'audit-{os.getpid()}-999999.jsonl')
+        for caminho in (orfao, proprio):
+            with open(caminho, 'w') as f:
+                f.write(evento)
+        with patch('audit_sink.fcntl', None):
+            assert sink.recuperar() == 1
+        assert not os.path.exists(orfao) and os.path.exists(proprio)
+
+    def test_recuperacao_com_banco_indisponivel(self, db_manager, sink, spill):
+        """Com o banco fora do ar o segmento fica no disco para a próxima tentativa"""
+        os.makedirs(spill, exist_ok=True)
+        orfao = os.path.join(spill, 'audit-999999-000001.jsonl')
+        with open(orfao, 'w') as f:
+            f.write(json.dumps(['auditoria_sistema', [1, 'login', None, None, None, None, None, None,
+                                                      '2025-01-01 10:00:00']]) + '\n')
+
+        with patch.object(sink, '_inserir', side_effect=RuntimeError('conexão recusada')), \
+                patch.object(db_manager, 'health_check', return_value=False):
+            assert sink.recuperar() == 0
+        assert os.path.exists(orfao)
+        assert not os.path.exists(os.path.join(spill, 'audit-rejeitados.jsonl'))
+        assert sink._spill_pendente is True
+
+        assert sink.recuperar() == 1
+        assert not os.path.exists(orfao)
+        assert self.contar(db_manager, 'auditoria_sistema') == 1
@@ -0,0 +1,146 @@
+import pytest
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_service import (
+    AuthService, SenhaHasher, CredenciaisInvalidas, UsuarioBloqueado,
+    AutenticacaoSobrecarregada, hash_senha, custo_hash
+)
+
+
+class TestAuthService:
+    """Testes para a autenticação contra a tabela usuarios"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """Usuário analista dos testes de login"""
+        db_manager.run(
+            "INSERT INTO usuarios (nome, email, senha, tipo) VALUES (?, ?, ?, ?)",
+            ('Ana Analista', 'ana@nimoenergia.com.br', hash_senha('correta', 4), 'analista')
+        )
+        return db_manager
+
+    def _usuario(self, db_manager):
+        return db_manager.run(
+            "SELECT senha, tentativas_login, bloqueado_ate FROM usuarios WHERE email = ?",
+            ('ana@nimoenergia.com.br',),
+            fetch=True
+        )[0]
+
+    def test_login_opens_session(self, db_manager):
+        """Teste de login válido com sessão registrada"""
+        service = AuthService(db_manager, SenhaHasher(rounds=4, max_workers=1))
+        usuario = service.autenticar('ana@nimoenergia.com.br', 'correta', ip_address='10.0.0.1')
+
+        assert usuario['tipo'] == 'analista'
+        sessoes = db_manager.run("SELECT usuario_id, ativo FROM sessoes_usuario WHERE id = ?",
+                                 (usuario['sid'],), fetch=True)
+        assert sessoes == [{'usuario_id': usuario['id'], 'ativo': 1}]
+
+    def test_unknown_user_rejected(self, db_manager):
+        """Teste de usuário inexistente"""
+        service = AuthService(db_manager, SenhaHasher(rounds=4, max_workers=1))
+        with pytest.raises(CredenciaisInvalidas):
+            service.autenticar('ninguem@nimoenergia.com.br', 'correta')
+
+    def test_lockout_after_failures(self, db_manager):
+        """Teste de bloqueio após o limite de tentativas"""
+        service = AuthService(db_manager, SenhaHasher(rounds=4, max_workers=1), max_tentativas=3)
+        for _ in range(3):
+            with pytest.raises(CredenciaisInvalidas):
+                service.autenticar('ana@nimoenergia.com.br', 'errada')
+
+        assert self._usuario(db_manager)['tentativas_login'] == 3
+        with pytest.raises(UsuarioBloqueado):
+            service.autenticar('ana@nimoenergia.com.br', 'correta')
+        # Senha errada durante o bloqueio: mesma resposta de credenciais inválidas, sem contar
+        with pytest.raises(CredenciaisInvalidas):
+            service.autenticar('ana@nimoenergia.com.br', 'errada')
+        assert self._usuario(db_manager)['tentativas_login'] == 3
+
+    def test_expired_lockout_restarts_count(self, db_manager):
+        """Teste de nova contagem de tentativas depois de um bloqueio vencido"""
+        service = AuthService(db_manager, SenhaHasher(rounds=4, max_workers=1), max_tentativas=3)
+        db_manager.run("UPDATE usuarios SET tentativas_login = 3, bloqueado_ate = ? WHERE email = ?",
+                       ('2000-01-01 00:00:00', 'ana@nimoenergia.com.br'))
+
+        with pytest.raises(CredenciaisInvalidas):
+            service.autenticar('ana@nimoenergia.com.br', 'errada')
+        usuario = self._usuario(db_manager)
+        assert (usuario['tentativas_login'], usuario['bloqueado_ate']) == (1, None)
+
+        with pytest.raises(CredenciaisInvalidas):
+            service.autenticar('ana@nimoenergia.com.br', 'errada')
+        assert self._usuario(db_manager)['tentativas_login'] == 2
+        with pytest.raises(CredenciaisInvalidas):
+            service.autenticar('ana@nimoenergia.com.br', 'errada')
+        with pytest.raises(UsuarioBloqueado):
+            service.autenticar('ana@nimoenergia.com.br', 'correta')
+
+    def test_dummy_hash_built_in_pool(self, db_manager):
+        """Teste do hash fictício gerado pelo pool limitado, uma única vez"""
+        hasher = SenhaHasher(rounds=4, max_workers=1)
+        service = AuthService(db_manager, hasher)
+        with patch.object(hasher, 'gerar', wraps=hasher.gerar) as gerar:
+            for _ in range(2):
+                with pytest.raises(CredenciaisInvalidas):
+                    service.autenticar('ninguem@nimoenergia.com.br', 'correta')
+        gerar.assert_called_once()
+
+    def test_success_resets_counters(self, db_manager):
+        """Teste de zeragem das tentativas após login válido"""
+        service = AuthService(db_manager, SenhaHasher(rounds=4, max_workers=1))
+        with pytest.raises(CredenciaisInvalidas):
+            service.autenticar('ana@nimoenergia.com.br', 'errada')
+        service.autenticar('ana@nimoenergia.com.br', 'correta')
+
+        usuario = self._usuario(db_manager)
+        assert usuario['tentativas_login'] == 0
+        assert usuario['bloqueado_ate'] is None
+
+    def test_rehash_on_higher_work_factor(self, db_manager):
+        """Teste de atualização transparente do fator de custo"""
+        service = AuthService(db_manager, SenhaHasher(rounds=5, max_workers=1))
+        service.autenticar('ana@nimoenergia.com.br', 'correta')
+
+        assert custo_hash(self._usuario(db_manager)['senha']) == 5
+        service.autenticar('ana@nimoenergia.com.br', 'correta')
+
+    def test_legacy_plaintext_upgraded(self, db_manager):
+        """Teste de migração de senha sem hash no primeiro login"""
+        db_manager.run("UPDATE usuarios SET senha = ? WHERE email = ?", ('legada', 'ana@nimoenergia.com.br'))
+        service = AuthService(db_manager, SenhaHasher(rounds=4, max_workers=1))
+        service.autenticar('ana@nimoenergia.com.br', 'legada')
+
+        assert custo_hash(self._usuario(db_manager)['senha']) == 4
+
+    def test_hasher_queue_limit(self):
+        """Teste de recusa imediata com a fila de verificação cheia"""
+        hasher = SenhaHasher(rounds=4, max_workers=1, max_queue=0)
+        liberar = threading.Event()
+        iniciou = threading.Event()
+
+        def lento(*args):
+            iniciou.set()
+            liberar.wait(5)
+            return True
+
+        thread = threading.Thread(target=hasher._executar, args=(lento,))
+        thread.start()
+        iniciou.wait(5)
+        try:
+            with pytest.raises(AutenticacaoSobrecarregada):
+                hasher.verificar('senha', hash_senha('senha', 4))
+        finally:
+            liberar.set()
+            thread.join()
+        assert hasher.verificar('senha', hash_senha('senha', 4))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,142 @@
+import pytest
+import os
+import sys
+from contextlib import contextmanager
+from unittest.mock import patch
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+from benchmarks.ambiente import semear
+from benchmarks.gerador import GeradorDados, cnpj
+from benchmarks.baseline import comparar
+from benchmarks.carga import percentil, resumir
+
+
+class TestBenchmarks:
+    """Testes das ferramentas de benchmark (não medem desempenho)"""
+
+    def test_percentil_nearest_rank(self):
+        """Percentis pelo método nearest-rank"""
+        valores = list(range(1, 101))
+        assert percentil(valores, 50) == 50
+        assert percentil(valores, 95) == 95
+        assert percentil(valores, 99) == 99
+        assert percentil([7], 99) == 7
+        assert percentil([], 50) is None
+
+    def test_resumir(self):
+        """Latências em ms, vazão pela duração e erros por endpoint"""
+        resumo = resumir({'health': ([0.003, 0.001, 0.002], 1)}, duracao=2.0)
+        assert resumo['health'] == {
+            'requisicoes': 4, 'erros': 1, 'rps': 2.0, 'p50_ms': 2.0, 'p95_ms': 3.0, 'p99_ms': 3.0
+        }
+
+    def test_comparar_com_baseline(self):
+        """Regressões acima da tolerância; melhorias e casos novos não falham"""
+        baseline = {
+            'micro': {'require_auth': {'por_operacao_us': 10.0}, 'json': {'por_operacao_us': 100.0}},
+            'carga': {'health': {'p95_ms': 10.0, 'rps': 100.0, 'requisicoes': 1000, 'erros': 0}},
+        }
+        resultado = {
+            'micro': {'require_auth': {'por_operacao_us': 12.0}, 'json': {'por_operacao_us': 50.0},
+                      'novo': {'por_operacao_us': 1.0}},
+            'carga': {'health': {'p95_ms': 12.4, 'rps': 80.0, 'requisicoes': 800, 'erros': 0}},
+        }
+        assert comparar(resultado, baseline, tolerancia=0.25) == []
+
+        resultado['micro']['require_auth']['por_operacao_us'] = 13.0
+        resultado['carga']['health'].update(p95_ms=20.0, rps=70.0, erros=50)
+        regressoes = comparar(resultado, baseline, tolerancia=0.25)
+        assert len(regressoes) == 4
+        assert regressoes[0].startswith('micro require_auth')
+        assert all(regressao.startswith('carga health') for regressao in regressoes[1:])
+
+    def test_cnpj_valido(self):
+        """Dígitos verificadores calculados pelo algoritmo da Receita"""
+        assert cnpj(11222333) == '11.222.333/0001-81'
+        assert cnpj(11444777) == '11.444.777/0001-61'
+
+
+class TestGeradorDados:
+    """Testes do gerador de dados sintéticos"""
+
+    @contextmanager
+    def banco(self, caminho):
+        """Banco SQLite isolado em `caminho`"""
+        with patch.dict(os.environ, {'DATABASE_TYPE': 'sqlite', 'DATABASE_PATH': str(caminho),
+                                     'AUTH_BCRYPT_ROUNDS': '4'}):
+            db_manager = DatabaseManager()
+            yield db_manager
+            db_manager.close_pool()
+
+    def gerar(self, db_manager, seed=7):
+        return GeradorDados(db_manager, seed=seed, lote=200).gerar(
+            transportadoras=30, documentos=600, historico=200, notificacoes=100, auditoria=50, uploads=5
+        )
+
+    def test_todas_as_tabelas_e_integridade(self, tmp_path):
+        """Todas as tabelas recebem linhas; FKs e cadeias de versões são válidas"""
+        with self.banco(tmp_path / 'dados.db') as db_manager:
+            self.verificar_carga(db_manager)
+
+    def verificar_carga(self, db_manager):
+        contagem = self.gerar(db_manager)
+        assert contagem['transportadoras'] == 30
+        assert contagem['documentos'] == 600
+        # O histórico de um documento é gravado inteiro: até 2 eventos além do pedido
+        assert 200 <= contagem['historico_documentos'] <= 202
+        assert contagem['notificacoes'] == 100
+        tabelas = [row['name'] for row in db_manager.run(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE TABLE%'", fetch=True
+        )]
+        for tabela in tabelas:
+            assert db_manager.run(f"SELECT COUNT(*) AS total FROM {tabela}", fetch=True)[0]['total'] > 0, tabela
+
+        assert db_manager.run("PRAGMA foreign_key_check", fetch=True) == []
+        # Índices suspensos durante a carga foram recriados
+        indices = db_manager.run("SELECT name FROM sqlite_master WHERE type = 'index'", fetch=True)
+        assert 'idx_documentos_hash_unico' in {row['name'] for row in indices}
+        inconsistentes = db_manager.run(
+            """SELECT COUNT(*) AS total FROM documentos d JOIN documentos a ON a.id = d.documento_anterior_id
+               WHERE a.versao_documento != d.versao_documento - 1 OR a.transportadora_id != d.transportadora_id
+                  OR a.tipo_documento_id != d.tipo_documento_id OR a.data_upload >= d.data_upload""", fetch=True
+        )[0]['total']
+        assert inconsistentes == 0
+        assert db_manager.run(
+            "SELECT COUNT(*) AS total FROM documentos WHERE versao_documento > 1 AND documento_anterior_id IS NULL",
+            fetch=True
+        )[0]['total'] == 0
+
+        # Vencidos só com vencimento no passado; vigentes vencem no futuro
+        vencidos = db_manager.run(
+            """SELECT COUNT(*) AS total FROM documentos
+               WHERE status = 'vencido' AND (data_vencimento IS NULL OR data_vencimento >= '2025-01-01')""",
+            fetch=True
+        )[0]['total']
+        assert vencidos == 0
+        resumo = db_manager.run("SELECT SUM(total) AS total FROM dashboard_resumo", fetch=True)[0]['total']
+        assert resumo == 600
+
+        with pytest.raises(RuntimeError):
+            self.gerar(db_manager)
+
+    def test_deterministico(self, tmp_path):
+        """Mesma semente, mesmas linhas; outra semente, outras linhas"""
+        consulta = """SELECT d.numero_protocolo, t.cnpj, d.status, d.data_vencimento, d.hash_arquivo,
+                             d.documento_anterior_id
+                      FROM documentos d JOIN transportadoras t ON t.id = d.transportadora_id ORDER BY d.id"""
+        conteudos = []
+        for nome, seed in (('a.db', 7), ('b.db', 7), ('c.db', 8)):
+            with self.banco(tmp_path / nome) as db_manager:
+                self.gerar(db_manager, seed)
+                conteudos.append(db_manager.run(consulta, fetch=True))
+        assert conteudos[0] == conteudos[1]
+        assert conteudos[0] != conteudos[2]
+
+    def test_semear_reaproveita_banco(self, tmp_path):
+        """O banco de benchmark já semeado não é carregado de novo"""
+        with self.banco(tmp_path / 'bench.db') as db_manager:
+            assert semear(db_manager, transportadoras=10, documentos=100, seed=3)['documentos'] == 100
+            assert semear(db_manager, transportadoras=10, documentos=100, seed=3) is None
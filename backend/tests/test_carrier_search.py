@@ -0,0 +1,117 @@
+import pytest
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_service import FiltroInvalido
+from carrier_search import CarrierSearch, digitos
+from sql_dialect import compile_sql
+
+TRANSPORTADORAS = [
+    ('11.222.333/0001-81', 'Transportes São João Ltda', 'Expresso Joanino', 'São Paulo', 'SP', 'APROVADO'),
+    ('11.222.444/0001-02', 'Silva Logística ME', 'Rápido Silva', 'Campinas', 'SP', 'APROVADO'),
+    ('22.333.444/0001-55', 'Transportadora Paulista SA', None, 'Curitiba', 'PR', 'PENDENTE'),
+    ('123.456.789-09', 'José da Silva', 'Silva Fretes', 'Joinville', 'SC', 'APROVADO'),
+]
+
+
+class TestCarrierSearch:
+    """Testes para a busca indexada de transportadoras"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """Transportadoras para a busca"""
+        db_manager.bulk_insert(
+            'transportadoras',
+            ('cnpj', 'razao_social', 'nome_fantasia', 'endereco_cidade', 'endereco_estado', 'status_cadastro'),
+            TRANSPORTADORAS
+        )
+        return db_manager
+
+    @pytest.fixture
+    def busca(self, db_manager):
+        return CarrierSearch(db_manager, default_limit=10)
+
+    def nomes(self, resultado):
+        return [row['razao_social'] for row in resultado['transportadoras']]
+
+    def test_digitos(self):
+        """Teste da normalização de CNPJ/CPF"""
+        assert digitos('11.222.333/0001-81') == '11222333000181'
+        assert digitos(None) == ''
+
+    def test_busca_por_nome_prefixo_e_acento(self, busca):
+        """Termos parciais, sem acento, em qualquer coluna e em qualquer ordem"""
+        assert self.nomes(busca.buscar('sao joao')) == ['Transportes São João Ltda']
+        # "paul" também casa a cidade São Paulo, que pesa menos que a razão social
+        assert self.nomes(busca.buscar('transp paul')) == ['Transportadora Paulista SA', 'Transportes São João Ltda']
+        assert self.nomes(busca.buscar('logistica')) == ['Silva Logística ME']
+        assert self.nomes(busca.buscar('curitiba')) == ['Transportadora Paulista SA']
+        assert busca.buscar('inexistente')['transportadoras'] == []
+        # Operadores FTS digitados pelo usuário são tratados como texto
+        assert busca.buscar('silva" OR "x')['transportadoras'] == []
+
+    def test_ranking_e_filtros(self, busca):
+        """Razão social pesa mais que nome fantasia; filtros por UF e status"""
+        resultado = self.nomes(busca.buscar('silva'))
+        assert set(resultado) == {'Silva Logística ME', 'José da Silva'}
+        assert self.nomes(busca.buscar('silva', {'uf': 'SC'})) == ['José da Silva']
+        assert self.nomes(busca.buscar('transp', {'status': 'PENDENTE'})) == ['Transportadora Paulista SA']
+
+    def test_busca_por_cnpj_com_ou_sem_mascara(self, busca):
+        """Prefixo de CNPJ/CPF digitado com ou sem pontuação"""
+        assert self.nomes(busca.buscar('11222')) == ['Transportes São João Ltda', 'Silva Logística ME']
+        assert self.nomes(busca.buscar('11.222.444')) == ['Silva Logística ME']
+        assert self.nomes(busca.buscar('123.456.789-09')) == ['José da Silva']
+
+    def test_cnpj_usa_indice(self, db_manager, busca):
+        """A busca por dígitos é um intervalo no índice de cnpj_digitos"""
+        sql, params = busca.montar_query('11222', {}, 10)
+        plano = db_manager.run(f"EXPLAIN QUERY PLAN {sql}", params, fetch=True)
+        assert any('idx_transportadoras_cnpj_digitos' in row['detail'] for row in plano)
+
+    def test_cnpj_prefixo_por_dialeto(self):
+        """Prefixo por LIKE no MySQL e PostgreSQL (intervalo dependeria da collation)"""
+        for db_type, placeholder in (('mysql', '%s'), ('postgresql', '%s'), ('sqlite', '?')):
+            busca = CarrierSearch(MagicMock(db_type=db_type))
+            sql, params = busca.montar_query('11.222', {'uf': 'SP'}, 10)
+            compilado = compile_sql(sql, db_type)
+            if db_type == 'sqlite':
+                assert f't.cnpj_digitos >= {placeholder} AND t.cnpj_digitos < {placeholder}' in compilado
+                assert params == ('11222', '11222:', 'SP', 10, 0)
+            else:
+                assert f't.cnpj_digitos LIKE {placeholder} AND t.endereco_estado = {placeholder}' in compilado
+                assert params == ('11222%', 'SP', 10, 0)
+
+    def test_paginacao(self, busca):
+        """Páginas por limit/offset com indicação da próxima"""
+        primeira = busca.buscar('silva', limite=1)
+        assert primeira['quantidade'] == 1 and primeira['proximo_offset'] == 1
+        segunda = busca.buscar('silva', limite=1, offset=1)
+        assert segunda['proximo_offset'] is None
+        assert self.nomes(primeira) != self.nomes(segunda)
+
+    def test_indice_acompanha_alteracoes(self, db_manager, busca):
+        """Triggers mantêm o FTS; reconstruir_indice() cobre linhas anteriores"""
+        db_manager.run("UPDATE transportadoras SET razao_social = ? WHERE cnpj = ?",
+                       ('Nova Era Cargas', '22.333.444/0001-55'))
+        db_manager.run("DELETE FROM transportadoras WHERE cnpj = ?", ('11.222.444/0001-02',))
+        assert self.nomes(busca.buscar('nova era')) == ['Nova Era Cargas']
+        assert busca.buscar('paulista')['transportadoras'] == []
+        assert self.nomes(busca.buscar('silva')) == ['José da Silva']
+
+        db_manager.run("INSERT INTO transportadoras_busca (transportadoras_busca) VALUES ('delete-all')")
+        assert busca.buscar('silva')['transportadoras'] == []
+        busca.reconstruir_indice()
+        assert self.nomes(busca.buscar('silva')) == ['José da Silva']
+
+    def test_parametros_invalidos(self, busca):
+        """Validação dos parâmetros de query"""
+        assert busca.parse_busca({'q': ' silva ', 'uf': 'sp'}) == ('silva', {'uf': 'SP'}, 10, 0)
+        for args in ({'q': 'a'}, {'q': 'silva', 'uf': 'SPP'}, {'q': 'silva', 'status': 'x'},
+                     {'q': 'silva', 'limit': '0'}, {'q': 'silva', 'offset': '-1'}, {'q': 'silva', 'limit': 'x'}):
+            with pytest.raises(FiltroInvalido):
+                busca.parse_busca(args)
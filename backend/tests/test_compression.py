@@ -0,0 +1,97 @@
+import gzip
+import os
+import sys
+
+import pytest
+from flask import Flask, Response, jsonify, request
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import ResponseCompressor
+
+
+class TestResponseCompressor:
+    """Testes da compressão negociada das respostas"""
+
+    @pytest.fixture
+    def app(self):
+        app = Flask(__name__)
+        compressor = ResponseCompressor(tamanho_minimo=100)
+        fechados = []
+        app.fechados = fechados
+
+        @app.after_request
+        def comprimir(response):
+            return compressor.aplicar(request, response)
+
+        @app.route('/grande')
+        def grande():
+            response = jsonify(itens=['documento'] * 100)
+            response.set_etag('abc')
+            return response.make_conditional(request)
+
+        @app.route('/pequeno')
+        def pequeno():
+            return jsonify(ok=True)
+
+        @app.route('/fluxo')
+        def fluxo():
+            def gerar():
+                try:
+                    for i in range(50):
+                        yield b'{"linha":%d}\n' % i
+                finally:
+                    fechados.append(True)
+            return Response(gerar(), mimetype='application/json')
+
+        @app.route('/pdf')
+        def pdf():
+            return Response(b'%PDF' * 100, mimetype='application/pdf')
+
+        return app
+
+    def test_gzip_acima_do_limite(self, app):
+        """Corpo grande comprimido, ETag fraco e Vary"""
+        response = app.test_client().get('/grande', headers={'Accept-Encoding': 'gzip, deflate'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.headers['ETag'] == 'W/"abc"'
+        assert int(response.headers['Content-Length']) == len(response.data)
+        assert gzip.decompress(response.data).startswith(b'{"itens":["documento"')
+
+        # O ETag fraco continua válido no If-None-Match
+        response = app.test_client().get(
+            '/grande', headers={'Accept-Encoding': 'gzip', 'If-None-Match': 'W/"abc"'}
+        )
+        assert response.status_code == 304
+
+    def test_sem_compressao(self, app):
+        """Abaixo do limite, sem Accept-Encoding, gzip recusado ou tipo já comprimido"""
+        cliente = app.test_client()
+        response = cliente.get('/pequeno', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.headers['Vary'] == 'Accept-Encoding'
+
+        response = cliente.get('/grande')
+        assert 'Content-Encoding' not in response.headers
+        assert response.headers['ETag'] == '"abc"'
+
+        assert 'Content-Encoding' not in cliente.get('/grande', headers={'Accept-Encoding': 'gzip;q=0'}).headers
+        assert 'Content-Encoding' not in cliente.get('/pdf', headers={'Accept-Encoding': 'gzip'}).headers
+
+    def test_streaming(self, app):
+        """Resposta em streaming comprimida pedaço a pedaço, sem Content-Length"""
+        response = app.test_client().get('/fluxo', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        texto = gzip.decompress(response.data)
+        assert texto.count(b'\n') == 50 and texto.endswith(b'{"linha":49}\n')
+        assert app.fechados == [True]
+
+    def test_brotli(self, app):
+        """br tem preferência quando o módulo brotli está instalado"""
+        brotli = pytest.importorskip('brotli')
+        response = app.test_client().get('/grande', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.data).startswith(b'{"itens"')
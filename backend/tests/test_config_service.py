@@ -0,0 +1,100 @@
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_service import ConfigService, converter_valor
+from sql_dialect import compile_sql
+
+
+class TestConfigService:
+    """Testes para as configurações tipadas em memória"""
+
+    @pytest.fixture
+    def config(self, db_manager):
+        config = ConfigService(db_manager, intervalo=0)
+        yield config
+        config.stop()
+
+    def test_converter_valor(self):
+        """Teste da conversão por tipo_valor"""
+        assert converter_valor(' 50 ', 'integer') == 50
+        assert converter_valor('Sim', 'boolean') is True
+        assert converter_valor('false', 'boolean') is False
+        assert converter_valor('{"a": [1, 2]}', 'json') == {'a': [1, 2]}
+        assert converter_valor('30,15', 'string') == '30,15'
+        with pytest.raises(ValueError):
+            converter_valor('talvez', 'boolean')
+        with pytest.raises(ValueError):
+            converter_valor('abc', 'integer')
+
+    def test_valores_tipados_lidos_uma_vez(self, db_manager, config):
+        """A tabela é lida na primeira consulta e servida da memória"""
+        with patch.object(db_manager, 'transaction', wraps=db_manager.transaction) as transaction:
+            assert config.obter('tamanho_maximo_arquivo') == 50
+            assert config.obter('compliance_minimo') == 80
+            assert config.obter('aprovacao_automatica') is False
+            assert config.obter('inexistente', 'padrao') == 'padrao'
+            assert config.todas()['sistema_nome'] == 'Portal NIMOENERGIA'
+            assert transaction.call_count == 1
+
+    def test_sincronizacao_incremental(self, db_manager, config):
+        """Alterações de outro processo são relidas só pelas linhas novas"""
+        config.obter('sistema_nome')
+        db_manager.run("UPDATE configuracoes SET data_atualizacao = ?", ('2024-12-31 00:00:00',))
+        db_manager.run("UPDATE configuracoes SET data_atualizacao = ? WHERE chave = ?",
+                       ('2025-01-01 00:00:00', 'sistema_nome'))
+        config.sincronizar()
+        # Marca estável (no passado): a detecção de mudança basta
+        assert config.sincronizar() == 0
+
+        db_manager.run("UPDATE configuracoes SET valor = ? WHERE chave = ?", ('true', 'aprovacao_automatica'))
+        db_manager.run(
+            "INSERT INTO configuracoes (chave, valor, tipo_valor) VALUES (?, ?, ?)",
+            ('limites', '{"documentos": 10}', 'json')
+        )
+        # Linhas da marca (mesmo segundo) + a alterada + a nova
+        assert config.sincronizar() == 3
+        assert config.obter('aprovacao_automatica') is True
+        assert config.obter('limites') == {'documentos': 10}
+        assert config.obter('compliance_minimo') == 80
+
+    def test_remocao_e_valor_invalido(self, db_manager, config):
+        """Chaves removidas somem; valores inválidos não derrubam a leitura"""
+        config.obter('sistema_nome')
+        db_manager.run("DELETE FROM configuracoes WHERE chave = ?", ('backup_automatico',))
+        db_manager.run("UPDATE configuracoes SET valor = ? WHERE chave = ?", ('muito', 'compliance_minimo'))
+        config.sincronizar()
+        assert config.obter('backup_automatico') is None
+        assert config.obter('compliance_minimo', 75) == 75
+        assert config.obter('tamanho_maximo_arquivo') == 50
+
+    def test_definir_atualiza_processo_e_demais(self, db_manager, config):
+        """definir() grava com o tipo cadastrado e outro processo converge"""
+        outro = ConfigService(db_manager, intervalo=0)
+        assert outro.obter('tamanho_maximo_arquivo') == 50
+
+        config.definir('tamanho_maximo_arquivo', 20)
+        assert config.obter('tamanho_maximo_arquivo') == 20
+        row = db_manager.run("SELECT valor, tipo_valor FROM configuracoes WHERE chave = ?",
+                             ('tamanho_maximo_arquivo',), fetch=True)[0]
+        assert row == {'valor': '20', 'tipo_valor': 'integer'}
+
+        outro.sincronizar()
+        assert outro.obter('tamanho_maximo_arquivo') == 20
+
+    def test_definir_usa_relogio_do_banco(self, db_manager, config):
+        """definir() grava data_atualizacao pelo relógio do banco, como os demais gravadores"""
+        antes = db_manager.run("SELECT CURRENT_TIMESTAMP AS agora", fetch=True)[0]['agora']
+        with patch.object(db_manager, 'run', wraps=db_manager.run) as run:
+            config.definir('tamanho_maximo_arquivo', 30)
+        sql, params = run.call_args_list[0].args
+        assert len(params) == 4
+        assert 'data_atualizacao = CURRENT_TIMESTAMP' in compile_sql(sql, 'mysql')
+        depois = db_manager.run("SELECT CURRENT_TIMESTAMP AS agora", fetch=True)[0]['agora']
+        gravado = db_manager.run("SELECT data_atualizacao FROM configuracoes WHERE chave = ?",
+                                 ('tamanho_maximo_arquivo',), fetch=True)[0]['data_atualizacao']
+        assert antes <= gravado <= depois
@@ -0,0 +1,172 @@
+import pytest
+import os
+import sys
+import sqlite3
+import threading
+import time
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_pool import ConnectionPool, PoolTimeoutError, PoolClosedError
+
+
+class TestConnectionPool:
+    """Testes para o pool de conexões"""
+
+    @pytest.fixture
+    def factory(self, tmp_path):
+        """Fábrica de conexões SQLite em arquivo temporário"""
+        db_path = str(tmp_path / 'pool.db')
+        return lambda: sqlite3.connect(db_path, check_same_thread=False)
+
+    def test_connection_is_reused(self, factory):
+        """Teste de reutilização da conexão física"""
+        pool = ConnectionPool(factory, max_size=2)
+        conn = pool.acquire()
+        raw = conn.raw
+        conn.close()
+
+        conn = pool.acquire()
+        assert conn.raw is raw
+        conn.close()
+        assert pool.stats()['created'] == 1
+
+    def test_proxy_delegates_and_close_is_idempotent(self, factory):
+        """Teste do proxy de conexão emprestada"""
+        pool = ConnectionPool(factory, max_size=1)
+        conn = pool.acquire()
+        assert conn.execute('SELECT 1').fetchone() == (1,)
+        conn.close()
+        conn.close()
+        assert pool.stats()['idle'] == 1
+        with pytest.raises(PoolClosedError):
+            conn.cursor()
+
+    def test_bounded_size_and_checkout_timeout(self, factory):
+        """Teste de limite de tamanho e timeout de empréstimo"""
+        pool = ConnectionPool(factory, max_size=1)
+        conn = pool.acquire()
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire(timeout=0.05)
+        assert pool.stats()['timeouts'] == 1
+        conn.close()
+
+    def test_waiter_receives_released_connection(self, factory):
+        """Teste de espera por conexão devolvida por outra thread"""
+        pool = ConnectionPool(factory, max_size=1)
+        conn = pool.acquire()
+
+        def release_later():
+            time.sleep(0.05)
+            conn.close()
+
+        thread = threading.Thread(target=release_later)
+        thread.start()
+        other = pool.acquire(timeout=2)
+        thread.join()
+        stats = pool.stats()
+        assert stats['in_use'] == 1
+        assert stats['wait_time_max_ms'] > 0
+        other.close()
+
+    def test_max_lifetime_recycles_connection(self, factory):
+        """Teste de reciclagem por tempo máximo de vida"""
+        pool = ConnectionPool(factory, max_size=1, max_lifetime=0.01)
+        conn = pool.acquire()
+        raw = conn.raw
+        time.sleep(0.02)
+        conn.close()
+
+        conn = pool.acquire()
+        assert conn.raw is not raw
+        conn.close()
+        assert pool.stats()['created'] == 2
+
+    def test_invalid_connection_is_discarded_on_borrow(self, factory):
+        """Teste de validação de saúde no empréstimo"""
+        def validator(raw):
+            raw.execute('SELECT 1')
+
+        pool = ConnectionPool(factory, max_size=1, ping_interval=0, validator=validator)
+        conn = pool.acquire()
+        raw = conn.raw
+        conn.close()
+        raw.close()
+
+        conn = pool.acquire()
+        assert conn.raw is not raw
+        conn.close()
+        assert pool.stats()['discarded'] == 1
+
+    def test_factory_error_frees_slot(self):
+        """Teste de falha na abertura da conexão"""
+        def failing_factory():
+            raise RuntimeError("Connection failed")
+
+        pool = ConnectionPool(failing_factory, max_size=1)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                pool.acquire(timeout=0.05)
+        assert pool.stats()['size'] == 0
+
+    def test_fork_resets_inherited_state(self, factory):
+        """Teste de descarte do estado herdado após fork"""
+        pool = ConnectionPool(factory, max_size=1)
+        pool.acquire().close()
+        pool._pid = -1  # simula um processo filho
+
+        conn = pool.acquire()
+        stats = pool.stats()
+        assert stats['created'] == 1
+        assert stats['in_use'] == 1
+        conn.close()
+
+    def test_connection_borrowed_before_fork_not_reused(self, factory):
+        """Teste de conexão emprestada antes do fork e devolvida no processo filho"""
+        pool = ConnectionPool(factory, max_size=2)
+        herdada = pool.acquire()
+        raw = herdada.raw
+        pool._reset_after_fork()  # o que register_at_fork faz no processo filho
+
+        herdada.close()
+        stats = pool.stats()
+        assert (stats['size'], stats['in_use'], stats['idle']) == (0, 0, 0)
+
+        conn = pool.acquire()
+        assert conn.raw is not raw
+        conn.close()
+        assert pool.stats()['idle'] == 1
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason="requer os.fork")
+    def test_release_in_forked_child(self, factory):
+        """Teste com fork real: a conexão do pai não entra na fila do filho"""
+        pool = ConnectionPool(factory, max_size=2)
+        herdada = pool.acquire()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                herdada.close()
+                stats = pool.stats()
+                if (stats['size'], stats['in_use'], stats['idle']) == (0, 0, 0):
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        herdada.close()
+        assert pool.stats()['idle'] == 1
+
+    def test_close_pool(self, factory):
+        """Teste de encerramento do pool"""
+        pool = ConnectionPool(factory, max_size=2)
+        pool.acquire().close()
+        pool.close()
+        assert pool.stats()['idle'] == 0
+        with pytest.raises(PoolClosedError):
+            pool.acquire()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
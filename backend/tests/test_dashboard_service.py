@@ -0,0 +1,81 @@
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard_service import DashboardService
+
+
+class TestDashboardService:
+    """Testes para os agregados do dashboard"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """Duas transportadoras, uma delas inativa"""
+        db_manager.run_many(
+            "INSERT INTO transportadoras (id, cnpj, razao_social, ativo) VALUES (?, ?, ?, ?)",
+            [(1, '11.111.111/0001-11', 'Silva Transportes', True),
+             (2, '22.222.222/0001-22', 'Rápido Sul', False)]
+        )
+        return db_manager
+
+    def _inserir_documento(self, tx, protocolo, transportadora_id, status):
+        tx.run(
+            """INSERT INTO documentos (numero_protocolo, transportadora_id, tipo_documento_id, usuario_upload_id,
+                                       nome_arquivo_original, nome_arquivo_sistema, caminho_arquivo,
+                                       tamanho_arquivo, hash_arquivo, status)
+               VALUES (?, ?, 1, 1, 'doc.pdf', 'doc.pdf', '/tmp/doc.pdf', 10, ?, ?)""",
+            (protocolo, transportadora_id, f'hash-{protocolo}', status)
+        )
+
+    def test_reconciliation_rebuilds_summary(self, db_manager):
+        """Teste de reconstrução do resumo a partir de documentos"""
+        with db_manager.transaction() as tx:
+            self._inserir_documento(tx, 'P1', 1, 'pendente')
+            self._inserir_documento(tx, 'P2', 1, 'aprovado')
+            self._inserir_documento(tx, 'P3', 2, 'aprovado')
+
+        service = DashboardService(db_manager)
+        service.reconciliar()
+        resumo = service.resumo()
+        assert resumo['total_documentos'] == 3
+        assert resumo['documentos_aprovados'] == 2
+        assert resumo['transportadoras_total'] == 2
+        assert resumo['transportadoras_ativas'] == 1
+        assert service.resumo(transportadora_id=2)['documentos_aprovados'] == 1
+
+    def test_transition_updates_summary_incrementally(self, db_manager):
+        """Teste de atualização incremental a cada transição de status"""
+        service = DashboardService(db_manager)
+        with db_manager.transaction() as tx:
+            self._inserir_documento(tx, 'P1', 1, 'pendente')
+            service.registrar_transicao(tx, 1, None, 'pendente')
+        with db_manager.transaction() as tx:
+            tx.run("UPDATE documentos SET status = 'aprovado' WHERE numero_protocolo = 'P1'")
+            service.registrar_transicao(tx, 1, 'pendente', 'aprovado')
+
+        resumo = service.resumo(transportadora_id=1)
+        assert resumo['documentos_pendentes'] == 0
+        assert resumo['documentos_aprovados'] == 1
+
+        # O incremental deve coincidir com a reconciliação completa
+        service.reconciliar()
+        assert service.resumo(transportadora_id=1)['documentos_aprovados'] == 1
+
+    def test_reads_are_cached_until_ttl(self, db_manager):
+        """Teste de leitura servida do cache em memória"""
+        service = DashboardService(db_manager, cache_ttl=60)
+        primeiro = service.resumo()
+        with patch.object(db_manager, 'run') as mock_run:
+            assert service.resumo() is primeiro
+            mock_run.assert_not_called()
+
+        service.invalidar()
+        assert service.resumo() is not primeiro
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
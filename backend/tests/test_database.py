@@ -212,6 +212,188 @@ class TestDatabaseManager:
         # Pelo menos uma conexão deve ter funcionado
         assert len(results) > 0
 
+    @pytest.fixture
+    def sqlite_manager(self, tmp_path):
+        """DatabaseManager SQLite em arquivo temporário"""
+        with patch.dict(os.environ, {'DATABASE_TYPE': 'sqlite', 'DATABASE_PATH': str(tmp_path / 'test.db')}):
+            db_manager = DatabaseManager()
+            db_manager.execute_query("CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT UNIQUE NOT NULL)")
+            yield db_manager
+            db_manager.close_pool()
+
+    def test_transaction_commits_once(self, sqlite_manager):
+        """Teste de unidade de trabalho com vários comandos"""
+        with sqlite_manager.transaction() as tx:
+            tx.execute("INSERT INTO itens (nome) VALUES (?)", ('a',))
+            tx.execute("INSERT INTO itens (nome) VALUES (?)", ('b',))
+            assert len(tx.execute("SELECT * FROM itens", fetch=True)) == 2
+
+        rows = sqlite_manager.execute_query("SELECT nome FROM itens ORDER BY nome", fetch=True)
+        assert [row['nome'] for row in rows] == ['a', 'b']
+
+    def test_transaction_rollback_on_error(self, sqlite_manager):
+        """Teste de rollback da transação inteira em caso de erro"""
+        with pytest.raises(Exception):
+            with sqlite_manager.transaction() as tx:
+                tx.execute("INSERT INTO itens (nome) VALUES (?)", ('a',))
+                tx.execute("INSERT INTO itens (nome) VALUES (?)", ('a',))
+
+        assert sqlite_manager.execute_query("SELECT * FROM itens", fetch=True) == []
+        assert sqlite_manager.pool_stats()['in_use'] == 0
+
+    def test_execute_many_and_bulk_insert(self, sqlite_manager):
+        """Teste de escrita em lote"""
+        count = sqlite_manager.execute_many(
+            "INSERT INTO itens (nome) VALUES (?)", [(f'item{i}',) for i in range(50)]
+        )
+        assert count == 50
+        sqlite_manager.bulk_insert('itens', ['nome'], [(f'lote{i}',) for i in range(25)])
+
+        rows = sqlite_manager.execute_query("SELECT COUNT(*) AS total FROM itens", fetch=True)
+        assert rows[0]['total'] == 75
+        assert sqlite_manager.pool_stats()['created'] == 1
+
+    def test_bulk_insert_rejects_invalid_identifier(self, sqlite_manager):
+        """Teste de validação de identificadores no insert em lote"""
+        with pytest.raises(ValueError):
+            sqlite_manager.bulk_insert('itens; DROP TABLE itens', ['nome'], [('x',)])
+
+    def test_iter_query_streams_in_batches(self, sqlite_manager):
+        """Teste de leitura em streaming com lotes"""
+        sqlite_manager.execute_many(
+            "INSERT INTO itens (nome) VALUES (?)", [(f'item{i:03d}',) for i in range(120)]
+        )
+        rows = sqlite_manager.iter_query("SELECT nome FROM itens ORDER BY nome", batch_size=50)
+
+        first = next(rows)
+        assert first == {'nome': 'item000'}
+        assert sqlite_manager.pool_stats()['in_use'] == 1
+
+        remaining = list(rows)
+        assert len(remaining) == 119
+        assert sqlite_manager.pool_stats()['in_use'] == 0
+
+    def test_iter_query_releases_connection_when_closed_early(self, sqlite_manager):
+        """Teste de devolução da conexão quando o iterador é abandonado"""
+        sqlite_manager.execute_many("INSERT INTO itens (nome) VALUES (?)", [('a',), ('b',)])
+        rows = sqlite_manager.iter_query("SELECT nome FROM itens", batch_size=1)
+        next(rows)
+        rows.close()
+        assert sqlite_manager.pool_stats()['in_use'] == 0
+
+    def test_sqlite_schema_and_sample_data(self, tmp_path):
+        """Teste da estrutura completa SQLite com índices compostos"""
+        with patch.dict(os.environ, {'DATABASE_TYPE': 'sqlite', 'DATABASE_PATH': str(tmp_path / 'schema.db')}):
+            db_manager = DatabaseManager()
+            db_manager.create_tables()
+            db_manager.create_tables()  # idempotente
+            db_manager.insert_sample_data()
+
+            indexes = {row['name'] for row in db_manager.execute_query(
+                "SELECT name FROM sqlite_master WHERE type = 'index'", fetch=True)}
+            assert 'idx_documentos_transportadora_status' in indexes
+            assert 'idx_documentos_vencimento_status' in indexes
+            assert 'idx_documentos_hash_unico' in indexes
+
+            tipos = db_manager.execute_query("SELECT COUNT(*) AS total FROM tipos_documento", fetch=True)
+            assert tipos[0]['total'] == 10
+            db_manager.close_pool()
+
+    def test_sqlite_migrates_existing_tables(self, tmp_path):
+        """Teste de migração de tabelas criadas antes das colunas novas"""
+        import re
+        with patch.dict(os.environ, {'DATABASE_TYPE': 'sqlite', 'DATABASE_PATH': str(tmp_path / 'antigo.db')}):
+            db_manager = DatabaseManager()
+            db_manager.create_tables()
+            conn = db_manager.get_connection()
+            try:
+                conn.execute("PRAGMA foreign_keys = OFF")
+                for tabela, coluna in (('transportadoras', r'cnpj_digitos VARCHAR\(14\) GENERATED.*?STORED,'),
+                                       ('notificacoes', r'proxima_tentativa TIMESTAMP NULL,')):
+                    ddl = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (tabela,)).fetchone()[0]
+                    conn.execute(f"DROP TABLE {tabela}")
+                    conn.execute(re.sub(coluna, '', ddl, flags=re.S))
+                conn.execute("DROP TABLE transportadoras_busca")
+                conn.execute("INSERT INTO transportadoras (cnpj, razao_social) VALUES ('12.345.678/0001-90', 'Transportes Antigos')")
+                conn.commit()
+            finally:
+                conn.close()
+
+            db_manager.create_tables()
+            db_manager.create_tables()  # idempotente
+
+            rows = db_manager.execute_query(
+                "SELECT cnpj_digitos FROM transportadoras WHERE cnpj_digitos LIKE '1234%'", fetch=True)
+            assert rows == [{'cnpj_digitos': '12345678000190'}]
+            rows = db_manager.execute_query(
+                "SELECT rowid FROM transportadoras_busca WHERE transportadoras_busca MATCH 'antigos'", fetch=True)
+            assert len(rows) == 1
+            colunas = {row['name'] for row in db_manager.execute_query("PRAGMA table_info(notificacoes)", fetch=True)}
+            assert 'proxima_tentativa' in colunas
+            indexes = {row['name'] for row in db_manager.execute_query(
+                "SELECT name FROM sqlite_master WHERE type = 'index'", fetch=True)}
+            assert {'idx_transportadoras_cnpj_digitos', 'idx_notificacoes_fila'} <= indexes
+            db_manager.close_pool()
+
+    def test_mysql_migration_adds_only_missing(self):
+        """Teste da migração MySQL guiada pelo information_schema"""
+        from database_manager import _MIGRACOES_MYSQL
+        with patch.dict(os.environ, {'DATABASE_TYPE': 'mysql'}):
+            db_manager = DatabaseManager()
+        existentes = {'cnpj_digitos', 'idx_notificacoes_fila'}
+        executadas = []
+
+        def execute_query(query, params=None, fetch=False):
+            if fetch:
+                return [{'1': 1}] if params[1] in existentes else []
+            executadas.append(query)
+
+        with patch.object(db_manager, 'execute_query', side_effect=execute_query):
+            db_manager._migrar_mysql()
+
+        esperadas = [f"ALTER TABLE {tabela} {ddl}" for tabela, _, nome, ddl in _MIGRACOES_MYSQL
+                     if nome not in existentes]
+        assert executadas == esperadas
+        assert len(executadas) == 4
+
+    def test_postgresql_migration_creates_search_indexes(self):
+        """Teste da migração PostgreSQL: extensão, coluna e índices da busca"""
+        from contextlib import contextmanager
+        from database_manager import _MIGRACOES_POSTGRESQL
+        with patch.dict(os.environ, {'DATABASE_TYPE': 'postgresql'}):
+            db_manager = DatabaseManager()
+
+        for existe in (False, True):
+            tx = MagicMock()
+            tx.execute.side_effect = lambda query, params=None, fetch=False: (
+                [{'tabela': 'transportadoras' if existe else None}] if fetch else None)
+
+            @contextmanager
+            def transaction():
+                yield tx
+
+            with patch.object(db_manager, 'transaction', transaction):
+                db_manager.create_tables()
+            executados = [chamada.args[0] for chamada in tx.execute.call_args_list if 'to_regclass' not in chamada.args[0]]
+            assert executados == ([comando for _, comando in _MIGRACOES_POSTGRESQL] if existe else [])
+        assert any('pg_trgm' in comando for _, comando in _MIGRACOES_POSTGRESQL)
+
+    def test_sqlite_connection_profile(self, sqlite_manager):
+        """Teste do perfil de PRAGMAs aplicado a cada conexão física"""
+        conn = sqlite_manager.get_connection()
+        try:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2
+            assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+            assert conn.execute('PRAGMA cache_size').fetchone()[0] < 0
+        finally:
+            conn.close()
+
+        result = sqlite_manager.sqlite_checkpoint('truncate')
+        assert result['busy'] == 0
+        with pytest.raises(ValueError):
+            sqlite_manager.sqlite_checkpoint('invalid')
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
 
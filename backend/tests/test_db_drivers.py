@@ -0,0 +1,38 @@
+import pytest
+import os
+import sys
+import sqlite3
+import subprocess
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_drivers import carregar_driver, drivers_carregados
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestDbDrivers:
+    """Testes dos drivers de banco carregados sob demanda"""
+
+    def test_carregar_driver(self):
+        """O módulo do driver é importado uma vez e reaproveitado"""
+        assert carregar_driver('sqlite') is sqlite3
+        assert carregar_driver('sqlite') is sqlite3
+        assert 'sqlite' in drivers_carregados()
+        with pytest.raises(ValueError):
+            carregar_driver('oracle')
+
+    def test_driver_importado_so_ao_conectar(self):
+        """DatabaseManager não importa o driver até abrir a primeira conexão"""
+        codigo = (
+            "import sys\n"
+            "from database_manager import DatabaseManager\n"
+            "manager = DatabaseManager()\n"
+            "assert manager.db_type == 'mysql'\n"
+            "assert not {'mysql.connector', 'psycopg2', 'sqlite3'} & set(sys.modules), sys.modules.keys()\n"
+        )
+        ambiente = {**os.environ, 'DATABASE_TYPE': 'mysql'}
+        resultado = subprocess.run([sys.executable, '-c', codigo], cwd=BACKEND, env=ambiente,
+                                   capture_output=True, text=True, timeout=60)
+        assert resultado.returncode == 0, resultado.stderr
@@ -0,0 +1,102 @@
+import pytest
+import os
+import sys
+import json
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_service import DocumentService, FiltroInvalido, AcessoNegado, codificar_cursor, decodificar_cursor
+
+
+class TestDocumentService:
+    """Testes para a listagem de documentos com paginação por cursor"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """25 documentos em duas transportadoras"""
+        db_manager.run_many(
+            "INSERT INTO transportadoras (id, cnpj, razao_social) VALUES (?, ?, ?)",
+            [(1, '11.111.111/0001-11', 'Silva Transportes'), (2, '22.222.222/0001-22', 'Rápido Sul')]
+        )
+        db_manager.run_many(
+            """INSERT INTO documentos (numero_protocolo, transportadora_id, tipo_documento_id, usuario_upload_id,
+                                       nome_arquivo_original, nome_arquivo_sistema, caminho_arquivo,
+                                       tamanho_arquivo, hash_arquivo, status, data_upload, data_vencimento)
+               VALUES (?, ?, ?, 1, ?, ?, '/tmp/doc', 10, ?, ?, ?, ?)""",
+            [(f'P{i:03d}', 1 + i % 2, 4 if i % 3 == 0 else 1, f'doc{i}.pdf', f'doc{i}.pdf', f'hash{i}',
+              'aprovado' if i % 2 else 'pendente',
+              # Dois documentos por segundo para exercitar o desempate por id
+              f'2024-01-01 10:00:{i // 2:02d}', f'2024-12-{1 + i:02d}')
+             for i in range(25)]
+        )
+        return db_manager
+
+    def _pagina(self, service, args):
+        filtros, cursor, limite = service.parse_filtros(args)
+        return json.loads(b''.join(service.pagina_json(filtros, cursor, limite)))
+
+    def test_keyset_pagination_walks_all_rows_once(self, db_manager):
+        """Teste de paginação completa sem repetições nem lacunas"""
+        service = DocumentService(db_manager)
+        vistos = []
+        args = {'limit': '7'}
+        while True:
+            pagina = self._pagina(service, args)
+            vistos.extend(doc['numero_protocolo'] for doc in pagina['documentos'])
+            if not pagina['proximo_cursor']:
+                break
+            args = {'limit': '7', 'cursor': pagina['proximo_cursor']}
+
+        assert len(vistos) == 25
+        assert vistos == [f'P{i:03d}' for i in reversed(range(25))]
+        assert db_manager.pool_stats()['in_use'] == 0
+
+    def test_filters(self, db_manager):
+        """Teste de filtros por transportadora, status, tipo e vencimento"""
+        service = DocumentService(db_manager)
+        pagina = self._pagina(service, {'transportadora_id': '2', 'status': 'aprovado'})
+        assert pagina['quantidade'] == 12
+        assert all(doc['transportadora_nome'] == 'Rápido Sul' for doc in pagina['documentos'])
+
+        pagina = self._pagina(service, {'tipo': 'SEGURO_RC'})
+        assert {doc['tipo_documento_codigo'] for doc in pagina['documentos']} == {'SEGURO_RC'}
+
+        pagina = self._pagina(service, {'vencimento_de': '2024-12-01', 'vencimento_ate': '2024-12-03'})
+        assert pagina['quantidade'] == 3
+
+    def test_invalid_parameters(self, db_manager):
+        """Teste de validação dos parâmetros"""
+        service = DocumentService(db_manager, max_limit=100)
+        with pytest.raises(FiltroInvalido):
+            service.parse_filtros({'limit': '101'})
+        with pytest.raises(FiltroInvalido):
+            service.parse_filtros({'transportadora_id': 'abc'})
+
+    def test_carrier_users_see_only_their_documents(self, db_manager):
+        """Teste do escopo por transportadora com duas transportadoras"""
+        service = DocumentService(db_manager)
+        silva = {'id': 10, 'tipo': 'transportadora', 'transportadora_id': 1}
+        rapido = {'id': 11, 'tipo': 'transportadora', 'transportadora_id': 2}
+
+        for usuario, esperada, quantidade in ((silva, 'Silva Transportes', 13), (rapido, 'Rápido Sul', 12)):
+            filtros = service.restringir(usuario, service.parse_filtros({'limit': '100'})[0])
+            pagina = json.loads(b''.join(service.pagina_json(filtros, None, 100)))
+            assert pagina['quantidade'] == quantidade
+            assert {doc['transportadora_nome'] for doc in pagina['documentos']} == {esperada}
+
+        assert service.restringir(silva, {'transportadora_id': 1}) == {'transportadora_id': 1}
+        with pytest.raises(AcessoNegado):
+            service.restringir(silva, {'transportadora_id': 2})
+        with pytest.raises(AcessoNegado):
+            service.restringir({'id': 12, 'tipo': 'transportadora', 'transportadora_id': None}, {})
+        assert service.restringir({'id': 1, 'tipo': 'admin'}, {'transportadora_id': 2}) == {'transportadora_id': 2}
+
+    def test_cursor_roundtrip(self):
+        """Teste de codificação do cursor"""
+        token = codificar_cursor('2024-01-01 10:00:00', 42)
+        assert decodificar_cursor(token) == ('2024-01-01 10:00:00', 42)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,148 @@
+import pytest
+import os
+import sys
+from datetime import date, timedelta
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard_service import DashboardService
+from expiry_scanner import ExpiryScanner, dias_aviso, prioridade_aviso
+
+HOJE = date(2025, 6, 10)
+
+
+class TestExpiryScanner:
+    """Testes para a varredura de vencimentos em lote"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """Transportadora com um usuário"""
+        db_manager.run(
+            "INSERT INTO transportadoras (id, cnpj, razao_social) VALUES (?, ?, ?)",
+            (1, '11.111.111/0001-11', 'Silva Transportes')
+        )
+        db_manager.run(
+            "INSERT INTO usuarios (email, senha, nome, tipo, transportadora_id) VALUES (?, ?, ?, ?, ?)",
+            ('ana@silva.com.br', 'x', 'Ana', 'transportadora', 1)
+        )
+        return db_manager
+
+    @pytest.fixture
+    def dashboard(self, db_manager):
+        return DashboardService(db_manager, reconcile_interval=0)
+
+    @pytest.fixture
+    def scanner(self, db_manager, dashboard):
+        return ExpiryScanner(db_manager, dashboard, interval=0)
+
+    def documento(self, db_manager, protocolo, vencimento, status='aprovado'):
+        db_manager.run(
+            """INSERT INTO documentos (numero_protocolo, transportadora_id, tipo_documento_id, usuario_upload_id,
+                                       nome_arquivo_original, nome_arquivo_sistema, caminho_arquivo,
+                                       tamanho_arquivo, hash_arquivo, data_vencimento, status)
+               VALUES (?, 1, 1, 1, 'a.pdf', 'a.pdf', 'a.pdf', 1, ?, ?, ?)""",
+            (protocolo, protocolo, vencimento.isoformat(), status)
+        )
+
+    def status(self, db_manager):
+        rows = db_manager.run("SELECT numero_protocolo, status FROM documentos", fetch=True)
+        return {row['numero_protocolo']: row['status'] for row in rows}
+
+    def avisos(self, db_manager):
+        rows = db_manager.run(
+            """SELECT d.numero_protocolo, n.titulo, n.prioridade, n.mensagem
+               FROM notificacoes n JOIN documentos d ON d.id = n.documento_id
+               ORDER BY d.numero_protocolo, n.id""",
+            fetch=True
+        )
+        return [(row['numero_protocolo'], row['titulo'], row['prioridade']) for row in rows]
+
+    def test_dias_aviso(self):
+        """Teste da leitura dos limiares configurados"""
+        assert dias_aviso('30,15,7,1') == [30, 15, 7, 1]
+        assert dias_aviso(' 7, 30,,x,7,0') == [30, 7]
+        assert prioridade_aviso(1) == 'critica' and prioridade_aviso(7) == 'alta' and prioridade_aviso(30) == 'normal'
+
+    def test_vence_documentos_e_atualiza_resumo(self, db_manager, dashboard, scanner):
+        """Teste da mudança para vencido com histórico e deltas do dashboard"""
+        self.documento(db_manager, 'VENCIDO-1', HOJE - timedelta(days=40))
+        self.documento(db_manager, 'VENCIDO-2', HOJE - timedelta(days=1), status='pendente')
+        self.documento(db_manager, 'REJEITADO', HOJE - timedelta(days=3), status='rejeitado')
+        self.documento(db_manager, 'VIGENTE', HOJE + timedelta(days=90))
+        dashboard.reconciliar()
+
+        resultado = scanner.executar(HOJE)
+        assert resultado['vencidos'] == 2
+        assert self.status(db_manager) == {
+            'VENCIDO-1': 'vencido', 'VENCIDO-2': 'vencido', 'REJEITADO': 'rejeitado', 'VIGENTE': 'aprovado'
+        }
+        historico = db_manager.run(
+            "SELECT status_anterior, status_novo FROM historico_documentos WHERE acao = ? ORDER BY documento_id",
+            ('vencimento',), fetch=True
+        )
+        assert historico == [
+            {'status_anterior': 'aprovado', 'status_novo': 'vencido'},
+            {'status_anterior': 'pendente', 'status_novo': 'vencido'},
+        ]
+
+        resumo = db_manager.run("SELECT status, total FROM dashboard_resumo WHERE total <> 0 ORDER BY status", fetch=True)
+        dashboard.reconciliar()
+        assert resumo == db_manager.run("SELECT status, total FROM dashboard_resumo ORDER BY status", fetch=True)
+
+    def test_avisos_por_faixa_sem_repeticao(self, db_manager, scanner):
+        """Cada documento recebe o aviso da faixa em que está, uma vez, mesmo com execuções repetidas"""
+        self.documento(db_manager, 'A-30', HOJE + timedelta(days=30))
+        self.documento(db_manager, 'B-1', HOJE + timedelta(days=1))
+        self.documento(db_manager, 'C-20', HOJE + timedelta(days=20))
+
+        scanner.executar(HOJE)
+        assert self.avisos(db_manager) == [
+            ('A-30', 'Documento vence em 30 dias', 'normal'),
+            ('B-1', 'Documento vence em 1 dia', 'critica'),
+            ('C-20', 'Documento vence em 30 dias', 'normal'),
+        ]
+        mensagem = db_manager.run("SELECT mensagem FROM notificacoes WHERE titulo = ?",
+                                  ('Documento vence em 1 dia',), fetch=True)[0]['mensagem']
+        assert mensagem == f"O documento B-1 vence em {(HOJE + timedelta(days=1)).isoformat()}."
+
+        # Mesma data: nada a fazer
+        assert scanner.executar(HOJE)['vencidos'] == 0
+        assert len(self.avisos(db_manager)) == 3
+
+        # Cinco dias depois: C-20 cruza 15 dias, B-1 vence; nada se repete
+        scanner.executar(HOJE + timedelta(days=5))
+        assert self.avisos(db_manager) == [
+            ('A-30', 'Documento vence em 30 dias', 'normal'),
+            ('B-1', 'Documento vence em 1 dia', 'critica'),
+            ('C-20', 'Documento vence em 30 dias', 'normal'),
+            ('C-20', 'Documento vence em 15 dias', 'normal'),
+        ]
+        assert self.status(db_manager)['B-1'] == 'vencido'
+
+        # Marca d'água perdida: a reexecução não duplica avisos
+        db_manager.run("UPDATE marcas_processamento SET valor = ?", ((HOJE - timedelta(days=1)).isoformat(),))
+        scanner.executar(HOJE + timedelta(days=5))
+        assert len(self.avisos(db_manager)) == 4
+
+    def test_documentos_cadastrados_depois_da_varredura(self, db_manager, scanner):
+        """Datas já varridas não escondem documentos cadastrados ou alterados depois"""
+        scanner.executar(HOJE)
+        self.documento(db_manager, 'ATRASADO', HOJE - timedelta(days=10), status='pendente')
+        self.documento(db_manager, 'PROXIMO', HOJE + timedelta(days=3))
+        self.documento(db_manager, 'ALTERADO', HOJE + timedelta(days=60))
+        db_manager.run("UPDATE documentos SET data_vencimento = ? WHERE numero_protocolo = ?",
+                       ((HOJE - timedelta(days=2)).isoformat(), 'ALTERADO'))
+
+        assert scanner.executar(HOJE + timedelta(days=1))['vencidos'] == 2
+        assert self.status(db_manager) == {'ATRASADO': 'vencido', 'PROXIMO': 'aprovado', 'ALTERADO': 'vencido'}
+        assert self.avisos(db_manager) == [('PROXIMO', 'Documento vence em 7 dias', 'alta')]
+
+    def test_limiares_da_configuracao(self, db_manager, scanner):
+        """Os limiares vêm de configuracoes.dias_aviso_vencimento"""
+        db_manager.run("UPDATE configuracoes SET valor = ? WHERE chave = ?", ('10', 'dias_aviso_vencimento'))
+        self.documento(db_manager, 'A-30', HOJE + timedelta(days=30))
+        self.documento(db_manager, 'D-10', HOJE + timedelta(days=10))
+
+        assert scanner.executar(HOJE)['avisos'] == [10]
+        assert self.avisos(db_manager) == [('D-10', 'Documento vence em 10 dias', 'normal')]
@@ -0,0 +1,69 @@
+import pytest
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from health_monitor import HealthMonitor, process_uptime
+
+
+class TestHealthMonitor:
+    """Testes para a sondagem de saúde em segundo plano"""
+
+    @pytest.fixture
+    def db_manager(self):
+        """DatabaseManager simulado"""
+        manager = MagicMock()
+        manager.health_check.return_value = True
+        manager.pool_stats.return_value = {'in_use': 3, 'idle': 1, 'max_size': 10}
+        return manager
+
+    def test_snapshot_before_first_probe(self, db_manager):
+        """Teste de snapshot antes da primeira sondagem"""
+        monitor = HealthMonitor(db_manager)
+        snapshot = monitor.snapshot()
+        assert snapshot['database'] == 'unknown'
+        assert snapshot['database_stale'] is True
+        db_manager.health_check.assert_not_called()
+
+    def test_refresh_updates_cached_status(self, db_manager):
+        """Teste de atualização do status em cache"""
+        monitor = HealthMonitor(db_manager)
+        monitor.refresh()
+        snapshot = monitor.snapshot()
+        assert snapshot['database'] == 'connected'
+        assert snapshot['database_latency_ms'] >= 0
+        assert snapshot['database_stale'] is False
+        assert snapshot['pool']['saturation'] == 0.3
+
+        # Leituras seguintes não sondam o banco novamente
+        monitor.snapshot()
+        assert db_manager.health_check.call_count == 1
+
+    def test_refresh_reports_failure(self, db_manager):
+        """Teste de falha na sondagem"""
+        db_manager.health_check.side_effect = Exception("Connection failed")
+        monitor = HealthMonitor(db_manager)
+        snapshot = monitor.refresh()
+        assert snapshot['database'] == 'disconnected'
+        assert snapshot['database_error'] == 'Connection failed'
+
+    def test_background_thread_probes_periodically(self, db_manager):
+        """Teste da thread de sondagem periódica"""
+        monitor = HealthMonitor(db_manager, interval=0.01)
+        monitor.ensure_started()
+        monitor.ensure_started()
+        time.sleep(0.1)
+        monitor.stop()
+        assert db_manager.health_check.call_count >= 2
+
+    def test_process_uptime_is_not_wall_clock(self):
+        """Teste de uptime real do processo"""
+        assert 0 <= process_uptime() < time.time() / 2
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from flask import Flask, jsonify, request
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_provider
+from json_provider import FastJSONProvider, codificar, decodificar
+
+
+LINHA = {
+    'id': 1,
+    'data_upload': datetime(2024, 3, 1, 10, 30, 5, 120),
+    'data_vencimento': date(2025, 1, 31),
+    'valor_garantia': Decimal('1500000.50'),
+    'limite_credito': Decimal('0'),
+    'razao_social': 'Transportes São João',
+    'formatos': ['pdf'],
+}
+
+
+class TestJSONProvider:
+    """Testes do provider JSON do app (orjson e fallback da stdlib)"""
+
+    @pytest.fixture(params=['orjson', 'stdlib'])
+    def backend(self, request):
+        if request.param == 'orjson':
+            pytest.importorskip('orjson')
+            yield
+        else:
+            with patch.object(json_provider, 'orjson', None):
+                yield
+
+    def test_tipos_do_banco(self, backend):
+        """Datas em ISO 8601, Decimal como número e texto em UTF-8"""
+        corpo = codificar(LINHA)
+        assert isinstance(corpo, bytes)
+        assert 'São João'.encode() in corpo
+        assert decodificar(corpo) == {
+            'id': 1,
+            'data_upload': '2024-03-01T10:30:05.000120',
+            'data_vencimento': '2025-01-31',
+            'valor_garantia': 1500000.5,
+            'limite_credito': 0.0,
+            'razao_social': 'Transportes São João',
+            'formatos': ['pdf'],
+        }
+
+    def test_mesma_saida_nos_dois_backends(self):
+        """orjson e stdlib produzem o mesmo JSON"""
+        pytest.importorskip('orjson')
+        dados = {**LINHA, 7: None, 'grande': 2 ** 70}
+        with patch.object(json_provider, 'orjson', None):
+            esperado = codificar(dados)
+        assert codificar(dados) == esperado
+
+    def test_tipo_desconhecido(self, backend):
+        """Tipos sem conversão continuam falhando"""
+        with pytest.raises(TypeError):
+            codificar({'valor': object()})
+
+    def test_jsonify_e_get_json(self, backend):
+        """jsonify e request.get_json passam pelo provider"""
+        app = Flask(__name__)
+        app.json = FastJSONProvider(app)
+
+        @app.route('/eco', methods=['POST'])
+        def eco():
+            return jsonify(entrada=request.get_json(), linha=LINHA)
+
+        response = app.test_client().post('/eco', data='{"x": [1, 2]}', content_type='application/json')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == {'entrada': {'x': [1, 2]}, 'linha': decodificar(codificar(LINHA))}
+        # Argumentos extras seguem pelo json da stdlib
+        assert app.json.dumps({'a': 1}, indent=2) == '{\n  "a": 1\n}'
+
+        response = app.test_client().post('/eco', data='{x', content_type='application/json')
+        assert response.status_code == 400
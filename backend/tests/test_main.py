@@ -1,4 +1,5 @@
 import pytest
+import io
 import json
 import os
 import sys
@@ -55,6 +56,29 @@ class TestPortalNIMOENERGIA:
         assert 'timestamp' in data
         assert 'version' in data
 
+    def test_api_health_serves_cached_probe(self, client):
+        """Teste de health check servido do cache, sem abrir conexão"""
+        with patch('main.db_manager.get_connection') as mock_connection:
+            response = client.get('/api/health')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['database'] in ['unknown', 'connected', 'disconnected']
+        assert 'pool' in data
+        assert data['uptime'] < 24 * 3600
+        mock_connection.assert_not_called()
+
+    def test_metrics_endpoint(self, client):
+        """Teste das métricas Prometheus com latência por rota e por consulta"""
+        client.get('/api/health')
+        client.get('/api/tipos-documentos')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        texto = response.get_data(as_text=True)
+        assert 'portal_http_request_duration_seconds_count{method="GET",route="/api/health",status="200"}' in texto
+        assert 'portal_db_query_duration_seconds_bucket{query="SELECT' in texto
+        assert '# TYPE portal_db_pool_connections gauge' in texto
+
     def test_login_success(self, client):
         """Teste de login com credenciais válidas"""
         response = client.post('/api/auth/login', 
@@ -102,9 +126,232 @@ class TestPortalNIMOENERGIA:
     def test_dashboard_unauthorized(self, client):
         """Teste de acesso não autorizado ao dashboard"""
         response = client.get('/api/dashboard')
-        # Se não tiver autenticação implementada, deve retornar 200
-        # Se tiver, deve retornar 401
-        assert response.status_code in [200, 401]
+        assert response.status_code == 401
+
+    def test_dashboard_transportadora(self, client):
+        """Teste do dashboard restrito à transportadora do usuário"""
+        import jwt
+        import time
+        import main
+        token = jwt.encode({'id': 1, 'tipo': 'transportadora', 'transportadora_id': 7,
+                            'exp': int(time.time()) + 600}, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+        with patch.object(main.dashboard_service, 'resumo', return_value={'total_documentos': 3}) as resumo:
+            response = client.get('/api/dashboard', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        assert response.get_json() == {'total_documentos': 3}
+        resumo.assert_called_once_with(7)
+
+    def test_listar_documentos(self, client, auth_headers):
+        """Teste da listagem de documentos paginada por cursor"""
+        response = client.get('/api/documentos?limit=10', headers=auth_headers)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert isinstance(data['documentos'], list)
+        assert 'proximo_cursor' in data
+
+    def test_listar_documentos_unauthorized(self, client):
+        """Teste de listagem sem token ou com token inválido"""
+        assert client.get('/api/documentos').status_code == 401
+        response = client.get('/api/documentos', headers={'Authorization': 'Bearer invalido'})
+        assert response.status_code == 401
+
+    def test_listar_documentos_escopo_transportadora(self, client):
+        """Teste de usuários de transportadora restritos aos próprios documentos"""
+        import jwt
+        import time
+        from database_manager import db_manager
+
+        def headers(transportadora_id):
+            token = jwt.encode({'id': 1, 'tipo': 'transportadora', 'transportadora_id': transportadora_id,
+                                'exp': int(time.time()) + 600}, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+            return {'Authorization': f'Bearer {token}'}
+
+        ids = []
+        for cnpj in ('71.000.000/0001-01', '72.000.000/0001-02'):
+            db_manager.run("INSERT INTO transportadoras (cnpj, razao_social) VALUES (?, ?) ON CONFLICT (cnpj) DO NOTHING",
+                           (cnpj, f'Escopo {cnpj}'))
+            ids.append(db_manager.run("SELECT id FROM transportadoras WHERE cnpj = ?", (cnpj,), fetch=True)[0]['id'])
+        for transportadora_id in ids:
+            db_manager.run(
+                """INSERT INTO documentos (numero_protocolo, transportadora_id, tipo_documento_id, usuario_upload_id,
+                                           nome_arquivo_original, nome_arquivo_sistema, caminho_arquivo,
+                                           tamanho_arquivo, hash_arquivo, status)
+                   VALUES (?, ?, 1, 1, 'escopo.pdf', 'escopo.pdf', '/tmp/escopo', 10, ?, 'pendente')
+                   ON CONFLICT (numero_protocolo) DO NOTHING""",
+                (f'ESCOPO-{transportadora_id}', transportadora_id, f'escopo{transportadora_id}')
+            )
+
+        primeira, segunda = ids
+        response = client.get('/api/documentos?limit=1000', headers=headers(primeira))
+        assert response.status_code == 200
+        assert {doc['transportadora_id'] for doc in response.get_json()['documentos']} == {primeira}
+
+        response = client.get(f'/api/documentos?transportadora_id={segunda}', headers=headers(primeira))
+        assert response.status_code == 403
+
+    def test_listar_documentos_invalid_filters(self, client, auth_headers):
+        """Teste de filtros inválidos na listagem de documentos"""
+        for query in ('status=desconhecido', 'cursor=@@@', 'limit=0', 'vencimento_de=31-12-2024'):
+            response = client.get(f'/api/documentos?{query}', headers=auth_headers)
+            assert response.status_code == 400
+
+    def test_buscar_transportadoras(self, client, auth_headers):
+        """Teste da busca de transportadoras por nome e por CNPJ sem máscara"""
+        from database_manager import db_manager
+        db_manager.run(
+            "INSERT INTO transportadoras (cnpj, razao_social) VALUES (?, ?) ON CONFLICT (cnpj) DO NOTHING",
+            ('44.555.666/0001-77', 'Busca Cargas Ltda')
+        )
+        response = client.get('/api/transportadoras/busca?q=busca%20carg', headers=auth_headers)
+        assert response.status_code == 200
+        assert [t['cnpj'] for t in response.get_json()['transportadoras']] == ['44.555.666/0001-77']
+        
+        response = client.get('/api/transportadoras/busca?q=44555666', headers=auth_headers)
+        assert response.get_json()['transportadoras'][0]['razao_social'] == 'Busca Cargas Ltda'
+        
+        assert client.get('/api/transportadoras/busca?q=a', headers=auth_headers).status_code == 400
+        assert client.get('/api/transportadoras/busca?q=busca').status_code == 401
+
+    def test_tipos_documentos_etag(self, client):
+        """Teste de ETag e resposta 304 nos tipos de documento"""
+        response = client.get('/api/tipos-documentos')
+        assert response.status_code == 200
+        tipos = json.loads(response.data)
+        assert any(tipo['codigo'] == 'SEGURO_RC' for tipo in tipos)
+        etag = response.headers['ETag']
+        assert not etag.startswith('W/')
+        
+        response = client.get('/api/tipos-documentos', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+    def test_listar_documentos_gzip(self, client, auth_headers):
+        """Teste da listagem em streaming comprimida com gzip"""
+        import gzip
+        response = client.get('/api/documentos', headers={**auth_headers, 'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert 'documentos' in json.loads(gzip.decompress(response.data))
+
+    def test_rate_limit_login(self, client):
+        """Teste do limite de login por IP com os headers documentados"""
+        import main
+        from rate_limiter import MemoryStorage
+        ip = {'REMOTE_ADDR': '10.20.30.40'}
+        with patch.object(main.rate_limiter, 'ativo', True), \
+                patch.object(main.rate_limiter, 'armazenamento', MemoryStorage()):
+            for restantes in range(9, -1, -1):
+                response = client.post('/api/auth/login', json={}, environ_base=ip)
+                assert response.status_code == 400
+                assert response.headers['X-RateLimit-Limit'] == '10'
+                assert response.headers['X-RateLimit-Remaining'] == str(restantes)
+                assert int(response.headers['X-RateLimit-Reset']) > 0
+
+            response = client.post('/api/auth/login', json={}, environ_base=ip)
+            assert response.status_code == 429
+            assert response.get_json()['code'] == 'RATE_LIMIT_EXCEEDED'
+            assert response.headers['Retry-After'] == str(response.get_json()['retry_after'])
+
+            # Outro IP e o health check seguem liberados
+            assert client.post('/api/auth/login', json={}, environ_base={'REMOTE_ADDR': '10.20.30.41'}).status_code == 400
+            response = client.get('/api/health', environ_base=ip)
+            assert response.status_code == 200 and 'X-RateLimit-Limit' not in response.headers
+
+    def test_rate_limit_atras_de_proxy(self, client):
+        """Atrás do nginx o limite de login é pelo IP do cliente, não pelo do proxy"""
+        import main
+        from rate_limiter import MemoryStorage
+        proxy = {'REMOTE_ADDR': '172.18.0.5'}
+        with patch.object(main.rate_limiter, 'ativo', True), \
+                patch.object(main.rate_limiter, 'armazenamento', MemoryStorage()), \
+                patch.object(main.app, 'wsgi_app', main.confiar_proxies(main.app.wsgi_app, 1)):
+            for i in range(10):
+                client.post('/api/auth/login', json={}, environ_base=proxy,
+                            headers={'X-Forwarded-For': '200.1.1.1'})
+            response = client.post('/api/auth/login', json={}, environ_base=proxy,
+                                   headers={'X-Forwarded-For': '200.1.1.1'})
+            assert response.status_code == 429
+            response = client.post('/api/auth/login', json={}, environ_base=proxy,
+                                   headers={'X-Forwarded-For': '200.2.2.2'})
+            assert response.status_code == 400
+        assert main.confiar_proxies(main.app.wsgi_app, 0) is main.app.wsgi_app
+
+    def test_upload_documento(self, client, auth_headers):
+        """Teste de upload em streaming com deduplicação"""
+        from database_manager import db_manager
+        db_manager.run(
+            "INSERT INTO transportadoras (cnpj, razao_social) VALUES (?, ?) ON CONFLICT (cnpj) DO NOTHING",
+            ('33.333.333/0001-33', 'Upload Transportes')
+        )
+        transportadora_id = db_manager.run(
+            "SELECT id FROM transportadoras WHERE cnpj = ?", ('33.333.333/0001-33',), fetch=True
+        )[0]['id']
+        
+        def enviar():
+            return client.post('/api/upload', headers=auth_headers, data={
+                'tipo_documento': 'ALVARA_FUNCIONAMENTO',
+                'transportadora_id': str(transportadora_id),
+                'arquivo': (io.BytesIO(b'%PDF-1.4 alvara'), 'alvara.pdf')
+            }, content_type='multipart/form-data')
+        
+        response = enviar()
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['numero_protocolo'].startswith('DOC-')
+        assert data['status'] == 'pendente'
+        
+        response = enviar()
+        assert response.status_code == 409
+        assert response.get_json()['id'] == data['id']
+        
+        response = client.post('/api/upload', headers=auth_headers, data={
+            'tipo_documento': 'ALVARA_FUNCIONAMENTO',
+            'transportadora_id': '99999',
+            'arquivo': (io.BytesIO(b'%PDF-1.4 outro alvara'), 'alvara.pdf')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+    def test_upload_sessao_retomavel(self, client, auth_headers):
+        """Teste do fluxo de upload em pedaços pela API"""
+        import hashlib
+        from database_manager import db_manager
+        db_manager.run(
+            "INSERT INTO transportadoras (cnpj, razao_social) VALUES (?, ?) ON CONFLICT (cnpj) DO NOTHING",
+            ('33.333.333/0001-33', 'Upload Transportes')
+        )
+        transportadora_id = db_manager.run(
+            "SELECT id FROM transportadoras WHERE cnpj = ?", ('33.333.333/0001-33',), fetch=True
+        )[0]['id']
+        conteudo = b'%PDF-1.4 apolice em pedacos'
+        
+        response = client.post('/api/upload/sessoes', headers=auth_headers, json={
+            'tipo_documento': 'SEGURO_CARGA', 'nome_arquivo': 'apolice.pdf',
+            'tamanho_total': len(conteudo), 'transportadora_id': transportadora_id
+        })
+        assert response.status_code == 201
+        sessao = response.get_json()
+        
+        response = client.put(f"/api/upload/sessoes/{sessao['id']}/chunks/0", data=conteudo, headers={
+            **auth_headers, 'X-Chunk-SHA256': hashlib.sha256(conteudo).hexdigest()
+        })
+        assert response.status_code == 200
+        
+        response = client.get(f"/api/upload/sessoes/{sessao['id']}", headers=auth_headers)
+        assert response.get_json()['completo'] is True
+        
+        response = client.post(f"/api/upload/sessoes/{sessao['id']}/finalizar", headers=auth_headers)
+        assert response.status_code == 201
+        assert response.get_json()['numero_protocolo'].startswith('DOC-')
+        
+        response = client.get(f"/api/upload/sessoes/{sessao['id']}", headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_upload_unauthorized(self, client):
+        """Teste de upload sem autenticação"""
+        response = client.post('/api/upload', data={'tipo_documento': 'ANTT'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 401
 
     def test_cors_headers(self, client):
         """Teste se os headers CORS estão configurados"""
@@ -112,12 +359,12 @@ class TestPortalNIMOENERGIA:
         # Verificar se CORS está habilitado
         assert response.status_code in [200, 204]
 
-    @patch('main.get_db_connection')
-    def test_database_connection_error(self, mock_db, client):
+    @patch('main.dashboard_service.resumo')
+    def test_database_connection_error(self, mock_resumo, client, auth_headers):
         """Teste de tratamento de erro de conexão com banco"""
-        mock_db.side_effect = Exception("Database connection failed")
+        mock_resumo.side_effect = Exception("Database connection failed")
         
-        response = client.get('/api/dashboard')
+        response = client.get('/api/dashboard', headers=auth_headers)
         # Deve tratar o erro graciosamente
         assert response.status_code in [200, 500]
 
@@ -253,6 +500,54 @@ class TestPortalNIMOENERGIA:
             # Deve funcionar com valores padrão
             assert response.status_code == 200
 
+    def test_create_app_e_iniciar_worker(self):
+        """Teste do factory (driver configurado) e do início dos recursos do worker"""
+        import main
+        from db_drivers import drivers_carregados
+        assert main.create_app() is app
+        assert 'sqlite' in drivers_carregados()
+
+        servicos = (
+            (main.metricas, 'ensure_started'), (main.health_monitor, 'ensure_started'),
+            (main.config_service, 'ensure_started'), (main.token_cache, 'ensure_started'),
+            (main.upload_sessions, 'ensure_gc_started'),
+        )
+        with patch.object(main.db_manager, 'get_connection') as get_connection:
+            patches = [patch.object(servico, metodo) for servico, metodo in servicos]
+            iniciados = [p.start() for p in patches]
+            try:
+                main.iniciar_worker()
+            finally:
+                for p in patches:
+                    p.stop()
+        assert all(iniciado.call_count == 1 for iniciado in iniciados)
+        get_connection.return_value.close.assert_called_once()
+        # A reconciliação do dashboard roda no processo worker, não em cada worker web
+        assert main.dashboard_service._reconciler.interval == 0
+
+    def test_import_time_budget(self):
+        """Teste do orçamento de import do main: sem drivers não usados e rápido"""
+        import subprocess
+        codigo = (
+            "import sys, time\n"
+            "inicio = time.perf_counter()\n"
+            "import main\n"
+            "print(time.perf_counter() - inicio)\n"
+            "print(','.join(m for m in ('mysql.connector', 'psycopg2', 'sqlite3') if m in sys.modules))\n"
+        )
+        backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ambiente = {**os.environ, 'DATABASE_TYPE': 'sqlite'}
+        # Melhor de 3 execuções: o orçamento mede o import, não a carga da máquina
+        tempos = []
+        for _ in range(3):
+            resultado = subprocess.run([sys.executable, '-c', codigo], cwd=backend, env=ambiente,
+                                       capture_output=True, text=True, timeout=60)
+            assert resultado.returncode == 0, resultado.stderr
+            tempo, modulos = resultado.stdout.splitlines()[-2:]
+            assert modulos == ''
+            tempos.append(float(tempo))
+        assert min(tempos) < float(os.getenv('IMPORT_TIME_BUDGET', 1.0))
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
 
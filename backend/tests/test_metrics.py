@@ -0,0 +1,157 @@
+import pytest
+import os
+import sys
+import glob
+import threading
+import subprocess
+import multiprocessing
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Metricas, impressao_sql
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+fork = multiprocessing.get_context('fork')
+
+
+def _worker(diretorio, valor, pronto, sair):
+    """Processo filho: soma `valor`, grava o retrato e espera o sinal para sair"""
+    metricas = Metricas(diretorio, intervalo=60)
+    uploads = metricas.contador('teste_bytes_total', 'Bytes', ('mode',))
+    metricas.gauge('teste_conexoes', 'Conexões', ('state',), lambda: [(('in_use',), 1)])
+    metricas.ensure_started()
+    uploads.somar(valor, 'simples')
+    metricas.gravar()
+    pronto.set()
+    sair.wait(10)
+
+
+def _contagem_no_filho(contador, fila):
+    fila.put(contador.coletar())
+
+
+class TestMetricas:
+    """Testes para as métricas no formato Prometheus"""
+
+    def amostras(self, texto):
+        """Linhas de amostra do texto exportado: {série: valor}"""
+        linhas = [linha.rsplit(' ', 1) for linha in texto.splitlines() if linha and not linha.startswith('#')]
+        return {serie: float(valor) for serie, valor in linhas}
+
+    def test_impressao_sql(self):
+        """Literais, placeholders e listas viram um formato único"""
+        assert impressao_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND nome = 'O''Brien'") == \
+            "SELECT * FROM t WHERE id IN (...) AND nome = ?"
+        assert impressao_sql("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == \
+            "INSERT INTO t (a, b) VALUES (?, ?)"
+        assert impressao_sql("SELECT\n  coluna1 FROM tabela2 LIMIT 10") == "SELECT coluna1 FROM tabela2 LIMIT ?"
+
+    def test_histograma_exportado(self):
+        """Buckets cumulativos, soma, contagem e rótulos escapados"""
+        metricas = Metricas()
+        latencia = metricas.histograma('teste_duracao_seconds', 'Duração', ('route',), buckets=(0.1, 1.0))
+        for valor in (0.05, 0.1, 0.5, 3.0):
+            latencia.observar(valor, '/api/"x"')
+
+        texto = metricas.exportar()
+        assert '# TYPE teste_duracao_seconds histogram' in texto
+        amostras = self.amostras(texto)
+        assert amostras['teste_duracao_seconds_bucket{route="/api/\\"x\\"",le="0.1"}'] == 2
+        assert amostras['teste_duracao_seconds_bucket{route="/api/\\"x\\"",le="1.0"}'] == 3
+        assert amostras['teste_duracao_seconds_bucket{route="/api/\\"x\\"",le="+Inf"}'] == 4
+        assert amostras['teste_duracao_seconds_count{route="/api/\\"x\\""}'] == 4
+        assert amostras['teste_duracao_seconds_sum{route="/api/\\"x\\""}'] == pytest.approx(3.65)
+
+    def test_threads_sem_perda(self):
+        """Observações concorrentes sem lock não se perdem; threads encerradas vão para a base"""
+        metricas = Metricas()
+        contador = metricas.contador('teste_eventos_total', 'Eventos', ('tipo',))
+
+        def observar():
+            for _ in range(10000):
+                contador.somar(1, 'a')
+
+        threads = [threading.Thread(target=observar) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert contador.coletar() == {('a',): [80000]}
+        assert contador._shards == []
+        contador.somar(5, 'a')
+        assert contador.coletar() == {('a',): [80005]}
+
+    def test_threads_encerradas_sem_coleta(self):
+        """Uma thread por requisição não acumula shards enquanto ninguém coleta"""
+        metricas = Metricas()
+        contador = metricas.contador('teste_requisicoes_total', 'Requisições')
+        for _ in range(50):
+            thread = threading.Thread(target=contador.somar)
+            thread.start()
+            thread.join()
+        assert len(contador._shards) == 1
+        assert contador.coletar() == {(): [50]}
+
+    def test_filho_comeca_zerado(self):
+        """Após fork() o filho não repete as contagens do pai"""
+        metricas = Metricas()
+        contador = metricas.contador('teste_fork_total', 'Eventos')
+        contador.somar(3)
+        fila = fork.Queue()
+        processo = fork.Process(target=_contagem_no_filho, args=(contador, fila))
+        processo.start()
+        assert fila.get(timeout=10) == {}
+        processo.join(10)
+        assert contador.coletar() == {(): [3]}
+
+    def test_agregacao_entre_processos(self, tmp_path):
+        """Séries somadas entre workers; contadores de workers encerrados são preservados"""
+        diretorio = str(tmp_path / 'metricas')
+        metricas = Metricas(diretorio, intervalo=60)
+        uploads = metricas.contador('teste_bytes_total', 'Bytes', ('mode',))
+        metricas.gauge('teste_conexoes', 'Conexões', ('state',), lambda: [(('in_use',), 2)])
+        metricas.ensure_started()
+        uploads.somar(5, 'simples')
+
+        sair = fork.Event()
+        processos = []
+        for valor in (10, 20):
+            pronto = fork.Event()
+            processo = fork.Process(target=_worker, args=(diretorio, valor, pronto, sair))
+            processo.start()
+            assert pronto.wait(10)
+            processos.append(processo)
+
+        amostras = self.amostras(metricas.exportar())
+        assert amostras['teste_bytes_total{mode="simples"}'] == 35
+        assert amostras['teste_conexoes{state="in_use"}'] == 4
+
+        sair.set()
+        for processo in processos:
+            processo.join(10)
+        amostras = self.amostras(metricas.exportar())
+        assert amostras['teste_bytes_total{mode="simples"}'] == 35
+        assert amostras['teste_conexoes{state="in_use"}'] == 2
+
+        # Retratos dos encerrados foram compactados em um único arquivo
+        restantes = sorted(os.path.basename(caminho) for caminho in glob.glob(os.path.join(diretorio, 'metrics-*')))
+        assert len(restantes) == 3
+        assert 'metrics-encerrados.json' in restantes
+        metricas.stop()
+
+    def test_sem_fcntl(self, tmp_path):
+        """Sem fcntl (Windows) o backend importa e as métricas ficam só no processo"""
+        codigo = (
+            "import sys\n"
+            "sys.modules['fcntl'] = None\n"
+            "import metrics, database_manager\n"
+            "assert metrics.fcntl is None\n"
+            f"m = metrics.Metricas({str(tmp_path / 'metricas')!r})\n"
+            "assert m.diretorio is None\n"
+        )
+        resultado = subprocess.run([sys.executable, '-c', codigo], cwd=BACKEND,
+                                   capture_output=True, text=True, timeout=60)
+        assert resultado.returncode == 0, resultado.stderr
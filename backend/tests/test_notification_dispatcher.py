@@ -0,0 +1,172 @@
+import pytest
+import os
+import sys
+import socketserver
+import threading
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notification_dispatcher import NotificationDispatcher, SMTPSender
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Diálogo SMTP mínimo: aceita tudo, exceto os destinatários em `recusar`"""
+
+    def responder(self, linha):
+        self.wfile.write(linha.encode() + b'\r\n')
+
+    def handle(self):
+        sink = self.server
+        with sink.lock:
+            sink.conexoes += 1
+        self.responder('220 sink SMTP')
+        destinatarios = []
+        while True:
+            linha = self.rfile.readline()
+            if not linha:
+                return
+            comando = linha.decode().strip()
+            verbo = comando.split(' ', 1)[0].upper()
+            if verbo in ('EHLO', 'HELO'):
+                self.responder('250 sink')
+            elif verbo in ('MAIL', 'RSET'):
+                destinatarios = []
+                self.responder('250 OK')
+            elif verbo == 'RCPT':
+                endereco = comando.split(':', 1)[1].strip().strip('<>')
+                if endereco in sink.recusar:
+                    self.responder(sink.recusar[endereco])
+                else:
+                    destinatarios.append(endereco)
+                    self.responder('250 OK')
+            elif verbo == 'DATA':
+                self.responder('354 fim com .')
+                dados = []
+                for linha in iter(self.rfile.readline, b'.\r\n'):
+                    dados.append(linha)
+                with sink.lock:
+                    sink.mensagens.append((destinatarios, b''.join(dados).decode()))
+                self.responder('250 OK')
+            elif verbo == 'NOOP':
+                self.responder('250 OK')
+            elif verbo == 'QUIT':
+                self.responder('221 tchau')
+                return
+            else:
+                self.responder('502 comando não implementado')
+
+
+class SinkSMTP(socketserver.ThreadingTCPServer):
+    """Servidor SMTP local que guarda as mensagens recebidas em memória"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SinkHandler)
+        self.lock = threading.Lock()
+        self.mensagens = []
+        self.conexoes = 0
+        self.recusar = {}
+
+
+class TestNotificationDispatcher:
+    """Testes para o envio de notificações em lote"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """Usuários destinatários das notificações"""
+        for email in ('ana@transportes.com.br', 'falha@transportes.com.br', 'inexistente@transportes.com.br'):
+            db_manager.run(
+                "INSERT INTO usuarios (email, senha, nome, tipo) VALUES (?, ?, ?, ?)",
+                (email, 'x', email.split('@')[0], 'transportadora')
+            )
+        return db_manager
+
+    @pytest.fixture
+    def sink(self):
+        sink = SinkSMTP()
+        thread = threading.Thread(target=sink.serve_forever, daemon=True)
+        thread.start()
+        yield sink
+        sink.shutdown()
+        sink.server_close()
+
+    @pytest.fixture
+    def dispatcher(self, db_manager, sink):
+        sender = SMTPSender('127.0.0.1', sink.server_address[1], use_tls=False, timeout=5)
+        dispatcher = NotificationDispatcher(db_manager, sender, batch_size=10, workers=1,
+                                            max_tentativas=2, backoff_base=60)
+        yield dispatcher
+        dispatcher.fechar()
+
+    def notificar(self, db_manager, email, titulo, prioridade='normal', canal='email'):
+        usuario_id = db_manager.run("SELECT id FROM usuarios WHERE email = ?", (email,), fetch=True)[0]['id']
+        db_manager.run(
+            """INSERT INTO notificacoes (usuario_id, tipo, titulo, mensagem, canal, prioridade)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (usuario_id, 'vencimento', titulo, f'Mensagem de {titulo}', canal, prioridade)
+        )
+
+    def status(self, db_manager):
+        rows = db_manager.run(
+            "SELECT titulo, status_envio, tentativas_envio, proxima_tentativa FROM notificacoes", fetch=True
+        )
+        return {row['titulo']: row for row in rows}
+
+    def test_envia_em_lote_criticas_primeiro(self, db_manager, dispatcher, sink):
+        """Teste de envio com prioridade e conexão SMTP reutilizada"""
+        self.notificar(db_manager, 'ana@transportes.com.br', 'normal 1')
+        self.notificar(db_manager, 'ana@transportes.com.br', 'baixa', prioridade='baixa')
+        self.notificar(db_manager, 'ana@transportes.com.br', 'critica', prioridade='critica')
+        self.notificar(db_manager, 'ana@transportes.com.br', 'no sistema', canal='sistema')
+
+        resultado = dispatcher.processar_lote()
+        assert resultado == {'reivindicadas': 3, 'enviadas': 3, 'reagendadas': 0, 'falhas': 0}
+        assert ['Subject: critica' in corpo for _, corpo in sink.mensagens] == [True, False, False]
+        assert 'Subject: baixa' in sink.mensagens[-1][1]
+
+        status = self.status(db_manager)
+        assert status['critica']['status_envio'] == 'enviado'
+        assert status['critica']['tentativas_envio'] == 1
+        assert status['no sistema']['status_envio'] == 'pendente'
+
+        self.notificar(db_manager, 'ana@transportes.com.br', 'normal 2')
+        assert dispatcher.processar_lote()['enviadas'] == 1
+        assert sink.conexoes == 1
+
+    def test_falhas_reagendadas_com_backoff(self, db_manager, dispatcher, sink):
+        """Teste de falha temporária (backoff) e permanente (erro imediato)"""
+        sink.recusar['falha@transportes.com.br'] = '451 tente mais tarde'
+        sink.recusar['inexistente@transportes.com.br'] = '550 caixa inexistente'
+        self.notificar(db_manager, 'falha@transportes.com.br', 'temporaria')
+        self.notificar(db_manager, 'inexistente@transportes.com.br', 'permanente')
+        self.notificar(db_manager, 'ana@transportes.com.br', 'ok')
+
+        resultado = dispatcher.processar_lote()
+        assert resultado == {'reivindicadas': 3, 'enviadas': 1, 'reagendadas': 1, 'falhas': 1}
+        status = self.status(db_manager)
+        assert status['temporaria']['status_envio'] == 'pendente'
+        assert status['temporaria']['proxima_tentativa'] is not None
+        assert status['permanente']['status_envio'] == 'erro'
+        assert status['ok']['status_envio'] == 'enviado'
+
+        # Ainda no backoff: nada a reivindicar
+        assert dispatcher.processar_lote()['reivindicadas'] == 0
+
+        db_manager.run("UPDATE notificacoes SET proxima_tentativa = NULL WHERE titulo = ?", ('temporaria',))
+        assert dispatcher.processar_lote()['falhas'] == 1
+        assert self.status(db_manager)['temporaria']['status_envio'] == 'erro'
+        assert self.status(db_manager)['temporaria']['tentativas_envio'] == 2
+
+    def test_reivindicacao_exclusiva(self, db_manager, dispatcher):
+        """Linhas reivindicadas ficam fora da fila até o fim do lease"""
+        for indice in range(15):
+            self.notificar(db_manager, 'ana@transportes.com.br', f'n{indice}')
+
+        primeiro = dispatcher.reivindicar()
+        segundo = dispatcher.reivindicar()
+        assert len(primeiro) == 10 and len(segundo) == 5
+        assert not {row['id'] for row in primeiro} & {row['id'] for row in segundo}
+        assert dispatcher.reivindicar() == []
@@ -0,0 +1,125 @@
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import (
+    RateLimiter, MemoryStorage, SQLiteStorage, Limite, parse_limites, criar_armazenamento
+)
+
+# Início de uma janela de minuto e de hora
+T0 = 1_700_002_800.0
+
+
+class TestRateLimiter:
+    """Testes do rate limiting por janela deslizante"""
+
+    @pytest.fixture(params=['memoria', 'sqlite'])
+    def armazenamento(self, request, tmp_path):
+        if request.param == 'memoria':
+            return MemoryStorage(shards=4)
+        return SQLiteStorage(str(tmp_path / 'rate_limit.db'))
+
+    def verificar(self, limiter, instante, endpoint='rota', identidade='usuario:1', ip='ip:10.0.0.1'):
+        with patch('rate_limiter.time.time', return_value=instante):
+            return limiter.verificar(endpoint, identidade, ip)
+
+    def test_parse_limites(self):
+        """Formatos documentados em inglês e português"""
+        assert parse_limites('1000 per hour; 100/minute') == [Limite(1000, 3600), Limite(100, 60)]
+        assert parse_limites('10 por minuto, 5/30 segundos') == [Limite(10, 60), Limite(5, 30)]
+        assert parse_limites('2 per days') == [Limite(2, 86400)]
+        assert parse_limites('') == []
+        with pytest.raises(ValueError):
+            parse_limites('10 per fortnight')
+        with pytest.raises(ValueError):
+            criar_armazenamento('redis://localhost')
+
+    def test_limite_e_janela_deslizante(self, armazenamento):
+        """Recusa acima do limite; a janela anterior pesa proporcionalmente ao tempo restante"""
+        limiter = RateLimiter(armazenamento, padrao='10 per minute')
+        for i in range(10):
+            resultado = self.verificar(limiter, T0 + 50)
+            assert resultado.permitido and resultado.restantes == 9 - i
+        assert resultado.limite == 10 and resultado.reset == int(T0) + 60
+
+        recusa = self.verificar(limiter, T0 + 50)
+        assert not recusa.permitido and recusa.restantes == 0
+        assert recusa.retry_after == 10
+
+        # No início da janela seguinte as 10 anteriores ainda contam inteiras
+        assert not self.verificar(limiter, T0 + 60).permitido
+        # Na metade dela, pesam 5: cabem mais 5
+        permitidas = [self.verificar(limiter, T0 + 90).permitido for _ in range(6)]
+        assert permitidas == [True] * 5 + [False]
+        # Duas janelas depois, o histórico não conta mais
+        assert self.verificar(limiter, T0 + 180).restantes == 9
+
+    def test_identidade_ip_e_isentos(self, armazenamento):
+        """Padrão por identidade, política por IP e endpoints isentos"""
+        limiter = RateLimiter(armazenamento, padrao='3 per minute')
+        limiter.politica(('login',), '2 per minute', por='ip')
+        limiter.isentar(('health',))
+
+        assert [self.verificar(limiter, T0, 'login', identidade=f'usuario:{i}').permitido
+                for i in range(3)] == [True, True, False]
+        # Outro IP tem a própria contagem na política de login
+        assert self.verificar(limiter, T0, 'login', ip='ip:10.0.0.2').permitido
+        # Mas o limite padrão é do usuário, qualquer que seja o IP
+        assert self.verificar(limiter, T0, 'rota', identidade='usuario:0').restantes == 1
+        assert self.verificar(limiter, T0, 'health') is None
+
+        with pytest.raises(ValueError):
+            limiter.politica(('x',), '1 per minute', por='cookie')
+
+    def test_limite_mais_apertado(self, armazenamento):
+        """Os headers informam o limite com menos requisições restantes"""
+        limiter = RateLimiter(armazenamento, padrao='1000 per hour; 5 per minute')
+        limiter.politica(('upload',), '3 per minute')
+        resultado = self.verificar(limiter, T0 + 1, 'upload')
+        assert (resultado.limite, resultado.restantes) == (3, 2)
+        resultado = self.verificar(limiter, T0 + 1)
+        assert (resultado.limite, resultado.restantes) == (5, 3)
+        assert self.verificar(limiter, T0 + 1, 'upload').restantes == 1
+        # Requisições recusadas no minuto não consomem a cota da hora
+        for _ in range(5):
+            self.verificar(limiter, T0 + 1)
+        excedido, contagens = armazenamento.consumir(('*', 'usuario:1'), limiter.padrao, T0 + 2)
+        assert excedido == 1 and contagens[0][0] == 5
+
+    def test_desativado_e_falha_do_armazenamento(self):
+        """Sem limites quando desativado; erro do armazenamento libera a requisição"""
+        limiter = RateLimiter(padrao='1 per minute', ativo=False)
+        assert self.verificar(limiter, T0) is None
+
+        limiter.ativo = True
+        with patch.object(limiter.armazenamento, 'consumir', side_effect=RuntimeError('indisponível')):
+            assert self.verificar(limiter, T0) is None
+
+    def test_sqlite_compartilhado_entre_workers(self, tmp_path):
+        """Dois limitadores no mesmo arquivo somam as requisições"""
+        caminho = str(tmp_path / 'comum.db')
+        workers = [RateLimiter(criar_armazenamento(f'sqlite:///{caminho}'), padrao='4 per minute') for _ in range(2)]
+        permitidas = [self.verificar(workers[i % 2], T0).permitido for i in range(6)]
+        assert permitidas == [True] * 4 + [False] * 2
+
+    def test_descarte_de_chaves_ociosas(self):
+        """Chaves expiradas são removidas quando o shard enche"""
+        armazenamento = MemoryStorage(shards=1, max_chaves=4)
+        limiter = RateLimiter(armazenamento, padrao='10 per minute')
+        for i in range(4):
+            self.verificar(limiter, T0, identidade=f'usuario:{i}')
+        self.verificar(limiter, T0 + 300, identidade='usuario:novo')
+        assert len(armazenamento._shards[0][0]) == 1
+
+    def test_descarte_respeita_janela_mais_longa(self):
+        """A chave ociosa só sai depois da janela mais longa, não da última configurada"""
+        armazenamento = MemoryStorage(shards=1, max_chaves=1)
+        limiter = RateLimiter(armazenamento, padrao='5 per hour; 100 per minute')
+        assert all(self.verificar(limiter, T0).permitido for _ in range(5))
+        # Passados 5 minutos outra chave enche o shard: a cota horária continua valendo
+        self.verificar(limiter, T0 + 300, identidade='usuario:2')
+        assert not self.verificar(limiter, T0 + 301).permitido
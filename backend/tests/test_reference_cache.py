@@ -0,0 +1,69 @@
+import pytest
+import json
+import os
+import sys
+from unittest.mock import patch
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reference_cache import ReferenceDataCache
+
+
+class TestReferenceDataCache:
+    """Testes para o cache de dados de referência"""
+
+    def test_loads_once(self, db_manager):
+        """Teste de leitura única enquanto a versão não muda"""
+        cache = ReferenceDataCache(db_manager)
+        with patch.object(cache, '_carregar', wraps=cache._carregar) as carregar:
+            corpo, etag = cache.tipos_documento()
+            assert cache.tipos_documento() == (corpo, etag)
+            assert cache.tipo_documento('SEGURO_RC')['nome'] == 'Seguro de Responsabilidade Civil'
+            assert carregar.call_count == 1
+
+        tipos = json.loads(corpo)
+        assert len(tipos) == 10
+        assert tipos[0]['ativo'] is True
+        assert isinstance(tipos[0]['formatos_aceitos'], list)
+
+    def test_invalidation_reloads_changed_rows(self, db_manager):
+        """Teste de invalidação pela versão após alteração de linha"""
+        cache = ReferenceDataCache(db_manager)
+        corpo, etag = cache.tipos_documento()
+
+        # Sem alteração no conteúdo o ETag se mantém
+        cache.invalidar()
+        assert cache.tipos_documento()[1] == etag
+
+        db_manager.run("UPDATE tipos_documento SET ativo = ? WHERE codigo = ?", (False, 'NOTA_FISCAL'))
+        assert cache.tipos_documento()[1] == etag
+        cache.invalidar()
+        novo_corpo, novo_etag = cache.tipos_documento()
+        assert novo_etag != etag
+        assert 'NOTA_FISCAL' not in {tipo['codigo'] for tipo in json.loads(novo_corpo)}
+        assert cache.versao == 2
+
+    def test_ttl_expiry_reloads(self, db_manager):
+        """Teste de recarga após o TTL (alterações de outros processos)"""
+        cache = ReferenceDataCache(db_manager, ttl=0)
+        cache.tipos_documento()
+        db_manager.run("UPDATE tipos_documento SET tamanho_maximo_mb = ? WHERE codigo = ?", (60, 'SEGURO_RC'))
+        assert cache.tipo_documento('SEGURO_RC')['tamanho_maximo_mb'] == 60
+
+    def test_writer_invalidates(self, db_manager):
+        """Teste de invalidação por quem grava tipos_documento"""
+        cache = ReferenceDataCache(db_manager)
+        db_manager.ao_alterar_referencia.append(cache.invalidar)
+        antigo = cache.tipo_documento('NOTA_FISCAL')['id']
+        db_manager.run("DELETE FROM tipos_documento WHERE codigo = ?", ('NOTA_FISCAL',))
+
+        # insert_sample_data recria a linha com outro id e invalida o cache
+        db_manager.insert_sample_data()
+        assert cache.versao == 1
+        assert cache.tipo_documento('NOTA_FISCAL')['id'] != antigo
+        assert cache.tipo_documento(antigo) is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,117 @@
+import pytest
+import os
+import sys
+from unittest.mock import patch, MagicMock
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_dialect import compile_sql, compile_prepared, insert_sql, PreparedStatementCache
+from database_manager import DatabaseManager
+
+
+class TestSqlDialect:
+    """Testes para o compilador de statements por dialeto"""
+
+    def test_placeholders_per_dialect(self):
+        """Teste de conversão de placeholders"""
+        sql = "SELECT * FROM usuarios WHERE email = ? AND tipo = ?"
+        assert compile_sql(sql, 'sqlite') == sql
+        assert compile_sql(sql, 'mysql') == "SELECT * FROM usuarios WHERE email = %s AND tipo = %s"
+        assert compile_sql(sql, 'postgresql') == "SELECT * FROM usuarios WHERE email = %s AND tipo = %s"
+
+    def test_literals_and_percent_escaping(self):
+        """Teste de literais com `?` e `%` preservados"""
+        sql = "SELECT * FROM documentos WHERE nome LIKE '%?%' AND status = ?"
+        assert compile_sql(sql, 'postgresql') == \
+            "SELECT * FROM documentos WHERE nome LIKE '%%?%%' AND status = %s"
+        # Sem parâmetros o driver não interpola, então `%` não é escapado
+        assert compile_sql("SELECT '100%'", 'mysql') == "SELECT '100%'"
+
+    def test_upsert_do_nothing(self):
+        """Teste de tradução de ON CONFLICT DO NOTHING"""
+        sql = "INSERT INTO configuracoes (chave, valor) VALUES (?, ?) ON CONFLICT (chave) DO NOTHING"
+        assert compile_sql(sql, 'mysql') == "INSERT IGNORE INTO configuracoes (chave, valor) VALUES (%s, %s)"
+        assert compile_sql(sql, 'sqlite') == sql
+        assert compile_sql(sql, 'postgresql').endswith("ON CONFLICT (chave) DO NOTHING")
+
+    def test_upsert_do_update(self):
+        """Teste de tradução de ON CONFLICT DO UPDATE"""
+        sql = insert_sql('configuracoes', ['chave', 'valor'], conflict=['chave'], update=['valor'])
+        assert sql == ("INSERT INTO configuracoes (chave, valor) VALUES (?, ?) "
+                       "ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor")
+        assert compile_sql(sql, 'mysql') == ("INSERT INTO configuracoes (chave, valor) VALUES (%s, %s) "
+                                             "ON DUPLICATE KEY UPDATE valor = VALUES(valor)")
+
+    def test_compilation_is_cached(self):
+        """Teste de cache do SQL compilado"""
+        sql = "SELECT id FROM transportadoras WHERE cnpj = ?"
+        compile_sql(sql, 'mysql')
+        hits = compile_sql.cache_info().hits
+        compile_sql(sql, 'mysql')
+        assert compile_sql.cache_info().hits == hits + 1
+
+    def test_unsupported_dialect(self):
+        """Teste com dialeto inválido"""
+        with pytest.raises(ValueError):
+            compile_sql("SELECT 1", 'oracle')
+
+    def test_postgresql_prepared_statement_reuse(self):
+        """Teste de PREPARE único e EXECUTE reutilizado no PostgreSQL"""
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        statements = PreparedStatementCache('postgresql')
+
+        statements.execute(conn, "SELECT * FROM usuarios WHERE id = ?", (1,))
+        statements.execute(conn, "SELECT * FROM usuarios WHERE id = ?", (2,))
+
+        executed = [call.args[0] for call in cursor.execute.call_args_list]
+        assert executed == [
+            "PREPARE portal_stmt_1 AS SELECT * FROM usuarios WHERE id = $1",
+            "EXECUTE portal_stmt_1 (%s)",
+            "EXECUTE portal_stmt_1 (%s)",
+        ]
+
+    def test_prepared_cache_eviction_deallocates(self):
+        """Teste de DEALLOCATE ao exceder o limite do cache"""
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        statements = PreparedStatementCache('postgresql', max_size=1)
+
+        statements.execute(conn, "SELECT 1")
+        statements.execute(conn, "SELECT 2")
+
+        executed = [call.args[0] for call in cursor.execute.call_args_list]
+        assert "DEALLOCATE portal_stmt_1" in executed
+        assert len(statements) == 1
+
+    def test_mysql_prepared_cursor_reuse(self):
+        """Teste de reutilização do cursor preparado no MySQL"""
+        conn = MagicMock()
+        statements = PreparedStatementCache('mysql')
+        sql = "INSERT INTO usuarios (email) VALUES (?) ON CONFLICT (email) DO NOTHING"
+
+        first = statements.execute(conn, sql, ('a@a.com',))
+        second = statements.execute(conn, sql, ('b@b.com',))
+
+        assert first is second
+        conn.cursor.assert_called_once_with(prepared=True)
+        first.execute.assert_called_with("INSERT IGNORE INTO usuarios (email) VALUES (?)", ('b@b.com',))
+
+    def test_manager_run_canonical_query(self, tmp_path):
+        """Teste de execução de query canônica pelo DatabaseManager"""
+        with patch.dict(os.environ, {'DATABASE_TYPE': 'sqlite', 'DATABASE_PATH': str(tmp_path / 'test.db')}):
+            db_manager = DatabaseManager()
+            db_manager.execute_query("CREATE TABLE itens (chave TEXT PRIMARY KEY, valor TEXT)")
+            upsert = insert_sql('itens', ['chave', 'valor'], conflict=['chave'], update=['valor'])
+
+            db_manager.run_many(upsert, [('a', '1'), ('b', '2')])
+            db_manager.run(upsert, ('a', '3'))
+
+            rows = db_manager.run("SELECT valor FROM itens WHERE chave = ?", ('a',), fetch=True)
+            assert rows == [{'valor': '3'}]
+            db_manager.close_pool()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,91 @@
+import pytest
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+from token_cache import TokenCache, SessaoRevogada
+
+
+class TestTokenCache:
+    """Testes para o cache de tokens verificados"""
+
+    def _decode(self, claims):
+        return MagicMock(side_effect=lambda token: dict(claims))
+
+    def test_decode_only_on_miss(self):
+        """Teste de verificação completa apenas na primeira requisição"""
+        cache = TokenCache()
+        decode = self._decode({'email': 'a@a.com', 'exp': time.time() + 60})
+
+        assert cache.verificar('token', decode)['email'] == 'a@a.com'
+        assert cache.verificar('token', decode)['email'] == 'a@a.com'
+        assert decode.call_count == 1
+        assert cache.stats()['hits'] == 1
+
+    def test_entry_expires_at_exp(self):
+        """Teste de remoção da entrada no exp do token"""
+        cache = TokenCache()
+        cache.put('token', {'exp': time.time() + 60})
+        with patch('token_cache.time.time', return_value=time.time() + 61):
+            assert cache.get('token') is None
+        assert cache.stats()['size'] == 0
+
+        # Tokens sem exp não são mantidos
+        cache.put('sem-exp', {'email': 'a@a.com'})
+        assert cache.get('sem-exp') is None
+
+    def test_bounded_lru(self):
+        """Teste do limite de tamanho com descarte do menos usado"""
+        cache = TokenCache(max_size=2)
+        exp = time.time() + 60
+        cache.put('a', {'exp': exp})
+        cache.put('b', {'exp': exp})
+        cache.get('a')
+        cache.put('c', {'exp': exp})
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.get('c') is not None
+
+    def test_revoked_session_rejected(self):
+        """Teste de recusa de token de sessão revogada"""
+        cache = TokenCache()
+        decode = self._decode({'sid': 's1', 'exp': time.time() + 60})
+        cache.verificar('token', decode)
+
+        cache.revogar('s1')
+        assert cache.stats()['size'] == 0
+        with pytest.raises(SessaoRevogada):
+            cache.verificar('token', decode)
+
+    def test_revocation_sync_from_sessions(self, tmp_path):
+        """Teste de sincronização com sessoes_usuario.ativo"""
+        with patch.dict(os.environ, {'DATABASE_TYPE': 'sqlite', 'DATABASE_PATH': str(tmp_path / 'sessoes.db')}):
+            db_manager = DatabaseManager()
+            db_manager.create_tables()
+            db_manager.insert_sample_data()
+            expiracao = (datetime.utcnow() + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+            db_manager.run_many(
+                "INSERT INTO sessoes_usuario (id, usuario_id, data_expiracao, ativo) VALUES (?, 1, ?, ?)",
+                [('ativa', expiracao, True), ('encerrada', expiracao, False)]
+            )
+
+            cache = TokenCache(db_manager)
+            cache.put('token', {'sid': 'encerrada', 'exp': time.time() + 60})
+            cache.sincronizar_revogacoes()
+
+            assert cache.get('token') is None
+            decode = self._decode({'sid': 'ativa', 'exp': time.time() + 60})
+            assert cache.verificar('outro', decode)['sid'] == 'ativa'
+            with pytest.raises(SessaoRevogada):
+                cache.verificar('token', self._decode({'sid': 'encerrada', 'exp': time.time() + 60}))
+            db_manager.close_pool()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
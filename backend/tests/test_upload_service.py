@@ -0,0 +1,287 @@
+import pytest
+import io
+import os
+import sys
+import hashlib
+from unittest.mock import patch
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import Transaction
+from dashboard_service import DashboardService
+from reference_cache import ReferenceDataCache
+from config_service import ConfigService
+from storage import DocumentStorage, ArquivoMuitoGrande, ArquivoPendente
+from werkzeug.exceptions import RequestEntityTooLarge
+import upload_service
+from upload_service import UploadService, UploadInvalido, DocumentoDuplicado
+
+BOUNDARY = 'portal-boundary'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def multipart(campos, arquivo=None, nome='apolice.pdf', campos_depois=None):
+    """Monta um corpo multipart/form-data com o arquivo entre os campos"""
+    partes = []
+    for nome_campo, valor in campos.items():
+        partes.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{nome_campo}"\r\n\r\n{valor}\r\n'.encode())
+    if arquivo is not None:
+        partes.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="arquivo"; filename="{nome}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode() + arquivo + b'\r\n'
+        )
+    for nome_campo, valor in (campos_depois or {}).items():
+        partes.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{nome_campo}"\r\n\r\n{valor}\r\n'.encode())
+    return b''.join(partes) + f'--{BOUNDARY}--\r\n'.encode()
+
+
+class ContadorStream(io.BytesIO):
+    """Stream que registra quantos bytes foram lidos"""
+
+    lidos = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.lidos += len(data)
+        return data
+
+
+class TestUploadService:
+    """Testes para o upload em streaming e armazenamento por hash"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """Transportadora e limite de 1 MB para SEGURO_RC"""
+        db_manager.run(
+            "INSERT INTO transportadoras (id, cnpj, razao_social) VALUES (?, ?, ?)",
+            (1, '11.111.111/0001-11', 'Silva Transportes')
+        )
+        db_manager.run("UPDATE tipos_documento SET tamanho_maximo_mb = ? WHERE codigo = ?", (1, 'SEGURO_RC'))
+        return db_manager
+
+    @pytest.fixture
+    def service(self, db_manager, tmp_path):
+        storage = DocumentStorage(str(tmp_path / 'uploads'), chunk_size=64 * 1024, fsync=False)
+        return UploadService(db_manager, storage, ReferenceDataCache(db_manager), DashboardService(db_manager))
+
+    def test_storage_hashes_while_writing(self, tmp_path):
+        """Teste de gravação por hash com deduplicação em disco"""
+        storage = DocumentStorage(str(tmp_path / 'uploads'), chunk_size=4, fsync=False)
+        conteudo = b'conteudo do documento'
+
+        primeiro = storage.salvar_stream(io.BytesIO(conteudo))
+        segundo = storage.salvar_stream(io.BytesIO(conteudo))
+
+        digest = hashlib.sha256(conteudo).hexdigest()
+        assert primeiro.hash == digest
+        assert primeiro.caminho == os.path.join(digest[:2], digest[2:4], digest)
+        assert not primeiro.existente and segundo.existente
+        with open(storage.caminho_absoluto(primeiro.caminho), 'rb') as f:
+            assert f.read() == conteudo
+        assert os.listdir(storage.tmp_dir) == []
+
+    def test_receive_and_register(self, service, db_manager):
+        """Teste de upload completo com registro em documentos"""
+        corpo = multipart({'tipo_documento': 'SEGURO_RC', 'transportadora_id': '1',
+                           'data_vencimento': '2025-12-31'}, b'%PDF-1.4 apolice')
+        recebido = service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+        documento = service.registrar_recebido({'id': 1, 'tipo': 'admin'}, recebido)
+
+        row = db_manager.run("SELECT * FROM documentos WHERE id = ?", (documento['id'],), fetch=True)[0]
+        assert row['hash_arquivo'] == hashlib.sha256(b'%PDF-1.4 apolice').hexdigest()
+        assert row['numero_protocolo'] == documento['numero_protocolo']
+        assert row['data_vencimento'] == '2025-12-31'
+        assert row['mime_type'] == 'application/pdf'
+        historico = db_manager.run("SELECT acao FROM historico_documentos WHERE documento_id = ?",
+                                   (documento['id'],), fetch=True)
+        assert historico == [{'acao': 'upload'}]
+
+    def test_unknown_carrier_rejected(self, service, db_manager):
+        """transportadora_id inexistente é erro de validação, não de integridade"""
+        corpo = multipart({'tipo_documento': 'SEGURO_RC', 'transportadora_id': '99999'}, b'%PDF-1.4 apolice')
+        recebido = service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+        with pytest.raises(UploadInvalido, match='99999'):
+            service.registrar_recebido({'id': 1, 'tipo': 'admin'}, recebido)
+        assert db_manager.run("SELECT COUNT(*) AS total FROM documentos", fetch=True)[0]['total'] == 0
+        assert os.listdir(service.storage.tmp_dir) == []
+
+    def test_large_reads_fed_to_decoder(self, service):
+        """Leituras maiores que o limite de campo do decoder não são recusadas"""
+        service.storage.chunk_size = 1024 * 1024
+        conteudo = b'%PDF-1.4 ' + os.urandom(600 * 1024)
+        corpo = multipart({'tipo_documento': 'SEGURO_RC', 'transportadora_id': '1'}, conteudo)
+        recebido = service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+        assert recebido.arquivo.tamanho == len(conteudo)
+        assert recebido.arquivo.hash == hashlib.sha256(conteudo).hexdigest()
+
+    def test_duplicate_detected_by_hash(self, service):
+        """Teste de deduplicação pelo hash do arquivo"""
+        usuario = {'id': 1, 'tipo': 'admin'}
+        for tentativa in range(2):
+            corpo = multipart({'tipo_documento': 'SEGURO_RC', 'transportadora_id': '1'}, b'mesmo arquivo')
+            recebido = service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+            if tentativa == 0:
+                service.registrar_recebido(usuario, recebido)
+            else:
+                with pytest.raises(DocumentoDuplicado):
+                    service.registrar_recebido(usuario, recebido)
+        assert os.listdir(service.storage.tmp_dir) == []
+
+    def test_nothing_published_when_registration_fails(self, service, db_manager):
+        """Teste de validação e inserção antes de o arquivo entrar no storage"""
+        conteudo = b'%PDF-1.4 sem transportadora'
+        caminho = service.storage.caminho_absoluto(service.storage.caminho_relativo(hashlib.sha256(conteudo).hexdigest()))
+
+        recebido = service.receber_multipart(io.BytesIO(multipart({'tipo_documento': 'SEGURO_RC'}, conteudo)),
+                                             CONTENT_TYPE)
+        assert not os.path.exists(caminho)
+        with pytest.raises(UploadInvalido):
+            service.registrar_recebido({'id': 1, 'tipo': 'admin'}, recebido)
+        assert not os.path.exists(caminho)
+        assert os.listdir(service.storage.tmp_dir) == []
+
+        corpo = multipart({'tipo_documento': 'SEGURO_RC', 'transportadora_id': '1'}, conteudo)
+        recebido = service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+        with patch.object(service.dashboard_service, 'registrar_transicao', side_effect=RuntimeError('falha')):
+            with pytest.raises(RuntimeError):
+                service.registrar_recebido({'id': 1, 'tipo': 'admin'}, recebido)
+        assert not os.path.exists(caminho)
+        assert db_manager.run("SELECT COUNT(*) AS n FROM documentos", fetch=True)[0]['n'] == 0
+
+        recebido = service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+        service.registrar_recebido({'id': 1, 'tipo': 'admin'}, recebido)
+        assert os.path.exists(caminho)
+
+    def test_revert_keeps_content_of_committed_upload(self, service, db_manager):
+        """Conteúdo publicado por uma transação desfeita fica se outro documento confirmado o usa"""
+        conteudo = b'%PDF-1.4 enviado por duas transportadoras'
+        digest = hashlib.sha256(conteudo).hexdigest()
+        caminho = service.storage.caminho_absoluto(service.storage.caminho_relativo(digest))
+        # Upload concorrente confirmado enquanto o nosso publicava o conteúdo novo
+        db_manager.run("INSERT INTO transportadoras (id, cnpj, razao_social) VALUES (?, ?, ?)",
+                       (2, '22.222.222/0001-22', 'Souza Cargas'))
+        db_manager.run(
+            """INSERT INTO documentos (numero_protocolo, transportadora_id, tipo_documento_id, usuario_upload_id,
+                                       nome_arquivo_original, nome_arquivo_sistema, caminho_arquivo,
+                                       tamanho_arquivo, hash_arquivo)
+               VALUES ('DOC-2', 2, 1, 1, 'a.pdf', 'a.pdf', ?, ?, ?)""",
+            (service.storage.caminho_relativo(digest), len(conteudo), digest)
+        )
+
+        publicar = ArquivoPendente.publicar
+
+        def publicar_e_falhar(arquivo):
+            publicar(arquivo)
+            raise RuntimeError('commit falhou')
+
+        recebido = service.receber_multipart(
+            io.BytesIO(multipart({'tipo_documento': 'SEGURO_RC', 'transportadora_id': '1'}, conteudo)), CONTENT_TYPE)
+        with patch.object(ArquivoPendente, 'publicar', publicar_e_falhar):
+            with pytest.raises(RuntimeError):
+                service.registrar_recebido({'id': 1, 'tipo': 'admin'}, recebido)
+        assert os.path.exists(caminho)
+        assert db_manager.run("SELECT COUNT(*) AS n FROM documentos", fetch=True)[0]['n'] == 1
+        assert os.listdir(service.storage.tmp_dir) == []
+
+    def test_confirm_republishes_reverted_content(self, tmp_path):
+        """confirmar() devolve ao storage um conteúdo retirado por outra transação"""
+        storage = DocumentStorage(str(tmp_path / 'uploads'), fsync=False)
+        pendentes = []
+        for _ in range(2):
+            gravacao = storage.gravacao()
+            gravacao.write(b'mesmo conteudo')
+            pendentes.append(gravacao.fechar())
+        primeiro, segundo = pendentes
+        assert not primeiro.publicar().existente
+        assert segundo.publicar().existente
+
+        primeiro.reverter()
+        caminho = storage.caminho_absoluto(segundo.caminho)
+        assert not os.path.exists(caminho)
+        segundo.confirmar()
+        primeiro.descartar()
+        with open(caminho, 'rb') as f:
+            assert f.read() == b'mesmo conteudo'
+        assert os.listdir(storage.tmp_dir) == []
+
+    def test_unique_index_reports_concurrent_duplicate(self, service, db_manager):
+        """Duplicata que escapa da consulta prévia é barrada pelo índice único"""
+        corpo = multipart({'tipo_documento': 'SEGURO_RC', 'transportadora_id': '1'}, b'%PDF-1.4 concorrente')
+        primeiro = service.registrar_recebido({'id': 1, 'tipo': 'admin'},
+                                              service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE))
+
+        run = Transaction.run
+        consultas = []
+
+        def sem_consulta_previa(tx, sql, params=None, fetch=False):
+            # A primeira consulta de duplicatas roda antes do commit do upload concorrente
+            if sql == upload_service._SQL_DUPLICADO and not consultas:
+                consultas.append(sql)
+                return []
+            return run(tx, sql, params, fetch=fetch)
+
+        recebido = service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+        with patch.object(Transaction, 'run', sem_consulta_previa):
+            with pytest.raises(DocumentoDuplicado) as erro:
+                service.registrar_recebido({'id': 1, 'tipo': 'admin'}, recebido)
+        assert erro.value.documento['numero_protocolo'] == primeiro['numero_protocolo']
+        assert db_manager.run("SELECT COUNT(*) AS n FROM documentos", fetch=True)[0]['n'] == 1
+        assert os.listdir(service.storage.tmp_dir) == []
+
+    def test_form_fields_limited(self, service):
+        """Teste do limite dos campos do formulário, inclusive sem Content-Length"""
+        corpo = multipart({'tipo_documento': 'SEGURO_RC', 'observacao': 'x' * (1024 * 1024)}, b'%PDF')
+        stream = ContadorStream(corpo)
+        with pytest.raises(RequestEntityTooLarge):
+            service.receber_multipart(stream, CONTENT_TYPE)
+        assert stream.lidos < len(corpo)
+
+        campos = {f'campo{i}': 'x' * (60 * 1024) for i in range(8)}
+        with pytest.raises(RequestEntityTooLarge):
+            service.receber_multipart(io.BytesIO(multipart(campos, b'%PDF')), CONTENT_TYPE)
+
+    def test_size_limit_enforced_mid_stream(self, service):
+        """Teste de recusa do arquivo grande antes de ler o corpo inteiro"""
+        corpo = multipart({'tipo_documento': 'SEGURO_RC', 'transportadora_id': '1'}, b'x' * (3 * 1024 * 1024))
+        stream = ContadorStream(corpo)
+
+        with pytest.raises(ArquivoMuitoGrande):
+            service.receber_multipart(stream, CONTENT_TYPE)
+        assert stream.lidos < len(corpo) / 2
+        assert os.listdir(service.storage.tmp_dir) == []
+
+    def test_type_after_file_still_limited(self, service):
+        """Teste do limite do tipo quando o campo vem depois do arquivo"""
+        corpo = multipart({}, b'x' * (2 * 1024 * 1024), campos_depois={'tipo_documento': 'SEGURO_RC'})
+        with pytest.raises(ArquivoMuitoGrande):
+            service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+
+    def test_global_limit_from_configuration(self, db_manager, service):
+        """Teste do limite global lido de configuracoes, sem passar do ambiente"""
+        service.limite_maximo = 4 * 1024 * 1024
+        service.config_service = ConfigService(db_manager, intervalo=0)
+        assert service.limite_padrao == 4 * 1024 * 1024
+
+        service.config_service.definir('tamanho_maximo_arquivo', 2)
+        assert service.limite_bytes() == 2 * 1024 * 1024
+        corpo = multipart({}, b'x' * (3 * 1024 * 1024), campos_depois={'tipo_documento': 'CERTIFICADO_ISO'})
+        with pytest.raises(ArquivoMuitoGrande):
+            service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+
+    def test_invalid_requests(self, service):
+        """Teste de uploads inválidos"""
+        with pytest.raises(UploadInvalido):
+            service.receber_multipart(io.BytesIO(b'{}'), 'application/json')
+        with pytest.raises(UploadInvalido):
+            service.receber_multipart(io.BytesIO(multipart({'tipo_documento': 'SEGURO_RC'})), CONTENT_TYPE)
+        with pytest.raises(UploadInvalido):
+            corpo = multipart({'tipo_documento': 'SEGURO_RC'}, b'MZ', nome='programa.exe')
+            service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+        with pytest.raises(UploadInvalido):
+            corpo = multipart({'tipo_documento': 'DESCONHECIDO'}, b'%PDF')
+            service.receber_multipart(io.BytesIO(corpo), CONTENT_TYPE)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
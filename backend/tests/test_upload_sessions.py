@@ -0,0 +1,153 @@
+import pytest
+import io
+import os
+import sys
+import hashlib
+
+# Adicionar o diretório pai ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard_service import DashboardService
+from reference_cache import ReferenceDataCache
+from storage import DocumentStorage, ArquivoMuitoGrande
+from upload_service import UploadService, UploadInvalido
+from upload_sessions import (
+    UploadSessionService, SessaoNaoEncontrada, SessaoEmFinalizacao, ChecksumInvalido, intervalos
+)
+
+CONTEUDO = bytes(range(256)) * 10  # 2560 bytes -> 3 pedaços de 1 KB
+USUARIO = {'id': 1, 'tipo': 'admin'}
+
+
+class TestUploadSessions:
+    """Testes para o upload retomável em pedaços"""
+
+    @pytest.fixture
+    def db_manager(self, db_manager):
+        """Transportadora das sessões de upload"""
+        db_manager.run(
+            "INSERT INTO transportadoras (id, cnpj, razao_social) VALUES (?, ?, ?)",
+            (1, '11.111.111/0001-11', 'Silva Transportes')
+        )
+        return db_manager
+
+    @pytest.fixture
+    def sessions(self, db_manager, tmp_path):
+        storage = DocumentStorage(str(tmp_path / 'uploads'), chunk_size=512, fsync=False)
+        uploads = UploadService(db_manager, storage, ReferenceDataCache(db_manager), DashboardService(db_manager))
+        return UploadSessionService(db_manager, uploads, tamanho_chunk=1024)
+
+    def _criar(self, sessions):
+        return sessions.criar(USUARIO, {
+            'tipo_documento': 'LICENCA_AMBIENTAL', 'nome_arquivo': 'licenca.pdf',
+            'tamanho_total': len(CONTEUDO), 'transportadora_id': 1, 'data_vencimento': '2026-06-30'
+        })
+
+    def _enviar(self, sessions, sessao_id, indice, checksum=True):
+        pedaco = CONTEUDO[indice * 1024:(indice + 1) * 1024]
+        sha256 = hashlib.sha256(pedaco).hexdigest() if checksum else None
+        return sessions.receber_chunk(USUARIO, sessao_id, indice, io.BytesIO(pedaco), sha256)
+
+    def test_intervalos(self):
+        """Teste de agrupamento dos pedaços recebidos"""
+        assert intervalos([0, 1, 2, 5, 7, 8]) == [[0, 2], [5, 5], [7, 8]]
+        assert intervalos([]) == []
+
+    def test_out_of_order_chunks_and_finalize(self, sessions, db_manager):
+        """Teste de envio fora de ordem, retomada e finalização"""
+        sessao = self._criar(sessions)
+        assert sessao['total_chunks'] == 3
+
+        self._enviar(sessions, sessao['id'], 2)
+        self._enviar(sessions, sessao['id'], 0)
+        status = sessions.status(USUARIO, sessao['id'])
+        assert status['recebidos'] == [[0, 0], [2, 2]]
+        assert status['faltando'] == 1
+
+        with pytest.raises(UploadInvalido):
+            sessions.finalizar(USUARIO, sessao['id'])
+
+        self._enviar(sessions, sessao['id'], 1)
+        documento = sessions.finalizar(USUARIO, sessao['id'])
+
+        digest = hashlib.sha256(CONTEUDO).hexdigest()
+        assert documento['hash_arquivo'] == digest
+        assert documento['numero_protocolo'].startswith('DOC-')
+        with open(sessions.storage.caminho_absoluto(sessions.storage.caminho_relativo(digest)), 'rb') as f:
+            assert f.read() == CONTEUDO
+        row = db_manager.run("SELECT data_vencimento, tamanho_arquivo FROM documentos WHERE id = ?",
+                             (documento['id'],), fetch=True)[0]
+        assert row == {'data_vencimento': '2026-06-30', 'tamanho_arquivo': len(CONTEUDO)}
+        with pytest.raises(SessaoNaoEncontrada):
+            sessions.status(USUARIO, sessao['id'])
+        assert os.listdir(sessions.sessoes_dir) == []
+
+    def test_chunk_validation(self, sessions):
+        """Teste de checksum, tamanho e índice dos pedaços"""
+        sessao = self._criar(sessions)
+        with pytest.raises(ChecksumInvalido):
+            sessions.receber_chunk(USUARIO, sessao['id'], 0, io.BytesIO(CONTEUDO[:1024]), '0' * 64)
+        with pytest.raises(UploadInvalido):
+            sessions.receber_chunk(USUARIO, sessao['id'], 0, io.BytesIO(CONTEUDO[:10]))
+        with pytest.raises(UploadInvalido):
+            sessions.receber_chunk(USUARIO, sessao['id'], 0, io.BytesIO(CONTEUDO[:1025]))
+        with pytest.raises(UploadInvalido):
+            sessions.receber_chunk(USUARIO, sessao['id'], 3, io.BytesIO(b'x'))
+        assert sessions.status(USUARIO, sessao['id'])['recebidos'] == []
+
+    def test_session_owner_and_size_limit(self, sessions):
+        """Teste de acesso por outro usuário e tamanho acima do limite do tipo"""
+        sessao = self._criar(sessions)
+        with pytest.raises(SessaoNaoEncontrada):
+            sessions.status({'id': 2, 'tipo': 'admin'}, sessao['id'])
+        with pytest.raises(ArquivoMuitoGrande):
+            sessions.criar(USUARIO, {'tipo_documento': 'LICENCA_AMBIENTAL', 'nome_arquivo': 'licenca.pdf',
+                                     'tamanho_total': 11 * 1024 * 1024, 'transportadora_id': 1})
+
+    def test_abandoned_sessions_collected(self, sessions, db_manager):
+        """Teste da coleta de sessões sem atividade"""
+        sessao = self._criar(sessions)
+        self._enviar(sessions, sessao['id'], 0)
+        db_manager.run("UPDATE upload_sessoes SET data_atualizacao = ? WHERE id = ?",
+                       ('2000-01-01 00:00:00', sessao['id']))
+
+        assert sessions.coletar_abandonadas() == 1
+        assert db_manager.run("SELECT COUNT(*) AS total FROM upload_sessoes_chunks", fetch=True)[0]['total'] == 0
+        assert os.listdir(sessions.sessoes_dir) == []
+
+    def test_interrupted_finalization_recovered(self, sessions, db_manager):
+        """Teste de recuperação de uma finalização interrompida pela queda do processo"""
+        sessao = self._criar(sessions)
+        for indice in range(3):
+            self._enviar(sessions, sessao['id'], indice)
+        # Estado deixado por um processo que caiu depois de reivindicar o arquivo
+        finalizando = sessions._caminho(sessao['id'], 'finalizando')
+        os.rename(sessions._caminho(sessao['id']), finalizando)
+        with pytest.raises(SessaoEmFinalizacao):
+            sessions.finalizar(USUARIO, sessao['id'])
+
+        # Finalização recente não é tocada; a interrompida volta a .part
+        assert sessions.coletar_abandonadas() == 0
+        assert os.path.exists(finalizando)
+        os.utime(finalizando, (0, 0))
+        sessions.coletar_abandonadas()
+        assert os.listdir(sessions.sessoes_dir) == [f"{sessao['id']}.part"]
+
+        documento = sessions.finalizar(USUARIO, sessao['id'])
+        assert documento['hash_arquivo'] == hashlib.sha256(CONTEUDO).hexdigest()
+        assert os.listdir(sessions.sessoes_dir) == []
+
+    def test_orphan_finalizing_file_removed(self, sessions):
+        """Teste de remoção de .finalizando sem sessão registrada"""
+        os.makedirs(sessions.sessoes_dir, exist_ok=True)
+        orfao = sessions._caminho('0' * 32, 'finalizando')
+        with open(orfao, 'wb') as f:
+            f.write(b'x')
+        os.utime(orfao, (0, 0))
+
+        sessions.coletar_abandonadas()
+        assert os.listdir(sessions.sessoes_dir) == []
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
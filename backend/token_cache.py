@@ -0,0 +1,149 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+
+class SessaoRevogada(Exception):
+    """Token válido de uma sessão encerrada (sessoes_usuario.ativo = false)"""
+
+
+class TokenCache:
+    """LRU de tokens JWT já verificados, indexado pelo digest do token
+
+    Cada entrada guarda as claims decodificadas e vale até o `exp` do token;
+    tokens sem `exp` não são mantidos. Sessões encerradas (claim `sid`) são
+    recusadas mesmo com assinatura válida: revogar() atua no processo atual e a
+    sincronização periódica com sessoes_usuario propaga para os demais workers.
+    """
+
+    def __init__(self, db_manager=None, max_size=10000, revocation_interval=30.0):
+        self.db_manager = db_manager
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._revogadas = set()
+        self._revogadas_locais = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._sync = None
+        if db_manager is not None:
+            self._sync = PeriodicTask('token-revocation', revocation_interval, self.sincronizar_revogacoes)
+
+    def ensure_started(self):
+        """Inicia a sincronização de revogações uma vez por processo"""
+        if self._sync is not None:
+            self._sync.ensure_started()
+
+    def stop(self):
+        """Interrompe a sincronização de revogações"""
+        if self._sync is not None:
+            self._sync.stop()
+
+    @staticmethod
+    def _chave(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def verificar(self, token, decode):
+        """Claims do token, chamando `decode` (verificação completa) só em cache miss
+
+        Erros de `decode` são propagados; SessaoRevogada indica sessão encerrada.
+        """
+        claims = self.get(token)
+        if claims is None:
+            claims = decode(token)
+            self.put(token, claims)
+        sid = claims.get('sid')
+        if sid is not None and sid in self._revogadas:
+            raise SessaoRevogada(f"Sessão {sid} encerrada")
+        return claims
+
+    def get(self, token):
+        """Claims em cache para o token, ou None se ausente ou expirado"""
+        chave = self._chave(token)
+        with self._lock:
+            entry = self._entries.get(chave)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry[0] <= time.time():
+                del self._entries[chave]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(chave)
+            self._hits += 1
+            return entry[1]
+
+    def claims(self, token):
+        """Como get(), mas sem alterar a ordem do LRU nem as estatísticas (rate limiting)"""
+        with self._lock:
+            entry = self._entries.get(self._chave(token))
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def put(self, token, claims):
+        """Guarda as claims de um token verificado até o seu `exp`"""
+        exp = claims.get('exp')
+        if not isinstance(exp, (int, float)) or exp <= time.time():
+            return
+        chave = self._chave(token)
+        with self._lock:
+            self._entries[chave] = (exp, claims)
+            self._entries.move_to_end(chave)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def revogar(self, sid, exp=None):
+        """Recusa os tokens da sessão `sid` neste processo e os remove do cache
+
+        Chamado depois de marcar sessoes_usuario.ativo = false; `exp` limita por
+        quanto tempo a revogação local é lembrada sem o banco.
+        """
+        with self._lock:
+            self._revogadas.add(sid)
+            self._revogadas_locais[sid] = exp or time.time() + 86400
+            for chave in [chave for chave, entry in self._entries.items() if entry[1].get('sid') == sid]:
+                del self._entries[chave]
+
+    def purgar_expirados(self):
+        """Remove entradas cujo `exp` já passou"""
+        agora = time.time()
+        with self._lock:
+            for chave in [chave for chave, entry in self._entries.items() if entry[0] <= agora]:
+                del self._entries[chave]
+            for sid in [sid for sid, exp in self._revogadas_locais.items() if exp <= agora]:
+                del self._revogadas_locais[sid]
+
+    def sincronizar_revogacoes(self):
+        """Carrega as sessões encerradas ainda não expiradas (idx_sessoes_ativo)"""
+        self.purgar_expirados()
+        rows = self.db_manager.run(
+            "SELECT id FROM sessoes_usuario WHERE ativo = ? AND data_expiracao > ?",
+            (False, datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')),
+            fetch=True
+        )
+        revogadas = {row['id'] for row in rows}
+        with self._lock:
+            revogadas.update(self._revogadas_locais)
+            novas = revogadas - self._revogadas
+            self._revogadas = revogadas
+            if novas:
+                for chave in [chave for chave, entry in self._entries.items() if entry[1].get('sid') in novas]:
+                    del self._entries[chave]
+
+    def stats(self):
+        """Estatísticas instantâneas do cache"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'revoked_sessions': len(self._revogadas),
+            }
@@ -0,0 +1,358 @@
+import os
+import uuid
+import logging
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+_LIMITE_CAMPO = 64 * 1024
+# Total de bytes fora do `arquivo` (campos e partes ignoradas), inclusive em corpos chunked
+_LIMITE_FORMULARIO = 256 * 1024
+# Pedaço entregue ao decoder por vez (deve caber em max_form_memory_size)
+_BLOCO_DECODER = 16 * 1024
+_SQL_DUPLICADO = """SELECT id, numero_protocolo, status FROM documentos
+                     WHERE hash_arquivo = ? AND transportadora_id = ? AND tipo_documento_id = ?"""
+
+
+class UploadInvalido(ValueError):
+    """Requisição de upload inválida (resposta 400)"""
+
+
+class DocumentoDuplicado(Exception):
+    """Arquivo idêntico já enviado para a mesma transportadora e tipo"""
+
+    def __init__(self, documento):
+        super().__init__(f"Documento já enviado: {documento['numero_protocolo']}")
+        self.documento = documento
+
+
+def gerar_protocolo():
+    """Número de protocolo único no formato DOC-AAAA-XXXXXXXXXX"""
+    return f"DOC-{datetime.utcnow():%Y}-{uuid.uuid4().hex[:10].upper()}"
+
+
+class ArquivoRecebido:
+    """Arquivo recebido (ainda fora do storage) e os campos do formulário que o acompanham"""
+
+    __slots__ = ('campos', 'arquivo', 'nome_original', 'mime_type', 'tipo')
+
+    def __init__(self, campos, arquivo, nome_original, mime_type, tipo):
+        self.campos = campos
+        self.arquivo = arquivo
+        self.nome_original = nome_original
+        self.mime_type = mime_type
+        self.tipo = tipo
+
+
+class LeitorMultipart:
+    """Decodifica um corpo multipart recebido em pedaços, gravando o `arquivo`
+
+    Não lê de nenhuma fonte: o chamador entrega os bytes com alimentar(), o que
+    permite usá-lo tanto com o stream WSGI quanto com o receive() do ASGI.
+    """
+
+    def __init__(self, service, content_type, campos=None):
+        mimetype, opcoes = parse_options_header(content_type or '')
+        if mimetype != 'multipart/form-data' or not opcoes.get('boundary'):
+            raise UploadInvalido("Envie o arquivo como multipart/form-data")
+        self.service = service
+        self.campos = dict(campos or {})
+        self.fim = False
+        self._decoder = MultipartDecoder(opcoes['boundary'].encode('latin-1'), max_form_memory_size=_LIMITE_CAMPO)
+        self._gravacao = None
+        self._nome_original = None
+        self._mime_type = None
+        self._parte = None  # ('campo', nome, bytearray) | ('arquivo',) | ('ignorar',)
+        self._tipo = None
+        self._arquivo_completo = False
+        self._bytes_formulario = 0
+
+    def alimentar(self, data):
+        """Processa mais bytes do corpo; None indica o fim da requisição"""
+        if not data:
+            self._processar(None)
+            self.fim = True
+            return
+        # O decoder recusa acumular mais que max_form_memory_size de uma vez
+        for inicio in range(0, len(data), _BLOCO_DECODER):
+            if self.fim:
+                break
+            self._processar(data[inicio:inicio + _BLOCO_DECODER])
+
+    def _processar(self, data):
+        service = self.service
+        campos = self.campos
+        self._decoder.receive_data(data)
+        while True:
+            try:
+                event = self._decoder.next_event()
+            except ValueError as e:
+                raise UploadInvalido(f"Corpo multipart inválido: {e}")
+            if isinstance(event, NeedData):
+                break
+            if isinstance(event, Epilogue):
+                self.fim = True
+                break
+            if isinstance(event, Field):
+                self._parte = ('campo', event.name, bytearray())
+            elif isinstance(event, File):
+                if event.name != 'arquivo' or self._gravacao is not None:
+                    self._parte = ('ignorar',)
+                    continue
+                if service.chave_tipo(campos):
+                    self._tipo = service.tipo_documento(service.chave_tipo(campos))
+                    service.validar_extensao(self._tipo, event.filename)
+                self._nome_original = event.filename
+                self._mime_type = event.headers.get('content-type')
+                self._gravacao = service.storage.gravacao(service.limite_bytes(self._tipo))
+                self._parte = ('arquivo',)
+            elif isinstance(event, Data):
+                if self._parte[0] == 'arquivo':
+                    self._gravacao.write(event.data)
+                    self._arquivo_completo = not event.more_data
+                    continue
+                self._bytes_formulario += len(event.data)
+                if self._bytes_formulario > _LIMITE_FORMULARIO:
+                    raise RequestEntityTooLarge()
+                if self._parte[0] == 'campo':
+                    self._parte[2].extend(event.data)
+                    if len(self._parte[2]) > _LIMITE_CAMPO:
+                        raise RequestEntityTooLarge()
+                    if not event.more_data:
+                        campos[self._parte[1]] = self._parte[2].decode('utf-8', errors='replace')
+
+    def concluir(self):
+        """Valida o que foi recebido e encerra a gravação (publicada só por registrar())"""
+        service = self.service
+        campos = self.campos
+        if self._gravacao is None or not self._nome_original:
+            raise UploadInvalido("Nenhum arquivo enviado")
+        if not self._arquivo_completo:
+            raise UploadInvalido("Upload incompleto")
+        if not service.chave_tipo(campos):
+            raise UploadInvalido("Tipo de documento é obrigatório")
+        if self._tipo is None:
+            # Tipo enviado depois do arquivo: valida agora, antes de aceitar o arquivo
+            self._tipo = service.tipo_documento(service.chave_tipo(campos))
+            service.validar_extensao(self._tipo, self._nome_original)
+            self._gravacao.verificar_limite(service.limite_bytes(self._tipo))
+        return ArquivoRecebido(campos, self._gravacao.fechar(), self._nome_original, self._mime_type, self._tipo)
+
+    def descartar(self):
+        """Remove o arquivo temporário de uma leitura interrompida"""
+        if self._gravacao is not None:
+            self._gravacao.descartar()
+
+
+class UploadService:
+    """Recebe uploads em streaming e registra o documento
+
+    O corpo multipart é lido em pedaços direto do socket e o arquivo segue para
+    o DocumentStorage, que calcula o SHA-256 durante a gravação. O limite de
+    tamanho do tipo de documento é aplicado assim que o tipo é conhecido (campo
+    enviado antes do arquivo ou na query string); até lá vale o limite global,
+    lido de configuracoes.tamanho_maximo_arquivo quando há um ConfigService e
+    nunca acima de `limite_padrao_mb`.
+    """
+
+    def __init__(self, db_manager, storage, reference_cache, dashboard_service, limite_padrao_mb=50,
+                 audit_sink=None, config_service=None):
+        self.db_manager = db_manager
+        self.storage = storage
+        self.reference_cache = reference_cache
+        self.dashboard_service = dashboard_service
+        self.limite_maximo = limite_padrao_mb * _MB
+        self.audit_sink = audit_sink
+        self.config_service = config_service
+
+    @property
+    def limite_padrao(self):
+        """Limite global em bytes (configuração do sistema, limitada pelo ambiente)"""
+        if self.config_service is not None:
+            limite_mb = self.config_service.obter('tamanho_maximo_arquivo')
+            if isinstance(limite_mb, int) and limite_mb > 0:
+                return min(limite_mb * _MB, self.limite_maximo)
+        return self.limite_maximo
+
+    def tipo_documento(self, chave):
+        """Tipo de documento ativo pelo id ou código"""
+        tipo = self.reference_cache.tipo_documento(chave) if chave else None
+        if tipo is None:
+            raise UploadInvalido(f"Tipo de documento inválido: {chave}")
+        return tipo
+
+    @staticmethod
+    def chave_tipo(campos):
+        """Tipo informado no formulário (tipo_documento ou tipo_documento_id)"""
+        return campos.get('tipo_documento') or campos.get('tipo_documento_id')
+
+    def limite_bytes(self, tipo=None):
+        """Tamanho máximo em bytes para o tipo, nunca acima do limite global"""
+        if tipo is not None and tipo.get('tamanho_maximo_mb'):
+            return min(int(tipo['tamanho_maximo_mb']) * _MB, self.limite_padrao)
+        return self.limite_padrao
+
+    def validar_extensao(self, tipo, nome_arquivo):
+        """Confere a extensão do arquivo com tipos_documento.formatos_aceitos"""
+        formatos = tipo.get('formatos_aceitos') or []
+        extensao = os.path.splitext(nome_arquivo)[1].lstrip('.').upper()
+        if formatos and extensao not in {formato.upper() for formato in formatos}:
+            raise UploadInvalido(f"Formato não aceito para {tipo['codigo']}: {extensao or 'sem extensão'}")
+
+    def leitor_multipart(self, content_type, campos=None):
+        """Leitor incremental do corpo multipart (alimentado pelo chamador)"""
+        return LeitorMultipart(self, content_type, campos)
+
+    def receber_multipart(self, stream, content_type, campos=None):
+        """Lê o corpo multipart em streaming e grava o campo `arquivo` (fora do storage)"""
+        leitor = self.leitor_multipart(content_type, campos)
+        try:
+            while not leitor.fim:
+                chunk = stream.read(self.storage.chunk_size)
+                leitor.alimentar(chunk or None)
+            return leitor.concluir()
+        except BaseException:
+            leitor.descartar()
+            raise
+
+    def transportadora_do_upload(self, usuario, campos):
+        """Transportadora dona do documento: a do usuário ou a informada pelo admin"""
+        if usuario.get('tipo') == 'transportadora':
+            if not usuario.get('transportadora_id'):
+                raise UploadInvalido("Usuário sem transportadora vinculada")
+            return usuario['transportadora_id']
+        try:
+            transportadora_id = int(campos['transportadora_id'])
+        except (KeyError, TypeError, ValueError):
+            raise UploadInvalido("transportadora_id é obrigatório")
+        if not self.db_manager.run("SELECT id FROM transportadoras WHERE id = ?", (transportadora_id,), fetch=True):
+            raise UploadInvalido(f"Transportadora não encontrada: {transportadora_id}")
+        return transportadora_id
+
+    def metadados(self, campos):
+        """Valida os campos opcionais do documento (vencimento, garantia, apólice)"""
+        dados = {}
+        if campos.get('data_vencimento'):
+            try:
+                dados['data_vencimento'] = date.fromisoformat(campos['data_vencimento']).isoformat()
+            except ValueError:
+                raise UploadInvalido(f"Data inválida em data_vencimento: {campos['data_vencimento']}")
+        if campos.get('valor_garantia'):
+            try:
+                dados['valor_garantia'] = str(Decimal(campos['valor_garantia']))
+            except InvalidOperation:
+                raise UploadInvalido(f"Valor inválido em valor_garantia: {campos['valor_garantia']}")
+        for campo in ('numero_apolice', 'seguradora'):
+            if campos.get(campo):
+                dados[campo] = campos[campo][:100]
+        return dados
+
+    def registrar_recebido(self, usuario, recebido, ip_address=None, user_agent=None):
+        """registrar() de um upload multipart, removendo o arquivo recebido se o registro falhar"""
+        try:
+            return self.registrar(
+                usuario, recebido.campos, recebido.tipo, recebido.arquivo,
+                recebido.nome_original, recebido.mime_type,
+                ip_address=ip_address, user_agent=user_agent
+            )
+        except BaseException:
+            recebido.arquivo.descartar()
+            raise
+
+    def _consultar_apos_falha(self, sql, params):
+        """Consulta feita após desfazer a transação; None se o banco também falhar"""
+        try:
+            return self.db_manager.run(sql, params, fetch=True)
+        except Exception as e:
+            logger.warning(f"Consulta após falha no registro não executada: {e}")
+            return None
+
+    def _conteudo_referenciado(self, hash_arquivo):
+        """Algum documento confirmado usa o conteúdo? Na dúvida (banco fora), sim"""
+        return self._consultar_apos_falha(
+            "SELECT 1 FROM documentos WHERE hash_arquivo = ? LIMIT 1", (hash_arquivo,)
+        ) != []
+
+    def registrar(self, usuario, campos, tipo, arquivo, nome_original, mime_type=None,
+                  ip_address=None, user_agent=None):
+        """Cria a linha em documentos e publica `arquivo` (ArquivoPendente) no storage
+
+        Tudo é validado e o documento é inserido antes da publicação, que é o
+        último passo da transação: uma falha em qualquer ponto não deixa no
+        storage conteúdo sem documento. Deduplica por hash; idx_documentos_hash_unico
+        garante a regra entre uploads concorrentes.
+        """
+        transportadora_id = self.transportadora_do_upload(usuario, campos)
+        metadados = self.metadados(campos)
+        protocolo = gerar_protocolo()
+        extensao = os.path.splitext(nome_original)[1].lower()
+        chave = (arquivo.hash, transportadora_id, tipo['id'])
+
+        try:
+            with self.db_manager.transaction() as tx:
+                existentes = tx.run(_SQL_DUPLICADO, chave, fetch=True)
+                if existentes:
+                    raise DocumentoDuplicado(existentes[0])
+
+                tx.run(
+                    """INSERT INTO documentos (numero_protocolo, transportadora_id, tipo_documento_id, usuario_upload_id,
+                                               nome_arquivo_original, nome_arquivo_sistema, caminho_arquivo,
+                                               tamanho_arquivo, hash_arquivo, mime_type, data_vencimento,
+                                               valor_garantia, numero_apolice, seguradora, status, ip_upload, user_agent)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (protocolo, transportadora_id, tipo['id'], usuario['id'], nome_original[:255],
+                     arquivo.hash + extensao, arquivo.caminho, arquivo.tamanho, arquivo.hash,
+                     mime_type, metadados.get('data_vencimento'), metadados.get('valor_garantia'),
+                     metadados.get('numero_apolice'), metadados.get('seguradora'), 'pendente',
+                     ip_address, user_agent)
+                )
+                documento_id = tx.run(
+                    "SELECT id FROM documentos WHERE numero_protocolo = ?", (protocolo,), fetch=True
+                )[0]['id']
+                if self.audit_sink is None:
+                    tx.run(
+                        """INSERT INTO historico_documentos (documento_id, usuario_id, acao, status_novo, ip_origem, user_agent)
+                           VALUES (?, ?, ?, ?, ?, ?)""",
+                        (documento_id, usuario['id'], 'upload', 'pendente', ip_address, user_agent)
+                    )
+                self.dashboard_service.registrar_transicao(tx, transportadora_id, None, 'pendente')
+                # Último passo antes do commit: conteúdo novo só entra no storage com o documento inserido
+                armazenado = arquivo.publicar()
+        except BaseException as e:
+            arquivo.reverter(lambda: self._conteudo_referenciado(arquivo.hash))
+            if isinstance(e, Exception) and not isinstance(e, DocumentoDuplicado):
+                # Upload concorrente do mesmo arquivo confirmado antes (violou o índice único)
+                existentes = self._consultar_apos_falha(_SQL_DUPLICADO, chave)
+                if existentes:
+                    raise DocumentoDuplicado(existentes[0]) from e
+            raise
+        arquivo.confirmar()
+
+        if self.audit_sink is not None:
+            # Histórico e auditoria gravados em lote, fora da requisição
+            self.audit_sink.historico(documento_id, usuario['id'], 'upload', status_novo='pendente',
+                                      ip_origem=ip_address, user_agent=user_agent)
+            self.audit_sink.auditar('upload_documento', usuario_id=usuario['id'], tabela_afetada='documentos',
+                                    registro_id=documento_id,
+                                    dados_novos={'numero_protocolo': protocolo, 'hash_arquivo': armazenado.hash},
+                                    ip_origem=ip_address, user_agent=user_agent)
+
+        logger.info(
+            f"Documento {protocolo} registrado ({armazenado.tamanho} bytes, "
+            f"{'arquivo reutilizado' if armazenado.existente else 'arquivo novo'})"
+        )
+        return {
+            'id': documento_id,
+            'numero_protocolo': protocolo,
+            'transportadora_id': transportadora_id,
+            'tipo_documento': tipo['codigo'],
+            'nome_arquivo': nome_original,
+            'tamanho_arquivo': armazenado.tamanho,
+            'hash_arquivo': armazenado.hash,
+            'status': 'pendente',
+        }
@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from background import PeriodicTask
+from metrics import bytes_upload
+from storage import ArquivoPendente, ArquivoMuitoGrande
+from upload_service import UploadInvalido, DocumentoDuplicado
+
+logger = logging.getLogger(__name__)
+
+_FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+# Tempo após o qual um arquivo .finalizando é considerado de uma finalização interrompida
+_FINALIZACAO_MAXIMA = 3600
+
+# Campos do formulário guardados na sessão e repassados ao registro do documento
+_CAMPOS_DOCUMENTO = ('transportadora_id', 'data_vencimento', 'valor_garantia', 'numero_apolice', 'seguradora')
+
+
+class SessaoNaoEncontrada(Exception):
+    """Sessão de upload inexistente, expirada ou de outro usuário (resposta 404)"""
+
+
+class ChecksumInvalido(UploadInvalido):
+    """SHA-256 do pedaço recebido difere do informado (resposta 422)"""
+
+
+class SessaoEmFinalizacao(Exception):
+    """Outra requisição já está finalizando a sessão (resposta 409)"""
+
+
+def _agora():
+    return datetime.utcnow().strftime(_FORMATO_DATA)
+
+
+def intervalos(indices):
+    """Agrupa índices ordenados em intervalos fechados [[inicio, fim], ...]"""
+    resultado = []
+    for indice in indices:
+        if resultado and indice == resultado[-1][1] + 1:
+            resultado[-1][1] = indice
+        else:
+            resultado.append([indice, indice])
+    return resultado
+
+
+class GravacaoChunk:
+    """Gravação de um pedaço na sua posição do arquivo da sessão"""
+
+    def __init__(self, sessions, sessao_id, indice, inicio, esperado):
+        self.sessions = sessions
+        self.sessao_id = sessao_id
+        self.indice = indice
+        self.inicio = inicio
+        self.esperado = esperado
+        self.recebido = 0
+        self._sha256 = hashlib.sha256()
+        self._fd = os.open(sessions._caminho(sessao_id), os.O_WRONLY)
+
+    @property
+    def restante(self):
+        """Bytes que ainda faltam para completar o pedaço"""
+        return self.esperado - self.recebido
+
+    def write(self, data):
+        """Grava mais bytes do pedaço, recusando o que exceder o tamanho esperado"""
+        if self.recebido + len(data) > self.esperado:
+            raise UploadInvalido(f"Pedaço {self.indice} maior que {self.esperado} bytes")
+        self._sha256.update(data)
+        os.pwrite(self._fd, data, self.inicio + self.recebido)
+        self.recebido += len(data)
+        bytes_upload.somar(len(data), 'sessao')
+
+    def fechar(self):
+        """Fecha o descritor do arquivo da sessão (idempotente)"""
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            os.close(fd)
+
+    def concluir(self, sha256_informado=None):
+        """Confere tamanho e SHA-256 e marca o pedaço como recebido"""
+        self.fechar()
+        if self.recebido != self.esperado:
+            raise UploadInvalido(f"Pedaço {self.indice} incompleto: {self.recebido} de {self.esperado} bytes")
+        digest = self._sha256.hexdigest()
+        if sha256_informado and sha256_informado.lower() != digest:
+            raise ChecksumInvalido(f"SHA-256 do pedaço {self.indice} não confere")
+        self.sessions._registrar_chunk(self.sessao_id, self.indice, self.recebido, digest)
+        return {'indice': self.indice, 'tamanho': self.recebido, 'sha256': digest}
+
+
+class UploadSessionService:
+    """Upload retomável em pedaços numerados
+
+    A sessão reserva um arquivo `<raiz>/sessoes/<id>.part` do tamanho total e
+    cada pedaço é gravado direto na sua posição (pwrite), em qualquer ordem e
+    inclusive em paralelo. Os pedaços recebidos ficam em upload_sessoes_chunks
+    com o SHA-256 conferido. Na finalização o arquivo já está montado: ele é
+    apenas lido para o hash e movido para o armazenamento, sem cópia.
+    """
+
+    def __init__(self, db_manager, upload_service, tamanho_chunk=8 * 1024 * 1024,
+                 expiracao_horas=24, gc_interval=3600.0):
+        self.db_manager = db_manager
+        self.upload_service = upload_service
+        self.storage = upload_service.storage
+        self.tamanho_chunk = tamanho_chunk
+        self.expiracao_horas = expiracao_horas
+        self.sessoes_dir = os.path.join(self.storage.root, 'sessoes')
+        self._gc = PeriodicTask('upload-sessions-gc', gc_interval, self.coletar_abandonadas)
+
+    def ensure_gc_started(self):
+        """Inicia a coleta periódica de sessões abandonadas uma vez por processo"""
+        self._gc.ensure_started()
+
+    def stop(self):
+        """Interrompe a coleta periódica"""
+        self._gc.stop()
+
+    def _caminho(self, sessao_id, sufixo='part'):
+        return os.path.join(self.sessoes_dir, f"{sessao_id}.{sufixo}")
+
+    def criar(self, usuario, dados):
+        """Abre uma sessão a partir de tipo_documento, nome_arquivo e tamanho_total"""
+        tipo = self.upload_service.tipo_documento(self.upload_service.chave_tipo(dados))
+        nome_arquivo = dados.get('nome_arquivo')
+        if not nome_arquivo or not isinstance(nome_arquivo, str):
+            raise UploadInvalido("nome_arquivo é obrigatório")
+        self.upload_service.validar_extensao(tipo, nome_arquivo)
+        try:
+            tamanho_total = int(dados.get('tamanho_total'))
+        except (TypeError, ValueError):
+            raise UploadInvalido("tamanho_total é obrigatório")
+        if tamanho_total <= 0:
+            raise UploadInvalido("tamanho_total deve ser maior que zero")
+        limite = self.upload_service.limite_bytes(tipo)
+        if tamanho_total > limite:
+            raise ArquivoMuitoGrande(limite)
+
+        campos = {campo: str(dados[campo]) for campo in _CAMPOS_DOCUMENTO if dados.get(campo) is not None}
+        transportadora_id = self.upload_service.transportadora_do_upload(usuario, campos)
+        self.upload_service.metadados(campos)
+
+        sessao_id = uuid.uuid4().hex
+        total_chunks = -(-tamanho_total // self.tamanho_chunk)
+        os.makedirs(self.sessoes_dir, exist_ok=True)
+        # Arquivo esparso com o tamanho final; os pedaços preenchem as posições
+        with open(self._caminho(sessao_id), 'wb') as f:
+            f.truncate(tamanho_total)
+
+        agora = _agora()
+        self.db_manager.run(
+            """INSERT INTO upload_sessoes (id, usuario_id, transportadora_id, tipo_documento_id,
+                                           nome_arquivo_original, mime_type, tamanho_total, tamanho_chunk,
+                                           total_chunks, metadata, data_criacao, data_atualizacao)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (sessao_id, usuario['id'], transportadora_id, tipo['id'], nome_arquivo[:255],
+             dados.get('mime_type'), tamanho_total, self.tamanho_chunk, total_chunks,
+             json.dumps(campos), agora, agora)
+        )
+        return {
+            'id': sessao_id,
+            'tamanho_total': tamanho_total,
+            'tamanho_chunk': self.tamanho_chunk,
+            'total_chunks': total_chunks,
+            'expira_em': (datetime.utcnow() + timedelta(hours=self.expiracao_horas)).isoformat(),
+        }
+
+    def _sessao(self, sessao_id, usuario):
+        rows = self.db_manager.run(
+            """SELECT id, usuario_id, transportadora_id, tipo_documento_id, nome_arquivo_original, mime_type,
+                      tamanho_total, tamanho_chunk, total_chunks, metadata
+               FROM upload_sessoes WHERE id = ?""",
+            (sessao_id,),
+            fetch=True
+        )
+        if not rows or rows[0]['usuario_id'] != usuario['id']:
+            raise SessaoNaoEncontrada(f"Sessão de upload não encontrada: {sessao_id}")
+        return rows[0]
+
+    def abrir_chunk(self, usuario, sessao_id, indice):
+        """Prepara a gravação do pedaço `indice` (alimentada pelo chamador)"""
+        sessao = self._sessao(sessao_id, usuario)
+        if not 0 <= indice < sessao['total_chunks']:
+            raise UploadInvalido(f"Índice de pedaço inválido: {indice}")
+        inicio = indice * sessao['tamanho_chunk']
+        esperado = min(sessao['tamanho_chunk'], sessao['tamanho_total'] - inicio)
+        try:
+            return GravacaoChunk(self, sessao_id, indice, inicio, esperado)
+        except FileNotFoundError:
+            raise SessaoEmFinalizacao(f"Sessão {sessao_id} já está sendo finalizada")
+
+    def receber_chunk(self, usuario, sessao_id, indice, stream, sha256_informado=None):
+        """Grava o pedaço `indice` na sua posição, conferindo tamanho e SHA-256"""
+        gravacao = self.abrir_chunk(usuario, sessao_id, indice)
+        try:
+            while True:
+                data = stream.read(min(self.storage.chunk_size, gravacao.restante + 1))
+                if not data:
+                    break
+                gravacao.write(data)
+        finally:
+            gravacao.fechar()
+        return gravacao.concluir(sha256_informado)
+
+    def _registrar_chunk(self, sessao_id, indice, tamanho, digest):
+        with self.db_manager.transaction() as tx:
+            tx.run(
+                """INSERT INTO upload_sessoes_chunks (sessao_id, indice, tamanho, sha256) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (sessao_id, indice) DO UPDATE SET tamanho = excluded.tamanho, sha256 = excluded.sha256""",
+                (sessao_id, indice, tamanho, digest)
+            )
+            tx.run("UPDATE upload_sessoes SET data_atualizacao = ? WHERE id = ?", (_agora(), sessao_id))
+
+    def _indices_recebidos(self, sessao_id):
+        rows = self.db_manager.run(
+            "SELECT indice FROM upload_sessoes_chunks WHERE sessao_id = ? ORDER BY indice",
+            (sessao_id,),
+            fetch=True
+        )
+        return [row['indice'] for row in rows]
+
+    def status(self, usuario, sessao_id):
+        """Intervalos de pedaços já recebidos, para o cliente retomar o envio"""
+        sessao = self._sessao(sessao_id, usuario)
+        indices = self._indices_recebidos(sessao_id)
+        return {
+            'id': sessao_id,
+            'tamanho_total': sessao['tamanho_total'],
+            'tamanho_chunk': sessao['tamanho_chunk'],
+            'total_chunks': sessao['total_chunks'],
+            'recebidos': intervalos(indices),
+            'faltando': sessao['total_chunks'] - len(indices),
+            'completo': len(indices) == sessao['total_chunks'],
+        }
+
+    def finalizar(self, usuario, sessao_id, ip_address=None, user_agent=None):
+        """Confere os pedaços, registra o documento e move o arquivo para o storage
+
+        O arquivo é publicado dentro da transação do registro, que o devolve à
+        sessão se falhar. Se o processo cair no meio, o `.finalizando` que sobra
+        volta a `.part` na coleta periódica e a finalização pode ser repetida.
+        """
+        sessao = self._sessao(sessao_id, usuario)
+        faltando = sessao['total_chunks'] - len(self._indices_recebidos(sessao_id))
+        if faltando:
+            raise UploadInvalido(f"Faltam {faltando} pedaço(s) para finalizar o upload")
+
+        # Renomear é atômico: só uma requisição consegue reivindicar o arquivo.
+        # O mtime marca o início da finalização para a coleta de interrompidas.
+        origem = self._caminho(sessao_id, 'finalizando')
+        try:
+            os.rename(self._caminho(sessao_id), origem)
+        except FileNotFoundError:
+            raise SessaoEmFinalizacao(f"Sessão {sessao_id} já está sendo finalizada")
+        os.utime(origem)
+
+        try:
+            arquivo = ArquivoPendente(
+                self.storage, origem, self.storage.calcular_hash(origem), sessao['tamanho_total']
+            )
+            campos = json.loads(sessao['metadata'] or '{}')
+            campos['transportadora_id'] = sessao['transportadora_id']
+            tipo = self.upload_service.tipo_documento(sessao['tipo_documento_id'])
+            documento = self.upload_service.registrar(
+                {**usuario, 'transportadora_id': sessao['transportadora_id']}, campos, tipo, arquivo,
+                sessao['nome_arquivo_original'], sessao['mime_type'],
+                ip_address=ip_address, user_agent=user_agent
+            )
+        except DocumentoDuplicado:
+            os.unlink(origem)
+            self._remover(sessao_id)
+            raise
+        except BaseException:
+            # Devolve o arquivo para que a finalização possa ser repetida
+            os.rename(origem, self._caminho(sessao_id))
+            raise
+
+        self._remover(sessao_id)
+        return documento
+
+    def cancelar(self, usuario, sessao_id):
+        """Descarta a sessão e o arquivo parcial"""
+        self._sessao(sessao_id, usuario)
+        self._remover(sessao_id)
+
+    def _remover(self, sessao_id):
+        with self.db_manager.transaction() as tx:
+            tx.run("DELETE FROM upload_sessoes_chunks WHERE sessao_id = ?", (sessao_id,))
+            tx.run("DELETE FROM upload_sessoes WHERE id = ?", (sessao_id,))
+        try:
+            os.unlink(self._caminho(sessao_id))
+        except FileNotFoundError:
+            pass
+
+    def _recuperar_finalizacoes(self):
+        """Trata arquivos .finalizando de finalizações interrompidas
+
+        Com a sessão ainda registrada o arquivo volta a `.part` para que a
+        finalização possa ser repetida; sem ela, é removido.
+        """
+        try:
+            nomes = os.listdir(self.sessoes_dir)
+        except FileNotFoundError:
+            return 0
+        limite = time.time() - _FINALIZACAO_MAXIMA
+        recuperados = 0
+        for nome in nomes:
+            sessao_id, _, sufixo = nome.partition('.')
+            if sufixo != 'finalizando':
+                continue
+            caminho = self._caminho(sessao_id, 'finalizando')
+            try:
+                if os.stat(caminho).st_mtime > limite:
+                    continue
+                if self.db_manager.run("SELECT id FROM upload_sessoes WHERE id = ?", (sessao_id,), fetch=True):
+                    os.rename(caminho, self._caminho(sessao_id))
+                else:
+                    os.unlink(caminho)
+            except FileNotFoundError:
+                continue
+            recuperados += 1
+        if recuperados:
+            logger.warning(f"{recuperados} finalização(ões) de upload interrompida(s) recuperada(s)")
+        return recuperados
+
+    def coletar_abandonadas(self):
+        """Recupera finalizações interrompidas e remove sessões sem atividade há mais de `expiracao_horas`"""
+        self._recuperar_finalizacoes()
+        limite = (datetime.utcnow() - timedelta(hours=self.expiracao_horas)).strftime(_FORMATO_DATA)
+        rows = self.db_manager.run(
+            "SELECT id FROM upload_sessoes WHERE data_atualizacao < ?", (limite,), fetch=True
+        )
+        for row in rows:
+            self._remover(row['id'])
+        if rows:
+            logger.info(f"{len(rows)} sessão(ões) de upload abandonada(s) removida(s)")
+        return len(rows)
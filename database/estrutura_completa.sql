@@ -57,6 +57,9 @@ CREATE TABLE tipos_documento (
 CREATE TABLE transportadoras (
     id_transportadora INT AUTO_INCREMENT PRIMARY KEY,
     cnpj VARCHAR(18) UNIQUE NOT NULL,
+    cnpj_digitos VARCHAR(14) GENERATED ALWAYS AS (
+        REPLACE(REPLACE(REPLACE(REPLACE(cnpj, '.', ''), '/', ''), '-', ''), ' ', '')
+    ) STORED,
     razao_social VARCHAR(200) NOT NULL,
     nome_fantasia VARCHAR(200),
     inscricao_estadual VARCHAR(20),
@@ -190,6 +193,7 @@ CREATE TABLE notificacoes (
     tentativas_envio INT DEFAULT 0,
     erro_envio TEXT,
     dados_extras JSON,
+    proxima_tentativa TIMESTAMP NULL,
     data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     CHECK (canal IN ('EMAIL', 'SMS', 'PUSH', 'SISTEMA')),
     CHECK (status_envio IN ('PENDENTE', 'ENVIADO', 'ERRO', 'LIDO')),
@@ -206,6 +210,8 @@ CREATE INDEX idx_tipos_documento_ativo ON tipos_documento(ativo);
 CREATE INDEX idx_transportadoras_cnpj ON transportadoras(cnpj);
 CREATE INDEX idx_transportadoras_razao_social ON transportadoras(razao_social);
 CREATE INDEX idx_transportadoras_status_ativo ON transportadoras(status_ativo);
+CREATE INDEX idx_transportadoras_cnpj_digitos ON transportadoras(cnpj_digitos);
+CREATE FULLTEXT INDEX ft_transportadoras_busca ON transportadoras(razao_social, nome_fantasia, endereco_cidade);
 CREATE INDEX idx_usuarios_email ON usuarios(email);
 CREATE INDEX idx_usuarios_tipo ON usuarios(tipo_usuario);
 CREATE INDEX idx_usuarios_transportadora ON usuarios(id_transportadora);
@@ -219,6 +225,20 @@ CREATE INDEX idx_historico_documento ON historico_documentos(id_documento);
 CREATE INDEX idx_historico_usuario ON historico_documentos(id_usuario);
 CREATE INDEX idx_notificacoes_usuario ON notificacoes(id_usuario);
 CREATE INDEX idx_notificacoes_status_envio ON notificacoes(status_envio);
+CREATE INDEX idx_notificacoes_fila ON notificacoes(status_envio, canal, proxima_tentativa);
+
+-- =====================================================
+-- MIGRAÇÃO DE BANCOS EXISTENTES
+-- Aplicada automaticamente por DatabaseManager.create_tables(), que só
+-- executa os passos cuja coluna/índice ainda não existe. Manualmente:
+-- =====================================================
+-- ALTER TABLE transportadoras ADD COLUMN cnpj_digitos VARCHAR(14) GENERATED ALWAYS AS (
+--     REPLACE(REPLACE(REPLACE(REPLACE(cnpj, '.', ''), '/', ''), '-', ''), ' ', '')
+-- ) STORED AFTER cnpj;
+-- ALTER TABLE transportadoras ADD INDEX idx_transportadoras_cnpj_digitos (cnpj_digitos);
+-- ALTER TABLE transportadoras ADD FULLTEXT INDEX ft_transportadoras_busca (razao_social, nome_fantasia, endereco_cidade);
+-- ALTER TABLE notificacoes ADD COLUMN proxima_tentativa TIMESTAMP NULL;
+-- ALTER TABLE notificacoes ADD INDEX idx_notificacoes_fila (status_envio, canal, proxima_tentativa);
 
 -- =====================================================
 -- DADOS INICIAIS
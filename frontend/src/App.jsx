@@ -332,8 +332,7 @@ const LoginForm = () => {
             <div className="mt-6 p-4 bg-gray-50 rounded-lg">
               <h3 className="font-medium text-gray-900 mb-2">Credenciais de Teste:</h3>
               <div className="text-sm text-gray-600 space-y-1">
-                <p><strong>Admin:</strong> admin@nimoenergia.com.br / admin123</p>
-                <p><strong>Transportadora:</strong> silva@silvatransportes.com.br / senha123</p>
+                <p><strong>Admin:</strong> admin@nimoenergia.com.br / senha123</p>
               </div>
             </div>
           </CardContent>